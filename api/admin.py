@@ -2,11 +2,12 @@
 
 from django.contrib import admin
 from .models import (
-    User, Role, Office, Permission, Client, Invoice, MerchandiseItem,
-    Vehicle, ShipmentManifest, Expense, AuditLog, CompanyInfo,
+    User, Role, Office, OfficeRoute, Permission, Client, Invoice, MerchandiseItem,
+    Vehicle, VehicleEvent, ShipmentManifest, Expense, AuditLog, CompanyInfo,
     Supplier, AssetCategory, Asset,
     # CAMBIO: Importar los nuevos modelos
-    ShippingType, PaymentMethod, ExpenseCategory, Category
+    ShippingType, PaymentMethod, ExpenseCategory, Category,
+    ExchangeRate
 )
 
 # Creamos una clase especial para mejorar la visualización de los Roles
@@ -18,11 +19,13 @@ class RoleAdmin(admin.ModelAdmin):
 # Registramos los modelos existentes
 admin.site.register(User)
 admin.site.register(Office)
+admin.site.register(OfficeRoute)
 admin.site.register(Permission)
 admin.site.register(Client)
 admin.site.register(Invoice)
 admin.site.register(MerchandiseItem)
 admin.site.register(Vehicle)
+admin.site.register(VehicleEvent)
 admin.site.register(ShipmentManifest)
 admin.site.register(Expense)
 admin.site.register(AuditLog)
@@ -36,6 +39,7 @@ admin.site.register(ShippingType)
 admin.site.register(PaymentMethod)
 admin.site.register(ExpenseCategory)
 admin.site.register(Category)
+admin.site.register(ExchangeRate)
 
 
 # CAMBIO: Le decimos a Django que use nuestra clase personalizada para el modelo Role
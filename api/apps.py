@@ -6,4 +6,8 @@ class ApiConfig(AppConfig):
 
     def ready(self):
         # Importa las señales para que se registren cuando la app esté lista
-        import api.signals
\ No newline at end of file
+        import api.signals
+        import api.checks
+        # Métricas y detector de consultas en cada conexión (ver api/instrumentation.py)
+        from api import instrumentation
+        instrumentation.install()
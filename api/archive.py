@@ -0,0 +1,152 @@
+# api/archive.py
+
+"""
+Archivo de datos antiguos (permiso system.cleanup).
+
+Las facturas entregadas y pagadas anteriores a ARCHIVE_INVOICE_DAYS pasan,
+con sus items, a ArchivedInvoice; los registros de auditoría anteriores a
+ARCHIVE_AUDIT_DAYS, a ArchivedAuditLog.
+
+Se trabaja por lotes de ARCHIVE_BATCH_SIZE filas: cada lote copia y borra en
+su propia transacción corta, así que los bloqueos duran lo que un lote y una
+interrupción pierde a lo sumo el lote en curso. No hay estado que reanudar:
+la siguiente ejecución sigue con las filas que aún cumplen el criterio. En
+PostgreSQL las filas bloqueadas por otra transacción se saltan (SKIP LOCKED)
+y quedan para la próxima ejecución.
+
+Las facturas archivadas siguen en los reportes de ganancias y pérdidas (ver
+api/reports.py) y en el rastreo público por su número (api/tracking.py); la
+sincronización incremental las informa como borradas.
+"""
+
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import dashboard, sync, tracking
+from .cache import on_commit_too
+from .models import ArchivedAuditLog, ArchivedInvoice, AuditLog, Invoice, MerchandiseItem
+from .serializers import invoice_rows
+
+# Facturas que ya no cambian
+FINISHED = Q(shipping_status='ENTREGADA', payment_status='PAGADA')
+
+
+def cutoffs(invoice_days=None, audit_days=None):
+    """Fechas límite (facturas, auditoría) a partir de los días a conservar."""
+    now = timezone.now()
+    invoice_days = settings.ARCHIVE_INVOICE_DAYS if invoice_days is None else invoice_days
+    audit_days = settings.ARCHIVE_AUDIT_DAYS if audit_days is None else audit_days
+    return now - timedelta(days=invoice_days), now - timedelta(days=audit_days)
+
+
+def archivable_invoices(before):
+    return Invoice.objects.filter(FINISHED, created_at__lt=before)
+
+
+def archivable_audit_logs(before):
+    return AuditLog.objects.filter(timestamp__lt=before)
+
+
+def pending(invoice_days=None, audit_days=None):
+    """Filas que se archivarían con estos días a conservar."""
+    invoices_before, audit_before = cutoffs(invoice_days, audit_days)
+    return {
+        'invoices': archivable_invoices(invoices_before).count(),
+        'audit_logs': archivable_audit_logs(audit_before).count(),
+    }
+
+
+def run(invoice_days=None, audit_days=None, batch_size=None, max_batches=None, pause=0):
+    """
+    Archiva por lotes y devuelve las filas archivadas {'invoices', 'audit_logs'}.
+    `max_batches` limita los lotes de cada tabla y `pause` (segundos) espacia
+    los lotes para no competir con el tráfico normal.
+    """
+    invoices_before, audit_before = cutoffs(invoice_days, audit_days)
+    batch_size = batch_size or settings.ARCHIVE_BATCH_SIZE
+    return {
+        'invoices': _in_batches(_archive_invoices, invoices_before, batch_size, max_batches, pause),
+        'audit_logs': _in_batches(_archive_audit_logs, audit_before, batch_size, max_batches, pause),
+    }
+
+
+def _in_batches(archive_batch, before, batch_size, max_batches, pause):
+    total = batches = 0
+    after = 0
+    while max_batches is None or batches < max_batches:
+        if batches and pause:
+            time.sleep(pause)
+        archived, after = archive_batch(before, after, batch_size)
+        if not archived:
+            break
+        total += archived
+        batches += 1
+    return total
+
+
+def _locked_batch(queryset, after, batch_size, *fields):
+    """Siguiente lote por clave primaria, bloqueado y sin esperar a las filas ya bloqueadas."""
+    return list(
+        queryset.filter(pk__gt=after).order_by('pk')
+        .select_for_update(skip_locked=True, of=('self',))
+        .values_list('pk', *fields)[:batch_size]
+    )
+
+
+def _archive_invoices(before, after, batch_size):
+    with transaction.atomic():
+        ids = [pk for pk, in _locked_batch(archivable_invoices(before), after, batch_size)]
+        if not ids:
+            return 0, after
+        batch = Invoice.objects.filter(pk__in=ids).order_by('pk')
+        data = invoice_rows.serialize(invoice_rows.values(batch))
+        public = {invoice.pk: tracking.represent(invoice) for invoice in tracking.tracked_invoices().filter(pk__in=ids)}
+        columns = batch.values_list(
+            'pk', 'invoice_number', 'origin_office_id', 'destination_office_id', 'created_at',
+            'payment_status', 'shipping_status', 'payment_currency', 'total', 'exchange_rate',
+        )
+        ArchivedInvoice.objects.bulk_create([
+            ArchivedInvoice(
+                original_id=pk, invoice_number=number, origin_office_id=origin, destination_office_id=destination,
+                created_at=created_at, payment_status=payment_status, shipping_status=shipping_status,
+                payment_currency=currency, total=total, exchange_rate=rate,
+                kilos=sum((Decimal(item['weight']) for item in record['items']), Decimal('0')),
+                data=record, tracking=public[pk],
+            )
+            for (pk, number, origin, destination, created_at, payment_status, shipping_status, currency, total, rate), record
+            in zip(columns, data)
+        ])
+        # Borrado directo, sin cargar cada factura: las señales se reemplazan por lo que sigue
+        MerchandiseItem.objects.filter(invoice_id__in=ids)._raw_delete(MerchandiseItem.objects.db)
+        batch._raw_delete(batch.db)
+        sync.log_bulk(Invoice, ids, deleted=True)
+        numbers = [record['invoice_number'] for record in data]
+        on_commit_too(lambda: tracking.invalidate(numbers))
+        # Las facturas terminadas están ENTREGADAS (ver FINISHED)
+        transaction.on_commit(lambda: dashboard.apply({'ENTREGADA': -len(ids)}))
+    return len(ids), ids[-1]
+
+
+def _archive_audit_logs(before, after, batch_size):
+    with transaction.atomic():
+        rows = _locked_batch(
+            archivable_audit_logs(before), after, batch_size, 'user_id', 'user__username', 'action', 'details', 'timestamp',
+        )
+        if not rows:
+            return 0, after
+        ArchivedAuditLog.objects.bulk_create([
+            ArchivedAuditLog(
+                original_id=pk, user_id=user_id, username=username or '', action=action, details=details,
+                timestamp=timestamp,
+            )
+            for pk, user_id, username, action, details, timestamp in rows
+        ])
+        ids = [row[0] for row in rows]
+        AuditLog.objects.filter(pk__in=ids)._raw_delete(AuditLog.objects.db)
+    return len(ids), ids[-1]
@@ -0,0 +1,257 @@
+# api/async_views.py
+
+"""
+Vistas asíncronas para los endpoints de lectura más consultados: perfil,
+dashboard, datos de referencia y búsqueda de facturas por número.
+
+Bajo ASGI (config/asgi.py) AsyncRoutesMiddleware resuelve las URLs con
+config.urls_asgi, que antepone estas vistas a las de DRF en las mismas rutas;
+bajo WSGI se siguen usando las vistas síncronas. Usan el ORM asíncrono, así
+que una petición que espera a la base de datos no ocupa un hilo, y responden
+exactamente el mismo JSON que la vista síncrona equivalente.
+
+Cada proceso atiende a lo sumo ASYNC_VIEW_CONCURRENCY de estas peticiones a
+la vez (conviene igualarlo al tamaño del pool de conexiones a la base de
+datos); las demás esperan hasta ASYNC_VIEW_QUEUE_TIMEOUT segundos y luego
+reciben 503.
+"""
+
+import asyncio
+import weakref
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import Sum
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from rest_framework import exceptions
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+
+from . import changefeed, dashboard, db_router
+from . import currency as currencies
+from .cache import reference_namespace
+from .models import User
+from .renderers import FastJSONRenderer
+from .serializers import ChangeFeedQuerySerializer, InvoiceSerializer, StatusChangeSerializer, UserSerializer
+from .views import dashboard_queries, dashboard_stats as build_dashboard_stats, feed_invoices, visible_invoices
+
+_renderer = FastJSONRenderer()
+_jwt = JWTAuthentication()
+_limits = weakref.WeakKeyDictionary()
+
+
+class Overloaded(Exception):
+    pass
+
+
+def render(data, status=200, headers=None):
+    """Misma codificación JSON que las respuestas de DRF."""
+    return HttpResponse(_renderer.render(data), content_type='application/json', status=status, headers=headers)
+
+
+def render_error(exc, request):
+    headers = None
+    if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+        headers = {'WWW-Authenticate': _jwt.authenticate_header(request)}
+    detail = exc.detail if isinstance(exc.detail, dict) else {'detail': exc.detail}
+    return render(detail, status=exc.status_code, headers=headers)
+
+
+async def authenticate(request):
+    """Autenticación JWT como la de DRF, pero con el usuario (rol, oficina y permisos) leído con el ORM asíncrono."""
+    header = _jwt.get_header(request)
+    if header is None:
+        return None
+    raw_token = _jwt.get_raw_token(header)
+    if raw_token is None:
+        return None
+    token = _jwt.get_validated_token(raw_token)
+    try:
+        user_id = token[jwt_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken("El token no contiene una identificación de usuario reconocible.")
+    user = await (
+        User.objects
+        .select_related('role', 'office')
+        .prefetch_related('role__permissions')
+        .filter(**{jwt_settings.USER_ID_FIELD: user_id})
+        .afirst()
+    )
+    if user is None:
+        raise exceptions.AuthenticationFailed("Usuario no encontrado.", code='user_not_found')
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed("Usuario inactivo.", code='user_inactive')
+    return user
+
+
+@asynccontextmanager
+async def concurrency_limit():
+    loop = asyncio.get_running_loop()
+    semaphore = _limits.get(loop)
+    if semaphore is None:
+        semaphore = _limits[loop] = asyncio.Semaphore(settings.ASYNC_VIEW_CONCURRENCY)
+    if semaphore.locked():
+        try:
+            await asyncio.wait_for(semaphore.acquire(), settings.ASYNC_VIEW_QUEUE_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise Overloaded
+    else:
+        await semaphore.acquire()
+    try:
+        yield
+    finally:
+        semaphore.release()
+
+
+def async_api_view(fallback=None, limited=True):
+    """
+    Convierte `view(request, user, ...)` en una vista asíncrona autenticada de
+    solo lectura. Los demás métodos, y las lecturas con parámetros si se indica
+    `fallback`, los atiende la vista síncrona `fallback`. Con limited=False la
+    vista no cuenta para el límite de concurrencia mientras espera (long-poll,
+    SSE) y debe usar concurrency_limit() en cada lectura.
+    """
+    def decorator(view):
+        sync_fallback = sync_to_async(fallback) if fallback else None
+
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if sync_fallback and (request.method != 'GET' or request.GET):
+                return await sync_fallback(request, *args, **kwargs)
+            if request.method != 'GET':
+                return render_error(exceptions.MethodNotAllowed(request.method), request)
+            try:
+                user = await authenticate(request)
+                if user is None:
+                    raise exceptions.NotAuthenticated()
+                request.user = user
+                if not limited:
+                    return await view(request, user, *args, **kwargs)
+                async with concurrency_limit():
+                    return await view(request, user, *args, **kwargs)
+            except exceptions.APIException as exc:
+                return render_error(exc, request)
+            except Http404:
+                return render_error(exceptions.NotFound(), request)
+            except Overloaded:
+                return render({'detail': "Servidor ocupado, intente de nuevo."}, status=503, headers={'Retry-After': '1'})
+
+        # Las vistas de DRF están exentas de CSRF; la alternativa síncrona también debe estarlo
+        wrapper.csrf_exempt = True
+        return wrapper
+    return decorator
+
+
+@async_api_view()
+async def user_profile(request, user):
+    return render(UserSerializer(user, context={'request': request}).data)
+
+
+@async_api_view()
+async def dashboard_stats(request, user):
+    currency = request.GET.get('currency', currencies.reporting_currency())
+    if currency not in currencies.CURRENCIES:
+        return render({'currency': 'Moneda no soportada.'}, status=400)
+    # Como la vista síncrona: las lecturas del dashboard van a una réplica
+    await db_router.ause_replica(user)
+    # Construir las consultas puede leer la tabla de tasas (síncrona y con caché por proceso)
+    revenue, expenses = await sync_to_async(dashboard_queries)(currency)
+    total_revenue = (await revenue.aaggregate(total=Sum('converted')))['total']
+    total_expenses = (await expenses.aaggregate(total=Sum('converted')))['total']
+    counts = await dashboard.ashipping_status_counts()
+    return render(build_dashboard_stats(currency, total_revenue, total_expenses, counts))
+
+
+@async_api_view()
+async def invoice_by_number(request, user, number):
+    invoice = await visible_invoices(user).filter(invoice_number=number).afirst()
+    if invoice is None:
+        raise Http404
+    return render(InvoiceSerializer(invoice).data)
+
+
+@async_api_view(limited=False)
+async def change_feed(request, user):
+    """Long-poll del feed de cambios, como ChangeFeedView pero sin ocupar un hilo mientras espera."""
+    params = ChangeFeedQuerySerializer(data=request.GET)
+    if not params.is_valid():
+        return render(params.errors, status=400)
+    since = params.validated_data.get('since')
+    if since is None:
+        async with concurrency_limit():
+            return render({'since': None, 'next': await sync_to_async(changefeed.head)(), 'results': []})
+    changes, cursor = await changefeed.await_changes(
+        since, feed_invoices(user), params.validated_data['wait'], gate=concurrency_limit,
+    )
+    return render({'since': since, 'next': cursor, 'results': StatusChangeSerializer(changes, many=True).data})
+
+
+@async_api_view(limited=False)
+async def change_stream(request, user):
+    """
+    Feed de cambios como server-sent events: un evento 'status' por cambio,
+    con la secuencia como id. Reanuda desde Last-Event-ID (reconexión del
+    navegador) o ?since=; sin ninguno empieza desde el cambio más reciente.
+    """
+    params = ChangeFeedQuerySerializer(data=request.GET)
+    if not params.is_valid():
+        return render(params.errors, status=400)
+    since = params.validated_data.get('since')
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    if since is None:
+        async with concurrency_limit():
+            since = await sync_to_async(changefeed.head)()
+    invoices = feed_invoices(user)
+
+    async def events():
+        cursor = since
+        yield f'retry: {settings.CHANGE_FEED_POLL_INTERVAL * 1000}\nid: {cursor}\n\n'.encode()
+        while True:
+            try:
+                changes, position = await changefeed.await_changes(
+                    cursor, invoices, settings.CHANGE_FEED_MAX_WAIT, gate=concurrency_limit,
+                )
+            except Overloaded:
+                await asyncio.sleep(settings.CHANGE_FEED_POLL_INTERVAL)
+                continue
+            for change in StatusChangeSerializer(changes, many=True).data:
+                yield b'id: %d\nevent: status\ndata: %s\n\n' % (change['seq'], _renderer.render(change))
+            if position != (changes[-1].id if changes else cursor):
+                # Un id sin datos solo avanza Last-Event-ID: la reconexión no repasa los cambios no visibles
+                yield b'id: %d\n\n' % position
+            elif not changes:
+                # Comentario para que los proxies no cierren la conexión inactiva
+                yield b': ping\n\n'
+            cursor = position
+
+    return StreamingHttpResponse(
+        events(), content_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+
+def reference_list(viewset):
+    """Lista de un viewset de referencia servida desde la misma caché que CachedReferenceMixin."""
+    queryset = viewset.queryset
+    namespace = reference_namespace(queryset.model)
+
+    async def view(request, user):
+        version = await namespace.aversion()
+        data = await namespace.aget(('list',), version=version)
+        if data is None:
+            rows = await _list(queryset.all())
+            data = list(viewset.serializer_class(rows, many=True).data)
+            await namespace.aset(('list',), data, version=version)
+        return render(data)
+
+    view.__name__ = view.__qualname__ = f'{viewset.__name__}.async_list'
+    return async_api_view(fallback=viewset.as_view({'get': 'list', 'post': 'create'}))(view)
+
+
+async def _list(queryset):
+    return [row async for row in queryset]
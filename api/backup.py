@@ -0,0 +1,496 @@
+# api/backup.py
+
+"""
+Respaldo y restauración de la base de datos y de los archivos subidos
+(permiso system.backupRestore).
+
+Un respaldo es un archivo tar con:
+
+- manifest.json: formato, id del respaldo, respaldo base (si es incremental),
+  marcas para el siguiente incremental y, por tabla, columnas, filas, trozos
+  y ids borrados;
+- data/<modelo>/<n>.jsonl.gz: las filas de cada tabla en trozos de
+  BACKUP_CHUNK_SIZE, una lista JSON por línea en el orden de las columnas;
+- media/...: los archivos de MEDIA_ROOT.
+
+Se respaldan los modelos de la app api y sus tablas M2M, en orden de
+dependencias. Las filas se leen con values_list() por trozos y cada trozo se
+comprime y se agrega al tar apenas se llena, así que la memoria no crece con
+el tamaño de las tablas. En PostgreSQL las tablas se leen en paralelo
+(BACKUP_WORKERS hilos) dentro de una misma foto de la base
+(pg_export_snapshot); en los demás motores, en una sola transacción.
+
+Un respaldo incremental (`since`, el manifiesto del respaldo anterior) trae:
+
+- de los modelos sincronizados (ver api/sync.py), los objetos guardados o
+  borrados según el log de sincronización desde el respaldo anterior;
+- de las tablas a las que solo se agregan filas (APPEND_ONLY), las nuevas,
+  y las que se archivaron (ver api/archive.py) como borradas;
+- los items de las facturas cambiadas;
+- las demás tablas, que son pequeñas, completas.
+
+La restauración recibe un respaldo completo seguido de sus incrementales (o
+solo incrementales, sobre una base que está en el estado del primero) y los
+aplica en una transacción: inserciones masivas sin señales, con las
+restricciones de claves foráneas verificadas al final, como loaddata.
+"""
+
+import datetime
+import gzip
+import io
+import json
+import os
+import tarfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from decimal import Decimal
+from itertools import islice
+from types import SimpleNamespace
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.color import no_style
+from django.db import connection, models, transaction
+from django.db.models.constants import OnConflict
+from django.utils import timezone
+from django.utils.duration import duration_iso_string
+
+from . import changefeed, currency, sync, tracking
+from .models import ArchivedAuditLog, ArchivedInvoice, AuditLog, Invoice, MerchandiseItem, StatusChange, SyncLog
+
+FORMAT = 1
+APP_LABEL = 'api'
+
+# Tablas a las que solo se agregan filas -> campo con la fecha de creación
+APPEND_ONLY = {
+    AuditLog: 'timestamp', StatusChange: 'created_at', SyncLog: 'created_at',
+    ArchivedInvoice: 'archived_at', ArchivedAuditLog: 'archived_at',
+}
+
+# Tablas que solo pierden filas al archivarlas (ver api/archive.py) -> tabla de archivo
+ARCHIVED_TO = {AuditLog: ArchivedAuditLog}
+
+# Tablas hijas que en un incremental se respaldan por sus padres cambiados
+CHILDREN = {MerchandiseItem: ('invoice_id', Invoice)}
+
+
+class BackupError(Exception):
+    """Respaldo inválido o que no corresponde a esta base de datos."""
+
+
+def backup_models():
+    """Modelos respaldados (los de la app api y sus tablas M2M) en orden de dependencias."""
+    selected = [
+        model for model in apps.get_app_config(APP_LABEL).get_models(include_auto_created=True)
+        if not model._meta.proxy and all(
+            field.related_model._meta.app_label == APP_LABEL
+            for field in model._meta.concrete_fields if field.is_relation
+        )
+    ]
+    return _sort_by_dependencies(selected)
+
+
+def _sort_by_dependencies(models_):
+    """Cada modelo después de los que referencia; los ciclos se resuelven al final con las restricciones diferidas."""
+    pending = list(models_)
+    ordered = []
+    while pending:
+        for model in pending:
+            depends = {
+                field.related_model for field in model._meta.concrete_fields
+                if field.is_relation and field.related_model is not model
+            }
+            if not depends & set(pending):
+                break
+        else:
+            model = pending[0]
+        pending.remove(model)
+        ordered.append(model)
+    return ordered
+
+
+def label(model):
+    return model._meta.label_lower
+
+
+def read_manifest(source):
+    with _open(source) as archive:
+        return _read_manifest(archive)
+
+
+def _open(source):
+    """Respaldo por ruta o como archivo abierto (ej: un archivo subido)."""
+    if isinstance(source, (str, os.PathLike)):
+        return tarfile.open(source)
+    source.seek(0)
+    return tarfile.open(fileobj=source)
+
+
+def _read_manifest(archive):
+    try:
+        manifest = json.load(archive.extractfile('manifest.json'))
+    except KeyError:
+        raise BackupError("El archivo no es un respaldo: falta manifest.json.")
+    if manifest.get('format') != FORMAT:
+        raise BackupError(f"Formato de respaldo no soportado: {manifest.get('format')}.")
+    return manifest
+
+
+# --- Respaldo ---
+
+def backup(path, since=None, workers=None, chunk_size=None, media=True):
+    """
+    Escribe un respaldo en `path` (completo, o incremental desde el manifiesto
+    `since`) y devuelve su manifiesto.
+    """
+    workers = workers or settings.BACKUP_WORKERS
+    chunk_size = chunk_size or settings.BACKUP_CHUNK_SIZE
+    if connection.vendor != 'postgresql' or connection.in_atomic_block:
+        # Sin una foto exportable los hilos no verían la misma base
+        workers = 1
+    started = time.perf_counter()
+    manifest = {
+        'format': FORMAT,
+        'id': uuid.uuid4().hex,
+        'kind': 'incremental' if since else 'full',
+        'base': since['id'] if since else None,
+        'created_at': timezone.now().isoformat(),
+    }
+    with tarfile.open(path, 'w') as archive, _snapshot(exported=workers > 1) as snapshot:
+        writer = _Writer(archive)
+        manifest['sync_watermark'] = _settled_head(SyncLog, 'created_at')
+        manifest['append_only'] = {label(model): _settled_head(model, field) for model, field in APPEND_ONLY.items()}
+        plans = [_plan_table(model, since, manifest, chunk_size) for model in backup_models()]
+
+        if workers > 1:
+            def dump(plan):
+                with _in_snapshot(snapshot):
+                    return _dump_table(writer, plan, chunk_size)
+            with ThreadPoolExecutor(workers) as pool:
+                manifest['tables'] = list(pool.map(dump, plans))
+        else:
+            manifest['tables'] = [_dump_table(writer, plan, chunk_size) for plan in plans]
+
+        newer_than = datetime.datetime.fromisoformat(since['created_at']).timestamp() if since else None
+        manifest['media'] = _add_media(writer, newer_than) if media else []
+        manifest['rows'] = sum(table['rows'] for table in manifest['tables'])
+        manifest['elapsed_s'] = round(time.perf_counter() - started, 3)
+        writer.add('manifest.json', json.dumps(manifest, indent=1).encode())
+    return manifest
+
+
+@contextmanager
+def _snapshot(exported=False):
+    """Transacción de lectura consistente; con `exported` (PostgreSQL) devuelve el id de su foto para los hilos."""
+    outermost = not connection.in_atomic_block
+    with transaction.atomic():
+        snapshot = None
+        if connection.vendor == 'postgresql' and outermost:
+            # En READ COMMITTED cada consulta vería una base distinta
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                if exported:
+                    cursor.execute('SELECT pg_export_snapshot()')
+                    snapshot = cursor.fetchone()[0]
+        yield snapshot
+
+
+@contextmanager
+def _in_snapshot(snapshot):
+    """En un hilo del respaldo paralelo, abre una transacción sobre la foto `snapshot` y cierra su conexión al final."""
+    try:
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ, READ ONLY')
+                cursor.execute('SET TRANSACTION SNAPSHOT %s', [snapshot])
+            yield
+    finally:
+        connection.close()
+
+
+def _settled_head(model, time_field):
+    """
+    Último id sin huecos recientes (ver changefeed.settled): un id anterior aún
+    sin confirmar no quedaría en este respaldo ni en el siguiente incremental.
+    """
+    window = timezone.now() - datetime.timedelta(seconds=settings.CHANGE_FEED_SETTLE)
+    rows = model._base_manager.order_by()
+    older = rows.filter(**{f'{time_field}__lt': window}).aggregate(head=models.Max('id'))['head'] or 0
+    recent = [
+        SimpleNamespace(id=pk, created_at=moment)
+        for pk, moment in rows.filter(id__gt=older).order_by('id').values_list('id', time_field)
+    ]
+    settled = changefeed.settled(recent, older)
+    return settled[-1].id if settled else older
+
+
+def _plan_table(model, since, manifest, chunk_size):
+    """(modelo, modo, querysets a volcar, ids borrados) para el respaldo completo o incremental."""
+    everything = model._base_manager.all()
+    if since is None:
+        return model, 'full', [everything], []
+    if model in sync.ENTITIES and not sync.needs_full_resync(since['sync_watermark']):
+        changed, deleted = _synced_changes(model, since['sync_watermark'], manifest['sync_watermark'])
+        return model, 'delta', _batches(everything, 'pk', changed, chunk_size), deleted
+    if model in APPEND_ONLY and label(model) in since['append_only']:
+        after, until = since['append_only'][label(model)], manifest['append_only'][label(model)]
+        return model, 'delta', [everything.filter(id__gt=after, id__lte=until)], _archived_since(model, since, manifest)
+    if model in CHILDREN and not sync.needs_full_resync(since['sync_watermark']):
+        parent_field, parent = CHILDREN[model]
+        changed, _ = _synced_changes(parent, since['sync_watermark'], manifest['sync_watermark'])
+        return model, 'delta', _batches(everything, parent_field, changed, chunk_size), []
+    return model, 'full', [everything], []
+
+
+def _archived_since(model, since, manifest):
+    """Ids de `model` que pasaron a su tabla de archivo desde el respaldo base."""
+    archive = ARCHIVED_TO.get(model)
+    if archive is None:
+        return []
+    after = since['append_only'].get(label(archive), 0)
+    until = manifest['append_only'][label(archive)]
+    return list(archive._base_manager.filter(id__gt=after, id__lte=until).values_list('original_id', flat=True))
+
+
+def _synced_changes(model, after, until):
+    """Ids guardados y borrados de `model` según el log de sincronización, contando el último cambio."""
+    latest = dict(
+        SyncLog.objects.filter(entity=sync.ENTITIES[model], id__gt=after, id__lte=until)
+        .order_by('id').values_list('object_id', 'deleted')
+    )
+    changed = [pk for pk, deleted in latest.items() if not deleted]
+    return changed, [pk for pk, deleted in latest.items() if deleted]
+
+
+def _batches(queryset, field, ids, size):
+    return [queryset.filter(**{f'{field}__in': ids[start:start + size]}) for start in range(0, len(ids), size)]
+
+
+def _dump_table(writer, plan, chunk_size):
+    model, mode, querysets, deleted = plan
+    columns = [field.attname for field in model._meta.concrete_fields]
+    name = label(model)
+    table = {
+        'model': name, 'columns': columns, 'mode': mode, 'rows': 0, 'bytes': 0, 'compressed_bytes': 0,
+        'chunks': [], 'deleted': deleted,
+    }
+    rows = (
+        row
+        for queryset in querysets
+        for row in queryset.order_by('pk').values_list(*columns).iterator(chunk_size=chunk_size)
+    )
+    while chunk := list(islice(rows, chunk_size)):
+        lines = '\n'.join(json.dumps(row, default=_encode, ensure_ascii=False, separators=(',', ':')) for row in chunk)
+        data = lines.encode()
+        compressed = gzip.compress(data, compresslevel=settings.BACKUP_COMPRESSION_LEVEL)
+        member = f"data/{name}/{len(table['chunks']):05d}.jsonl.gz"
+        writer.add(member, compressed)
+        table['chunks'].append(member)
+        table['rows'] += len(chunk)
+        table['bytes'] += len(data)
+        table['compressed_bytes'] += len(compressed)
+    return table
+
+
+def _encode(value):
+    """Valores que json no conoce; a diferencia de DjangoJSONEncoder, conserva los microsegundos."""
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return duration_iso_string(value)
+    if isinstance(value, (Decimal, uuid.UUID)):
+        return str(value)
+    raise TypeError(f"Valor no respaldable: {type(value).__name__}")
+
+
+def _add_media(writer, newer_than=None):
+    """Agrega los archivos de MEDIA_ROOT (en un incremental, los modificados desde el respaldo base)."""
+    root = settings.MEDIA_ROOT
+    added = []
+    for directory, _, files in os.walk(root):
+        for filename in sorted(files):
+            path = os.path.join(directory, filename)
+            if newer_than is not None and os.path.getmtime(path) <= newer_than:
+                continue
+            relative = os.path.relpath(path, root).replace(os.sep, '/')
+            writer.add_file('media/' + relative, path)
+            added.append(relative)
+    return added
+
+
+class _Writer:
+    """Agrega miembros al tar desde varios hilos."""
+
+    def __init__(self, archive):
+        self.archive = archive
+        self.lock = threading.Lock()
+
+    def add(self, name, data):
+        info = tarfile.TarInfo(name)
+        info.size = len(data)
+        info.mtime = int(time.time())
+        with self.lock:
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def add_file(self, name, path):
+        with self.lock:
+            self.archive.add(path, arcname=name, recursive=False)
+
+
+# --- Restauración ---
+
+def restore(sources, media=True):
+    """
+    Restaura los respaldos `sources` (rutas o archivos) en orden: un completo
+    y sus incrementales. Devuelve {'archives', 'tables': {modelo: filas},
+    'deleted', 'media', 'elapsed_s'}.
+    """
+    started = time.perf_counter()
+    archives = [_open(source) for source in sources]
+    try:
+        manifests = [_read_manifest(archive) for archive in archives]
+        for previous, manifest in zip(manifests, manifests[1:]):
+            if manifest['base'] != previous['id']:
+                raise BackupError(f"El respaldo {manifest['id']} no es incremental de {previous['id']}.")
+        by_label = {label(model): model for model in backup_models()}
+        for manifest in manifests:
+            for table in manifest['tables']:
+                model = by_label.get(table['model'])
+                if model is None or table['columns'] != [field.attname for field in model._meta.concrete_fields]:
+                    raise BackupError(f"La tabla {table['model']} del respaldo no coincide con el esquema actual.")
+
+        summary = {'archives': [manifest['id'] for manifest in manifests], 'tables': {}, 'deleted': 0, 'media': 0}
+        with transaction.atomic(), connection.constraint_checks_disabled():
+            for archive, manifest in zip(archives, manifests):
+                _restore_archive(archive, manifest, by_label, summary)
+            connection.check_constraints(table_names=[model._meta.db_table for model in by_label.values()])
+            with connection.cursor() as cursor:
+                for statement in connection.ops.sequence_reset_sql(no_style(), list(by_label.values())):
+                    cursor.execute(statement)
+            transaction.on_commit(_clear_caches)
+        if media:
+            for archive in archives:
+                summary['media'] += _extract_media(archive)
+    finally:
+        for archive in archives:
+            archive.close()
+    summary['elapsed_s'] = round(time.perf_counter() - started, 3)
+    return summary
+
+
+def _restore_archive(archive, manifest, by_label, summary):
+    tables = [(by_label[table['model']], table) for table in manifest['tables']]
+    full = manifest['kind'] == 'full'
+    if full:
+        for model in reversed([model for model, _ in tables]):
+            model._base_manager.all()._raw_delete(model._base_manager.db)
+        for model in _outside_dependents(by_label.values()):
+            # Ej: el log del admin o los grupos de los usuarios borrados
+            model._base_manager.all()._raw_delete(model._base_manager.db)
+
+    kept = {}
+    for model, table in tables:
+        upsert = not full
+        if upsert and table['mode'] == 'full':
+            kept[model] = set()
+        for rows in _read_chunks(archive, model, table):
+            _insert(model, rows, upsert)
+            if model in kept:
+                kept[model].update(row.pk for row in rows)
+        summary['tables'][table['model']] = summary['tables'].get(table['model'], 0) + table['rows']
+
+    # Los borrados, de los dependientes hacia sus referencias y con las cascadas y
+    # señales de Django (ej: SET_NULL en las facturas de un manifiesto borrado)
+    for model, table in reversed(tables):
+        removed = model._base_manager.none()
+        if model in kept:
+            removed = model._base_manager.exclude(pk__in=kept[model])
+        elif table['deleted']:
+            removed = model._base_manager.filter(pk__in=table['deleted'])
+        summary['deleted'] += removed.delete()[0]
+
+
+def _outside_dependents(models_):
+    """Modelos de otras apps (o tablas M2M no respaldadas) con claves foráneas a los respaldados."""
+    models_ = set(models_)
+    return [
+        model for model in apps.get_models(include_auto_created=True)
+        if model not in models_ and not model._meta.proxy and any(
+            field.is_relation and field.related_model in models_ for field in model._meta.concrete_fields
+        )
+    ]
+
+
+def _read_chunks(archive, model, table):
+    # to_python() solo para lo que json no devuelve tal cual (decimales, fechas...)
+    converters = [
+        (position, field.to_python) for position, field in enumerate(model._meta.concrete_fields)
+        if _needs_conversion(field.target_field if field.is_relation else field)
+    ]
+    for member in table['chunks']:
+        with gzip.open(archive.extractfile(member), 'rt', encoding='utf-8') as lines:
+            rows = []
+            for line in lines:
+                values = json.loads(line)
+                for position, convert in converters:
+                    if values[position] is not None:
+                        values[position] = convert(values[position])
+                rows.append(model(*values))
+            yield rows
+
+
+def _needs_conversion(field):
+    return not isinstance(field, (
+        models.CharField, models.TextField, models.IntegerField, models.BooleanField, models.JSONField, models.FileField,
+    ))
+
+
+def _insert(model, rows, upsert):
+    """
+    INSERT masivo en modo raw (como loaddata): sin señales y sin pre_save(),
+    que reemplazaría las fechas auto_now_add. Con `upsert` actualiza las filas existentes.
+    """
+    opts = model._meta
+    fields = opts.concrete_fields
+    options = {}
+    if upsert:
+        features = connection.features
+        options = {
+            'on_conflict': OnConflict.UPDATE,
+            'update_fields': [field for field in fields if not field.primary_key],
+            'unique_fields': [opts.pk] if features.supports_update_conflicts_with_target else [],
+        }
+        if not options['update_fields']:
+            options = {'on_conflict': OnConflict.IGNORE}
+    batch_size = max(connection.ops.bulk_batch_size(fields, rows), 1)
+    manager = model._base_manager
+    for start in range(0, len(rows), batch_size):
+        manager._insert(rows[start:start + batch_size], fields=fields, raw=True, using=manager.db, **options)
+
+
+def _extract_media(archive):
+    root = os.path.realpath(settings.MEDIA_ROOT)
+    extracted = 0
+    for member in archive.getmembers():
+        if not member.isfile() or not member.name.startswith('media/'):
+            continue
+        target = os.path.realpath(os.path.join(root, member.name[len('media/'):]))
+        if os.path.commonpath([root, target]) != root:
+            raise BackupError(f"Ruta de archivo inválida en el respaldo: {member.name}.")
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with archive.extractfile(member) as source, open(target, 'wb') as destination:
+            while block := source.read(1024 * 1024):
+                destination.write(block)
+        extracted += 1
+    return extracted
+
+
+def _clear_caches():
+    # Las cachés de reportes, referencias y rastreo tienen datos de la base anterior
+    cache.clear()
+    tracking.clear_local_cache()
+    currency.invalidate_rate_table()
@@ -0,0 +1,245 @@
+# api/benchmarks.py
+
+"""
+Utilidades compartidas por los comandos de benchmark (python manage.py benchmark_*).
+
+Hay tres formas de enviar las peticiones, todas con la misma interfaz
+`request(method, path, data) -> (código, bytes)`:
+
+- ClientRunner: el cliente de pruebas de Django (sin servidor).
+- WSGIRunner: el WSGIHandler real de Django, que conserva el ciclo de vida de
+  las conexiones a la base de datos (close_old_connections al inicio y al
+  final de cada petición) tal como ocurre detrás de gunicorn o uwsgi.
+- HTTPRunner: HTTP contra un servidor ya levantado (gunicorn config.wsgi,
+  uvicorn config.asgi:application, ...).
+
+ASGIRunner es la variante asíncrona de WSGIRunner (`await request(...)`),
+para medir las vistas de api/async_views.py con run_async_concurrently.
+"""
+
+import asyncio
+import http.client
+import json
+import math
+import threading
+import time
+from urllib.parse import urlsplit
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.db import connections
+from django.test import Client
+from django.test.client import RequestFactory
+
+
+def percentile(sorted_values, pct):
+    """Percentil por rango más cercano sobre una lista ya ordenada."""
+    if not sorted_values:
+        return 0.0
+    rank = max(math.ceil(pct / 100 * len(sorted_values)) - 1, 0)
+    return sorted_values[rank]
+
+
+def summarize(latencies, elapsed):
+    """Resume latencias (en segundos) en milisegundos y peticiones por segundo."""
+    values = sorted(latencies)
+    count = len(values)
+    ms = lambda seconds: round(seconds * 1000, 3)
+    return {
+        'requests': count,
+        'elapsed_s': round(elapsed, 3),
+        'rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'mean_ms': ms(sum(values) / count) if count else 0.0,
+        'p50_ms': ms(percentile(values, 50)),
+        'p95_ms': ms(percentile(values, 95)),
+        'p99_ms': ms(percentile(values, 99)),
+        'max_ms': ms(values[-1]) if count else 0.0,
+    }
+
+
+class WSGIRunner:
+    """Ejecuta peticiones contra el WSGIHandler del proyecto."""
+
+    def __init__(self, token=None):
+        self.handler = WSGIHandler()
+        defaults = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        self.factory = RequestFactory(**defaults)
+
+    def request(self, method, path, data=None):
+        """Devuelve (código de estado, bytes del cuerpo)."""
+        if data is None:
+            environ = self.factory.generic(method, path).environ
+        else:
+            environ = self.factory.generic(method, path, json.dumps(data), content_type='application/json').environ
+        status = {}
+
+        def start_response(status_line, headers, exc_info=None):
+            status['code'] = int(status_line.split(' ', 1)[0])
+
+        result = self.handler(environ, start_response)
+        size = 0
+        try:
+            for chunk in result:
+                size += len(chunk)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status.get('code'), size
+
+
+class ASGIRunner:
+    """Ejecuta peticiones contra el ASGIHandler del proyecto, dentro del bucle de eventos actual."""
+
+    def __init__(self, token=None):
+        self.handler = ASGIHandler()
+        self.headers = [(b'authorization', f'Bearer {token}'.encode())] if token else []
+
+    async def request(self, method, path, data=None):
+        """Devuelve (código de estado, bytes del cuerpo)."""
+        path, _, query = path.partition('?')
+        headers = list(self.headers)
+        body = b''
+        if data is not None:
+            body = json.dumps(data).encode()
+            headers += [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+            'method': method, 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '', 'headers': headers,
+            'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+        }
+        messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+        status = {'size': 0}
+
+        async def receive():
+            if messages:
+                return messages.pop()
+            # Django escucha la desconexión del cliente mientras atiende la petición
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            elif message['type'] == 'http.response.body':
+                status['size'] += len(message.get('body', b''))
+
+        await self.handler(scope, receive, send)
+        return status.get('code'), status['size']
+
+
+class ClientRunner:
+    """Ejecuta peticiones con el cliente de pruebas de Django (uno por hilo)."""
+
+    def __init__(self, token=None):
+        self.defaults = {'HTTP_AUTHORIZATION': f'Bearer {token}'} if token else {}
+        self._local = threading.local()
+
+    def request(self, method, path, data=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = Client(**self.defaults)
+        if data is None:
+            response = client.generic(method, path)
+        else:
+            response = client.generic(method, path, json.dumps(data), content_type='application/json')
+        size = sum(len(chunk) for chunk in response.streaming_content) if response.streaming else len(response.content)
+        return response.status_code, size
+
+
+class HTTPRunner:
+    """Ejecuta peticiones HTTP contra un servidor externo (una conexión keep-alive por hilo)."""
+
+    def __init__(self, base_url, token=None):
+        url = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if url.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = url.netloc
+        self.prefix = url.path.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self._local = threading.local()
+
+    def request(self, method, path, data=None):
+        headers = dict(self.headers)
+        body = None
+        if data is not None:
+            body = json.dumps(data)
+            headers['Content-Type'] = 'application/json'
+        for attempt in range(2):
+            connection = getattr(self._local, 'connection', None)
+            if connection is None:
+                connection = self._local.connection = self.connection_class(self.netloc, timeout=60)
+            try:
+                connection.request(method, self.prefix + path, body=body, headers=headers)
+                response = connection.getresponse()
+                return response.status, len(response.read())
+            except (http.client.HTTPException, ConnectionError):
+                # El servidor cerró la conexión keep-alive: se reintenta una vez con otra
+                connection.close()
+                self._local.connection = None
+                if attempt:
+                    raise
+
+
+def run_concurrently(task, threads, iterations):
+    """
+    Ejecuta `task()` `iterations` veces en cada uno de `threads` hilos.
+    Devuelve (latencias en segundos, errores, tiempo total).
+    """
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        local = []
+        barrier.wait()
+        try:
+            for _ in range(iterations):
+                started = time.perf_counter()
+                try:
+                    task()
+                except Exception as exc:  # se reporta, no detiene la carga
+                    with lock:
+                        errors.append(repr(exc))
+                local.append(time.perf_counter() - started)
+        finally:
+            connections.close_all()
+            with lock:
+                latencies.extend(local)
+
+    pool = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in pool:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in pool:
+        thread.join()
+    return latencies, errors, time.perf_counter() - started
+
+
+def run_async_concurrently(task, concurrency, iterations):
+    """
+    Como run_concurrently, pero con `concurrency` tareas asyncio en un solo
+    hilo que hacen `await task()` `iterations` veces cada una.
+    """
+    latencies = []
+    errors = []
+
+    async def worker():
+        for _ in range(iterations):
+            started = time.perf_counter()
+            try:
+                await task()
+            except Exception as exc:  # se reporta, no detiene la carga
+                errors.append(repr(exc))
+            latencies.append(time.perf_counter() - started)
+
+    async def main():
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return time.perf_counter() - started
+
+    try:
+        elapsed = asyncio.run(main())
+    finally:
+        connections.close_all()
+    return latencies, errors, elapsed
@@ -0,0 +1,156 @@
+# api/cache.py
+
+"""
+Capa de caché del API sobre el framework de caché de Django.
+
+Cada espacio de nombres (CacheNamespace) agrupa claves relacionadas bajo un
+prefijo con versión: invalidar el espacio completo es incrementar su versión,
+sin tener que conocer ni borrar cada clave. Las tablas de referencia
+(oficinas, roles, permisos, tipos de envío, etc.) tienen un espacio por
+modelo que se invalida con las señales post_save, post_delete y m2m_changed.
+
+El backend se elige con CACHE_BACKEND en la configuración (ver config/settings.py).
+"""
+
+import secrets
+from typing import Any, Callable, Iterable, Optional, TypeVar
+
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.response import Response
+
+T = TypeVar('T')
+
+# Sin expiración: las entradas viven hasta que se invalida su espacio
+FOREVER = None
+
+
+def _new_version() -> int:
+    """
+    Versión inicial de un espacio: aleatoria, para que no coincida con una ya
+    usada (cuyas entradas no expiran). Una basada en la hora podría repetirse
+    tras varios incr() o con el reloj atrasado. 62 bits dejan margen para
+    incr() en Redis, que usa enteros de 64 bits con signo.
+    """
+    return secrets.randbits(62)
+
+
+class CacheNamespace:
+    """Conjunto de claves con prefijo y versión comunes."""
+
+    def __init__(self, name: str, timeout: Optional[int] = FOREVER):
+        self.name = name
+        self.timeout = timeout
+        self.version_key = f'{name}:version'
+
+    def version(self) -> int:
+        # Si la versión se pierde (desalojo o reinicio de la caché) se
+        # regenera con un valor nuevo para no reutilizar claves antiguas.
+        return cache.get_or_set(self.version_key, _new_version, timeout=None)
+
+    def key(self, *parts: Any, version: Optional[int] = None) -> str:
+        version = self.version() if version is None else version
+        return ':'.join([self.name, f'v{version}', *(str(part) for part in parts)])
+
+    def get(self, parts: Iterable[Any], default: Optional[T] = None) -> Optional[T]:
+        return cache.get(self.key(*parts), default)
+
+    def set(self, parts: Iterable[Any], value: Any, timeout: Optional[int] = None) -> None:
+        cache.set(self.key(*parts), value, self.timeout if timeout is None else timeout)
+
+    def get_or_set(self, parts: Iterable[Any], factory: Callable[[], T], timeout: Optional[int] = None) -> T:
+        key = self.key(*parts)
+        value = cache.get(key)
+        if value is None:
+            value = factory()
+            cache.set(key, value, self.timeout if timeout is None else timeout)
+        return value
+
+    def get_many(self, keys_parts: Iterable[Iterable[Any]], version: Optional[int] = None) -> dict:
+        """Devuelve {partes: valor} para las entradas presentes."""
+        version = self.version() if version is None else version
+        keys = {self.key(*parts, version=version): tuple(parts) for parts in keys_parts}
+        return {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+
+    def set_many(self, values: dict, version: Optional[int] = None, timeout: Optional[int] = None) -> None:
+        version = self.version() if version is None else version
+        cache.set_many(
+            {self.key(*parts, version=version): value for parts, value in values.items()},
+            timeout=self.timeout if timeout is None else timeout,
+        )
+
+    def delete_many(self, keys_parts: Iterable[Iterable[Any]]) -> None:
+        version = self.version()
+        cache.delete_many([self.key(*parts, version=version) for parts in keys_parts])
+
+    # Variantes para vistas asíncronas (api/async_views.py)
+
+    async def aversion(self) -> int:
+        return await cache.aget_or_set(self.version_key, _new_version, timeout=None)
+
+    async def aget(self, parts: Iterable[Any], default: Optional[T] = None, version: Optional[int] = None) -> Optional[T]:
+        version = await self.aversion() if version is None else version
+        return await cache.aget(self.key(*parts, version=version), default)
+
+    async def aset(self, parts: Iterable[Any], value: Any, timeout: Optional[int] = None, version: Optional[int] = None) -> None:
+        version = await self.aversion() if version is None else version
+        await cache.aset(self.key(*parts, version=version), value, self.timeout if timeout is None else timeout)
+
+    def invalidate(self) -> None:
+        """Descarta todas las claves del espacio."""
+        try:
+            cache.incr(self.version_key)
+        except ValueError:
+            self.version()
+
+
+def on_commit_too(callback: Callable[[], None]) -> None:
+    """
+    Ejecuta una invalidación de inmediato y otra vez al confirmar la
+    transacción, para no dejar en caché datos leídos antes del commit.
+    """
+    callback()
+    transaction.on_commit(callback)
+
+
+# --- Datos de referencia ---
+
+_reference_namespaces = {}
+
+
+def reference_namespace(model) -> CacheNamespace:
+    """Espacio de nombres de la caché para un modelo de referencia."""
+    label = model._meta.label_lower
+    if label not in _reference_namespaces:
+        _reference_namespaces[label] = CacheNamespace(f'ref:{label}')
+    return _reference_namespaces[label]
+
+
+class CachedReferenceMixin:
+    """
+    Sirve `list` y `retrieve` de un ModelViewSet desde la caché del modelo.
+    Las peticiones con parámetros de consulta no se cachean.
+    """
+
+    def _namespace(self) -> CacheNamespace:
+        return reference_namespace(self.get_queryset().model)
+
+    def list(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().list(request, *args, **kwargs)
+        data = self._namespace().get_or_set(
+            ('list',),
+            lambda: list(self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data),
+        )
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if request.query_params:
+            return super().retrieve(request, *args, **kwargs)
+        lookup = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        data = self._namespace().get_or_set(
+            ('detail', lookup),
+            lambda: self.get_serializer(self.get_object()).data,
+        )
+        return Response(data)
+
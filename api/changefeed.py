@@ -0,0 +1,225 @@
+# api/changefeed.py
+
+"""
+Feed de cambios de estado de facturas y manifiestos.
+
+Cada transición (creación incluida) se agrega a la tabla StatusChange, cuyo
+id es un número de secuencia creciente. Las pantallas de despacho piden solo
+lo nuevo con un cursor:
+
+    GET /api/changes/?since=<seq>[&wait=<segundos>]
+
+y reciben {'since', 'next', 'results'}; la siguiente petición usa `next`.
+Con `wait` la petición espera (long-poll) hasta que haya cambios visibles o
+venza el plazo. Bajo ASGI además hay un stream SSE en /api/changes/stream/
+(ver api/async_views.py) que reanuda desde Last-Event-ID.
+
+Los save() de Invoice y ShipmentManifest se registran con la señal post_save
+(ver api/signals.py). Los .update() masivos no disparan señales: deben pasar
+por changefeed.update() para que sus transiciones queden en el feed (y en el
+log de sincronización y la caché del rastreo, ver api/sync.py y api/tracking.py).
+"""
+
+import asyncio
+import time
+from collections import Counter
+import weakref
+from contextlib import nullcontext
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import BooleanField, Exists, ExpressionWrapper, Max, OuterRef, Q
+from django.utils import timezone
+
+from . import dashboard, sync, tracking
+from .cache import on_commit_too
+from .models import Invoice, ShipmentManifest, StatusChange
+
+# Modelo -> (entidad en el feed, campo con el número visible)
+ENTITIES = {
+    Invoice: ('invoice', 'invoice_number'),
+    ShipmentManifest: ('manifest', 'manifest_number'),
+}
+
+_watchers = weakref.WeakKeyDictionary()
+
+
+def record_save(instance, created, update_fields=None):
+    """Registra las transiciones de estado de un objeto recién guardado."""
+    model = type(instance)
+    entity, number_field = ENTITIES[model]
+    loaded = getattr(instance, '_loaded_status', {})
+    changes = []
+    for field in model.tracked_status_fields:
+        if update_fields is not None and field not in update_fields:
+            continue
+        new = getattr(instance, field)
+        old = '' if created else loaded.get(field, '')
+        if old != new:
+            changes.append(StatusChange(
+                entity=entity, object_id=instance.pk, number=getattr(instance, number_field),
+                field=field, old_value=old, new_value=new,
+            ))
+        loaded[field] = new
+    instance._loaded_status = loaded
+    if changes:
+        StatusChange.objects.bulk_create(changes)
+        _count_shipping(changes)
+
+
+def update(queryset, field, value, **extra):
+    """
+    queryset.update(**{field: value}, **extra) registrando en el feed la
+    transición de cada fila que cambia de estado. Devuelve las filas actualizadas.
+    """
+    number_field = ENTITIES[queryset.model][1]
+    with transaction.atomic(using=queryset.db):
+        rows = list(
+            queryset.exclude(**{field: value}).select_for_update()
+            .values_list('pk', number_field, field).order_by()
+        )
+        updated = queryset.update(**{field: value}, **extra)
+        record_bulk(queryset.model, field, value, rows)
+    return updated
+
+
+def record_bulk(model, field, value, rows, invalidate_tracking=True):
+    """
+    Registra las transiciones de un .update() masivo, que no dispara señales:
+    `rows` son las filas (pk, número, estado anterior) que pasaron a `value`.
+    Con invalidate_tracking=False quien llama actualiza el rastreo (ver tracking.patch()).
+    """
+    entity = ENTITIES[model][0]
+    changes = StatusChange.objects.bulk_create([
+        StatusChange(entity=entity, object_id=pk, number=number, field=field, old_value=old, new_value=value)
+        for pk, number, old in rows
+    ])
+    _count_shipping(changes)
+    sync.log_bulk(model, [pk for pk, _, _ in rows])
+    if model is Invoice and invalidate_tracking:
+        numbers = [number for _, number, _ in rows]
+        on_commit_too(lambda: tracking.invalidate(numbers))
+
+
+def _count_shipping(changes):
+    """Ajusta el conteo por estado de envío del dashboard (ver api/dashboard.py) al confirmar."""
+    deltas = Counter()
+    for change in changes:
+        if change.entity == 'invoice' and change.field == 'shipping_status':
+            deltas[change.new_value] += 1
+            if change.old_value:
+                deltas[change.old_value] -= 1
+    if deltas:
+        # Solo al confirmar: un ajuste no se puede repetir ni deshacer
+        transaction.on_commit(lambda: dashboard.apply(deltas))
+
+
+def head():
+    """Último número de secuencia del feed (0 si está vacío)."""
+    return StatusChange.objects.aggregate(head=Max('id'))['head'] or 0
+
+
+def read(since, invoices=None, limit=None):
+    """
+    Cambios posteriores a `since`, como (cambios visibles, cursor siguiente).
+
+    `invoices` es el queryset de facturas que el usuario puede ver, o None si
+    las ve todas; los manifiestos son visibles para todos.
+    """
+    limit = limit or settings.CHANGE_FEED_PAGE_SIZE
+    queryset = StatusChange.objects.filter(id__gt=since).order_by('id')
+    if invoices is not None:
+        visible = Q(entity='manifest') | Exists(invoices.filter(pk=OuterRef('object_id')))
+        queryset = queryset.annotate(visible=ExpressionWrapper(visible, output_field=BooleanField()))
+    rows = settled(list(queryset[:limit]), since)
+    cursor = rows[-1].id if rows else since
+    return [row for row in rows if getattr(row, 'visible', True)], cursor
+
+
+def settled(rows, since):
+    """
+    Recorta las filas en el primer hueco reciente de la secuencia. Los ids se
+    asignan al insertar pero se ven al confirmar la transacción: un hueco
+    puede ser una transacción aún abierta, y si el cursor lo saltara ese
+    cambio se perdería. Los huecos más antiguos que CHANGE_FEED_SETTLE
+    segundos son transacciones revertidas y se ignoran.
+    """
+    settled_before = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_SETTLE)
+    expected = since + 1
+    for position, row in enumerate(rows):
+        if row.id != expected and row.created_at > settled_before:
+            return rows[:position]
+        expected = row.id + 1
+    return rows
+
+
+def wait_for(since, invoices=None, timeout=0):
+    """Como read(), pero espera hasta `timeout` segundos a que haya cambios visibles."""
+    deadline = time.monotonic() + timeout
+    while True:
+        changes, cursor = read(since, invoices)
+        if changes or time.monotonic() >= deadline:
+            return changes, cursor
+        since = cursor
+        time.sleep(min(settings.CHANGE_FEED_POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+
+
+async def await_changes(since, invoices=None, timeout=0, gate=nullcontext):
+    """
+    Versión asíncrona de wait_for(): mientras esperan, los suscriptores del
+    proceso comparten una sola consulta periódica de la cabeza del feed.
+    Cada lectura se hace dentro de `gate()` (ej: el límite de concurrencia).
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    watcher = _watchers.get(loop)
+    if watcher is None:
+        watcher = _watchers[loop] = _Watcher()
+    while True:
+        async with gate():
+            changes, cursor = await sync_to_async(read)(since, invoices)
+        if changes or loop.time() >= deadline:
+            return changes, cursor
+        if cursor >= watcher.head:
+            await watcher.wait(cursor, deadline - loop.time())
+        elif cursor == since:
+            # Hueco reciente en la secuencia (ver settled): se reintenta en el próximo sondeo
+            await asyncio.sleep(min(settings.CHANGE_FEED_POLL_INTERVAL, deadline - loop.time()))
+        since = cursor
+
+
+class _Watcher:
+    """Consulta la cabeza del feed mientras haya suscriptores esperando y los despierta cuando avanza."""
+
+    def __init__(self):
+        self.head = 0
+        self.advanced = asyncio.Event()
+        self.waiting = 0
+        self.task = None
+
+    async def wait(self, after, timeout):
+        self.waiting += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._poll())
+        try:
+            # El primer valor de la cabeza llega con la primera consulta del sondeo
+            await asyncio.wait_for(self._advanced_past(after), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self.waiting -= 1
+
+    async def _advanced_past(self, after):
+        while self.head <= after:
+            await self.advanced.wait()
+
+    async def _poll(self):
+        while self.waiting:
+            current = await sync_to_async(head)()
+            if current != self.head:
+                self.head = current
+                self.advanced.set()
+                self.advanced = asyncio.Event()
+            await asyncio.sleep(settings.CHANGE_FEED_POLL_INTERVAL)
@@ -0,0 +1,75 @@
+# api/checks.py
+
+"""
+Autoverificación de la configuración que afecta al rendimiento.
+
+`performance_report()` describe qué ajustes están activos; se escribe en el
+log al arrancar el servidor (config/wsgi.py y config/asgi.py) y también se
+expone como system check de despliegue:
+
+    python manage.py check --deploy --tag performance
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.checks import Warning, register
+
+logger = logging.getLogger('api.performance')
+
+
+def _template_loaders():
+    options = settings.TEMPLATES[0].get('OPTIONS', {}) if settings.TEMPLATES else {}
+    loaders = options.get('loaders')
+    if loaders is None:
+        # Desde Django 4.1 el cargador con caché se usa por defecto
+        return 'cached (por defecto)', True
+    cached = any(
+        (loader[0] if isinstance(loader, (list, tuple)) else loader) == 'django.template.loaders.cached.Loader'
+        for loader in loaders
+    )
+    return ('cached' if cached else 'sin caché'), cached
+
+
+def performance_report():
+    """Lista de (ajuste, valor, es_recomendado) para la configuración actual."""
+    database = settings.DATABASES['default']
+    pool = database.get('OPTIONS', {}).get('pool')
+    max_age = database.get('CONN_MAX_AGE', 0)
+    persistent = max_age is None or max_age > 0
+    if pool:
+        connections = 'pool psycopg'
+    elif persistent:
+        connections = f'persistentes ({"sin límite" if max_age is None else f"{max_age}s"})'
+    else:
+        connections = 'una por petición'
+    # Bajo ASGI las conexiones persistentes no se cierran a tiempo: solo sirve el pool
+    reused_connections = bool(pool) or (persistent and not getattr(settings, 'RUNNING_ASGI', False))
+    cache_backend = settings.CACHES['default']['BACKEND'].rsplit('.', 1)[-1]
+    loaders, cached_templates = _template_loaders()
+    renderers = settings.REST_FRAMEWORK.get('DEFAULT_RENDERER_CLASSES')
+    browsable = renderers is None or any('BrowsableAPIRenderer' in renderer for renderer in renderers)
+
+    return [
+        ('DEBUG', settings.DEBUG, not settings.DEBUG),
+        ('Conexiones a la BD', connections, reused_connections),
+        ('Health checks de conexión', database.get('CONN_HEALTH_CHECKS', False), database.get('CONN_HEALTH_CHECKS', False)),
+        ('Backend de caché', cache_backend, cache_backend not in ('LocMemCache', 'DummyCache')),
+        ('Cargador de plantillas', loaders, cached_templates),
+        ('Media servida por Django', settings.DEBUG, not settings.DEBUG),
+        ('API navegable de DRF', browsable, not browsable),
+    ]
+
+
+def log_performance_report():
+    for name, value, recommended in performance_report():
+        logger.log(logging.INFO if recommended else logging.WARNING, "%s: %s", name, value)
+
+
+@register('performance', deploy=True)
+def check_performance_settings(app_configs, **kwargs):
+    return [
+        Warning(f"{name}: {value}", hint="Use el perfil config.settings_production.", id=f'api.W{index:03d}')
+        for index, (name, value, recommended) in enumerate(performance_report(), start=1)
+        if not recommended
+    ]
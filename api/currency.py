@@ -0,0 +1,164 @@
+# api/currency.py
+
+"""
+Conversión de montos entre bolívares (VES) y dólares (USD).
+
+Las facturas guardan la tasa BCV con la que se emitieron (Invoice.exchange_rate)
+y el histórico de tasas vive en ExchangeRate. Para las consultas agregadas se
+construyen expresiones que convierten cada fila en SQL, de modo que un solo
+SUM() devuelve el total en la moneda de reporte. Las búsquedas de tasa por
+fecha desde Python se resuelven con una tabla ordenada en memoria (bisect),
+ligada a una versión en la caché compartida: un cambio de tasa en cualquier
+worker hace que todos la recarguen.
+"""
+
+import bisect
+import threading
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import (
+    Case, DateTimeField, DecimalField, ExpressionWrapper, F, OuterRef, Subquery, Value, When,
+)
+from django.db.models.functions import Coalesce, Round, TruncDate
+
+from .cache import CacheNamespace
+from .models import CompanyInfo, ExchangeRate
+
+CURRENCIES = ('VES', 'USD')
+# Los gastos y la contabilidad se llevan en bolívares
+BASE_CURRENCY = 'VES'
+RATE_TABLE_TTL = 300
+NAMESPACE = CacheNamespace('currency:rates')
+
+AMOUNT_FIELD = DecimalField(max_digits=14, decimal_places=2)
+RATE_FIELD = DecimalField(max_digits=14, decimal_places=4)
+
+
+def reporting_currency():
+    return getattr(settings, 'REPORTING_CURRENCY', BASE_CURRENCY)
+
+
+class RateTable:
+    """Tasas ordenadas por fecha. `rate_on` devuelve la última tasa publicada hasta ese día."""
+
+    def __init__(self, rows):
+        rows = sorted(rows)
+        self.dates = [day for day, _ in rows]
+        self.rates = [rate for _, rate in rows]
+
+    def __len__(self):
+        return len(self.dates)
+
+    def rate_on(self, day):
+        if not self.dates:
+            return None
+        index = bisect.bisect_right(self.dates, day)
+        # Antes de la primera tasa registrada se usa la más antigua conocida
+        return self.rates[max(index - 1, 0)]
+
+
+_lock = threading.Lock()
+_table = None  # (versión, momento de carga, RateTable)
+
+
+def _current(loaded, version):
+    return loaded is not None and loaded[0] == version and time.monotonic() - loaded[1] < RATE_TABLE_TTL
+
+
+def get_rate_table():
+    """
+    Devuelve la tabla de tasas del proceso, recargándola si expiró o si otro
+    proceso la invalidó (la versión compartida cambió).
+    """
+    global _table
+    # La versión se lee antes de cargar: si cambia durante la carga, la
+    # siguiente llamada vuelve a cargar
+    version = NAMESPACE.version()
+    loaded = _table
+    if _current(loaded, version):
+        return loaded[2]
+    with _lock:
+        if not _current(_table, version):
+            _table = (version, time.monotonic(), RateTable(ExchangeRate.objects.values_list('date', 'rate')))
+        return _table[2]
+
+
+def invalidate_rate_table():
+    """Descarta la tabla en este proceso y, con la versión compartida, en los demás."""
+    global _table
+    NAMESPACE.invalidate()
+    with _lock:
+        _table = None
+
+
+def rate_on(day):
+    """Tasa BCV vigente en `day`; si no hay histórico, la tasa actual de CompanyInfo."""
+    rate = get_rate_table().rate_on(day)
+    if rate is None:
+        # Una lectura simple: load() usa get_or_create, que el router de
+        # réplicas cuenta como escritura (ver api/db_router.py)
+        rate = CompanyInfo.objects.filter(pk=1).values_list('bcv_rate', flat=True).first()
+    if rate is None:
+        rate = CompanyInfo.load().bcv_rate
+    return Decimal(rate)
+
+
+def convert(amount, from_currency, to_currency, rate):
+    """Convierte un monto usando una tasa en Bs/USD."""
+    if from_currency == to_currency:
+        return amount
+    if to_currency == 'USD':
+        return (amount / rate).quantize(Decimal('0.01'))
+    return (amount * rate).quantize(Decimal('0.01'))
+
+
+def _rate_for_date_subquery(datetime_ref):
+    return Subquery(
+        ExchangeRate.objects
+        .filter(date__lte=TruncDate(ExpressionWrapper(datetime_ref, output_field=DateTimeField())))
+        .order_by('-date')
+        .values('rate')[:1],
+        output_field=RATE_FIELD,
+    )
+
+
+def _fallback_rate():
+    """
+    Tasa para las fechas en que el subquery no encuentra ninguna: las
+    anteriores a todo el histórico. Es la misma de rate_on(): la más antigua
+    conocida o, sin histórico, la actual de CompanyInfo.
+    """
+    return Value(rate_on(date.min), output_field=RATE_FIELD)
+
+
+def invoice_amount(currency, field='total', prefix=''):
+    """
+    Expresión SQL con el monto de la factura en `currency`. Usa la tasa
+    guardada en la factura y, para facturas antiguas sin ella, la del
+    histórico para su fecha, igual que rate_on().
+    """
+    amount = F(prefix + field)
+    rate = Coalesce(
+        F(prefix + 'exchange_rate'),
+        _rate_for_date_subquery(OuterRef(prefix + 'created_at')),
+        _fallback_rate(),
+        output_field=RATE_FIELD,
+    )
+    other = 'VES' if currency == 'USD' else 'USD'
+    converted = amount / rate if currency == 'USD' else amount * rate
+    return Case(
+        When(**{prefix + 'payment_currency': other}, then=Round(converted, 2)),
+        default=amount,
+        output_field=AMOUNT_FIELD,
+    )
+
+
+def expense_amount(currency, field='amount'):
+    """Expresión SQL con el monto del gasto (registrado en bolívares) en `currency`."""
+    if currency == BASE_CURRENCY:
+        return F(field)
+    rate = Coalesce(_rate_for_date_subquery(OuterRef('created_at')), _fallback_rate(), output_field=RATE_FIELD)
+    return Round(F(field) / rate, 2, output_field=AMOUNT_FIELD)
@@ -0,0 +1,76 @@
+# api/dashboard.py
+
+"""
+Conteo de facturas por estado de envío del dashboard.
+
+El GROUP BY sobre toda la tabla de facturas es la consulta más cara del
+dashboard, así que el conteo vive en la caché compartida (una clave por
+estado) y se ajusta con incr/decr cuando cambia: changefeed registra toda
+transición de estado (record_save y record_bulk) y las señales y el archivo
+descuentan las facturas que salen de la tabla. Si falta alguna clave, la
+siguiente lectura recalcula todo. Un ajuste que coincide con un recálculo
+puede perderse, así que las claves vencen a los DASHBOARD_COUNTS_TIMEOUT
+segundos.
+"""
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from .models import Invoice
+
+
+def _key(status):
+    return f'dashboard:shipping:{status}'
+
+
+STATUSES = [status for status, _ in Invoice.SHIPPING_STATUS_CHOICES]
+KEYS = {_key(status): status for status in STATUSES}
+
+
+def _grouped():
+    return Invoice.objects.order_by().values_list('shipping_status').annotate(count=Count('id'))
+
+
+def _cached(values):
+    """{estado: facturas} (solo los estados con facturas), o None si falta alguna clave."""
+    if len(values) != len(KEYS):
+        return None
+    return {KEYS[key]: count for key, count in values.items() if count}
+
+
+def _entries(counts):
+    return {_key(status): counts.get(status, 0) for status in STATUSES}
+
+
+def shipping_status_counts():
+    counts = _cached(cache.get_many(list(KEYS)))
+    if counts is None:
+        counts = dict(_grouped())
+        cache.set_many(_entries(counts), settings.DASHBOARD_COUNTS_TIMEOUT)
+    return counts
+
+
+async def ashipping_status_counts():
+    counts = _cached(await cache.aget_many(list(KEYS)))
+    if counts is None:
+        counts = {status: count async for status, count in _grouped()}
+        await cache.aset_many(_entries(counts), settings.DASHBOARD_COUNTS_TIMEOUT)
+    return counts
+
+
+def apply(deltas):
+    """Suma a los conteos guardados `deltas` ({estado: +n o -n})."""
+    for status, delta in deltas.items():
+        if not delta:
+            continue
+        try:
+            cache.incr(_key(status), delta)
+        except ValueError:
+            # La clave venció: se recalcula todo en la próxima lectura
+            invalidate()
+            return
+
+
+def invalidate():
+    cache.delete_many(list(KEYS))
@@ -0,0 +1,135 @@
+# api/db_router.py
+
+"""
+Lecturas desde réplicas de la base de datos (DATABASE_REPLICAS).
+
+Solo van a una réplica las consultas de las acciones que lo piden: las
+listas y el detalle de los viewsets con ReplicaReadsMixin, el reporte de
+ganancias y pérdidas y el dashboard. Todo lo demás, y toda escritura, usa la
+base principal, así que una vista que lee para después escribir nunca
+decide con datos atrasados. Dentro de una transacción de la principal
+también se lee de la principal.
+
+Lectura de lo propio: tras una petición que escribió en la base, las
+lecturas de ese usuario vuelven a la principal durante
+REPLICA_STICKY_SECONDS (más que el retraso esperado de las réplicas), para
+que vea de inmediato lo que acaba de guardar. La marca se guarda en la caché
+compartida y vale para todos los procesos.
+
+Requiere ReplicaRoutingMiddleware; sin él (comandos, tareas) todo se lee de
+la principal.
+"""
+
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+
+class _RequestState:
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = None
+        self.wrote = False
+
+
+# Estado de la petición en curso; es mutable para que los cambios hechos en
+# un hilo (vistas síncronas bajo ASGI) se vean desde el middleware
+_state = ContextVar('replica_request_state', default=None)
+
+
+def _sticky_key(user_id):
+    return f'replica:sticky:{user_id}'
+
+
+def is_sticky(user):
+    """True si el usuario escribió hace menos de REPLICA_STICKY_SECONDS."""
+    return user is not None and user.is_authenticated and bool(cache.get(_sticky_key(user.pk)))
+
+
+async def ais_sticky(user):
+    return user is not None and user.is_authenticated and bool(await cache.aget(_sticky_key(user.pk)))
+
+
+def stick(user):
+    cache.set(_sticky_key(user.pk), True, settings.REPLICA_STICKY_SECONDS)
+
+
+def use_replica(user):
+    """Lee de una réplica el resto de la petición, salvo que `user` haya escrito hace poco."""
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS or is_sticky(user):
+        return False
+    state.replica = random.choice(settings.DATABASE_REPLICAS)
+    return True
+
+
+async def ause_replica(user):
+    """use_replica() para las vistas asíncronas (api/async_views.py)."""
+    state = _state.get()
+    if state is None or not settings.DATABASE_REPLICAS or await ais_sticky(user):
+        return False
+    state.replica = random.choice(settings.DATABASE_REPLICAS)
+    return True
+
+
+def reading_from_replica():
+    state = _state.get()
+    return state is not None and state.replica is not None
+
+
+def start_request():
+    return _state.set(_RequestState())
+
+
+def end_request(token, user):
+    state = _state.get()
+    _state.reset(token)
+    if state.wrote and user is not None and user.is_authenticated:
+        stick(user)
+
+
+class ReplicaRouter:
+    """Router de DATABASE_ROUTERS; sin réplicas configuradas no cambia nada."""
+
+    def db_for_read(self, model, **hints):
+        # Las relaciones de un objeto ya cargado se leen de su misma base
+        if hints.get('instance') is not None:
+            return None
+        state = _state.get()
+        if state is None or state.replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Las réplicas son copias de la principal: los objetos se pueden relacionar
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return None
+
+
+class ReplicaReadsMixin:
+    """
+    Atiende desde una réplica las peticiones GET de las acciones en
+    `replica_actions` (en un APIView, todas sus peticiones GET). Se decide
+    después de autenticar y verificar permisos, que se leen de la principal.
+    """
+
+    replica_actions = ('list', 'retrieve')
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        action = getattr(self, 'action', None)
+        if request.method in SAFE_METHODS and (action is None or action in self.replica_actions):
+            use_replica(request.user)
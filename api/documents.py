@@ -0,0 +1,234 @@
+# api/documents.py
+
+"""
+PDF de las guías (facturas) y de los manifiestos, generados en el servidor
+con el membrete de CompanyInfo (el formato está en api/pdf.py).
+
+Las plantillas compiladas y el logo, ya escalado y convertido a JPEG, se
+guardan por versión de la caché de referencia de CompanyInfo, que las
+señales invalidan al editarla: la primera página tras un cambio recompila
+las plantillas y las demás solo llenan campos. El logo escalado se guarda
+también en la caché compartida para que cada proceso no tenga que abrir y
+reducir la imagen original.
+
+El PDF de un manifiesto lleva su resumen y, a continuación, las guías de
+todas sus facturas. Con al menos PDF_POOL_MIN_GUIDES guías, estas se
+dibujan en un pool de PDF_WORKERS procesos. Los datos se leen antes, en
+unas pocas consultas, y los procesos no usan la base de datos.
+`python manage.py benchmark_pdf` mide las páginas por segundo.
+"""
+
+import io
+import math
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils import timezone
+
+from . import pdf
+from .cache import reference_namespace
+from .models import CompanyInfo, Invoice, MerchandiseItem
+
+# Tamaño máximo del logo escalado, en píxeles (unas 2,5 veces la caja del membrete)
+LOGO_MAX_PIXELS = (280, 140)
+LOGO_JPEG_QUALITY = 85
+# Lotes por proceso: más lotes que procesos reparten mejor las guías largas
+CHUNKS_PER_WORKER = 4
+
+_compiled = {}
+_pool = None
+_pool_workers = None
+_pool_lock = threading.Lock()
+
+
+# --- Membrete y plantillas ---
+
+def _scaled_logo(image_field):
+    """(jpeg, ancho, alto) del logo reducido a LOGO_MAX_PIXELS, o None si no hay logo legible."""
+    if not image_field:
+        return None
+    from PIL import Image
+    try:
+        with image_field.open('rb') as fh:
+            image = Image.open(fh)
+            image.load()
+    except (OSError, ValueError):
+        return None
+    if image.mode in ('RGBA', 'LA', 'P'):
+        # JPEG no tiene transparencia: se pinta sobre blanco
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        image = background
+    image = image.convert('RGB')
+    image.thumbnail(LOGO_MAX_PIXELS)
+    output = io.BytesIO()
+    image.save(output, 'JPEG', quality=LOGO_JPEG_QUALITY, optimize=True)
+    return output.getvalue(), image.width, image.height
+
+
+def _load_branding():
+    company = CompanyInfo.load()
+    return {
+        'company': {
+            'name': company.name, 'rif': company.rif, 'address': company.address, 'phone': company.phone,
+            'postal_license': company.postal_license,
+        },
+        'logo': _scaled_logo(company.logo),
+    }
+
+
+def branding():
+    """
+    (plantillas, logo) vigentes: {'guide': Template, 'manifest': Template} y
+    (jpeg, ancho, alto) o None.
+    """
+    namespace = reference_namespace(CompanyInfo)
+    version = namespace.version()
+    compiled = _compiled.get('current')
+    if compiled is None or compiled[0] != version:
+        data = namespace.get_or_set(('pdf-branding',), _load_branding)
+        logo_size = data['logo'][1:] if data['logo'] else None
+        templates = {
+            'guide': pdf.compile_guide(data['company'], logo_size),
+            'manifest': pdf.compile_manifest(data['company'], logo_size),
+        }
+        compiled = (version, templates, data['logo'])
+        _compiled['current'] = compiled
+    return compiled[1], compiled[2]
+
+
+def clear_compiled():
+    _compiled.clear()
+
+
+# --- Datos ---
+
+def _amount(value):
+    """1234.5 -> '1.234,50'"""
+    return f'{value:,.2f}'.replace(',', '_').replace('.', ',').replace('_', '.')
+
+
+def _weight(value):
+    return _amount(value or Decimal('0'))
+
+
+def _date(value):
+    return timezone.localtime(value).strftime('%d/%m/%Y %H:%M') if value else ''
+
+
+def _client(prefix, client):
+    return {
+        f'{prefix}_name': client.name,
+        f'{prefix}_id': f'{client.id_type}-{client.id_number}',
+        f'{prefix}_phone': client.phone,
+        f'{prefix}_address': client.address,
+    }
+
+
+def guides(invoices):
+    """Datos de las guías de `invoices` (un queryset), en dos consultas."""
+    invoices = list(
+        invoices.select_related('sender', 'recipient', 'origin_office', 'destination_office', 'shipping_type', 'manifest')
+    )
+    items = {}
+    for invoice_id, quantity, description, weight in (
+        MerchandiseItem.objects.filter(invoice__in=[invoice.pk for invoice in invoices])
+        .order_by('invoice', 'pk').values_list('invoice', 'quantity', 'description', 'weight')
+    ):
+        items.setdefault(invoice_id, []).append((quantity, description, weight))
+
+    result = []
+    for invoice in invoices:
+        rows = items.get(invoice.pk, [])
+        result.append({
+            'number': invoice.invoice_number,
+            'date': _date(invoice.created_at),
+            'manifest': invoice.manifest.manifest_number if invoice.manifest else '',
+            **_client('sender', invoice.sender),
+            **_client('recipient', invoice.recipient),
+            'origin': invoice.origin_office.name,
+            'destination': invoice.destination_office.name,
+            'shipping_type': invoice.shipping_type.name if invoice.shipping_type else '',
+            'payment_type': invoice.get_payment_type_display(),
+            'items': [(quantity, description, _weight(weight)) for quantity, description, weight in rows],
+            'weight': _weight(sum((weight for _, _, weight in rows), Decimal('0'))),
+            'declared_value': _amount(invoice.declared_value) if invoice.has_insurance else '',
+            'subtotal': _amount(invoice.subtotal),
+            'tax': _amount(invoice.tax),
+            'ipostel': _amount(invoice.ipostel) if invoice.ipostel else '',
+            'igtf': _amount(invoice.igtf) if invoice.igtf else '',
+            'total': _amount(invoice.total),
+            'currency': invoice.payment_currency,
+        })
+    return result
+
+
+def manifest_summary(manifest):
+    rows = list(
+        Invoice.objects.filter(manifest=manifest).order_by('destination_office__name', 'invoice_number')
+        .values_list('invoice_number', 'destination_office__name', 'recipient__name')
+        .annotate(packages=Sum('items__quantity', default=0), weight=Sum('items__weight', default=Decimal('0')))
+    )
+    vehicle = manifest.vehicle
+    driver = manifest.driver
+    return {
+        'number': manifest.manifest_number,
+        'office': manifest.office.name if manifest.office else '',
+        'departure': _date(manifest.departure_time),
+        'vehicle': f'{vehicle.license_plate} - {vehicle.brand} {vehicle.model}',
+        'driver': (driver.get_full_name() or driver.username) if driver else vehicle.driver,
+        'status': manifest.get_status_display(),
+        'rows': [
+            (index, number, destination, recipient, packages, _weight(weight))
+            for index, (number, destination, recipient, packages, weight) in enumerate(rows, 1)
+        ],
+        'packages': sum(row[3] for row in rows),
+        'weight': _weight(sum((row[4] for row in rows), Decimal('0'))),
+    }
+
+
+# --- Render ---
+
+def _executor(workers):
+    """Pool de procesos compartido; se crea al primer uso y se recrea si cambia el número de procesos."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # 'spawn': los procesos no heredan los hilos ni las conexiones del servidor
+            _pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context('spawn'))
+            _pool_workers = workers
+        return _pool
+
+
+def render_guides(template, data, workers=None, min_guides=None):
+    """Páginas comprimidas de las guías de `data`, en paralelo si son al menos `min_guides`."""
+    workers = settings.PDF_WORKERS if workers is None else workers
+    min_guides = settings.PDF_POOL_MIN_GUIDES if min_guides is None else min_guides
+    if workers <= 1 or len(data) < min_guides:
+        return pdf.render_guides(template, data)
+    size = math.ceil(len(data) / (workers * CHUNKS_PER_WORKER))
+    chunks = [data[start:start + size] for start in range(0, len(data), size)]
+    executor = _executor(workers)
+    return [stream for streams in executor.map(pdf.render_guides, [template] * len(chunks), chunks) for stream in streams]
+
+
+def invoice_pdf(invoice):
+    templates, logo = branding()
+    [guide] = guides(Invoice.objects.filter(pk=invoice.pk))
+    return pdf.document(pdf.render_guides(templates['guide'], [guide]), logo)
+
+
+def manifest_pdf(manifest, with_guides=True, workers=None):
+    templates, logo = branding()
+    streams = pdf.compress(pdf.manifest_pages(templates['manifest'], manifest_summary(manifest)))
+    if with_guides:
+        data = guides(Invoice.objects.filter(manifest=manifest).order_by('destination_office__name', 'invoice_number'))
+        streams += render_guides(templates['guide'], data, workers)
+    return pdf.document(streams, logo)
@@ -0,0 +1,233 @@
+# api/fleet.py
+
+"""
+Historial y uso de la flota.
+
+Cada vehículo tiene eventos (VehicleEvent): un viaje por manifiesto, que se
+abre al despacharlo y se cierra al finalizarlo (api/manifests.py), y las
+ventanas de mantenimiento, abiertas mientras el vehículo está
+'En Mantenimiento'. Al cerrar un evento se suman sus valores a la fila
+VehicleUtilization del vehículo con un UPDATE ... SET x = x + n, así que la
+pantalla de la flota lee el uso de todos los vehículos en una sola consulta
+(`utilization()`), sin recorrer el historial. `python manage.py
+rebuild_fleet_stats` recalcula las filas desde los eventos.
+
+Kilómetros de un viaje: los que informa el conductor al finalizar o, si no,
+los de la ruta planificada (api/routing.py). Los kilos por kilómetro
+(kg-km) suman el peso dejado en cada oficina por los kilómetros recorridos
+hasta ella; sin ruta, se supone la carga completa durante todo el viaje. El
+uso es kg-km sobre capacity_kg por kilómetro.
+"""
+
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Max, Q, Sum
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import routing, sync
+from .models import MerchandiseItem, ShipmentManifest, Vehicle, VehicleEvent, VehicleUtilization
+
+ZERO = Decimal('0')
+CENTS = Decimal('0.01')
+
+
+def _seconds(started, ended):
+    return max(int((ended - started).total_seconds()), 0)
+
+
+def accumulate(vehicle_id, last_active_at, **deltas):
+    """Suma `deltas` a los totales del vehículo; la primera vez crea su fila."""
+    rows = VehicleUtilization.objects.filter(pk=vehicle_id)
+    while True:
+        if rows.update(last_active_at=last_active_at, **{field: F(field) + value for field, value in deltas.items()}):
+            return
+        try:
+            with transaction.atomic():
+                VehicleUtilization.objects.create(vehicle_id=vehicle_id, last_active_at=last_active_at, **deltas)
+            return
+        except IntegrityError:
+            # Otra transacción creó la fila: ahora el UPDATE la encuentra
+            continue
+
+
+# --- Viajes ---
+
+def start_trip(manifest):
+    VehicleEvent.objects.create(
+        vehicle_id=manifest.vehicle_id, kind='VIAJE', manifest=manifest, driver_id=manifest.driver_id,
+        started_at=manifest.departure_time,
+    )
+
+
+def measure_trip(manifest, distance_km=None):
+    """(km, kilos, kg-km) del viaje del manifiesto; ver el docstring del módulo."""
+    weights = dict(
+        MerchandiseItem.objects.filter(invoice__manifest=manifest).order_by()
+        .values_list('invoice__destination_office').annotate(Sum('weight'))
+    )
+    load = sum(weights.values(), ZERO)
+    try:
+        route = routing.plan(manifest)
+    except serializers.ValidationError:
+        route = None
+    if route is None:
+        distance = distance_km or ZERO
+        return distance, load, (load * distance).quantize(CENTS)
+
+    travelled, kg_km = ZERO, ZERO
+    for stop in route['stops']:
+        travelled += stop['distance_km']
+        kg_km += weights.get(stop['office'], ZERO) * travelled
+    if distance_km is not None and route['total_distance_km']:
+        # Los kilómetros reales se reparten en la misma proporción que los planificados
+        kg_km = kg_km * distance_km / route['total_distance_km']
+    distance = route['total_distance_km'] if distance_km is None else distance_km
+    return distance, load, kg_km.quantize(CENTS)
+
+
+def end_trip(manifest, ended_at, distance_km=None):
+    """Cierra el viaje del manifiesto y lo suma a los totales del vehículo."""
+    distance, load, kg_km = measure_trip(manifest, distance_km)
+    values = {'ended_at': ended_at, 'distance_km': distance, 'load_kg': load, 'kg_km': kg_km}
+    if not VehicleEvent.objects.filter(manifest=manifest, ended_at__isnull=True).update(**values):
+        # Manifiestos despachados antes de que existiera el historial
+        VehicleEvent.objects.create(
+            vehicle_id=manifest.vehicle_id, kind='VIAJE', manifest=manifest, driver_id=manifest.driver_id,
+            started_at=manifest.departure_time or ended_at, **values,
+        )
+    capacity = Vehicle.objects.filter(pk=manifest.vehicle_id).values_list('capacity_kg', flat=True).get()
+    accumulate(
+        manifest.vehicle_id, ended_at, trips=1,
+        trip_seconds=_seconds(manifest.departure_time or ended_at, ended_at),
+        distance_km=distance, kg_km=kg_km, capacity_kg_km=(capacity * distance).quantize(CENTS),
+    )
+
+
+# --- Mantenimiento ---
+
+def open_maintenance(vehicle, notes=''):
+    VehicleEvent.objects.create(vehicle=vehicle, kind='MANTENIMIENTO', started_at=timezone.now(), notes=notes)
+
+
+def close_maintenance(vehicle):
+    """Cierra la ventana de mantenimiento abierta del vehículo, si hay una."""
+    now = timezone.now()
+    event = (
+        VehicleEvent.objects.select_for_update()
+        .filter(vehicle=vehicle, kind='MANTENIMIENTO', ended_at__isnull=True).order_by('-started_at').first()
+    )
+    if event is None:
+        return
+    event.ended_at = now
+    event.save(update_fields=['ended_at'])
+    accumulate(vehicle.pk, now, maintenance_count=1, maintenance_seconds=_seconds(event.started_at, now))
+
+
+def start_maintenance(vehicle, notes=''):
+    with transaction.atomic():
+        if not Vehicle.objects.filter(pk=vehicle.pk, status='Disponible').update(status='En Mantenimiento'):
+            raise serializers.ValidationError(f"El vehículo {vehicle.license_plate} no está disponible.")
+        # .update() no dispara señales
+        sync.log_bulk(Vehicle, [vehicle.pk])
+        open_maintenance(vehicle, notes)
+    vehicle.status = 'En Mantenimiento'
+
+
+def finish_maintenance(vehicle):
+    with transaction.atomic():
+        if not Vehicle.objects.filter(pk=vehicle.pk, status='En Mantenimiento').update(status='Disponible'):
+            raise serializers.ValidationError(f"El vehículo {vehicle.license_plate} no está en mantenimiento.")
+        sync.log_bulk(Vehicle, [vehicle.pk])
+        close_maintenance(vehicle)
+    vehicle.status = 'Disponible'
+
+
+# --- Lectura y recálculo ---
+
+UTILIZATION_FIELDS = (
+    'pk', 'license_plate', 'status', 'capacity_kg', 'utilization__trips', 'utilization__trip_seconds',
+    'utilization__distance_km', 'utilization__kg_km', 'utilization__capacity_kg_km',
+    'utilization__maintenance_count', 'utilization__maintenance_seconds', 'utilization__last_active_at',
+)
+
+
+def utilization(vehicles=None):
+    """Uso de cada vehículo, en una consulta."""
+    now = timezone.now()
+    rows = []
+    queryset = (Vehicle.objects.all() if vehicles is None else vehicles).order_by('license_plate')
+    for (pk, plate, status, capacity, trips, trip_seconds, distance, kg_km, capacity_kg_km,
+         maintenance_count, maintenance_seconds, last_active_at) in queryset.values_list(*UTILIZATION_FIELDS):
+        rows.append({
+            'vehicle': pk,
+            'license_plate': plate,
+            'status': status,
+            'capacity_kg': capacity,
+            'trips': trips or 0,
+            'trip_hours': round((trip_seconds or 0) / 3600, 1),
+            'distance_km': distance or ZERO,
+            'kg_km': kg_km or ZERO,
+            'utilization_pct': (kg_km / capacity_kg_km * 100).quantize(Decimal('0.1')) if capacity_kg_km else None,
+            'maintenance_count': maintenance_count or 0,
+            'maintenance_hours': round((maintenance_seconds or 0) / 3600, 1),
+            'last_active_at': last_active_at,
+            # Solo un vehículo disponible está ocioso
+            'idle_days': (now - last_active_at).days if status == 'Disponible' and last_active_at else None,
+        })
+    return rows
+
+
+def backfill_trips():
+    """Crea los viajes de los manifiestos finalizados que no tienen uno; devuelve cuántos."""
+    pending = ShipmentManifest.objects.filter(status='FINALIZADO', vehicle_event__isnull=True).order_by('pk')
+    created = 0
+    for manifest in pending.iterator():
+        distance, load, kg_km = measure_trip(manifest)
+        ended_at = manifest.arrival_time or manifest.departure_time or timezone.now()
+        VehicleEvent.objects.create(
+            vehicle_id=manifest.vehicle_id, kind='VIAJE', manifest=manifest, driver_id=manifest.driver_id,
+            started_at=manifest.departure_time or ended_at, ended_at=ended_at,
+            distance_km=distance, load_kg=load, kg_km=kg_km,
+        )
+        created += 1
+    return created
+
+
+def rebuild():
+    """Recalcula los totales de todos los vehículos desde sus eventos cerrados."""
+    closed = VehicleEvent.objects.filter(ended_at__isnull=False)
+    trips = Q(kind='VIAJE')
+    maintenance = Q(kind='MANTENIMIENTO')
+    totals = (
+        closed.order_by().values('vehicle')
+        .annotate(
+            total_trips=Count('pk', filter=trips),
+            total_km=Sum('distance_km', filter=trips, default=ZERO),
+            total_kg_km=Sum('kg_km', filter=trips, default=ZERO),
+            total_capacity=Sum(F('distance_km') * F('vehicle__capacity_kg'), filter=trips, default=ZERO),
+            total_maintenance=Count('pk', filter=maintenance),
+            last_end=Max('ended_at'),
+        )
+    )
+    # Las duraciones se suman en Python: no todas las bases restan fechas igual
+    seconds = {}
+    for vehicle_id, kind, started, ended in closed.values_list('vehicle', 'kind', 'started_at', 'ended_at'):
+        key = (vehicle_id, kind)
+        seconds[key] = seconds.get(key, 0) + _seconds(started, ended)
+    rows = [
+        VehicleUtilization(
+            vehicle_id=row['vehicle'], trips=row['total_trips'], distance_km=row['total_km'], kg_km=row['total_kg_km'],
+            capacity_kg_km=Decimal(row['total_capacity']).quantize(CENTS),
+            trip_seconds=seconds.get((row['vehicle'], 'VIAJE'), 0),
+            maintenance_count=row['total_maintenance'],
+            maintenance_seconds=seconds.get((row['vehicle'], 'MANTENIMIENTO'), 0),
+            last_active_at=row['last_end'],
+        )
+        for row in totals
+    ]
+    with transaction.atomic():
+        VehicleUtilization.objects.all().delete()
+        VehicleUtilization.objects.bulk_create(rows)
+    return len(rows)
@@ -0,0 +1,135 @@
+# api/idempotency.py
+
+"""
+Cabecera Idempotency-Key para las acciones que no deben ejecutarse dos veces
+(crear facturas, cambios masivos, despachar y finalizar manifiestos).
+
+La primera petición con una clave reserva la fila (usuario, clave) de
+IdempotencyKey antes de ejecutar la vista y, si termina con 2xx, guarda la
+respuesta. Un reintento con la misma clave y el mismo cuerpo recibe la
+respuesta guardada (cabecera Idempotent-Replayed) sin volver a ejecutar la
+vista; si llega mientras la original sigue en curso, espera hasta
+IDEMPOTENCY_WAIT_SECONDS a que termine y, si no, recibe 409. Reutilizar la
+clave con otro cuerpo o en otra ruta es un error (422).
+
+Las respuestas que no son 2xx no se guardan: la clave queda libre para
+reintentar. Las claves vencen a los IDEMPOTENCY_KEY_TTL segundos y una
+petición en curso por más de IDEMPOTENCY_LOCK_SECONDS se da por abandonada
+(ej: el proceso murió). `python manage.py prune_idempotency_keys` borra las
+vencidas.
+"""
+
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = IdempotencyKey._meta.get_field('key').max_length
+# Intervalo entre consultas mientras se espera a la petición original
+POLL_INTERVAL = 0.05
+
+
+def idempotent(view_method):
+    """Decorador para los métodos de una vista de DRF; sin la cabecera no cambia nada."""
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key or not request.user.is_authenticated:
+            return view_method(self, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {'detail': f"{HEADER} admite hasta {MAX_KEY_LENGTH} caracteres."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        record, earlier = _claim(request.user, key, fingerprint(request))
+        if earlier is not None:
+            return earlier
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            _release(record)
+            raise
+        if status.is_success(response.status_code):
+            record.status_code = response.status_code
+            record.response = JSONRenderer().render(response.data).decode()
+            record.save(update_fields=['status_code', 'response'])
+        else:
+            _release(record)
+        return response
+    return wrapper
+
+
+def fingerprint(request):
+    """Identifica la petición: el mismo cuerpo JSON con otro orden de claves da lo mismo."""
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f'{request.method} {request.path}\n{body}'.encode()).hexdigest()
+
+
+def _claim(user, key, fingerprint):
+    """
+    Reserva la clave y devuelve (fila, None), o (None, respuesta) si otra
+    petición ya la usó: la respuesta guardada, 409 o 422.
+    """
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+    while True:
+        now = timezone.now()
+        try:
+            # La reserva se confirma de inmediato para que los duplicados la vean
+            with transaction.atomic():
+                return IdempotencyKey.objects.create(
+                    user=user, key=key, fingerprint=fingerprint,
+                    expires_at=now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL),
+                ), None
+        except IntegrityError:
+            pass
+
+        existing = IdempotencyKey.objects.filter(user=user, key=key).first()
+        if existing is None:
+            continue
+        abandoned = (
+            existing.status_code is None
+            and existing.created_at <= now - timedelta(seconds=settings.IDEMPOTENCY_LOCK_SECONDS)
+        )
+        if existing.expires_at <= now or abandoned:
+            # Condicionado a la fila leída: si dos la reclaman, solo uno la borra
+            IdempotencyKey.objects.filter(pk=existing.pk, status_code=existing.status_code).delete()
+            continue
+        if existing.fingerprint != fingerprint:
+            return None, Response(
+                {'detail': f"{HEADER} ya se usó con otra petición."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        if existing.status_code is not None:
+            return None, Response(
+                json.loads(existing.response), status=existing.status_code, headers={REPLAYED_HEADER: 'true'},
+            )
+        if time.monotonic() >= deadline:
+            return None, Response(
+                {'detail': "La petición original con esta clave sigue en curso; reintente más tarde."},
+                status=status.HTTP_409_CONFLICT,
+            )
+        time.sleep(POLL_INTERVAL)
+
+
+def _release(record):
+    IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+
+def prune():
+    """Borra las claves vencidas; devuelve cuántas."""
+    deleted, _ = IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,58 @@
+# api/instrumentation.py
+
+"""
+Un solo execute-wrapper por conexión a la base de datos, para las métricas
+por petición (api/metrics.py) y el detector de consultas
+(api/query_inspector.py).
+
+Las conexiones de Django son por hilo y, bajo ASGI, las consultas no corren
+en el hilo del bucle de eventos sino en los de sync_to_async. Por eso el
+wrapper no lo ponen los middlewares alrededor de la petición: se añade a cada
+conexión al abrirse (señal connection_created) y lee de las ContextVar de la
+petición en curso, que sync_to_async copia al hilo donde se ejecuta la consulta.
+"""
+
+import sys
+import time
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from . import metrics, query_inspector
+
+
+def execute_wrapper(execute, sql, params, many, context):
+    request_metrics = metrics.current()
+    reports = query_inspector.active_reports()
+    if request_metrics is None and not reports:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        elapsed = time.perf_counter() - started
+        if request_metrics is not None:
+            request_metrics.queries += 1
+            request_metrics.sql_time += elapsed
+        if reports:
+            field = query_inspector.serializer_field_path(sys._getframe(1))
+            for report in reports:
+                report.record(sql, elapsed, field)
+
+
+def instrument(connection):
+    # Al principio de la lista: connection.execute_wrapper() quita con pop()
+    # el último wrapper, que así sigue siendo el suyo
+    if execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, execute_wrapper)
+
+
+def _on_connection_created(sender, connection, **kwargs):
+    instrument(connection)
+
+
+def install():
+    connection_created.connect(_on_connection_created, dispatch_uid='api.instrumentation')
+    # Las conexiones de este hilo que ya estaban abiertas
+    for connection in connections.all(initialized_only=True):
+        instrument(connection)
@@ -0,0 +1,32 @@
+# api/management/commands/archive_data.py
+
+from django.core.management.base import BaseCommand
+
+from api import archive
+
+
+class Command(BaseCommand):
+    help = (
+        "Archiva por lotes las facturas entregadas y pagadas anteriores a ARCHIVE_INVOICE_DAYS (con sus "
+        "items) y la auditoría anterior a ARCHIVE_AUDIT_DAYS (ver api/archive.py). Puede interrumpirse "
+        "y volver a ejecutarse: continúa con lo que falte."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--invoice-days', type=int, help="Días de facturas a conservar (por defecto, ARCHIVE_INVOICE_DAYS).")
+        parser.add_argument('--audit-days', type=int, help="Días de auditoría a conservar (por defecto, ARCHIVE_AUDIT_DAYS).")
+        parser.add_argument('--batch-size', type=int, help="Filas por lote (por defecto, ARCHIVE_BATCH_SIZE).")
+        parser.add_argument('--max-batches', type=int, help="Lotes como máximo por tabla en esta ejecución.")
+        parser.add_argument('--pause', type=float, default=0, help="Segundos de espera entre lotes.")
+        parser.add_argument('--dry-run', action='store_true', help="Solo informa cuántas filas se archivarían.")
+
+    def handle(self, *args, **options):
+        days = {'invoice_days': options['invoice_days'], 'audit_days': options['audit_days']}
+        if options['dry_run']:
+            counts = archive.pending(**days)
+            self.stdout.write(f"Se archivarían {counts['invoices']} facturas y {counts['audit_logs']} registros de auditoría.")
+            return
+        counts = archive.run(
+            **days, batch_size=options['batch_size'], max_batches=options['max_batches'], pause=options['pause'],
+        )
+        self.stdout.write(f"{counts['invoices']} facturas y {counts['audit_logs']} registros de auditoría archivados.")
@@ -0,0 +1,259 @@
+# api/management/commands/benchmark_api.py
+
+import itertools
+import json
+import queue
+import secrets
+import subprocess
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+from api.benchmarks import ClientRunner, HTTPRunner, WSGIRunner, run_concurrently, summarize
+from api.models import AuditLog, Client, Expense, Invoice, Office, ShipmentManifest, User, Vehicle
+
+SCENARIOS = ('invoice_create', 'invoice_list', 'dashboard_stats', 'dispatch', 'finalize_trip', 'client_lookup')
+TRANSPORTS = ('client', 'wsgi', 'http')
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide throughput y latencia (p50/p95/p99) de los endpoints principales con el cliente "
+        "de pruebas, el WSGIHandler o un servidor HTTP real, y guarda los resultados en JSON "
+        "para compararlos entre commits. Escribe en la base de datos: úsese sobre una copia "
+        "desechable (ver generate_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', default=','.join(SCENARIOS), help="Separados por coma: " + ', '.join(SCENARIOS))
+        parser.add_argument('--transports', default='client,wsgi', help="Separados por coma: " + ', '.join(TRANSPORTS))
+        parser.add_argument('--url', help="URL base del servidor para el transporte http (ej: http://127.0.0.1:8000).")
+        parser.add_argument('--username', default='benchmark', help="Usuario con oficina asignada (generate_data crea 'benchmark').")
+        parser.add_argument('--threads', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=50, help="Peticiones por hilo y escenario.")
+        parser.add_argument('--invoices-per-manifest', type=int, default=20)
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+        parser.add_argument('--compare', help="Archivo JSON de una ejecución anterior para comparar.")
+        parser.add_argument('--tolerance', type=float, default=10.0, help="Variación (%%) de p95 o req/s considerada regresión.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        scenarios = self._choices(options['scenarios'], SCENARIOS, 'Escenarios')
+        transports = self._choices(options['transports'], TRANSPORTS, 'Transportes')
+        if 'http' in transports and not options['url']:
+            raise CommandError("El transporte http requiere --url.")
+
+        self.user = self._get_user(options['username'])
+        self.offices = list(Office.objects.exclude(pk=self.user.office_id)[:20])
+        if not self.offices:
+            raise CommandError("Se necesita al menos otra oficina como destino; ejecute generate_data.")
+        self.invoices_per_manifest = options['invoices_per_manifest']
+        self.token = secrets.token_hex(2)
+        self.sequence = itertools.count(1)
+        self.lookups = list(Client.objects.order_by('?').values_list('id_type', 'id_number')[:1000])
+
+        from rest_framework_simplejwt.tokens import AccessToken
+        access = str(AccessToken.for_user(self.user))
+        runners = {
+            'client': lambda: ClientRunner(token=access),
+            'wsgi': lambda: WSGIRunner(token=access),
+            'http': lambda: HTTPRunner(options['url'], token=access),
+        }
+
+        results = {
+            'commit': self._commit(),
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'threads': options['threads'],
+            'requests_per_thread': options['requests'],
+            'data': self._data_volume(),
+            'results': {},
+        }
+        total = options['threads'] * options['requests']
+        for transport in transports:
+            runner = runners[transport]()
+            results['results'][transport] = {}
+            for scenario in scenarios:
+                # +1 por la petición de calentamiento
+                task = getattr(self, f'_task_{scenario}')(runner, total + 1)
+                try:
+                    task()
+                except RuntimeError as exc:
+                    raise CommandError(f"[{transport}] {scenario}: {exc}")
+                latencies, errors, elapsed = run_concurrently(task, options['threads'], options['requests'])
+                summary = summarize(latencies, elapsed)
+                summary['errors'] = len(errors)
+                if errors:
+                    summary['first_error'] = errors[0]
+                results['results'][transport][scenario] = summary
+                self.stdout.write(
+                    f"[{transport:<6}] {scenario:<16} {summary['rps']:>8} req/s  p50 {summary['p50_ms']} ms  "
+                    f"p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  errores {summary['errors']}"
+                )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+        if options['compare']:
+            regressions = self._compare(options['compare'], results, options['tolerance'])
+            if regressions and options['fail_on_regression']:
+                raise CommandError(f"{len(regressions)} regresiones: {', '.join(regressions)}")
+
+    # --- Escenarios: cada uno prepara sus datos y devuelve la tarea a medir ---
+
+    def _task_invoice_list(self, runner, total):
+        return self._get(runner, '/api/invoices/?limit=50')
+
+    def _task_dashboard_stats(self, runner, total):
+        return self._get(runner, '/api/dashboard-stats/')
+
+    def _task_client_lookup(self, runner, total):
+        if not self.lookups:
+            raise CommandError("No hay clientes para buscar; ejecute generate_data.")
+        lookups = itertools.cycle(self.lookups)
+
+        def task():
+            id_type, id_number = next(lookups)
+            query = urlencode({'id_type': id_type, 'id_number': id_number})
+            self._expect(runner.request('GET', f'/api/clients/?{query}'), 200)
+        return task
+
+    def _task_invoice_create(self, runner, total):
+        def task():
+            number = next(self.sequence)
+            client = lambda role: {
+                'id_type': 'V', 'id_number': f'B{self.token}{role}{number:07d}', 'name': f'Cliente benchmark {number}',
+            }
+            payload = {
+                'sender': client('S'),
+                'recipient': client('R'),
+                'items': [{'quantity': 2, 'description': 'Caja benchmark', 'weight': '12.50'}],
+                'subtotal': '100.00', 'tax': '16.00', 'total': '116.00',
+                'destination_office_id': self.offices[number % len(self.offices)].pk,
+            }
+            self._expect(runner.request('POST', '/api/invoices/', payload), 201)
+        return task
+
+    def _task_dispatch(self, runner, total):
+        pending = queue.SimpleQueue()
+        for manifest, invoice_ids in self._manifests(total, 'PLANIFICADO'):
+            pending.put((manifest.pk, invoice_ids))
+
+        def task():
+            manifest_id, invoice_ids = pending.get_nowait()
+            self._expect(runner.request('POST', f'/api/manifests/{manifest_id}/dispatch/', {'invoice_ids': invoice_ids}), 200)
+        return task
+
+    def _task_finalize_trip(self, runner, total):
+        pending = queue.SimpleQueue()
+        for manifest, _ in self._manifests(total, 'EN_RUTA'):
+            pending.put(manifest.pk)
+
+        def task():
+            self._expect(runner.request('POST', f'/api/manifests/{pending.get_nowait()}/finalize_trip/'), 200)
+        return task
+
+    # --- Datos de apoyo ---
+
+    def _manifests(self, total, status):
+        """Crea `total` manifiestos, cada uno con su vehículo y sus facturas, listos para despachar o finalizar."""
+        now = timezone.now()
+        in_route = status == 'EN_RUTA'
+        client = Client.objects.first() or Client.objects.create(id_type='V', id_number=f'B{self.token}', name='Cliente benchmark')
+        numbers = [next(self.sequence) for _ in range(total)]
+        with transaction.atomic():
+            vehicles = Vehicle.objects.bulk_create([
+                Vehicle(
+                    license_plate=f'B{self.token}{number:05d}', brand='Benchmark', model='Carga', year=2024,
+                    capacity_kg=12000, status='En Ruta' if in_route else 'Disponible',
+                )
+                for number in numbers
+            ])
+            manifests = ShipmentManifest.objects.bulk_create([
+                ShipmentManifest(
+                    manifest_number=f'B-{self.token}-{number:07d}', vehicle=vehicle, status=status,
+                    departure_time=now if in_route else None,
+                )
+                for number, vehicle in zip(numbers, vehicles)
+            ])
+            invoices = Invoice.objects.bulk_create([
+                Invoice(
+                    invoice_number=f'B-{self.token}-{number:07d}-{index:03d}',
+                    sender=client, recipient=client,
+                    origin_office=self.user.office, destination_office=self.offices[0], created_by=self.user,
+                    shipping_status='EN_TRANSITO' if in_route else 'PENDIENTE_DESPACHO',
+                    manifest=manifest if in_route else None,
+                    subtotal=Decimal('100.00'), tax=Decimal('16.00'), total=Decimal('116.00'),
+                )
+                for number, manifest in zip(numbers, manifests)
+                for index in range(self.invoices_per_manifest)
+            ])
+        if manifests and manifests[0].pk is None:
+            raise CommandError("La base de datos no devuelve las claves de bulk_create.")
+        size = self.invoices_per_manifest
+        return [
+            (manifest, [invoice.pk for invoice in invoices[position * size:(position + 1) * size]])
+            for position, manifest in enumerate(manifests)
+        ]
+
+    def _get(self, runner, path):
+        return lambda: self._expect(runner.request('GET', path), 200)
+
+    def _expect(self, result, expected):
+        code, _ = result
+        if code != expected:
+            raise RuntimeError(f"HTTP {code} (se esperaba {expected})")
+
+    def _choices(self, value, allowed, label):
+        chosen = [item.strip() for item in value.split(',') if item.strip()]
+        unknown = set(chosen) - set(allowed)
+        if unknown:
+            raise CommandError(f"{label} desconocidos: {', '.join(sorted(unknown))}")
+        return chosen
+
+    def _get_user(self, username):
+        try:
+            user = User.objects.select_related('office').get(username=username)
+        except User.DoesNotExist:
+            raise CommandError(f"El usuario '{username}' no existe; ejecute generate_data o indique --username.")
+        if not user.office_id:
+            raise CommandError(f"El usuario '{username}' no tiene oficina asignada.")
+        return user
+
+    def _data_volume(self):
+        models = {'clients': Client, 'invoices': Invoice, 'manifests': ShipmentManifest, 'expenses': Expense, 'audit_logs': AuditLog}
+        return {name: model.objects.count() for name, model in models.items()}
+
+    def _commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], cwd=settings.BASE_DIR,
+                capture_output=True, text=True, check=True,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    def _compare(self, path, current, tolerance):
+        """Muestra la variación contra una ejecución anterior y devuelve las regresiones."""
+        with open(path) as fh:
+            baseline = json.load(fh)
+        self.stdout.write(f"\nComparación con {baseline.get('commit') or path} (tolerancia {tolerance}%):")
+        regressions = []
+        for transport, scenarios in current['results'].items():
+            for scenario, summary in scenarios.items():
+                previous = baseline.get('results', {}).get(transport, {}).get(scenario)
+                if not previous:
+                    continue
+                change = lambda key: (summary[key] - previous[key]) / previous[key] * 100 if previous[key] else 0.0
+                p95, rps = change('p95_ms'), change('rps')
+                regressed = p95 > tolerance or rps < -tolerance
+                if regressed:
+                    regressions.append(f'{transport}/{scenario}')
+                line = f"[{transport:<6}] {scenario:<16} p95 {p95:+.1f}%  req/s {rps:+.1f}%"
+                self.stdout.write(self.style.ERROR(line + '  REGRESIÓN') if regressed else line)
+        return regressions
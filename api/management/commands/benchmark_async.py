@@ -0,0 +1,134 @@
+# api/management/commands/benchmark_async.py
+
+import itertools
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api.benchmarks import ASGIRunner, HTTPRunner, WSGIRunner, run_async_concurrently, run_concurrently, summarize
+from api.models import Invoice, User
+
+# Mezcla de lecturas (endpoint, peso): la del tráfico habitual del frontend
+WORKLOAD = (
+    ('profile', 30),
+    ('dashboard_stats', 10),
+    ('reference_data', 40),
+    ('invoice_by_number', 20),
+)
+REFERENCE_PATHS = ('/api/offices/', '/api/shipping-types/', '/api/payment-methods/', '/api/expense-categories/')
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara las vistas síncronas (WSGI, un hilo por petición) con las asíncronas (ASGI, "
+        "api/async_views.py) bajo una mezcla de lecturas a la misma concurrencia: req/s y "
+        "latencia p50/p95/p99 total y por endpoint. Solo lee de la base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', default='benchmark', help="Usuario con oficina asignada (generate_data crea 'benchmark').")
+        parser.add_argument('--concurrency', type=int, default=16, help="Hilos (WSGI) o tareas (ASGI) simultáneos.")
+        parser.add_argument('--requests', type=int, default=50, help="Peticiones por hilo o tarea.")
+        parser.add_argument('--wsgi-url', help="Mide un servidor WSGI real (ej: gunicorn) en lugar del WSGIHandler en proceso.")
+        parser.add_argument('--asgi-url', help="Mide un servidor ASGI real (ej: uvicorn) en lugar del ASGIHandler en proceso.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options['username'])
+        except User.DoesNotExist:
+            raise CommandError(f"El usuario '{options['username']}' no existe; ejecute generate_data o indique --username.")
+        numbers = list(Invoice.objects.filter(origin_office=user.office_id).order_by('?').values_list('invoice_number', flat=True)[:1000])
+        if not numbers:
+            raise CommandError("No hay facturas que buscar; ejecute generate_data.")
+
+        from rest_framework_simplejwt.tokens import AccessToken
+        access = str(AccessToken.for_user(user))
+        concurrency, iterations = options['concurrency'], options['requests']
+        workload = self._workload(numbers, concurrency * iterations + 1, options['seed'])
+
+        results = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'concurrency': concurrency,
+            'requests_per_worker': iterations,
+            'workload': dict(WORKLOAD),
+            'results': {},
+        }
+        for transport in ('wsgi', 'asgi'):
+            url = options[f'{transport}_url']
+            timings = defaultdict(list)
+            paths = iter(workload)
+            lock = threading.Lock()
+
+            def record(endpoint, started, code):
+                with lock:
+                    timings[endpoint].append(time.perf_counter() - started)
+                if code != 200:
+                    raise RuntimeError(f"{endpoint}: HTTP {code}")
+
+            if url or transport == 'wsgi':
+                runner = HTTPRunner(url, token=access) if url else WSGIRunner(token=access)
+
+                def task():
+                    with lock:
+                        endpoint, path = next(paths)
+                    started = time.perf_counter()
+                    record(endpoint, started, runner.request('GET', path)[0])
+
+                task()
+                timings.clear()
+                latencies, errors, elapsed = run_concurrently(task, concurrency, iterations)
+            else:
+                runner = ASGIRunner(token=access)
+
+                async def task():
+                    endpoint, path = next(paths)
+                    started = time.perf_counter()
+                    record(endpoint, started, (await runner.request('GET', path))[0])
+
+                run_async_concurrently(task, 1, 1)
+                timings.clear()
+                latencies, errors, elapsed = run_async_concurrently(task, concurrency, iterations)
+
+            label = f'{transport} ({url})' if url else transport
+            summary = summarize(latencies, elapsed)
+            summary['errors'] = len(errors)
+            if errors:
+                summary['first_error'] = errors[0]
+            summary['endpoints'] = {endpoint: summarize(values, elapsed) for endpoint, values in sorted(timings.items())}
+            results['results'][label] = summary
+            self._write(label, 'total', summary)
+            for endpoint, endpoint_summary in summary['endpoints'].items():
+                self._write(label, endpoint, endpoint_summary)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _workload(self, numbers, total, seed):
+        """Secuencia reproducible de (endpoint, ruta) con las proporciones de WORKLOAD."""
+        generator = random.Random(seed)
+        endpoints, weights = zip(*WORKLOAD)
+        references = itertools.cycle(REFERENCE_PATHS)
+        paths = {
+            'profile': lambda: '/api/profile/',
+            'dashboard_stats': lambda: '/api/dashboard-stats/',
+            'reference_data': lambda: next(references),
+            'invoice_by_number': lambda: f'/api/invoices/by-number/{generator.choice(numbers)}/',
+        }
+        return [(endpoint, paths[endpoint]()) for endpoint in generator.choices(endpoints, weights, k=total)]
+
+    def _write(self, label, endpoint, summary):
+        self.stdout.write(
+            f"[{label}] {endpoint:<18} {summary['requests']:>6} pet.  {summary['rps']:>8} req/s  "
+            f"p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms"
+            + (f"  errores {summary['errors']}" if 'errors' in summary else '')
+        )
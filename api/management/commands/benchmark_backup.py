@@ -0,0 +1,76 @@
+# api/management/commands/benchmark_backup.py
+
+import json
+import os
+import tempfile
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from api import backup
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el respaldo (y con --restore, la restauración) de la base actual: filas/s, MB/s de "
+        "JSON generado y tamaño comprimido, para cada combinación de hilos y nivel de gzip. "
+        "--restore reemplaza la base con su propio respaldo: úsese sobre una copia desechable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', default='1,4', help="Hilos a probar, separados por coma (solo PostgreSQL usa más de uno).")
+        parser.add_argument('--levels', default='1,6', help="Niveles de gzip a probar, separados por coma.")
+        parser.add_argument('--chunk-size', type=int, help="Filas por trozo (por defecto, BACKUP_CHUNK_SIZE).")
+        parser.add_argument('--restore', action='store_true', help="Mide también la restauración del último respaldo.")
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        results = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'results': {},
+        }
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'respaldo.tar')
+            for workers in self._ints(options['workers']):
+                for level in self._ints(options['levels']):
+                    with override_settings(BACKUP_COMPRESSION_LEVEL=level):
+                        manifest = backup.backup(path, workers=workers, chunk_size=options['chunk_size'], media=False)
+                    summary = self._summary(manifest['rows'], manifest['elapsed_s'], manifest['tables'])
+                    summary['archive_bytes'] = os.path.getsize(path)
+                    key = f'backup workers={workers} gzip={level}'
+                    results['results'][key] = summary
+                    self._write(key, summary)
+            if options['restore']:
+                restored = backup.restore([path], media=False)
+                summary = self._summary(sum(restored['tables'].values()), restored['elapsed_s'], manifest['tables'])
+                results['results']['restore'] = summary
+                self._write('restore', summary)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _summary(self, rows, elapsed, tables):
+        raw = sum(table['bytes'] for table in tables)
+        compressed = sum(table['compressed_bytes'] for table in tables)
+        return {
+            'rows': rows,
+            'elapsed_s': elapsed,
+            'rows_per_s': round(rows / elapsed, 1) if elapsed else 0.0,
+            'mb_per_s': round(raw / elapsed / 1e6, 2) if elapsed else 0.0,
+            'json_bytes': raw,
+            'compressed_bytes': compressed,
+            'ratio': round(raw / compressed, 2) if compressed else 0.0,
+        }
+
+    def _ints(self, value):
+        return [int(item) for item in value.split(',') if item.strip()]
+
+    def _write(self, key, summary):
+        self.stdout.write(
+            f"{key:<28} {summary['rows']:>9} filas  {summary['elapsed_s']} s  {summary['rows_per_s']} filas/s  "
+            f"{summary['mb_per_s']} MB/s  comprimido x{summary['ratio']}"
+        )
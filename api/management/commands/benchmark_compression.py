@@ -0,0 +1,118 @@
+# api/management/commands/benchmark_compression.py
+
+import gc
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api import compression
+from api.models import Invoice
+from api.renderers import FastJSONRenderer
+from api.serializers import invoice_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el costo de entregar una página de facturas: render a JSON con el JSONRenderer de DRF y con "
+        "FastJSONRenderer (api/renderers.py), y compresión con gzip y brotli (si está instalado) en varios "
+        "niveles. Informa bytes enviados y tiempo de CPU por respuesta. Verifica que ambos renderers "
+        "produzcan los mismos bytes y que la compresión sea reversible."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Facturas por página.")
+        parser.add_argument('--gzip-levels', default='1,5,9', help="Niveles de gzip, separados por coma.")
+        parser.add_argument('--brotli-qualities', default='1,4,9', help="Calidades de brotli, separadas por coma.")
+        parser.add_argument('--repeat', type=int, default=5, help="Repeticiones; se informa la mejor.")
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            levels = {
+                'gzip': [int(value) for value in options['gzip_levels'].split(',')],
+                'br': [int(value) for value in options['brotli_qualities'].split(',')],
+            }
+        except ValueError:
+            raise CommandError("--gzip-levels y --brotli-qualities son listas de enteros separados por coma.")
+        if options['rows'] < 1 or options['repeat'] < 1:
+            raise CommandError("--rows y --repeat deben ser mayores que cero.")
+        repeat = options['repeat']
+
+        # Mismo queryset que la lista de InvoiceViewSet para un usuario que ve todo
+        queryset = Invoice.objects.order_by('-created_at', '-pk')
+        if not queryset.exists():
+            raise CommandError("No hay facturas que serializar; ejecute generate_data.")
+        started = time.process_time()
+        data = invoice_rows.serialize(invoice_rows.values(queryset)[:options['rows']])
+        serialize_ms = (time.process_time() - started) * 1000
+
+        renderers = {'drf': JSONRenderer(), 'fast': FastJSONRenderer()}
+        body = renderers['fast'].render(data)
+        if renderers['drf'].render(data) != body:
+            raise CommandError("FastJSONRenderer no produce el mismo JSON que JSONRenderer.")
+
+        results = {}
+        for name, renderer in renderers.items():
+            results[name] = self._measure(lambda renderer=renderer: renderer.render(data), repeat)
+            results[name]['bytes'] = len(body)
+        for encoding in compression.available():
+            for level in levels[encoding]:
+                compressed = compression.compress(body, encoding, level)
+                if self._decompress(compressed, encoding) != body:
+                    raise CommandError(f"La compresión {encoding} {level} no es reversible.")
+                summary = self._measure(lambda: compression.compress(body, encoding, level), repeat)
+                # CPU por respuesta: render con FastJSONRenderer más la compresión
+                summary['response_cpu_ms'] = round(results['fast']['cpu_ms'] + summary['cpu_ms'], 3)
+                summary['bytes'] = len(compressed)
+                summary['ratio'] = round(len(body) / len(compressed), 1)
+                results[f'{encoding}-{level}'] = summary
+
+        payload = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rows': len(data),
+            'serialize_cpu_ms': round(serialize_ms, 3),
+            'encodings': list(compression.available()),
+            'repeat': repeat,
+            'results': results,
+        }
+        self.stdout.write(f"{len(data)} facturas, serialización {payload['serialize_cpu_ms']} ms de CPU")
+        for name, summary in results.items():
+            line = f"{name:<8} {summary['bytes']:>10} bytes  CPU {summary['cpu_ms']} ms  pico {summary['peak_kib']} KiB"
+            if 'ratio' in summary:
+                line += f"  x{summary['ratio']}  respuesta {summary['response_cpu_ms']} ms"
+            self.stdout.write(line)
+        if 'br' not in compression.available():
+            self.stdout.write("brotli no está instalado: solo se mide gzip.")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(payload, fh, indent=2)
+
+    def _decompress(self, data, encoding):
+        if encoding == 'br':
+            return compression.brotli.decompress(data)
+        import gzip
+        return gzip.decompress(data)
+
+    def _measure(self, run, repeat):
+        """Mejor tiempo de CPU entre `repeat` corridas y el pico de memoria de una corrida aparte."""
+        cpu = []
+        for _ in range(repeat):
+            gc.collect()
+            started = time.process_time()
+            run()
+            cpu.append(time.process_time() - started)
+        gc.collect()
+        tracemalloc.start()
+        try:
+            run()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {'cpu_ms': round(min(cpu) * 1000, 3), 'peak_kib': round(peak / 1024, 1)}
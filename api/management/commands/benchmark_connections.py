@@ -0,0 +1,127 @@
+# api/management/commands/benchmark_connections.py
+
+import itertools
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from api.benchmarks import WSGIRunner, run_concurrently, summarize
+from api.models import User
+
+MODES = {
+    # Una conexión nueva por petición
+    'new': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'pool': None},
+    # Conexiones persistentes por hilo con verificación de salud
+    'persistent': {'CONN_MAX_AGE': 600, 'CONN_HEALTH_CHECKS': True, 'pool': None},
+    # Pool de psycopg 3 compartido por todos los hilos
+    'pool': {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': True, 'pool': {'min_size': 2, 'max_size': 10}},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara la latencia de peticiones concurrentes con conexiones nuevas, "
+        "persistentes y con pool contra la base de datos configurada."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/profile/', help="Endpoint a consultar (GET).")
+        parser.add_argument('--username', help="Usuario con el que se autentican las peticiones (por defecto, el primer superusuario).")
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--requests', type=int, default=100, help="Peticiones por hilo.")
+        parser.add_argument('--modes', default='new,persistent,pool', help="Modos separados por coma: " + ', '.join(MODES))
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        modes = [mode.strip() for mode in options['modes'].split(',') if mode.strip()]
+        unknown = set(modes) - set(MODES)
+        if unknown:
+            raise CommandError(f"Modos desconocidos: {', '.join(sorted(unknown))}")
+
+        user = self._get_user(options['username'])
+        from rest_framework_simplejwt.tokens import AccessToken
+        runner = WSGIRunner(token=str(AccessToken.for_user(user)))
+        path = options['path']
+
+        def task():
+            code, _ = runner.request('GET', path)
+            if code >= 500:
+                raise RuntimeError(f"HTTP {code}")
+
+        db_settings = connections.settings['default']
+        original = {
+            'CONN_MAX_AGE': db_settings.get('CONN_MAX_AGE', 0),
+            'CONN_HEALTH_CHECKS': db_settings.get('CONN_HEALTH_CHECKS', False),
+            'OPTIONS': dict(db_settings.get('OPTIONS', {})),
+        }
+        opened = itertools.count()
+        counter = lambda **kwargs: next(opened)
+        connection_created.connect(counter)
+
+        results = {'path': path, 'threads': options['threads'], 'requests_per_thread': options['requests'], 'modes': {}}
+        try:
+            for mode in modes:
+                if not self._apply_mode(db_settings, original, MODES[mode]):
+                    self.stderr.write(f"[{mode}] omitido: requiere PostgreSQL con psycopg[pool] instalado.")
+                    continue
+                task()  # calentamiento: carga middleware, URLs y el pool
+                opened = itertools.count()
+                latencies, errors, elapsed = run_concurrently(task, options['threads'], options['requests'])
+                summary = summarize(latencies, elapsed)
+                summary['connections_opened'] = next(opened)
+                summary['errors'] = len(errors)
+                if MODES[mode]['pool']:
+                    # Con pool, connection_created cuenta préstamos; el pool informa las conexiones reales
+                    summary['pool_connections'] = connections['default'].pool.get_stats()['connections_num']
+                results['modes'][mode] = summary
+                self.stdout.write(
+                    f"[{mode:<10}] {summary['rps']:>8} req/s  p50 {summary['p50_ms']} ms  "
+                    f"p95 {summary['p95_ms']} ms  p99 {summary['p99_ms']} ms  "
+                    f"conexiones {summary.get('pool_connections', summary['connections_opened'])}  errores {summary['errors']}"
+                )
+        finally:
+            connection_created.disconnect(counter)
+            self._reset(db_settings)
+            db_settings.update(original)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f"El usuario '{username}' no existe.")
+        user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError("No hay superusuarios; indique --username.")
+        return user
+
+    def _reset(self, db_settings):
+        connection = connections['default']
+        if hasattr(connection, 'close_pool') and db_settings.get('OPTIONS', {}).get('pool'):
+            connection.close_pool()
+        connections.close_all()
+
+    def _apply_mode(self, db_settings, original, mode):
+        self._reset(db_settings)
+        options = dict(original['OPTIONS'])
+        options.pop('pool', None)
+        if mode['pool']:
+            if connections['default'].vendor != 'postgresql':
+                return False
+            try:
+                import psycopg_pool  # noqa: F401
+            except ImportError:
+                return False
+            options['pool'] = mode['pool']
+        db_settings.update({
+            'CONN_MAX_AGE': mode['CONN_MAX_AGE'],
+            'CONN_HEALTH_CHECKS': mode['CONN_HEALTH_CHECKS'],
+            'OPTIONS': options,
+        })
+        return True
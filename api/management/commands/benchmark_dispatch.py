@@ -0,0 +1,161 @@
+# api/management/commands/benchmark_dispatch.py
+
+import json
+import secrets
+import threading
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from api import changefeed
+from api.benchmarks import WSGIRunner, run_concurrently, summarize
+from api.manifests import format_number
+from api.models import Client, Invoice, ManifestSequence, ShipmentManifest, StatusChange, User, Vehicle
+
+PATH = '/api/manifests/create-and-dispatch/'
+
+
+class Command(BaseCommand):
+    help = (
+        "Prueba de carga del despacho: varios despachadores en paralelo crean y despachan manifiestos "
+        f"({PATH}). Verifica que los números de manifiesto no se repitan ni dejen huecos por oficina y "
+        "día, y que ninguna factura ni vehículo quede en dos manifiestos. Crea sus propios vehículos y "
+        "facturas pendientes; requiere oficinas con usuarios (ver generate_data)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dispatchers', type=int, default=8, help="Hilos despachando a la vez.")
+        parser.add_argument('--manifests', type=int, default=5, help="Manifiestos por despachador.")
+        parser.add_argument('--invoices', type=int, default=10, help="Facturas por manifiesto.")
+        parser.add_argument(
+            '--offices', type=int, default=1,
+            help="Oficinas que despachan; con 1, todos compiten por el mismo contador de números.",
+        )
+        parser.add_argument(
+            '--overlap', action='store_true',
+            help="Cada manifiesto pide la mitad de las facturas del anterior: los despachos compiten por ellas.",
+        )
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        dispatchers, per_dispatcher, size = options['dispatchers'], options['manifests'], options['invoices']
+        if min(dispatchers, per_dispatcher, size, options['offices']) < 1:
+            raise CommandError("Todos los valores deben ser mayores que cero.")
+        users = self._users(options['offices'])
+        total = dispatchers * per_dispatcher
+        step = max(size // 2, 1) if options['overlap'] else size
+        token = secrets.token_hex(2)
+
+        vehicles, invoice_ids = self._fixtures(token, users[0], total, step * (total - 1) + size)
+        from rest_framework_simplejwt.tokens import AccessToken
+        runners = [WSGIRunner(token=str(AccessToken.for_user(user))) for user in users]
+        jobs = iter([
+            (runners[number % len(runners)], vehicle.pk, invoice_ids[number * step:number * step + size])
+            for number, vehicle in enumerate(vehicles)
+        ])
+        lock = threading.Lock()
+        codes = []
+        feed_head = changefeed.head()
+
+        def task():
+            with lock:
+                runner, vehicle, ids = next(jobs)
+            code, _ = runner.request('POST', PATH, {'vehicle': vehicle, 'invoice_ids': ids})
+            with lock:
+                codes.append(code)
+            if code >= 500:
+                raise RuntimeError(f"HTTP {code}")
+
+        latencies, errors, elapsed = run_concurrently(task, dispatchers, per_dispatcher)
+        summary = summarize(latencies, elapsed)
+        summary.update({
+            'dispatched': codes.count(201),
+            'rejected': sum(1 for code in codes if 400 <= code < 500),
+            'errors': len(errors),
+            'first_error': errors[0] if errors else None,
+        })
+        checks = self._checks(users, vehicles, feed_head, summary['dispatched'])
+
+        results = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'dispatchers': dispatchers,
+            'manifests_per_dispatcher': per_dispatcher,
+            'invoices_per_manifest': size,
+            'offices': len(users),
+            'overlap': options['overlap'],
+            'results': summary,
+            'checks': checks,
+        }
+        self.stdout.write(
+            f"{summary['rps']:>8} manifiestos/s  p50 {summary['p50_ms']} ms  p95 {summary['p95_ms']} ms  "
+            f"p99 {summary['p99_ms']} ms  despachados {summary['dispatched']}  rechazados {summary['rejected']}  "
+            f"errores {summary['errors']}"
+        )
+        for name, ok in checks.items():
+            self.stdout.write(f"  {'ok   ' if ok else 'FALLA'} {name}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+        if not all(checks.values()):
+            raise CommandError("El despacho concurrente dejó datos inconsistentes.")
+
+    def _users(self, offices):
+        """Un usuario activo por oficina, de `offices` oficinas distintas."""
+        users = {}
+        for user in User.objects.filter(office__isnull=False, is_active=True).select_related('office').order_by('office_id', 'pk'):
+            users.setdefault(user.office_id, user)
+            if len(users) == offices:
+                return list(users.values())
+        raise CommandError(f"Se necesitan usuarios activos en {offices} oficinas; ejecute generate_data.")
+
+    def _fixtures(self, token, user, vehicles, invoices):
+        """Vehículos disponibles y facturas pendientes para la prueba."""
+        client = Client.objects.first() or Client.objects.create(id_type='V', id_number=f'D{token}', name='Cliente benchmark')
+        with transaction.atomic():
+            created = Vehicle.objects.bulk_create([
+                Vehicle(
+                    license_plate=f'D{token}{number:05d}', brand='Benchmark', model='Despacho', year=2024,
+                    capacity_kg=12000,
+                )
+                for number in range(vehicles)
+            ])
+            pending = Invoice.objects.bulk_create([
+                Invoice(
+                    invoice_number=f'D-{token}-{number:07d}', sender=client, recipient=client,
+                    origin_office=user.office, destination_office=user.office, created_by=user,
+                    subtotal=Decimal('100.00'), tax=Decimal('16.00'), total=Decimal('116.00'),
+                )
+                for number in range(invoices)
+            ])
+        if created and created[0].pk is None:
+            raise CommandError("La base de datos no devuelve las claves de bulk_create.")
+        return created, [invoice.pk for invoice in pending]
+
+    def _checks(self, users, vehicles, feed_head, dispatched):
+        manifests = ShipmentManifest.objects.filter(vehicle__in=vehicles)
+        day = timezone.localdate()
+        gapless = True
+        for user in users:
+            last = ManifestSequence.objects.filter(office=user.office, day=day).values_list('last_number', flat=True).first() or 0
+            numbers = set(
+                ShipmentManifest.objects.filter(manifest_number__startswith=format_number(user.office_id, day, 0)[:-3])
+                .values_list('manifest_number', flat=True)
+            )
+            gapless &= numbers == {format_number(user.office_id, day, n) for n in range(1, last + 1)}
+        twice = (
+            StatusChange.objects.filter(id__gt=feed_head, entity='invoice', new_value='EN_TRANSITO')
+            .values('object_id').annotate(times=Count('id')).filter(times__gt=1)
+        )
+        return {
+            'un manifiesto por despacho exitoso': manifests.count() == dispatched,
+            'números sin huecos ni repetidos por oficina y día': gapless,
+            'ningún vehículo en dos manifiestos': not manifests.values('vehicle').annotate(n=Count('id')).filter(n__gt=1).exists(),
+            'ninguna factura despachada dos veces': not twice.exists(),
+            'todas las facturas de cada manifiesto en tránsito': not Invoice.objects.filter(
+                manifest__in=manifests).exclude(shipping_status='EN_TRANSITO').exists(),
+        }
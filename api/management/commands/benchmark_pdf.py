@@ -0,0 +1,97 @@
+# api/management/commands/benchmark_pdf.py
+
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+
+from api import documents, pdf
+from api.cache import reference_namespace
+from api.models import CompanyInfo, Invoice
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la generación de PDF de guías (api/documents.py): compilación de las plantillas con y sin "
+        "caché, lectura de los datos y páginas por segundo al dibujar un lote de guías en un solo archivo "
+        "con distintos números de procesos. Verifica que todos produzcan el mismo archivo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--guides', type=int, default=500, help="Guías del lote.")
+        parser.add_argument('--workers', default='1,2,4', help="Números de procesos a comparar, separados por coma.")
+        parser.add_argument('--repeat', type=int, default=3, help="Repeticiones; se informa la mejor.")
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            worker_counts = [int(value) for value in options['workers'].split(',')]
+        except ValueError:
+            raise CommandError("--workers es una lista de enteros separados por coma.")
+        if min(options['guides'], options['repeat'], *worker_counts) < 1:
+            raise CommandError("Todos los valores deben ser mayores que cero.")
+        queryset = Invoice.objects.order_by('pk')[:options['guides']]
+        if not queryset.exists():
+            raise CommandError("No hay facturas; ejecute generate_data.")
+
+        # Plantillas: sin nada en caché (logo incluido) y ya compiladas
+        documents.clear_compiled()
+        reference_namespace(CompanyInfo).invalidate()
+        started = time.perf_counter()
+        templates, logo = documents.branding()
+        cold = time.perf_counter() - started
+        started = time.perf_counter()
+        documents.branding()
+        warm = time.perf_counter() - started
+
+        started = time.perf_counter()
+        data = documents.guides(queryset)
+        load = time.perf_counter() - started
+
+        results, outputs = {}, set()
+        for workers in worker_counts:
+            # El primer lote arranca los procesos; no se cronometra
+            documents.render_guides(templates['guide'], data[:workers], workers, min_guides=1)
+            best = None
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                streams = documents.render_guides(templates['guide'], data, workers, min_guides=1)
+                content = pdf.document(streams, logo)
+                elapsed = time.perf_counter() - started
+                best = elapsed if best is None else min(best, elapsed)
+            outputs.add(content)
+            results[f'workers={workers}'] = {
+                'pages': len(streams),
+                'bytes': len(content),
+                'seconds': round(best, 4),
+                'pages_per_second': round(len(streams) / best, 1) if best else None,
+            }
+
+        summary = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'guides': len(data),
+            'logo': logo is not None,
+            'templates_cold_ms': round(cold * 1000, 3),
+            'templates_cached_ms': round(warm * 1000, 3),
+            'load_ms': round(load * 1000, 3),
+            'results': results,
+            'identical': len(outputs) == 1,
+        }
+        self.stdout.write(
+            f"plantillas {summary['templates_cold_ms']} ms (en caché {summary['templates_cached_ms']} ms)  "
+            f"datos de {len(data)} guías {summary['load_ms']} ms"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10} {result['pages']:>6} páginas  {result['seconds']} s  {result['pages_per_second']} páginas/s  "
+                f"{result['bytes'] // 1024} KiB"
+            )
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(summary, fh, indent=2)
+        if not summary['identical']:
+            raise CommandError("Los distintos números de procesos no producen el mismo PDF.")
@@ -0,0 +1,130 @@
+# api/management/commands/benchmark_routing.py
+
+import itertools
+import json
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api import routing
+
+# Factor entre la distancia en línea recta y la de carretera, y velocidad media
+ROAD_FACTOR = 1.3
+SPEED_KMH = 70
+# Con hasta estas paradas se compara con el óptimo por fuerza bruta
+BRUTE_FORCE_STOPS = 8
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el optimizador de rutas de los manifiestos (api/routing.py) sobre grafos sintéticos de "
+        "oficinas: tiempo de los caminos más cortos y del ordenamiento de paradas, y cuánto acorta la ruta "
+        "frente al orden de las facturas y al vecino más cercano. Con pocas paradas compara además con el "
+        "óptimo. No usa la base de datos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--offices', default='50,200,1000', help="Tamaños del grafo, separados por coma.")
+        parser.add_argument('--stops', default='8,25,50', help="Paradas por manifiesto, separadas por coma.")
+        parser.add_argument('--neighbors', type=int, default=3, help="Tramos hacia las oficinas más cercanas.")
+        parser.add_argument('--repeat', type=int, default=20, help="Manifiestos aleatorios por combinación.")
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(value) for value in options['offices'].split(',')]
+            stop_counts = [int(value) for value in options['stops'].split(',')]
+        except ValueError:
+            raise CommandError("--offices y --stops son listas de enteros separados por coma.")
+        if min(*sizes, *stop_counts, options['repeat'], options['neighbors']) < 1:
+            raise CommandError("Todos los valores deben ser mayores que cero.")
+        rng = random.Random(options['seed'])
+
+        results = []
+        for size in sizes:
+            graph = self._graph(rng, size, options['neighbors'])
+            for stops in stop_counts:
+                if stops >= size:
+                    continue
+                summary = self._measure(rng, graph, size, stops, options['repeat'])
+                results.append(summary)
+                self.stdout.write(
+                    f"{size:>6} oficinas {stops:>4} paradas  caminos {summary['paths_ms']} ms  "
+                    f"orden {summary['solve_ms']} ms (máx {summary['solve_max_ms']})  "
+                    f"vs orden de facturas -{summary['vs_input_pct']}%  vs vecino más cercano "
+                    f"-{summary['vs_nearest_pct']}%"
+                    + (f"  sobre el óptimo +{summary['gap_to_optimal_pct']}%" if 'gap_to_optimal_pct' in summary else '')
+                )
+
+        payload = {
+            'timestamp': timezone.now().isoformat(),
+            'neighbors': options['neighbors'],
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(payload, fh, indent=2)
+
+    def _graph(self, rng, size, neighbors):
+        """Oficinas en un cuadrado de 1000 km unidas a sus vecinas más cercanas, y en cadena para que sea conexo."""
+        points = [(rng.uniform(0, 1000), rng.uniform(0, 1000)) for _ in range(size)]
+
+        def edge(a, b):
+            km = math.dist(points[a], points[b]) * ROAD_FACTOR
+            return (a, b, round(km / SPEED_KMH * 60) + 1, round(km, 2))
+
+        edges = {}
+        for a in range(size):
+            nearest = sorted(range(size), key=lambda b: math.dist(points[a], points[b]))[1:neighbors + 1]
+            for b in nearest:
+                edges[min(a, b), max(a, b)] = edge(a, b)
+        chain = sorted(range(size), key=lambda a: points[a])
+        for a, b in zip(chain, chain[1:]):
+            edges.setdefault((min(a, b), max(a, b)), edge(a, b))
+        return routing.build_graph(list(edges.values()))
+
+    def _measure(self, rng, graph, size, stops, repeat):
+        paths_ms, solve_ms, vs_input, vs_nearest, gaps = [], [], [], [], []
+        for _ in range(repeat):
+            offices = rng.sample(range(size), stops + 1)
+            started = time.perf_counter()
+            distances = [routing.shortest_paths(graph, office, offices)[0] for office in offices]
+            matrix = [[best[office][0] for office in offices] for best in distances]
+            paths_ms.append((time.perf_counter() - started) * 1000)
+
+            started = time.perf_counter()
+            route = routing.solve(matrix)
+            solve_ms.append((time.perf_counter() - started) * 1000)
+
+            cost = routing.route_cost(route, matrix)
+            vs_input.append(self._saving(routing.route_cost(list(range(stops + 1)), matrix), cost))
+            vs_nearest.append(self._saving(routing.route_cost(routing.nearest_neighbor(matrix), matrix), cost))
+            if stops <= BRUTE_FORCE_STOPS:
+                optimal = min(
+                    routing.route_cost([0, *order], matrix) for order in itertools.permutations(range(1, stops + 1))
+                )
+                gaps.append((cost - optimal) / optimal * 100 if optimal else 0)
+
+        summary = {
+            'offices': size,
+            'stops': stops,
+            'paths_ms': round(statistics.median(paths_ms), 3),
+            'solve_ms': round(statistics.median(solve_ms), 3),
+            'solve_max_ms': round(max(solve_ms), 3),
+            'vs_input_pct': round(statistics.mean(vs_input), 1),
+            'vs_nearest_pct': round(statistics.mean(vs_nearest), 1),
+        }
+        if gaps:
+            summary['gap_to_optimal_pct'] = round(statistics.mean(gaps), 2)
+        return summary
+
+    def _saving(self, before, after):
+        """Porcentaje en que `after` acorta `before`."""
+        return (before - after) / before * 100 if before else 0
@@ -0,0 +1,92 @@
+# api/management/commands/benchmark_serialization.py
+
+import gc
+import json
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from api.models import Invoice
+from api.serializers import InvoiceSerializer, invoice_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Compara InvoiceSerializer con la serialización por tuplas (api/row_serializers.py) sobre una "
+        "página de facturas: tiempo de CPU, tiempo total y pico de memoria asignada, incluyendo las "
+        "consultas y el render a JSON. Verifica además que ambas produzcan los mismos bytes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=10000, help="Facturas por página.")
+        parser.add_argument('--repeat', type=int, default=5, help="Repeticiones; se informa la mejor.")
+        parser.add_argument('--json', dest='json_path', help="Guarda los resultados en este archivo JSON.")
+
+    def handle(self, *args, **options):
+        rows, repeat = options['rows'], options['repeat']
+        # Mismo queryset que la lista de InvoiceViewSet para un usuario que ve todo
+        queryset = (
+            Invoice.objects.select_related('sender', 'recipient').prefetch_related('items')
+            .order_by('-created_at', '-pk')
+        )
+        renderer = JSONRenderer()
+        paths = {
+            'serializer': lambda: renderer.render(InvoiceSerializer(queryset[:rows], many=True).data),
+            'rows': lambda: renderer.render(invoice_rows.serialize(invoice_rows.values(queryset)[:rows])),
+        }
+
+        if not queryset.exists():
+            raise CommandError("No hay facturas que serializar; ejecute generate_data.")
+        outputs = {name: render() for name, render in paths.items()}
+        if outputs['serializer'] != outputs['rows']:
+            raise CommandError("La serialización por tuplas no produce el mismo JSON que InvoiceSerializer.")
+
+        results = {
+            'timestamp': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'rows': min(rows, queryset.count()),
+            'bytes': len(outputs['rows']),
+            'repeat': repeat,
+            'results': {name: self._measure(render, repeat) for name, render in paths.items()},
+        }
+        base, fast = results['results']['serializer'], results['results']['rows']
+        results['speedup'] = round(base['cpu_ms'] / fast['cpu_ms'], 2) if fast['cpu_ms'] else None
+        results['memory_ratio'] = round(base['peak_kib'] / fast['peak_kib'], 2) if fast['peak_kib'] else None
+
+        for name, summary in results['results'].items():
+            self.stdout.write(
+                f"{name:<11} {results['rows']:>6} filas  CPU {summary['cpu_ms']} ms  total {summary['wall_ms']} ms  "
+                f"pico {summary['peak_kib']} KiB"
+            )
+        self.stdout.write(f"CPU x{results['speedup']}  memoria x{results['memory_ratio']}")
+
+        if options['json_path']:
+            with open(options['json_path'], 'w') as fh:
+                json.dump(results, fh, indent=2)
+
+    def _measure(self, render, repeat):
+        """Mejor tiempo de CPU y total entre `repeat` corridas, y el pico de memoria de una corrida aparte."""
+        cpu, wall = [], []
+        for _ in range(repeat):
+            gc.collect()
+            started_cpu, started = time.process_time(), time.perf_counter()
+            render()
+            cpu.append(time.process_time() - started_cpu)
+            wall.append(time.perf_counter() - started)
+        # tracemalloc hace más lento el código medido: el pico se toma sin cronometrar
+        gc.collect()
+        tracemalloc.start()
+        try:
+            render()
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return {
+            'cpu_ms': round(min(cpu) * 1000, 3),
+            'wall_ms': round(min(wall) * 1000, 3),
+            'peak_kib': round(peak / 1024, 1),
+        }
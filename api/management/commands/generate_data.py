@@ -0,0 +1,313 @@
+# api/management/commands/generate_data.py
+
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from api import reports
+from api.cache import reference_namespace
+from api.currency import invalidate_rate_table
+from api.models import (
+    AuditLog, Client, ExchangeRate, Expense, Invoice, MerchandiseItem, Office,
+    ShipmentManifest, User, Vehicle,
+)
+
+CITIES = [
+    'Caracas', 'Valencia', 'Maracaibo', 'Barquisimeto', 'Maracay', 'Puerto Ordaz',
+    'Barcelona', 'Mérida', 'San Cristóbal', 'Maturín', 'Cumaná', 'Puerto La Cruz',
+]
+DESCRIPTIONS = ['Caja de repuestos', 'Electrodomésticos', 'Documentos', 'Ropa', 'Medicinas', 'Alimentos', 'Herramientas']
+EXPENSE_CATEGORIES = ['Combustible', 'Sueldos', 'Alquiler', 'Mantenimiento', 'Peajes', 'Servicios']
+AUDIT_ACTIONS = ['Inicio de sesión', 'Creación de factura', 'Actualización de factura', 'Despacho de manifiesto', 'Registro de gasto']
+
+# Prefijo de los números generados. Los números reales son '<inicial de la oficina>-000001',
+# así que nunca coinciden con una factura o un manifiesto emitido por el sistema.
+PREFIX = 'SD'
+
+
+@contextmanager
+def historical_dates(*fields):
+    """bulk_create respeta auto_now_add y sobrescribiría las fechas históricas generadas."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def money(value):
+    return Decimal(value).quantize(Decimal('0.01'))
+
+
+class Command(BaseCommand):
+    help = (
+        "Llena la base de datos con datos sintéticos en volúmenes realistas (oficinas, "
+        "clientes, facturas con items, manifiestos, gastos y bitácora) para los benchmarks. "
+        "Úsese solo sobre una base de datos desechable."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', type=float, default=1.0, help="Multiplica todos los volúmenes (ej: 0.001 para una prueba rápida).")
+        parser.add_argument('--offices', type=int, default=10)
+        parser.add_argument('--users-per-office', type=int, default=5)
+        parser.add_argument('--clients', type=int, default=1_000_000)
+        parser.add_argument('--invoices', type=int, default=5_000_000)
+        parser.add_argument('--items-per-invoice', type=int, default=2, help="Promedio de items por factura.")
+        parser.add_argument('--vehicles', type=int, default=200)
+        parser.add_argument('--manifests', type=int, default=100_000)
+        parser.add_argument('--expenses', type=int, default=200_000)
+        parser.add_argument('--audit-logs', type=int, default=1_000_000)
+        parser.add_argument('--days', type=int, default=365, help="Antigüedad máxima de los registros generados.")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        if options['offices'] < 2:
+            raise CommandError("Se necesitan al menos 2 oficinas (origen y destino).")
+        if options['users_per_office'] < 1:
+            raise CommandError("Se necesita al menos un usuario por oficina.")
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.days = options['days']
+        self.now = timezone.now()
+        scale = options['scale']
+        count = lambda name: max(int(options[name] * scale), 1)
+
+        offices = self._offices(options['offices'])
+        self.users_by_office = self._users(offices, options['users_per_office'])
+        self.users = [user for users in self.users_by_office.values() for user in users]
+        self.rates = self._exchange_rates()
+        client_ids = self._clients(count('clients'))
+        vehicles = self._vehicles(count('vehicles'))
+        manifests = self._manifests(count('manifests'), vehicles)
+        self._invoices(count('invoices'), options['items_per_invoice'], offices, client_ids, manifests)
+        self._expenses(count('expenses'), offices)
+        self._audit_logs(count('audit_logs'))
+
+        # Las inserciones masivas no disparan señales: se invalidan las cachés a mano
+        reports.invalidate_all()
+        invalidate_rate_table()
+        for model in (Office, ExchangeRate):
+            reference_namespace(model).invalidate()
+        self.stdout.write(self.style.SUCCESS("Datos generados."))
+
+    # --- Utilidades ---
+
+    def _moment(self, max_days=None):
+        """Un instante al azar entre ahora y `max_days` días atrás."""
+        return self.now - timedelta(seconds=self.random.randint(0, (max_days or self.days) * 86400))
+
+    def _bulk(self, label, model, total, build):
+        """Crea `total` objetos con `build(índice)` en lotes; devuelve los objetos creados por lote."""
+        done = 0
+        while done < total:
+            size = min(self.batch_size, total - done)
+            objects = [build(done + index) for index in range(size)]
+            with transaction.atomic():
+                created = model.objects.bulk_create(objects, batch_size=self.batch_size)
+                yield created
+            done += size
+            self.stdout.write(f"  {label}: {done}/{total}", ending='\r')
+        self.stdout.write(f"  {label}: {total}/{total}")
+
+    def _next_index(self, model):
+        return (model.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+
+    # --- Generadores ---
+
+    def _offices(self, total):
+        offices = []
+        for index in range(total):
+            name = CITIES[index] if index < len(CITIES) else f'Oficina {index + 1}'
+            office, _ = Office.objects.get_or_create(name=name, defaults={'address': f'Av. Principal de {name}'})
+            offices.append(office)
+        self.stdout.write(f"  oficinas: {total}")
+        return offices
+
+    def _users(self, offices, per_office):
+        password = make_password(None)
+        users = [
+            User(username=f'bench.{office.pk}.{index}', password=password, office=office)
+            for office in offices for index in range(per_office)
+        ]
+        User.objects.bulk_create(users, ignore_conflicts=True)
+        # Superusuario con oficina, usado por defecto en benchmark_api
+        User.objects.get_or_create(
+            username='benchmark',
+            defaults={'office': offices[0], 'is_staff': True, 'is_superuser': True, 'password': password},
+        )
+        by_office = {office.pk: [] for office in offices}
+        for user in User.objects.filter(username__startswith='bench.', office__in=offices):
+            by_office[user.office_id].append(user)
+        self.stdout.write(f"  usuarios: {len(users)} (+ 'benchmark')")
+        return by_office
+
+    def _exchange_rates(self):
+        today = timezone.localdate()
+        rates = {}
+        rate = Decimal('36.5')
+        for offset in range(self.days, -1, -1):
+            rate = (rate * Decimal(1 + self.random.uniform(-0.002, 0.006))).quantize(Decimal('0.0001'))
+            rates[today - timedelta(days=offset)] = rate
+        ExchangeRate.objects.bulk_create(
+            [ExchangeRate(date=day, rate=value) for day, value in rates.items()], ignore_conflicts=True,
+        )
+        # Si ya existía historial para algún día, las facturas usan la tasa guardada
+        rates.update(ExchangeRate.objects.filter(date__in=list(rates)).values_list('date', 'rate'))
+        return rates
+
+    def _clients(self, total):
+        start = self._next_index(Client)
+
+        def build(index):
+            number = start + index
+            return Client(
+                id_type=self.random.choice('VVVVEJ'),
+                id_number=str(50_000_000 + number),
+                name=f'Cliente {number}',
+                phone=f'0414-{number % 10_000_000:07d}',
+                address=f'Calle {number % 500}, Casa {number % 97}',
+            )
+
+        for _ in self._bulk('clientes', Client, total, build):
+            pass
+        return list(Client.objects.values_list('pk', flat=True))
+
+    def _vehicles(self, total):
+        start = self._next_index(Vehicle)
+
+        def build(index):
+            return Vehicle(
+                license_plate=f'{PREFIX}{start + index:06d}',
+                brand=self.random.choice(['Iveco', 'Chevrolet', 'Ford', 'Mitsubishi']),
+                model='Carga',
+                year=self.random.randint(2005, 2024),
+                capacity_kg=self.random.choice([3500, 7500, 12000, 24000]),
+            )
+
+        return [vehicle for batch in self._bulk('vehículos', Vehicle, total, build) for vehicle in batch]
+
+    def _manifests(self, total, vehicles):
+        start = self._next_index(ShipmentManifest)
+        # Los más recientes siguen en ruta; el resto terminó su viaje
+        in_route = max(total // 100, 1)
+
+        def build(index):
+            if index >= total - in_route:
+                departure = self._moment(max_days=2)
+                return ShipmentManifest(
+                    manifest_number=f'{PREFIX}-{start + index:09d}', vehicle=self.random.choice(vehicles),
+                    driver=self.random.choice(self.users), departure_time=departure, status='EN_RUTA',
+                )
+            departure = self._moment()
+            return ShipmentManifest(
+                manifest_number=f'{PREFIX}-{start + index:09d}', vehicle=self.random.choice(vehicles),
+                driver=self.random.choice(self.users), departure_time=departure,
+                arrival_time=departure + timedelta(hours=self.random.randint(4, 48)), status='FINALIZADO',
+            )
+
+        manifests = [manifest for batch in self._bulk('manifiestos', ShipmentManifest, total, build) for manifest in batch]
+        return {
+            'FINALIZADO': [manifest.pk for manifest in manifests if manifest.status == 'FINALIZADO'] or [None],
+            'EN_RUTA': [manifest.pk for manifest in manifests if manifest.status == 'EN_RUTA'],
+        }
+
+    def _invoices(self, total, items_per_invoice, offices, client_ids, manifests):
+        start = self._next_index(Invoice)
+        tax_rate = Decimal('0.16')
+
+        def build(index):
+            created_at = self._moment()
+            origin, destination = self.random.sample(offices, 2)
+            age = (self.now - created_at).days
+            if age > 3:
+                shipping_status, manifest_id = 'ENTREGADA', self.random.choice(manifests['FINALIZADO'])
+            elif manifests['EN_RUTA'] and self.random.random() < 0.5:
+                shipping_status, manifest_id = 'EN_TRANSITO', self.random.choice(manifests['EN_RUTA'])
+            else:
+                shipping_status, manifest_id = 'PENDIENTE_DESPACHO', None
+            roll = self.random.random()
+            payment_status = 'ANULADA' if roll < 0.02 else 'PENDIENTE_PAGO' if roll < 0.10 else 'PAGADA'
+            subtotal = money(self.random.uniform(10, 500))
+            tax = money(subtotal * tax_rate)
+            invoice = Invoice(
+                invoice_number=f'{PREFIX}-{start + index:010d}',
+                sender_id=self.random.choice(client_ids),
+                recipient_id=self.random.choice(client_ids),
+                origin_office=origin,
+                destination_office=destination,
+                created_by=self.random.choice(self.users_by_office[origin.pk]),
+                created_at=created_at,
+                payment_status=payment_status,
+                shipping_status=shipping_status,
+                manifest_id=manifest_id,
+                payment_currency=self.random.choice(['VES', 'VES', 'USD']),
+                subtotal=subtotal,
+                tax=tax,
+                total=subtotal + tax,
+                exchange_rate=self.rates.get(timezone.localdate(created_at)),
+            )
+            return invoice
+
+        def build_items(invoice):
+            return [
+                MerchandiseItem(
+                    invoice_id=invoice.pk,
+                    quantity=self.random.randint(1, 5),
+                    description=self.random.choice(DESCRIPTIONS),
+                    weight=money(self.random.uniform(0.5, 50)),
+                )
+                for _ in range(self.random.randint(1, max(2 * items_per_invoice - 1, 1)))
+            ]
+
+        with historical_dates(Invoice._meta.get_field('created_at')):
+            for batch in self._bulk('facturas', Invoice, total, build):
+                if batch and batch[0].pk is None:
+                    # Backends que no devuelven las claves en bulk_create
+                    ids = dict(Invoice.objects.filter(
+                        invoice_number__in=[invoice.invoice_number for invoice in batch]
+                    ).values_list('invoice_number', 'pk'))
+                    for invoice in batch:
+                        invoice.pk = ids[invoice.invoice_number]
+                MerchandiseItem.objects.bulk_create(
+                    [item for invoice in batch for item in build_items(invoice)], batch_size=self.batch_size,
+                )
+
+    def _expenses(self, total, offices):
+        def build(index):
+            office = self.random.choice(offices)
+            return Expense(
+                description=f'Gasto {index}',
+                amount=money(self.random.uniform(5, 2000)),
+                category=self.random.choice(EXPENSE_CATEGORIES),
+                office=office,
+                created_by=self.random.choice(self.users_by_office[office.pk]),
+                created_at=self._moment(),
+            )
+
+        with historical_dates(Expense._meta.get_field('created_at')):
+            for _ in self._bulk('gastos', Expense, total, build):
+                pass
+
+    def _audit_logs(self, total):
+        def build(index):
+            return AuditLog(
+                user=self.random.choice(self.users),
+                action=self.random.choice(AUDIT_ACTIONS),
+                details=f'Registro generado {index}',
+                timestamp=self._moment(),
+            )
+
+        with historical_dates(AuditLog._meta.get_field('timestamp')):
+            for _ in self._bulk('bitácora', AuditLog, total, build):
+                pass
@@ -0,0 +1,13 @@
+# api/management/commands/prune_idempotency_keys.py
+
+from django.core.management.base import BaseCommand
+
+from api import idempotency
+
+
+class Command(BaseCommand):
+    help = "Borra las respuestas guardadas de Idempotency-Key que ya vencieron (IDEMPOTENCY_KEY_TTL)."
+
+    def handle(self, *args, **options):
+        deleted = idempotency.prune()
+        self.stdout.write(f"{deleted} claves de idempotencia vencidas borradas.")
@@ -0,0 +1,19 @@
+# api/management/commands/prune_sync_log.py
+
+from django.core.management.base import BaseCommand
+
+from api import sync
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra el log de sincronización incremental más antiguo que SYNC_LOG_RETENTION_DAYS. "
+        "Los clientes con una marca de agua anterior tendrán que resincronizar todo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Días a conservar (por defecto, SYNC_LOG_RETENTION_DAYS).")
+
+    def handle(self, *args, **options):
+        deleted = sync.prune(options['days'])
+        self.stdout.write(f"{deleted} filas borradas del log de sincronización.")
@@ -0,0 +1,20 @@
+# api/management/commands/rebuild_fleet_stats.py
+
+from django.core.management.base import BaseCommand
+
+from api import fleet
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula el uso de cada vehículo (VehicleUtilization) desde su historial de eventos. Antes crea "
+        "los viajes de los manifiestos finalizados que no tienen uno (los anteriores al historial)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-backfill', action='store_true', help="No crea los viajes que faltan.")
+
+    def handle(self, *args, **options):
+        if not options['skip_backfill']:
+            self.stdout.write(f"{fleet.backfill_trips()} viajes creados desde manifiestos finalizados.")
+        self.stdout.write(f"Uso recalculado para {fleet.rebuild()} vehículos.")
@@ -0,0 +1,31 @@
+# api/management/commands/restore.py
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api import backup
+
+
+class Command(BaseCommand):
+    help = (
+        "Restaura respaldos de `backup`: uno completo seguido de sus incrementales, en orden. Reemplaza "
+        "los datos de la base con los del respaldo completo."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help="Respaldos a aplicar, en orden.")
+        parser.add_argument('--no-media', action='store_true', help="No restaura los archivos de MEDIA_ROOT.")
+        parser.add_argument('--noinput', '--no-input', action='store_false', dest='interactive')
+
+    def handle(self, *args, **options):
+        if options['interactive']:
+            answer = input("Se reemplazarán los datos de la base de datos. Escriba 'si' para continuar: ")
+            if answer.strip().lower() not in ('si', 'sí'):
+                raise CommandError("Restauración cancelada.")
+        try:
+            summary = backup.restore(options['paths'], media=not options['no_media'])
+        except (OSError, backup.BackupError) as error:
+            raise CommandError(f"No se pudo restaurar: {error}")
+        self.stdout.write(
+            f"{len(summary['archives'])} respaldos restaurados: {sum(summary['tables'].values())} filas, "
+            f"{summary['deleted']} borradas y {summary['media']} archivos en {summary['elapsed_s']} s."
+        )
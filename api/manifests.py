@@ -0,0 +1,165 @@
+# api/manifests.py
+
+"""
+Numeración y despacho de manifiestos de carga.
+
+Los números son por oficina y por día: M<id de la oficina>-<AAAAMMDD>-<NNN>
+(ej: M3-20250114-007). El contador es una fila de ManifestSequence por
+oficina y día que se incrementa con UPDATE ... SET last_number = last_number + 1:
+la fila queda bloqueada hasta el fin de la transacción del despacho, así
+que los despachos simultáneos de una oficina se ordenan (los de oficinas
+distintas no se esperan) y un despacho que falla devuelve su número, sin
+dejar huecos. La primera asignación del día crea la fila; si dos
+transacciones la crean a la vez, la restricción única deja una y la otra
+reintenta el UPDATE.
+
+El despacho toma el vehículo y las facturas con UPDATE condicionados a su
+estado (Disponible, PENDIENTE_DESPACHO): si otro despacho se adelantó, las
+filas actualizadas no cuadran y la transacción se revierte. Así ningún
+vehículo ni factura queda en dos manifiestos, también en SQLite, donde
+select_for_update() no bloquea.
+
+Finalizar un viaje son unas pocas sentencias sobre conjuntos, sin importar
+cuántas facturas lleve el manifiesto: un UPDATE condicionado del manifiesto,
+uno del vehículo y uno de las facturas (ENTREGADA o, para las indicadas,
+DEVUELTA), más los registros en bloque del feed, la sincronización y los
+eventos de entrega (DeliveryEvent) y el cierre del viaje en el historial del
+vehículo (api/fleet.py). Las cachés se ajustan en su lugar: el
+conteo del dashboard con los deltas de cada estado y las entradas del
+rastreo con los nuevos valores, en vez de invalidarse.
+"""
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, Value, When
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import changefeed, fleet, sync, tracking
+from .models import DeliveryEvent, Invoice, ManifestSequence, ShipmentManifest, Vehicle
+
+
+def format_number(office_id, day, number):
+    return f"M{office_id}-{day:%Y%m%d}-{number:03d}"
+
+
+def allocate_number(office, day=None):
+    """Siguiente número de manifiesto de la oficina; debe llamarse dentro de la transacción que lo usa."""
+    day = day or timezone.localdate()
+    sequence = ManifestSequence.objects.filter(office=office, day=day)
+    while True:
+        if sequence.update(last_number=F('last_number') + 1):
+            number = sequence.values_list('last_number', flat=True).get()
+            break
+        try:
+            with transaction.atomic():
+                ManifestSequence.objects.create(office=office, day=day, last_number=1)
+            number = 1
+            break
+        except IntegrityError:
+            # Otra transacción creó la fila del día: ahora el UPDATE la encuentra
+            continue
+    return format_number(office.pk, day, number)
+
+
+def create(office, vehicle, driver=None):
+    """Manifiesto PLANIFICADO con el siguiente número de la oficina."""
+    if office is None:
+        raise serializers.ValidationError("El usuario no tiene una oficina asignada.")
+    with transaction.atomic():
+        return ShipmentManifest.objects.create(
+            manifest_number=allocate_number(office), office=office, vehicle=vehicle, driver=driver,
+        )
+
+
+def dispatch(manifest, invoice_ids, driver=None):
+    """Pone en ruta el manifiesto con su vehículo y las facturas pendientes `invoice_ids`."""
+    invoice_ids = list(dict.fromkeys(invoice_ids))
+    with transaction.atomic(), sync.deferred():
+        if manifest.status != 'PLANIFICADO':
+            raise serializers.ValidationError("Este manifiesto ya ha sido despachado o finalizado.")
+        vehicle = manifest.vehicle
+        if not Vehicle.objects.filter(pk=vehicle.pk, status='Disponible').update(status='En Ruta'):
+            raise serializers.ValidationError(f"El vehículo {vehicle.license_plate} no está disponible.")
+        vehicle.status = 'En Ruta'
+        # .update() no dispara señales
+        sync.log_bulk(Vehicle, [vehicle.pk])
+
+        pending = Invoice.objects.filter(pk__in=invoice_ids, shipping_status='PENDIENTE_DESPACHO')
+        if changefeed.update(pending, 'shipping_status', 'EN_TRANSITO', manifest=manifest) != len(invoice_ids):
+            raise serializers.ValidationError("Una o más facturas no existen o no están pendientes para despacho.")
+
+        if driver is not None:
+            manifest.driver = driver
+        manifest.status = 'EN_RUTA'
+        manifest.departure_time = timezone.now()
+        manifest.save()
+        fleet.start_trip(manifest)
+    return manifest
+
+
+def create_and_dispatch(office, vehicle, invoice_ids, driver=None):
+    """Crea el manifiesto y lo despacha en una sola transacción: si algo falla, no queda nada."""
+    with transaction.atomic():
+        return dispatch(create(office, vehicle, driver), invoice_ids)
+
+
+def finalize(manifest, returned=None, user=None, distance_km=None):
+    """
+    Finaliza el viaje: el manifiesto pasa a FINALIZADO, su vehículo queda
+    Disponible y sus facturas en tránsito pasan a ENTREGADA, salvo las de
+    `returned` ({id: motivo}), que pasan a DEVUELTA. El viaje se cierra en el
+    historial del vehículo con `distance_km` o los kilómetros de la ruta
+    (ver api/fleet.py). Devuelve los ids {'delivered': [...], 'returned': [...]}.
+    """
+    returned = returned or {}
+    now = timezone.now()
+    with transaction.atomic(), sync.deferred():
+        if not ShipmentManifest.objects.filter(pk=manifest.pk, status='EN_RUTA').update(
+                status='FINALIZADO', arrival_time=now):
+            raise serializers.ValidationError("El manifiesto no está en ruta.")
+        invoices = list(
+            Invoice.objects.filter(manifest=manifest).select_for_update(of=('self',))
+            .values_list('pk', 'invoice_number', 'shipping_status').order_by('pk')
+        )
+        in_transit = [(pk, number) for pk, number, state in invoices if state == 'EN_TRANSITO']
+        unknown = set(returned) - {pk for pk, _ in in_transit}
+        if unknown:
+            raise serializers.ValidationError(
+                {'returned': f"Facturas que no están en tránsito en este manifiesto: {sorted(unknown)}."}
+            )
+
+        outcome = Value('ENTREGADA')
+        if returned:
+            outcome = Case(When(pk__in=list(returned), then=Value('DEVUELTA')), default=outcome)
+        Invoice.objects.filter(pk__in=[pk for pk, _ in in_transit], shipping_status='EN_TRANSITO').update(
+            shipping_status=outcome,
+        )
+        Vehicle.objects.filter(pk=manifest.vehicle_id).update(status='Disponible')
+
+        outcomes = {pk: 'DEVUELTA' if pk in returned else 'ENTREGADA' for pk, _ in in_transit}
+        changefeed.record_bulk(ShipmentManifest, 'status', 'FINALIZADO', [(manifest.pk, manifest.manifest_number, 'EN_RUTA')])
+        for state in ('ENTREGADA', 'DEVUELTA'):
+            rows = [(pk, number, 'EN_TRANSITO') for pk, number in in_transit if outcomes[pk] == state]
+            changefeed.record_bulk(Invoice, 'shipping_status', state, rows, invalidate_tracking=False)
+        sync.log_bulk(Vehicle, [manifest.vehicle_id])
+        fleet.end_trip(manifest, now, distance_km)
+        DeliveryEvent.objects.bulk_create([
+            DeliveryEvent(
+                manifest=manifest, invoice_id=pk, invoice_number=number, outcome=outcomes[pk],
+                reason=returned.get(pk, ''), recorded_by=user,
+            )
+            for pk, number in in_transit
+        ])
+
+        # El rastreo de todas las facturas del manifiesto muestra su estado y su llegada
+        changes = {number: {'manifest_status': 'FINALIZADO', 'arrival_time': now} for _, number, _ in invoices}
+        for pk, number in in_transit:
+            changes[number]['shipping_status'] = outcomes[pk]
+        transaction.on_commit(lambda: tracking.patch(changes))
+
+    manifest.status = 'FINALIZADO'
+    manifest.arrival_time = now
+    return {
+        'delivered': [pk for pk, state in outcomes.items() if state == 'ENTREGADA'],
+        'returned': [pk for pk, state in outcomes.items() if state == 'DEVUELTA'],
+    }
@@ -0,0 +1,182 @@
+# api/metrics.py
+
+"""
+Métricas de rendimiento por petición.
+
+PerformanceMiddleware (api/middleware.py) abre un RequestMetrics por petición
+y lo deja en una ContextVar; el execute-wrapper de la base de datos (ver
+api/instrumentation.py) y el cronómetro de serializadores acumulan en él. Al terminar, la petición se
+etiqueta con la vista y acción de DRF (ej: 'InvoiceViewSet.list') y se suma al
+registro del proceso, que se expone en formato de texto de Prometheus.
+
+Los contadores son por proceso: con varios workers, Prometheus debe
+consultar cada uno (o agregarse con un sidecar).
+"""
+
+import threading
+import time
+from contextvars import ContextVar
+
+from rest_framework import serializers
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current = ContextVar('request_metrics', default=None)
+
+
+class RequestMetrics:
+    """Datos acumulados durante una petición."""
+
+    __slots__ = ('started', 'view', 'queries', 'sql_time', 'serializer_time', '_serializer_depth')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view = None
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self._serializer_depth = 0
+
+
+def current():
+    return _current.get()
+
+
+def start_request():
+    metrics = RequestMetrics()
+    return metrics, _current.set(metrics)
+
+
+def end_request(token):
+    _current.reset(token)
+
+
+def view_label(view_func, method):
+    """Nombre de la vista de DRF y su acción, ej: 'ShipmentManifestViewSet.dispatch'."""
+    cls = getattr(view_func, 'cls', None)
+    if cls is None:
+        return getattr(view_func, '__name__', 'unknown')
+    actions = getattr(view_func, 'actions', None)
+    action = actions.get(method.lower()) if actions else method.lower()
+    return f'{cls.__name__}.{action}'
+
+
+# --- Tiempo de serialización ---
+# Se mide alrededor de `Serializer.data`, que es donde DRF llama a
+# to_representation. La profundidad evita contar dos veces los serializadores
+# que se invocan dentro de otro.
+
+_original_data = serializers.BaseSerializer.data
+
+
+def _timed_data(self):
+    metrics = _current.get()
+    if metrics is None or metrics._serializer_depth:
+        return _original_data.fget(self)
+    metrics._serializer_depth += 1
+    started = time.perf_counter()
+    try:
+        return _original_data.fget(self)
+    finally:
+        metrics.serializer_time += time.perf_counter() - started
+        metrics._serializer_depth -= 1
+
+
+def install_serializer_timer():
+    if serializers.BaseSerializer.data is _original_data:
+        serializers.BaseSerializer.data = property(_timed_data)
+
+
+# --- Registro del proceso ---
+
+class _Series:
+    __slots__ = ('count', 'duration', 'buckets', 'queries', 'sql_time', 'serializer_time', 'response_bytes')
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.buckets = [0] * len(DURATION_BUCKETS)
+        self.queries = 0
+        self.sql_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def observe(self, view, method, status, duration, metrics, response_bytes):
+        key = (view, method, f'{status // 100}xx')
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = _Series()
+            series.count += 1
+            series.duration += duration
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if duration <= bound:
+                    series.buckets[index] += 1
+                    break
+            series.queries += metrics.queries
+            series.sql_time += metrics.sql_time
+            series.serializer_time += metrics.serializer_time
+            series.response_bytes += response_bytes
+
+    def reset(self):
+        with self._lock:
+            self._series.clear()
+
+    def render_prometheus(self):
+        """Exposición en formato de texto de Prometheus 0.0.4."""
+        with self._lock:
+            snapshot = [(key, _copy(series)) for key, series in sorted(self._series.items())]
+
+        lines = [
+            '# HELP http_request_duration_seconds Tiempo total de la petición.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        for (view, method, status), series in snapshot:
+            labels = f'view="{view}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, series.buckets):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="+Inf"}} {series.count}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {series.duration:.6f}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {series.count}')
+
+        counters = [
+            ('http_request_db_queries_total', 'Consultas SQL ejecutadas.', 'queries', '{}'),
+            ('http_request_db_seconds_total', 'Tiempo total en consultas SQL.', 'sql_time', '{:.6f}'),
+            ('http_request_serializer_seconds_total', 'Tiempo total en serializadores de DRF.', 'serializer_time', '{:.6f}'),
+            ('http_response_bytes_total', 'Bytes del cuerpo de las respuestas.', 'response_bytes', '{}'),
+        ]
+        for name, help_text, attr, fmt in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for (view, method, status), series in snapshot:
+                labels = f'view="{view}",method="{method}",status="{status}"'
+                lines.append(f'{name}{{{labels}}} {fmt.format(getattr(series, attr))}')
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(series):
+    clone = _Series()
+    for attr in _Series.__slots__:
+        value = getattr(series, attr)
+        setattr(clone, attr, list(value) if isinstance(value, list) else value)
+    return clone
+
+
+registry = MetricsRegistry()
+
+
+def server_timing(duration, metrics):
+    """Valor de la cabecera Server-Timing (milisegundos)."""
+    return ', '.join([
+        f'total;dur={duration * 1000:.1f}',
+        f'db;dur={metrics.sql_time * 1000:.1f};desc="{metrics.queries} queries"',
+        f'serialize;dur={metrics.serializer_time * 1000:.1f}',
+    ])
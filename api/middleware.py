@@ -0,0 +1,209 @@
+# api/middleware.py
+
+import logging
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.handlers.asgi import ASGIRequest
+from django.utils.cache import patch_vary_headers
+
+from . import compression, db_router, metrics
+from .query_inspector import QueryBudgetExceeded, inspect_queries, query_budget_for
+
+logger = logging.getLogger('api.queries')
+
+
+class HybridMiddleware:
+    """
+    Base para middleware que funciona igual bajo WSGI y ASGI: bajo ASGI se
+    ejecuta sin pasar por un hilo, para no anular las vistas asíncronas.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+            # Django ejecutaría un process_view síncrono en un hilo aparte
+            if hasattr(self, 'process_view'):
+                process_view = self.process_view
+
+                async def async_process_view(request, view_func, view_args, view_kwargs):
+                    return process_view(request, view_func, view_args, view_kwargs)
+                self.process_view = async_process_view
+
+
+class AsyncRoutesMiddleware(HybridMiddleware):
+    """Bajo ASGI resuelve las URLs con settings.ASGI_URLCONF (vistas asíncronas)."""
+
+    def __call__(self, request):
+        if isinstance(request, ASGIRequest) and getattr(settings, 'ASGI_URLCONF', None):
+            request.urlconf = settings.ASGI_URLCONF
+        return self.get_response(request)
+
+
+class PerformanceMiddleware(HybridMiddleware):
+    """
+    Mide cada petición (tiempo total, consultas SQL y su tiempo, tiempo en
+    serializadores y tamaño de la respuesta), añade la cabecera Server-Timing
+    y acumula las métricas expuestas en /api/metrics/.
+    Se desactiva con PERFORMANCE_METRICS = False.
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PERFORMANCE_METRICS', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+        metrics.install_serializer_timer()
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        request_metrics, token = metrics.start_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, request_metrics, response)
+
+    async def __acall__(self, request):
+        request_metrics, token = metrics.start_request()
+        try:
+            response = await self.get_response(request)
+        finally:
+            metrics.end_request(token)
+        return self._finish(request, request_metrics, response)
+
+    def _finish(self, request, request_metrics, response):
+        duration = time.perf_counter() - request_metrics.started
+        size = 0 if response.streaming else len(response.content)
+        view = request_metrics.view or 'unresolved'
+        metrics.registry.observe(view, request.method, response.status_code, duration, request_metrics, size)
+        response['Server-Timing'] = metrics.server_timing(duration, request_metrics)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request_metrics = metrics.current()
+        if request_metrics is not None:
+            request_metrics.view = metrics.view_label(view_func, request.method)
+        return None
+
+
+class QueryInspectorMiddleware(HybridMiddleware):
+    """Aplica el detector a cada petición según settings.QUERY_INSPECTOR."""
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        mode = getattr(settings, 'QUERY_INSPECTOR', 'off')
+        if mode == 'off':
+            return self.get_response(request)
+        with inspect_queries() as report:
+            response = self.get_response(request)
+        return self._check(request, mode, report, response)
+
+    async def __acall__(self, request):
+        mode = getattr(settings, 'QUERY_INSPECTOR', 'off')
+        if mode == 'off':
+            return await self.get_response(request)
+        with inspect_queries() as report:
+            response = await self.get_response(request)
+        return self._check(request, mode, report, response)
+
+    def _check(self, request, mode, report, response):
+        budget = getattr(request, '_query_budget', None)
+        over_budget = budget is not None and len(report) > budget
+        if over_budget or report.repeated() or report.slow():
+            message = f"{request.method} {request.path}: {report.describe()}"
+            if over_budget:
+                message = f"Presupuesto de {budget} consultas superado. {message}"
+                if mode == 'raise':
+                    raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        response['X-Query-Count'] = str(len(report))
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._query_budget = query_budget_for(view_func, request.method)
+        return None
+
+
+class CompressionMiddleware(HybridMiddleware):
+    """
+    Comprime con brotli o gzip, según Accept-Encoding, las respuestas JSON y
+    de texto de al menos COMPRESSION_MIN_BYTES (ver api/compression.py). Va
+    dentro de PerformanceMiddleware para que el tamaño medido sea el enviado.
+    Se desactiva con RESPONSE_COMPRESSION = False (ej: si ya comprime el proxy).
+    """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'RESPONSE_COMPRESSION', True):
+            raise MiddlewareNotUsed
+        super().__init__(get_response)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        return self._compress(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self._compress(request, await self.get_response(request))
+
+    def _compress(self, request, response):
+        if response.has_header('Content-Encoding') or not compression.compressible(response.get('Content-Type', '')):
+            return response
+        if not response.streaming and len(response.content) < settings.COMPRESSION_MIN_BYTES:
+            return response
+        # La respuesta depende de Accept-Encoding aunque esta vez no se comprima
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = compression.negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if response.is_async:
+                response.streaming_content = compression.acompress_stream(response.streaming_content, encoding)
+            else:
+                response.streaming_content = compression.compress_stream(response.streaming_content, encoding)
+            del response['Content-Length']
+        else:
+            compressed = compression.compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+        # Mismo contenido, otros bytes: el ETag deja de ser fuerte
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+
+class ReplicaRoutingMiddleware(HybridMiddleware):
+    """
+    Delimita la petición para api/db_router.py: las vistas marcadas pueden
+    leer de una réplica y, si la petición escribió, el usuario lee de la
+    principal durante REPLICA_STICKY_SECONDS.
+    """
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = db_router.start_request()
+        try:
+            return self.get_response(request)
+        finally:
+            db_router.end_request(token, getattr(request, 'user', None))
+
+    async def __acall__(self, request):
+        token = db_router.start_request()
+        try:
+            return await self.get_response(request)
+        finally:
+            db_router.end_request(token, getattr(request, 'user', None))
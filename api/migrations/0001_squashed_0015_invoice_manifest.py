@@ -0,0 +1,452 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:23
+
+import django.contrib.auth.validators
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+# Migración compactada de 0001 a 0015: crea el esquema final directamente
+# (sin la fusión 0010 ni los campos que luego se eliminaron), así las bases
+# nuevas y las de pruebas se crean con una sola migración. Las bases ya
+# migradas siguen usando las originales, que se pueden borrar cuando todas
+# las instalaciones hayan aplicado la 0015.
+
+# Lista completa de permisos de la aplicación
+ALL_PERMISSIONS = {
+    # Dashboard
+    'dashboard.view': 'Ver el Dashboard',
+    # Shipping Guide (Invoice Creation)
+    'shipping-guide.view': 'Ver la página de Crear Factura',
+    # Invoices
+    'invoices.view': 'Ver lista de Facturas',
+    'invoices.create': 'Crear nuevas Facturas',
+    'invoices.edit': 'Editar Facturas existentes',
+    'invoices.void': 'Anular Facturas',
+    'invoices.delete': 'Eliminar Facturas (anuladas)',
+    'invoices.changeStatus': 'Cambiar estado de pago/envío',
+    # Clients
+    'clientes.view': 'Ver Clientes',
+    'clientes.create': 'Crear Clientes',
+    'clientes.edit': 'Editar Clientes',
+    'clientes.delete': 'Eliminar Clientes',
+    # Suppliers
+    'proveedores.view': 'Ver Proveedores',
+    'proveedores.create': 'Crear Proveedores',
+    'proveedores.edit': 'Editar Proveedores',
+    'proveedores.delete': 'Eliminar Proveedores',
+    # Fleet
+    'flota.view': 'Ver Flota y Remesas',
+    'flota.create': 'Crear Vehículos',
+    'flota.edit': 'Editar Vehículos',
+    'flota.delete': 'Eliminar Vehículos',
+    'flota.dispatch': 'Despachar y finalizar viajes',
+    # Accounting
+    'libro-contable.view': 'Ver Libro Contable',
+    'libro-contable.create': 'Crear Gastos',
+    'libro-contable.edit': 'Editar Gastos',
+    'libro-contable.delete': 'Eliminar Gastos',
+    # Inventory
+    'inventario.view': 'Ver módulo de Inventario',
+    'inventario-envios.view': 'Ver Inventario de Envíos',
+    'inventario-bienes.view': 'Ver Inventario de Bienes',
+    'inventario-bienes.create': 'Crear Bienes',
+    'inventario-bienes.edit': 'Editar Bienes',
+    'inventario-bienes.delete': 'Eliminar Bienes',
+    'bienes-categorias.view': 'Ver Categorías de Bienes',
+    'bienes-categorias.create': 'Crear Categorías de Bienes',
+    'bienes-categorias.edit': 'Editar Categorías de Bienes',
+    'bienes-categorias.delete': 'Eliminar Categorías de Bienes',
+    # Reports
+    'reports.view': 'Ver Reportes',
+    # System & Audit
+    'system.view': 'Ver página de Sistema',
+    'system.cleanup': 'Usar herramienta de limpieza',
+    'system.backupRestore': 'Realizar respaldos y restauraciones',
+    'auditoria.view': 'Ver Auditoría',
+    # Configuration
+    'configuracion.view': 'Ver página de Configuración',
+    'config.company.edit': 'Editar datos de la empresa',
+    'config.users.manage': 'Gestionar usuarios y roles',
+    'config.roles.manage': 'Gestionar roles y permisos',
+    'config.users.edit_protected': 'Editar usuarios protegidos (admin/soporte)',
+    'config.users.manage_tech_users': 'Gestionar usuarios de Soporte Técnico',
+    # Parameters (sub-config pages)
+    'categories.view': 'Ver Categorías de Mercancía',
+    'categories.create': 'Crear Categorías de Mercancía',
+    'categories.edit': 'Editar Categorías de Mercancía',
+    'categories.delete': 'Eliminar Categorías de Mercancía',
+    'offices.view': 'Ver Oficinas y Sucursales',
+    'offices.create': 'Crear Oficinas',
+    'offices.edit': 'Editar Oficinas',
+    'offices.delete': 'Eliminar Oficinas',
+    'shipping-types.view': 'Ver Tipos de Envío',
+    'shipping-types.create': 'Crear Tipos de Envío',
+    'shipping-types.edit': 'Editar Tipos de Envío',
+    'shipping-types.delete': 'Eliminar Tipos de Envío',
+    'payment-methods.view': 'Ver Formas de Pago',
+    'payment-methods.create': 'Crear Formas de Pago',
+    'payment-methods.edit': 'Editar Formas de Pago',
+    'payment-methods.delete': 'Eliminar Formas de Pago',
+}
+
+ROLES_PERMISSIONS = {
+    'Operador': [
+        'dashboard.view', 'shipping-guide.view', 'invoices.view', 'invoices.create', 
+        'invoices.edit', 'invoices.changeStatus', 'clientes.view', 'clientes.create', 
+        'clientes.edit', 'proveedores.view', 'proveedores.create', 'proveedores.edit', 
+        'flota.view', 'flota.create', 'flota.edit', 'flota.dispatch', 'libro-contable.view', 
+        'libro-contable.create', 'libro-contable.edit', 'inventario.view', 
+        'inventario-envios.view', 'inventario-bienes.view', 'bienes-categorias.view', 
+        'reports.view', 'auditoria.view', 'configuracion.view',
+    ],
+    'Administrador': [
+        'dashboard.view', 'shipping-guide.view', 'invoices.view', 'invoices.create', 
+        'invoices.edit', 'invoices.changeStatus', 'invoices.void', 'clientes.view', 
+        'clientes.create', 'clientes.edit', 'clientes.delete', 'proveedores.view', 
+        'proveedores.create', 'proveedores.edit', 'proveedores.delete', 'flota.view', 
+        'flota.create', 'flota.edit', 'flota.delete', 'flota.dispatch', 'libro-contable.view', 
+        'libro-contable.create', 'libro-contable.edit', 'libro-contable.delete', 
+        'inventario.view', 'inventario-envios.view', 'inventario-bienes.view', 
+        'inventario-bienes.create', 'inventario-bienes.edit', 'inventario-bienes.delete', 
+        'bienes-categorias.view', 'bienes-categorias.create', 'bienes-categorias.edit', 
+        'bienes-categorias.delete', 'reports.view', 'auditoria.view', 'configuracion.view',
+        'config.company.edit', 'config.users.manage', 'config.roles.manage', 
+        'categories.view', 'categories.create', 'categories.edit', 'categories.delete',
+        'offices.view', 'offices.create', 'offices.edit', 'offices.delete',
+        'shipping-types.view', 'shipping-types.create', 'shipping-types.edit', 'shipping-types.delete',
+        'payment-methods.view', 'payment-methods.create', 'payment-methods.edit', 'payment-methods.delete',
+    ],
+    'Soporte Técnico': list(ALL_PERMISSIONS.keys())
+}
+
+def seed_data(apps, schema_editor):
+    Permission = apps.get_model('api', 'Permission')
+    Role = apps.get_model('api', 'Role')
+
+    # Crear todos los permisos
+    for key, description in ALL_PERMISSIONS.items():
+        Permission.objects.get_or_create(key=key, defaults={'description': description})
+
+    # Crear roles y asignar permisos
+    for role_name, permission_keys in ROLES_PERMISSIONS.items():
+        role, created = Role.objects.get_or_create(name=role_name)
+        permissions_to_add = Permission.objects.filter(key__in=permission_keys)
+        role.permissions.set(permissions_to_add)
+
+
+def seed_data(apps, schema_editor):
+    Permission = apps.get_model('api', 'Permission')
+    Role = apps.get_model('api', 'Role')
+
+    # Crear todos los permisos
+    for key, description in ALL_PERMISSIONS.items():
+        Permission.objects.get_or_create(key=key, defaults={'description': description})
+
+    # Crear roles y asignar permisos
+    for role_name, permission_keys in ROLES_PERMISSIONS.items():
+        role, created = Role.objects.get_or_create(name=role_name)
+        permissions_to_add = Permission.objects.filter(key__in=permission_keys)
+        role.permissions.set(permissions_to_add)
+
+
+
+class Migration(migrations.Migration):
+
+    replaces = [
+        ('api', '0001_initial'),
+        ('api', '0002_remove_user_full_name_client_invoice_merchandiseitem'),
+        ('api', '0003_vehicle_shipmentmanifest_invoice_manifest'),
+        ('api', '0004_expense'),
+        ('api', '0005_assetcategory_companyinfo_supplier_asset_auditlog'),
+        ('api', '0006_vehicle_driver_vehicle_imageurl_alter_vehicle_status'),
+        ('api', '0007_remove_vehicle_imageurl_vehicle_image'),
+        ('api', '0008_category_expensecategory_paymentmethod_shippingtype_and_more'),
+        ('api', '0009_seed_permissions_and_roles'),
+        ('api', '0010_merge_20250812_2210'),
+        ('api', '0011_remove_companyinfo_logo_url_companyinfo_login_image_and_more'),
+        ('api', '0012_invoice_declared_value_invoice_discount_percentage_and_more'),
+        ('api', '0013_invoice_report_idx_expense_report_idx'),
+        ('api', '0014_exchangerate_invoice_exchange_rate'),
+        ('api', '0015_invoice_manifest'),
+    ]
+
+    initial = True
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AssetCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='CompanyInfo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(default='Transporte Alianza 2025 C.A.', max_length=255)),
+                ('rif', models.CharField(max_length=20)),
+                ('address', models.TextField()),
+                ('phone', models.CharField(max_length=50)),
+                ('logo', models.ImageField(blank=True, null=True, upload_to='company/')),
+                ('login_image', models.ImageField(blank=True, null=True, upload_to='company/')),
+                ('postal_license', models.CharField(blank=True, max_length=50)),
+                ('cost_per_kg', models.DecimalField(decimal_places=2, default=1.0, max_digits=10)),
+                ('tax_rate', models.DecimalField(decimal_places=2, default=16.0, help_text='Tasa de IVA en porcentaje (ej: 16.0)', max_digits=5)),
+                ('bcv_rate', models.DecimalField(decimal_places=2, default=36.5, max_digits=10)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=14)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='ExpenseCategory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Office',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('address', models.CharField(max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=50)),
+                ('next_invoice_number', models.PositiveIntegerField(default=1)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PaymentMethod',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('type', models.CharField(choices=[('Efectivo', 'Efectivo'), ('Transferencia', 'Transferencia'), ('PagoMovil', 'Pago Móvil'), ('Credito', 'Crédito'), ('Otro', 'Otro')], default='Efectivo', max_length=20)),
+                ('bank_name', models.CharField(blank=True, max_length=100)),
+                ('account_number', models.CharField(blank=True, max_length=20)),
+                ('beneficiary_name', models.CharField(blank=True, max_length=255)),
+                ('beneficiary_id', models.CharField(blank=True, max_length=20)),
+                ('phone', models.CharField(blank=True, max_length=20)),
+                ('email', models.EmailField(blank=True, max_length=254)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Permission',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(help_text="Ej: 'invoices.create', 'flota.view'", max_length=100, unique=True)),
+                ('description', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ShippingType',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('rif', models.CharField(blank=True, max_length=20)),
+                ('phone', models.CharField(blank=True, max_length=50)),
+                ('address', models.TextField(blank=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Vehicle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('license_plate', models.CharField(max_length=10, unique=True)),
+                ('brand', models.CharField(max_length=50)),
+                ('model', models.CharField(max_length=50)),
+                ('year', models.PositiveIntegerField()),
+                ('capacity_kg', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('status', models.CharField(choices=[('Disponible', 'Disponible'), ('En Ruta', 'En Ruta'), ('En Mantenimiento', 'En Mantenimiento')], default='Disponible', max_length=20)),
+                ('driver', models.CharField(blank=True, max_length=100)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='vehicles/')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='User',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('password', models.CharField(max_length=128, verbose_name='password')),
+                ('last_login', models.DateTimeField(blank=True, null=True, verbose_name='last login')),
+                ('is_superuser', models.BooleanField(default=False, help_text='Designates that this user has all permissions without explicitly assigning them.', verbose_name='superuser status')),
+                ('username', models.CharField(error_messages={'unique': 'A user with that username already exists.'}, help_text='Required. 150 characters or fewer. Letters, digits and @/./+/-/_ only.', max_length=150, unique=True, validators=[django.contrib.auth.validators.UnicodeUsernameValidator()], verbose_name='username')),
+                ('first_name', models.CharField(blank=True, max_length=150, verbose_name='first name')),
+                ('last_name', models.CharField(blank=True, max_length=150, verbose_name='last name')),
+                ('is_staff', models.BooleanField(default=False, help_text='Designates whether the user can log into this admin site.', verbose_name='staff status')),
+                ('is_active', models.BooleanField(default=True, help_text='Designates whether this user should be treated as active. Unselect this instead of deleting accounts.', verbose_name='active')),
+                ('date_joined', models.DateTimeField(default=django.utils.timezone.now, verbose_name='date joined')),
+                ('email', models.EmailField(blank=True, max_length=254)),
+                ('groups', models.ManyToManyField(blank=True, help_text='The groups this user belongs to. A user will get all permissions granted to each of their groups.', related_name='user_set', related_query_name='user', to='auth.group', verbose_name='groups')),
+                ('user_permissions', models.ManyToManyField(blank=True, help_text='Specific permissions for this user.', related_name='user_set', related_query_name='user', to='auth.permission', verbose_name='user permissions')),
+                ('office', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.office')),
+            ],
+            options={
+                'verbose_name': 'user',
+                'verbose_name_plural': 'users',
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('action', models.CharField(help_text="Ej: 'Creación de factura', 'Inicio de sesión'", max_length=255)),
+                ('details', models.TextField(blank=True, help_text='Detalles adicionales, como el ID del objeto afectado.')),
+                ('timestamp', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-timestamp'],
+            },
+        ),
+        migrations.CreateModel(
+            name='Client',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('id_type', models.CharField(choices=[('V', 'V'), ('E', 'E'), ('J', 'J'), ('G', 'G')], default='V', max_length=1)),
+                ('id_number', models.CharField(max_length=20)),
+                ('name', models.CharField(max_length=255)),
+                ('phone', models.CharField(blank=True, max_length=50)),
+                ('address', models.TextField(blank=True)),
+            ],
+            options={
+                'unique_together': {('id_type', 'id_number')},
+            },
+        ),
+        migrations.CreateModel(
+            name='Invoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_number', models.CharField(help_text="Número de factura único, ej: 'A-000001'", max_length=20, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('payment_status', models.CharField(choices=[('PENDIENTE_PAGO', 'Pendiente de Pago'), ('PAGADA', 'Pagada'), ('ANULADA', 'Anulada')], default='PENDIENTE_PAGO', max_length=20)),
+                ('shipping_status', models.CharField(choices=[('PENDIENTE_DESPACHO', 'Pendiente para Despacho'), ('EN_TRANSITO', 'En Tránsito'), ('ENTREGADA', 'Entregada'), ('DEVUELTA', 'Devuelta')], default='PENDIENTE_DESPACHO', max_length=20)),
+                ('payment_type', models.CharField(choices=[('flete-pagado', 'Flete Pagado'), ('flete-destino', 'Flete a Destino')], default='flete-pagado', max_length=20)),
+                ('payment_currency', models.CharField(choices=[('VES', 'Bolívares'), ('USD', 'Dólares')], default='VES', max_length=3)),
+                ('has_insurance', models.BooleanField(default=False)),
+                ('declared_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('insurance_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('has_discount', models.BooleanField(default=False)),
+                ('discount_percentage', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('subtotal', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('tax', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('ipostel', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('igtf', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+                ('recipient', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='received_invoices', to='api.client')),
+                ('sender', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sent_invoices', to='api.client')),
+                ('destination_office', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='destination_invoices', to='api.office')),
+                ('origin_office', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='origin_invoices', to='api.office')),
+                ('payment_method', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.paymentmethod')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='MerchandiseItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField()),
+                ('description', models.CharField(max_length=255)),
+                ('weight', models.DecimalField(decimal_places=2, help_text='Peso real en Kg', max_digits=10)),
+                ('invoice', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='api.invoice')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Asset',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255)),
+                ('description', models.TextField(blank=True)),
+                ('purchase_date', models.DateField(blank=True, null=True)),
+                ('purchase_value', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('category', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.assetcategory')),
+                ('office', models.ForeignKey(help_text='Ubicación del bien', null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.office')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Role',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('permissions', models.ManyToManyField(blank=True, to='api.permission')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='role',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.role'),
+        ),
+        migrations.CreateModel(
+            name='ShipmentManifest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('manifest_number', models.CharField(max_length=20, unique=True)),
+                ('departure_time', models.DateTimeField(blank=True, null=True)),
+                ('arrival_time', models.DateTimeField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('PLANIFICADO', 'Planificado'), ('EN_RUTA', 'En Ruta'), ('FINALIZADO', 'Finalizado')], default='PLANIFICADO', max_length=20)),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.vehicle')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='manifest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='api.shipmentmanifest'),
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='shipping_type',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='api.shippingtype'),
+        ),
+        migrations.CreateModel(
+            name='Expense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('description', models.CharField(max_length=255)),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('created_by', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to=settings.AUTH_USER_MODEL)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, to='api.office')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'office'], name='expense_report_idx')],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'origin_office', 'destination_office'], name='invoice_report_idx'),
+        ),
+        # Datos iniciales de 0009. El RunPython de 0014 se omite: copia la tasa
+        # de CompanyInfo, que no existe todavía en una instalación nueva.
+        migrations.RunPython(seed_data, migrations.RunPython.noop),
+    ]
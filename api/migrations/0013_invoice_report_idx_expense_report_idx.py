@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0012_invoice_declared_value_invoice_discount_percentage_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='expense',
+            index=models.Index(fields=['created_at', 'office'], name='expense_report_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['created_at', 'origin_office', 'destination_office'], name='invoice_report_idx'),
+        ),
+    ]
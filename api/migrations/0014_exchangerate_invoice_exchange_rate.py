@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:09
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_current_rate(apps, schema_editor):
+    # La tasa actual de la empresa pasa a ser el primer registro del histórico
+    CompanyInfo = apps.get_model('api', 'CompanyInfo')
+    ExchangeRate = apps.get_model('api', 'ExchangeRate')
+    company = CompanyInfo.objects.filter(pk=1).first()
+    if company:
+        ExchangeRate.objects.get_or_create(date=timezone.localdate(), defaults={'rate': company.bcv_rate})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0013_invoice_report_idx_expense_report_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=14)),
+            ],
+            options={
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.AddField(
+            model_name='invoice',
+            name='exchange_rate',
+            field=models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True),
+        ),
+        migrations.RunPython(seed_current_rate, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0014_exchangerate_invoice_exchange_rate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='manifest',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='invoices', to='api.shipmentmanifest'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_squashed_0015_invoice_manifest'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('invoice', 'Factura'), ('manifest', 'Manifiesto')], max_length=10)),
+                ('object_id', models.BigIntegerField()),
+                ('number', models.CharField(help_text='Número de la factura o del manifiesto', max_length=20)),
+                ('field', models.CharField(max_length=20)),
+                ('old_value', models.CharField(blank=True, max_length=20)),
+                ('new_value', models.CharField(max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entity', 'object_id'], name='status_change_object_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:51
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0017_synclog'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAuditLog',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('user_id', models.BigIntegerField(blank=True, null=True)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('action', models.CharField(max_length=255)),
+                ('details', models.TextField(blank=True)),
+                ('timestamp', models.DateTimeField(db_index=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedInvoice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True)),
+                ('invoice_number', models.CharField(max_length=20, unique=True)),
+                ('created_at', models.DateTimeField()),
+                ('payment_status', models.CharField(max_length=20)),
+                ('shipping_status', models.CharField(max_length=20)),
+                ('payment_currency', models.CharField(max_length=3)),
+                ('total', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('exchange_rate', models.DecimalField(blank=True, decimal_places=4, max_digits=14, null=True)),
+                ('kilos', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('data', models.JSONField(help_text='Representación de InvoiceSerializer al archivar')),
+                ('tracking', models.JSONField(help_text='Representación de TrackingSerializer al archivar')),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('destination_office', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.office')),
+                ('origin_office', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='+', to='api.office')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['created_at', 'origin_office'], name='archived_invoice_report_idx')],
+            },
+        ),
+    ]
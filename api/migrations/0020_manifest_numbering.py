@@ -0,0 +1,31 @@
+# Generated by Django 5.2.4 on 2026-10-19 05:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0019_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='shipmentmanifest',
+            name='office',
+            field=models.ForeignKey(blank=True, help_text='Oficina que despacha', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='manifests', to='api.office'),
+        ),
+        migrations.CreateModel(
+            name='ManifestSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('last_number', models.PositiveIntegerField(default=0)),
+                ('office', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='api.office')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('office', 'day'), name='manifest_sequence_office_day_unique')],
+            },
+        ),
+    ]
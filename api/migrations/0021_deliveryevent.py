@@ -0,0 +1,28 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0020_manifest_numbering'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliveryEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('invoice_id', models.BigIntegerField(db_index=True)),
+                ('invoice_number', models.CharField(max_length=20)),
+                ('outcome', models.CharField(choices=[('ENTREGADA', 'Entregada'), ('DEVUELTA', 'Devuelta')], max_length=20)),
+                ('reason', models.CharField(blank=True, help_text='Motivo de la devolución', max_length=255)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('manifest', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='delivery_events', to='api.shipmentmanifest')),
+                ('recorded_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
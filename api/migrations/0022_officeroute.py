@@ -0,0 +1,27 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0021_deliveryevent'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OfficeRoute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('distance_km', models.DecimalField(decimal_places=2, max_digits=8)),
+                ('travel_minutes', models.PositiveIntegerField()),
+                ('destination', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes_in', to='api.office')),
+                ('origin', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='routes_out', to='api.office')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('origin', 'destination'), name='office_route_unique'), models.CheckConstraint(condition=models.Q(('origin', models.F('destination')), _negated=True), name='office_route_not_loop')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 5.2.4 on 2026-10-19 06:08
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0022_officeroute'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VehicleUtilization',
+            fields=[
+                ('vehicle', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='utilization', serialize=False, to='api.vehicle')),
+                ('trips', models.PositiveIntegerField(default=0)),
+                ('trip_seconds', models.BigIntegerField(default=0)),
+                ('distance_km', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('kg_km', models.DecimalField(decimal_places=2, default=0, max_digits=18)),
+                ('capacity_kg_km', models.DecimalField(decimal_places=2, default=0, help_text='Capacidad por kilómetro recorrido', max_digits=18)),
+                ('maintenance_count', models.PositiveIntegerField(default=0)),
+                ('maintenance_seconds', models.BigIntegerField(default=0)),
+                ('last_active_at', models.DateTimeField(blank=True, help_text='Fin del último viaje o mantenimiento', null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='VehicleEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('VIAJE', 'Viaje'), ('MANTENIMIENTO', 'Mantenimiento')], max_length=20)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField(blank=True, null=True)),
+                ('distance_km', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('load_kg', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('kg_km', models.DecimalField(decimal_places=2, default=0, help_text='Kilos transportados por kilómetro recorrido', max_digits=16)),
+                ('notes', models.CharField(blank=True, max_length=255)),
+                ('driver', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('manifest', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='vehicle_event', to='api.shipmentmanifest')),
+                ('vehicle', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='events', to='api.vehicle')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['vehicle', '-started_at'], name='vehicle_event_history_idx')],
+            },
+        ),
+    ]
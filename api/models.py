@@ -16,6 +16,26 @@ class Office(models.Model):
     def __str__(self):
         return self.name
 
+class OfficeRoute(models.Model):
+    """
+    Tramo de carretera entre dos oficinas, con su distancia y tiempo de viaje.
+    Con las oficinas forma el grafo que usa api/routing.py; un tramo sin su
+    inverso registrado vale también en sentido contrario.
+    """
+    origin = models.ForeignKey(Office, related_name='routes_out', on_delete=models.CASCADE)
+    destination = models.ForeignKey(Office, related_name='routes_in', on_delete=models.CASCADE)
+    distance_km = models.DecimalField(max_digits=8, decimal_places=2)
+    travel_minutes = models.PositiveIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['origin', 'destination'], name='office_route_unique'),
+            models.CheckConstraint(condition=~models.Q(origin=models.F('destination')), name='office_route_not_loop'),
+        ]
+
+    def __str__(self):
+        return f"{self.origin} -> {self.destination} ({self.distance_km} km)"
+
 class Permission(models.Model):
     key = models.CharField(max_length=100, unique=True, help_text="Ej: 'invoices.create', 'flota.view'")
     description = models.CharField(max_length=255)
@@ -75,8 +95,30 @@ class Client(models.Model):
     def __str__(self):
         return f"{self.name} ({self.get_id_type_display()}-{self.id_number})"
 
+class StatusTrackingMixin:
+    """
+    Guarda los estados leídos de la base de datos para que el feed de cambios
+    (api/changefeed.py) registre la transición al guardar.
+    """
+    tracked_status_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_status = {
+            name: getattr(instance, name) for name in cls.tracked_status_fields if name in field_names
+        }
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self._loaded_status = {
+            **getattr(self, '_loaded_status', {}),
+            **{name: getattr(self, name) for name in self.tracked_status_fields if fields is None or name in fields},
+        }
+
 # Reemplaza tu clase Invoice con esta
-class Invoice(models.Model):
+class Invoice(StatusTrackingMixin, models.Model):
     """El modelo central: la factura o guía de envío."""
     STATUS_CHOICES = [
         ('PENDIENTE_PAGO', 'Pendiente de Pago'),
@@ -104,6 +146,8 @@ class Invoice(models.Model):
     
     origin_office = models.ForeignKey(Office, related_name='origin_invoices', on_delete=models.PROTECT)
     destination_office = models.ForeignKey(Office, related_name='destination_invoices', on_delete=models.PROTECT)
+    # Manifiesto (remesa) en el que viaja la factura; lo asigna el despacho
+    manifest = models.ForeignKey('ShipmentManifest', related_name='invoices', on_delete=models.SET_NULL, null=True, blank=True)
 
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -129,6 +173,16 @@ class Invoice(models.Model):
     ipostel = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     igtf = models.DecimalField(max_digits=12, decimal_places=2, default=0)
     total = models.DecimalField(max_digits=12, decimal_places=2)
+    # Tasa BCV (Bs. por dólar) vigente al emitir la factura
+    exchange_rate = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+
+    tracked_status_fields = ('payment_status', 'shipping_status')
+
+    class Meta:
+        indexes = [
+            # Reportes por periodo y ruta
+            models.Index(fields=['created_at', 'origin_office', 'destination_office'], name='invoice_report_idx'),
+        ]
     
     def __str__(self):
         return f"Factura {self.invoice_number} - {self.sender.name} a {self.recipient.name}"
@@ -171,23 +225,150 @@ class Vehicle(models.Model):
     def __str__(self):
         return f"{self.brand} {self.model} ({self.license_plate})"
 
-class ShipmentManifest(models.Model):
+class VehicleEvent(models.Model):
+    """
+    Historial de un vehículo: cada viaje (de un manifiesto) y cada ventana de
+    mantenimiento. Mientras dura, el evento queda sin `ended_at`.
+    """
+    KIND_CHOICES = [
+        ('VIAJE', 'Viaje'),
+        ('MANTENIMIENTO', 'Mantenimiento'),
+    ]
+    vehicle = models.ForeignKey(Vehicle, related_name='events', on_delete=models.CASCADE)
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    manifest = models.OneToOneField(
+        'ShipmentManifest', related_name='vehicle_event', on_delete=models.SET_NULL, null=True, blank=True,
+    )
+    driver = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField(null=True, blank=True)
+    distance_km = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    load_kg = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    kg_km = models.DecimalField(max_digits=16, decimal_places=2, default=0, help_text="Kilos transportados por kilómetro recorrido")
+    notes = models.CharField(max_length=255, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['vehicle', '-started_at'], name='vehicle_event_history_idx')]
+
+    def __str__(self):
+        return f"{self.vehicle.license_plate}: {self.get_kind_display()} {self.started_at:%Y-%m-%d}"
+
+class VehicleUtilization(models.Model):
+    """
+    Totales de los eventos cerrados de un vehículo, que api/fleet.py mantiene
+    al cerrar cada evento para no recorrer el historial al mostrar la flota.
+    """
+    vehicle = models.OneToOneField(Vehicle, related_name='utilization', on_delete=models.CASCADE, primary_key=True)
+    trips = models.PositiveIntegerField(default=0)
+    trip_seconds = models.BigIntegerField(default=0)
+    distance_km = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    kg_km = models.DecimalField(max_digits=18, decimal_places=2, default=0)
+    capacity_kg_km = models.DecimalField(max_digits=18, decimal_places=2, default=0, help_text="Capacidad por kilómetro recorrido")
+    maintenance_count = models.PositiveIntegerField(default=0)
+    maintenance_seconds = models.BigIntegerField(default=0)
+    last_active_at = models.DateTimeField(null=True, blank=True, help_text="Fin del último viaje o mantenimiento")
+
+    def __str__(self):
+        return f"Uso de {self.vehicle_id}"
+
+class ShipmentManifest(StatusTrackingMixin, models.Model):
     """Representa una remesa o manifiesto de carga para un viaje."""
     STATUS_CHOICES = [
         ('PLANIFICADO', 'Planificado'),
         ('EN_RUTA', 'En Ruta'),
         ('FINALIZADO', 'Finalizado'),
     ]
+    # Lo asigna api/manifests.py: M<oficina>-<AAAAMMDD>-<NNN>
     manifest_number = models.CharField(max_length=20, unique=True)
+    office = models.ForeignKey(
+        Office, related_name='manifests', on_delete=models.PROTECT, null=True, blank=True,
+        help_text="Oficina que despacha",
+    )
     vehicle = models.ForeignKey(Vehicle, on_delete=models.PROTECT)
     driver = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT, null=True, blank=True)
     departure_time = models.DateTimeField(null=True, blank=True)
     arrival_time = models.DateTimeField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PLANIFICADO')
 
+    tracked_status_fields = ('status',)
+
     def __str__(self):
         return f"Manifiesto {self.manifest_number} (Vehículo: {self.vehicle.license_plate})"
 
+class DeliveryEvent(models.Model):
+    """
+    Resultado de la entrega de una factura al finalizar el viaje de su
+    manifiesto (ver api/manifests.py). Como StatusChange, guarda la factura
+    por id y número para conservarse cuando la factura se archiva.
+    """
+    OUTCOME_CHOICES = [
+        ('ENTREGADA', 'Entregada'),
+        ('DEVUELTA', 'Devuelta'),
+    ]
+    manifest = models.ForeignKey(ShipmentManifest, related_name='delivery_events', on_delete=models.CASCADE)
+    invoice_id = models.BigIntegerField(db_index=True)
+    invoice_number = models.CharField(max_length=20)
+    outcome = models.CharField(max_length=20, choices=OUTCOME_CHOICES)
+    reason = models.CharField(max_length=255, blank=True, help_text="Motivo de la devolución")
+    recorded_by = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.invoice_number}: {self.outcome}"
+
+class ManifestSequence(models.Model):
+    """Último número de manifiesto asignado por oficina y día (ver api/manifests.py)."""
+    office = models.ForeignKey(Office, related_name='+', on_delete=models.CASCADE)
+    day = models.DateField()
+    last_number = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['office', 'day'], name='manifest_sequence_office_day_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.office_id} {self.day}: {self.last_number}"
+
+class StatusChange(models.Model):
+    """
+    Feed de cambios de estado de facturas y manifiestos. Solo se agregan filas:
+    el id es el número de secuencia con el que los clientes piden ?since=.
+    """
+    ENTITY_CHOICES = [
+        ('invoice', 'Factura'),
+        ('manifest', 'Manifiesto'),
+    ]
+    entity = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    object_id = models.BigIntegerField()
+    number = models.CharField(max_length=20, help_text="Número de la factura o del manifiesto")
+    field = models.CharField(max_length=20)
+    # Vacío al crear el objeto
+    old_value = models.CharField(max_length=20, blank=True)
+    new_value = models.CharField(max_length=20)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entity', 'object_id'], name='status_change_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.pk} {self.entity} {self.number}: {self.field} {self.old_value} -> {self.new_value}"
+
+class SyncLog(models.Model):
+    """
+    Log de cambios para la sincronización incremental (api/sync.py): una fila
+    por objeto guardado o borrado. El id es la marca de agua de los clientes.
+    """
+    entity = models.CharField(max_length=20)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.pk} {self.entity} {self.object_id}{' (borrado)' if self.deleted else ''}"
+
 class MerchandiseItem(models.Model):
     invoice = models.ForeignKey(Invoice, related_name='items', on_delete=models.CASCADE)
     quantity = models.PositiveIntegerField()
@@ -205,6 +386,11 @@ class Expense(models.Model):
     created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.PROTECT)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'office'], name='expense_report_idx'),
+        ]
+
     def __str__(self):
         return f"Gasto: {self.description} - {self.amount}"
     
@@ -221,6 +407,69 @@ class AuditLog(models.Model):
     def __str__(self):
         return f"{self.timestamp} - {self.user}: {self.action}"
 
+class ArchivedInvoice(models.Model):
+    """
+    Factura archivada (ver api/archive.py). Conserva las columnas que usan los
+    reportes, la representación completa de la factura con sus items y la del
+    rastreo público, que sigue respondiendo por el número de factura.
+    """
+    original_id = models.BigIntegerField(unique=True)
+    invoice_number = models.CharField(max_length=20, unique=True)
+    origin_office = models.ForeignKey(Office, related_name='+', on_delete=models.PROTECT)
+    destination_office = models.ForeignKey(Office, related_name='+', on_delete=models.PROTECT)
+    created_at = models.DateTimeField()
+    payment_status = models.CharField(max_length=20)
+    shipping_status = models.CharField(max_length=20)
+    payment_currency = models.CharField(max_length=3)
+    total = models.DecimalField(max_digits=12, decimal_places=2)
+    exchange_rate = models.DecimalField(max_digits=14, decimal_places=4, null=True, blank=True)
+    kilos = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    data = models.JSONField(help_text="Representación de InvoiceSerializer al archivar")
+    tracking = models.JSONField(help_text="Representación de TrackingSerializer al archivar")
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['created_at', 'origin_office'], name='archived_invoice_report_idx'),
+        ]
+
+    def __str__(self):
+        return f"Factura archivada {self.invoice_number}"
+
+class ArchivedAuditLog(models.Model):
+    """Registro de auditoría archivado (ver api/archive.py); el usuario se guarda por id y nombre."""
+    original_id = models.BigIntegerField(unique=True)
+    user_id = models.BigIntegerField(null=True, blank=True)
+    username = models.CharField(max_length=150, blank=True)
+    action = models.CharField(max_length=255)
+    details = models.TextField(blank=True)
+    timestamp = models.DateTimeField(db_index=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.timestamp} - {self.username}: {self.action}"
+
+class IdempotencyKey(models.Model):
+    """
+    Respuesta guardada de una petición con cabecera Idempotency-Key (ver
+    api/idempotency.py). Sin status_code, la petición original sigue en curso.
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='+', on_delete=models.CASCADE)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64, help_text="SHA-256 del método, la ruta y el cuerpo")
+    status_code = models.PositiveSmallIntegerField(null=True, blank=True)
+    response = models.TextField(blank=True, help_text="Cuerpo JSON de la respuesta")
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='idempotency_user_key_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
 class CompanyInfo(models.Model):
     """Modelo Singleton para guardar la configuración de la empresa."""
     name = models.CharField(max_length=255, default="Transporte Alianza 2025 C.A.")
@@ -251,6 +500,17 @@ class CompanyInfo(models.Model):
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
     
+class ExchangeRate(models.Model):
+    """Histórico de la tasa oficial del BCV (bolívares por dólar), una por día."""
+    date = models.DateField(unique=True)
+    rate = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta:
+        ordering = ['-date']
+
+    def __str__(self):
+        return f"{self.date}: {self.rate} Bs/USD"
+    
 class Supplier(models.Model):
     """Representa a un proveedor de bienes o servicios."""
     name = models.CharField(max_length=255, unique=True)
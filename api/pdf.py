@@ -0,0 +1,325 @@
+# api/pdf.py
+
+"""
+Escritor de PDF mínimo para las guías y los manifiestos (ver api/documents.py).
+
+No importa Django: los procesos que dibujan guías en paralelo lo cargan sin
+configurar nada. Usa las fuentes estándar de PDF (Helvetica,
+Helvetica-Bold y Courier para las cifras) con codificación WinAnsi, que
+cubre los acentos del español, así que no incrusta fuentes. El logo se
+incluye una sola vez por archivo, como JPEG, aunque lo usen todas las
+páginas, y cada página comparte el mismo diccionario de recursos.
+
+Una plantilla (Template) es lo fijo de una página (membrete, rótulos,
+marcos) ya convertido en operadores PDF, más la posición y la fuente de cada
+campo; llenarla es concatenar bytes. Las tablas de ítems y de guías se
+dibujan aparte y se reparten en páginas.
+"""
+
+import zlib
+
+# A4 en puntos
+PAGE_WIDTH, PAGE_HEIGHT = 595, 842
+MARGIN = 40
+RIGHT = PAGE_WIDTH - MARGIN
+FONTS = {'F1': b'Helvetica', 'F2': b'Helvetica-Bold', 'F3': b'Courier'}
+# Ancho de un carácter de Courier en fracción del tamaño de la fuente:
+# las cifras van en Courier para poder alinearlas a la derecha
+COURIER_WIDTH = 0.6
+# Caja del logo en el membrete, en puntos
+LOGO_BOX = (110, 55)
+ROW_HEIGHT = 14
+COMPRESSION_LEVEL = 6
+
+
+def _escape(value):
+    data = ' '.join(str(value).split()).encode('cp1252', errors='replace')
+    return data.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+
+
+def clip(value, chars):
+    value = ' '.join(str(value).split())
+    return value if len(value) <= chars else value[:chars - 1] + '…'
+
+
+def text(x, y, value, font='F1', size=9):
+    return b'BT /%s %d Tf %.2f %.2f Td (%s) Tj ET\n' % (font.encode(), size, x, y, _escape(value))
+
+
+def number(right, y, value, size=9, font='F3'):
+    """Texto en Courier que termina en `right`."""
+    value = str(value)
+    return text(right - len(value) * size * COURIER_WIDTH, y, value, font, size)
+
+
+def line(x1, y1, x2, y2):
+    return b'%.2f %.2f m %.2f %.2f l S\n' % (x1, y1, x2, y2)
+
+
+def rect(x, y, width, height, fill=None):
+    if fill is None:
+        return b'%.2f %.2f %.2f %.2f re S\n' % (x, y, width, height)
+    return b'%.2f g %.2f %.2f %.2f %.2f re f 0 g\n' % (fill, x, y, width, height)
+
+
+class Template:
+    """Página compilada: `static` son bytes fijos y `slots` {campo: (x, y, fuente, tamaño, caracteres, derecha)}."""
+
+    def __init__(self, static, slots):
+        self.static = static
+        self.slots = slots
+
+    def fill(self, values):
+        parts = [self.static]
+        for name, (x, y, font, size, chars, right) in self.slots.items():
+            value = values.get(name)
+            if value is None or value == '':
+                continue
+            parts.append(number(x, y, value, size, font) if right else text(x, y, clip(value, chars), font, size))
+        return b''.join(parts)
+
+
+class _Builder:
+    def __init__(self):
+        self.parts = []
+        self.slots = {}
+
+    def add(self, data):
+        self.parts.append(data)
+
+    def slot(self, name, x, y, font='F1', size=9, chars=60, right=False):
+        self.slots[name] = (x, y, font, size, chars, right)
+
+    def field(self, label, name, x, y, width=55, chars=40):
+        self.add(text(x, y, label, 'F2', 8))
+        self.slot(name, x + width, y, chars=chars)
+
+    def template(self):
+        return Template(b''.join(self.parts), self.slots)
+
+
+def _letterhead(builder, company, logo_size, title):
+    """Membrete de la empresa y título del documento; devuelve la altura libre."""
+    top = PAGE_HEIGHT - MARGIN
+    x = MARGIN
+    if logo_size:
+        width, height = logo_size
+        scale = min(LOGO_BOX[0] / width, LOGO_BOX[1] / height)
+        width, height = width * scale, height * scale
+        builder.add(b'q %.2f 0 0 %.2f %.2f %.2f cm /Logo Do Q\n' % (width, height, x, top - height))
+        x += width + 12
+    builder.add(text(x, top - 12, company['name'], 'F2', 13))
+    details = [f"RIF: {company['rif']}", company['address'], f"Teléfono: {company['phone']}"]
+    if company['postal_license']:
+        details.append(f"Permiso postal: {company['postal_license']}")
+    for offset, detail in enumerate(details):
+        builder.add(text(x, top - 26 - offset * 10, clip(detail, 95), size=8))
+    builder.add(line(MARGIN, top - 68, RIGHT, top - 68))
+    builder.add(text(MARGIN, top - 90, title, 'F2', 14))
+    builder.add(text(RIGHT - 170, top - 90, 'N°', 'F2', 14))
+    builder.slot('number', RIGHT - 145, top - 90, 'F2', 14, chars=20)
+    builder.slot('page', RIGHT, MARGIN - 10, 'F1', 8, right=True)
+    return top - 110
+
+
+# --- Guía de envío ---
+
+GUIDE_TABLE_TOP = 500
+GUIDE_TABLE_BOTTOM = 210
+GUIDE_ROWS = (GUIDE_TABLE_TOP - GUIDE_TABLE_BOTTOM) // ROW_HEIGHT - 1
+
+
+def compile_guide(company, logo_size=None):
+    builder = _Builder()
+    y = _letterhead(builder, company, logo_size, 'GUÍA DE ENVÍO')
+    builder.field('Fecha:', 'date', MARGIN, y, 35)
+    builder.field('Manifiesto:', 'manifest', RIGHT - 170, y, 55)
+
+    half = (RIGHT - MARGIN - 10) / 2
+    for x, party, label in ((MARGIN, 'sender', 'REMITENTE'), (MARGIN + half + 10, 'recipient', 'DESTINATARIO')):
+        builder.add(rect(x, y - 100, half, 84))
+        builder.add(text(x + 6, y - 30, label, 'F2', 9))
+        for offset, field in enumerate(('name', 'id', 'phone', 'address')):
+            builder.slot(f'{party}_{field}', x + 6, y - 45 - offset * 12, chars=48)
+
+    y -= 120
+    builder.field('Origen:', 'origin', MARGIN, y, 45)
+    builder.field('Destino:', 'destination', MARGIN + half + 10, y, 45)
+    builder.field('Tipo de envío:', 'shipping_type', MARGIN, y - 14, 70)
+    builder.field('Pago:', 'payment_type', MARGIN + half + 10, y - 14, 45)
+
+    builder.add(rect(MARGIN, GUIDE_TABLE_TOP - 4, RIGHT - MARGIN, ROW_HEIGHT, fill=0.9))
+    builder.add(text(MARGIN + 6, GUIDE_TABLE_TOP, 'Cant.', 'F2', 9))
+    builder.add(text(MARGIN + 50, GUIDE_TABLE_TOP, 'Descripción', 'F2', 9))
+    builder.add(text(RIGHT - 60, GUIDE_TABLE_TOP, 'Peso (kg)', 'F2', 9))
+    builder.add(line(MARGIN, GUIDE_TABLE_BOTTOM, RIGHT, GUIDE_TABLE_BOTTOM))
+    return builder.template()
+
+
+def _guide_totals(guide):
+    lines = [('Subtotal', guide['subtotal']), ('IVA', guide['tax'])]
+    lines += [(label, guide[key]) for label, key in (('IPOSTEL', 'ipostel'), ('IGTF', 'igtf')) if guide.get(key)]
+    if guide.get('declared_value'):
+        lines.insert(0, ('Valor declarado', guide['declared_value']))
+    parts = [text(MARGIN, GUIDE_TABLE_BOTTOM - 16, f"Peso total: {guide['weight']} kg", 'F2', 9)]
+    y = GUIDE_TABLE_BOTTOM - 16
+    for label, value in lines:
+        parts.append(text(RIGHT - 200, y, label, size=9))
+        parts.append(number(RIGHT, y, value))
+        y -= 13
+    parts.append(text(RIGHT - 200, y - 2, f"Total {guide['currency']}", 'F2', 10))
+    parts.append(number(RIGHT, y - 2, guide['total'], 10, 'F3'))
+    return b''.join(parts)
+
+
+def guide_pages(template, guide):
+    """Contenido sin comprimir de las páginas de una guía."""
+    items = guide['items']
+    chunks = [items[start:start + GUIDE_ROWS] for start in range(0, len(items), GUIDE_ROWS)] or [[]]
+    pages = []
+    for index, chunk in enumerate(chunks, 1):
+        parts = [template.fill({**guide, 'page': f'Página {index} de {len(chunks)}'})]
+        y = GUIDE_TABLE_TOP - ROW_HEIGHT
+        for quantity, description, weight in chunk:
+            parts.append(number(MARGIN + 30, y, quantity))
+            parts.append(text(MARGIN + 50, y, clip(description, 70)))
+            parts.append(number(RIGHT, y, weight))
+            y -= ROW_HEIGHT
+        if index == len(chunks):
+            parts.append(_guide_totals(guide))
+        else:
+            parts.append(text(MARGIN, GUIDE_TABLE_BOTTOM - 16, 'Continúa en la página siguiente.', size=8))
+        pages.append(b''.join(parts))
+    return pages
+
+
+# --- Manifiesto de carga ---
+
+MANIFEST_TABLE_TOP = 600
+MANIFEST_TABLE_BOTTOM = 150
+MANIFEST_ROWS = (MANIFEST_TABLE_TOP - MANIFEST_TABLE_BOTTOM) // ROW_HEIGHT - 1
+# (título, x, caracteres o None si es una cifra alineada a la derecha en x)
+MANIFEST_COLUMNS = (
+    ('#', MARGIN + 20, None),
+    ('Guía', MARGIN + 28, 14),
+    ('Destino', MARGIN + 110, 22),
+    ('Destinatario', MARGIN + 240, 34),
+    ('Bultos', RIGHT - 70, None),
+    ('Peso (kg)', RIGHT, None),
+)
+
+
+def compile_manifest(company, logo_size=None):
+    builder = _Builder()
+    y = _letterhead(builder, company, logo_size, 'MANIFIESTO DE CARGA')
+    half = (RIGHT - MARGIN - 10) / 2
+    builder.field('Oficina:', 'office', MARGIN, y, 45)
+    builder.field('Salida:', 'departure', MARGIN + half + 10, y, 40)
+    builder.field('Vehículo:', 'vehicle', MARGIN, y - 14, 45)
+    builder.field('Conductor:', 'driver', MARGIN + half + 10, y - 14, 50)
+    builder.field('Estado:', 'status', MARGIN, y - 28, 45)
+
+    builder.add(rect(MARGIN, MANIFEST_TABLE_TOP - 4, RIGHT - MARGIN, ROW_HEIGHT, fill=0.9))
+    for title, x, chars in MANIFEST_COLUMNS:
+        if chars is None:
+            builder.add(text(x - len(title) * 5, MANIFEST_TABLE_TOP, title, 'F2', 9))
+        else:
+            builder.add(text(x, MANIFEST_TABLE_TOP, title, 'F2', 9))
+    builder.add(line(MARGIN, MANIFEST_TABLE_BOTTOM, RIGHT, MANIFEST_TABLE_BOTTOM))
+    return builder.template()
+
+
+def _manifest_totals(manifest):
+    y = MANIFEST_TABLE_BOTTOM - 16
+    parts = [
+        text(MARGIN, y, f"Guías: {len(manifest['rows'])}", 'F2', 9),
+        text(RIGHT - 200, y, 'Totales', 'F2', 9),
+        number(RIGHT - 70, y, manifest['packages']),
+        number(RIGHT, y, manifest['weight']),
+    ]
+    for x, label in ((MARGIN, 'Despachado por'), (MARGIN + 280, 'Recibido por')):
+        parts.append(line(x, MARGIN + 30, x + 200, MARGIN + 30))
+        parts.append(text(x, MARGIN + 18, label, size=8))
+    return b''.join(parts)
+
+
+def manifest_pages(template, manifest):
+    """Contenido sin comprimir de las páginas del resumen de un manifiesto."""
+    rows = manifest['rows']
+    chunks = [rows[start:start + MANIFEST_ROWS] for start in range(0, len(rows), MANIFEST_ROWS)] or [[]]
+    pages = []
+    for index, chunk in enumerate(chunks, 1):
+        parts = [template.fill({**manifest, 'page': f'Página {index} de {len(chunks)}'})]
+        y = MANIFEST_TABLE_TOP - ROW_HEIGHT
+        for row in chunk:
+            for value, (_, x, chars) in zip(row, MANIFEST_COLUMNS):
+                parts.append(number(x, y, value) if chars is None else text(x, y, clip(value, chars)))
+            y -= ROW_HEIGHT
+        if index == len(chunks):
+            parts.append(_manifest_totals(manifest))
+        pages.append(b''.join(parts))
+    return pages
+
+
+# --- Archivo ---
+
+def compress(pages):
+    return [zlib.compress(page, COMPRESSION_LEVEL) for page in pages]
+
+
+def render_guides(template, guides):
+    """Páginas comprimidas de varias guías; es lo que corre en los procesos del pool."""
+    return [stream for guide in guides for stream in compress(guide_pages(template, guide))]
+
+
+def document(streams, logo=None):
+    """
+    Archivo PDF con una página por contenido comprimido de `streams`. `logo`
+    es (jpeg, ancho, alto) en píxeles, o None.
+    """
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    def stream(header, data):
+        return b'<< %s /Length %d >>\nstream\n%s\nendstream' % (header, len(data), data)
+
+    catalog = add(None)
+    pages = add(None)
+    fonts = b' '.join(
+        b'/%s %d 0 R' % (name.encode(), add(b'<< /Type /Font /Subtype /Type1 /BaseFont /%s /Encoding /WinAnsiEncoding >>' % base))
+        for name, base in FONTS.items()
+    )
+    xobjects = b''
+    if logo is not None:
+        data, width, height = logo
+        image = add(stream(
+            b'/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB '
+            b'/BitsPerComponent 8 /Filter /DCTDecode' % (width, height), data,
+        ))
+        xobjects = b' /XObject << /Logo %d 0 R >>' % image
+    resources = add(b'<< /Font << %s >>%s >>' % (fonts, xobjects))
+    kids = []
+    for content in streams:
+        contents = add(stream(b'/Filter /FlateDecode', content))
+        kids.append(add(
+            b'<< /Type /Page /Parent %d 0 R /MediaBox [0 0 %d %d] /Resources %d 0 R /Contents %d 0 R >>'
+            % (pages, PAGE_WIDTH, PAGE_HEIGHT, resources, contents)
+        ))
+    objects[catalog - 1] = b'<< /Type /Catalog /Pages %d 0 R >>' % pages
+    objects[pages - 1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (
+        b' '.join(b'%d 0 R' % kid for kid in kids), len(kids),
+    )
+
+    output = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number_, body in enumerate(objects, 1):
+        offsets.append(len(output))
+        output += b'%d 0 obj\n%s\nendobj\n' % (number_, body)
+    xref = len(output)
+    output += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    output += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    output += b'trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, catalog, xref)
+    return bytes(output)
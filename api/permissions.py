@@ -0,0 +1,31 @@
+# api/permissions.py
+
+from rest_framework.permissions import BasePermission
+
+
+def user_has_permission_key(user, key):
+    """
+    Indica si el usuario tiene el permiso de aplicación `key` (ej: 'reports.view')
+    a través de su rol. El superusuario tiene todos los permisos.
+    """
+    if not user or not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return True
+    if not user.role_id:
+        return False
+    return user.role.permissions.filter(key=key).exists()
+
+
+class HasPermissionKey(BasePermission):
+    """
+    Permiso de DRF basado en las claves del modelo Permission.
+    La vista declara la clave requerida con el atributo `required_permission`.
+    """
+    message = 'No tienes permiso para realizar esta acción.'
+
+    def has_permission(self, request, view):
+        key = getattr(view, 'required_permission', None)
+        if key is None:
+            return True
+        return user_has_permission_key(request.user, key)
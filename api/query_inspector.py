@@ -0,0 +1,146 @@
+# api/query_inspector.py
+
+"""
+Detector de consultas lentas y patrones N+1, para pruebas y staging.
+
+Dentro de una petición agrupa las consultas por su forma normalizada (sin
+literales y con las listas IN colapsadas). Una forma que se repite muchas
+veces es casi siempre un N+1; para señalar al culpable se registra el campo
+de serializador de DRF que se estaba resolviendo cuando se ejecutó la
+consulta (ej: 'ExpenseSerializer.created_by.role').
+
+Las vistas pueden declarar un presupuesto de consultas por acción:
+
+    class ExpenseViewSet(viewsets.ModelViewSet):
+        query_budget = {'list': 4}
+
+QueryInspectorMiddleware (api/middleware.py) lo aplica a cada petición.
+Con QUERY_INSPECTOR = 'raise' (pruebas) superar el presupuesto lanza
+QueryBudgetExceeded y la prueba falla; con 'log' (staging) solo se registra
+en el logger 'api.queries'; con 'off' no se inspecciona nada.
+"""
+
+import re
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from rest_framework import serializers
+
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LISTS = re.compile(r'IN \((?:%s|\?)(?:, (?:%s|\?))*\)')
+_SPACES = re.compile(r'\s+')
+
+# Inspecciones abiertas en este contexto; las alimenta api/instrumentation.py
+_reports = ContextVar('query_reports', default=())
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def normalize(sql):
+    """Forma de la consulta, independiente de los valores concretos."""
+    shape = _STRINGS.sub('?', sql)
+    shape = _NUMBERS.sub('?', shape)
+    shape = _IN_LISTS.sub('IN (...)', shape)
+    return _SPACES.sub(' ', shape).strip()
+
+
+def serializer_field_path(frame):
+    """Ruta del campo de serializador que se está resolviendo en la pila, o None."""
+    fields = []
+    while frame is not None:
+        if frame.f_code.co_name in ('get_attribute', 'to_representation'):
+            candidate = frame.f_locals.get('self')
+            if isinstance(candidate, serializers.Field) and candidate.field_name and (not fields or fields[-1] is not candidate):
+                fields.append(candidate)
+        frame = frame.f_back
+    if not fields:
+        return None
+    outermost = fields[-1]
+    parent = outermost.parent
+    if isinstance(parent, serializers.ListSerializer):
+        parent = parent.child
+    names = [field.field_name for field in reversed(fields)]
+    return '.'.join([type(parent).__name__, *names])
+
+
+class QueryReport:
+    """Consultas registradas durante una inspección."""
+
+    def __init__(self):
+        self.queries = []
+
+    def record(self, sql, elapsed, field):
+        self.queries.append((normalize(sql), elapsed, field))
+
+    def __len__(self):
+        return len(self.queries)
+
+    @property
+    def total_time(self):
+        return sum(elapsed for _, elapsed, _ in self.queries)
+
+    def repeated(self, threshold=None):
+        """Formas que se repiten al menos `threshold` veces (patrones N+1)."""
+        threshold = threshold or getattr(settings, 'NPLUSONE_THRESHOLD', 3)
+        groups = defaultdict(lambda: {'count': 0, 'time': 0.0, 'fields': set()})
+        for shape, elapsed, field in self.queries:
+            group = groups[shape]
+            group['count'] += 1
+            group['time'] += elapsed
+            if field:
+                group['fields'].add(field)
+        return sorted(
+            (
+                {'sql': shape, 'count': group['count'], 'time': group['time'], 'fields': sorted(group['fields'])}
+                for shape, group in groups.items() if group['count'] >= threshold
+            ),
+            key=lambda group: -group['count'],
+        )
+
+    def slow(self, threshold_ms=None):
+        threshold_ms = threshold_ms or getattr(settings, 'SLOW_QUERY_MS', 100)
+        return [(shape, elapsed) for shape, elapsed, _ in self.queries if elapsed * 1000 >= threshold_ms]
+
+    def describe(self):
+        lines = [f"{len(self)} consultas en {self.total_time * 1000:.1f} ms"]
+        for group in self.repeated():
+            origin = ', '.join(group['fields']) or 'origen desconocido'
+            lines.append(f"  N+1 x{group['count']} ({origin}): {group['sql'][:200]}")
+        for shape, elapsed in self.slow():
+            lines.append(f"  lenta {elapsed * 1000:.1f} ms: {shape[:200]}")
+        return '\n'.join(lines)
+
+
+def active_reports():
+    return _reports.get()
+
+
+@contextmanager
+def inspect_queries():
+    """
+    Registra las consultas de todas las conexiones mientras dura el bloque,
+    también las que corren en los hilos de sync_to_async de la petición.
+    """
+    report = QueryReport()
+    token = _reports.set(_reports.get() + (report,))
+    try:
+        yield report
+    finally:
+        _reports.reset(token)
+
+
+def query_budget_for(view_func, method):
+    """Presupuesto declarado por la vista para la acción de esta petición, o None."""
+    cls = getattr(view_func, 'cls', None)
+    budget = getattr(cls, 'query_budget', None)
+    if budget is None:
+        return None
+    if isinstance(budget, int):
+        return budget
+    actions = getattr(view_func, 'actions', None) or {}
+    return budget.get(actions.get(method.lower(), method.lower()))
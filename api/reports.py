@@ -0,0 +1,266 @@
+# api/reports.py
+
+"""
+Motor de reportes de ganancias y pérdidas.
+
+Agrupa en SQL los ingresos (Invoice.total, sin facturas ANULADAS), kilos y
+guías por par de oficinas origen/destino, y los gastos por oficina, en
+periodos de un día, una semana o un mes. Las facturas archivadas (ver
+api/archive.py) se suman desde ArchivedInvoice.
+
+Los montos se convierten a la moneda de reporte dentro de la misma consulta
+(ver api/currency.py).
+
+Los periodos cerrados no cambian, así que su resultado se guarda en la caché
+de Django sin expiración (REPLICA_CACHE_SECONDS si se leyó de una réplica,
+ver api/db_router.py); el periodo abierto (el actual) se recalcula en cada
+consulta, y solo él. Las señales de Invoice, MerchandiseItem y Expense
+invalidan los periodos afectados cuando se escribe un registro, y un cambio
+en el histórico de tasas invalida todos los reportes guardados.
+"""
+
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Count, DateTimeField, Sum
+from django.db.models.functions import Trunc
+from django.utils import timezone
+
+from .models import ArchivedInvoice, Expense, Invoice, MerchandiseItem, Office
+from . import currency as currencies
+from . import db_router
+from .cache import CacheNamespace
+
+GRANULARITIES = ('day', 'week', 'month')
+NAMESPACE = CacheNamespace('reports:pl')
+ZERO = Decimal('0')
+
+
+def period_start(value, granularity):
+    """Devuelve la fecha en que comienza el periodo que contiene `value`."""
+    if granularity == 'day':
+        return value
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    return value.replace(day=1)
+
+
+def next_period(start, granularity):
+    """Devuelve la fecha de inicio del periodo siguiente a `start`."""
+    if granularity == 'day':
+        return start + timedelta(days=1)
+    if granularity == 'week':
+        return start + timedelta(days=7)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def iter_periods(start, end, granularity):
+    """Itera los inicios de periodo que cubren el rango [start, end]."""
+    current = period_start(start, granularity)
+    while current <= end:
+        yield current
+        current = next_period(current, granularity)
+
+
+def _local_midnight(value):
+    return timezone.make_aware(datetime.combine(value, time.min))
+
+
+def _cache_parts(granularity, start, currency):
+    return (currency, granularity, start.isoformat())
+
+
+def _period_of(row):
+    return timezone.localtime(row['period']).date()
+
+
+def _compute_periods(granularity, starts, currency):
+    """
+    Calcula los periodos indicados con cuatro consultas agrupadas
+    (facturas, mercancía, facturas archivadas y gastos) sobre el rango que los contiene.
+    """
+    range_start = _local_midnight(min(starts))
+    range_end = _local_midnight(next_period(max(starts), granularity))
+    data = {start: {'routes': {}, 'expenses': {}} for start in starts}
+
+    invoices = (
+        Invoice.objects
+        .filter(created_at__gte=range_start, created_at__lt=range_end)
+        .exclude(payment_status='ANULADA')
+        .annotate(period=Trunc('created_at', granularity, output_field=DateTimeField()))
+        .values('period', 'origin_office', 'destination_office')
+        .annotate(revenue=Sum(currencies.invoice_amount(currency)), guides=Count('id'))
+        .order_by()
+    )
+    for row in invoices:
+        bucket = data.get(_period_of(row))
+        if bucket is None:
+            continue
+        route = bucket['routes'].setdefault(
+            (row['origin_office'], row['destination_office']),
+            {'revenue': ZERO, 'kilos': ZERO, 'guides': 0},
+        )
+        route['revenue'] += row['revenue'] or ZERO
+        route['guides'] += row['guides']
+
+    items = (
+        MerchandiseItem.objects
+        .filter(invoice__created_at__gte=range_start, invoice__created_at__lt=range_end)
+        .exclude(invoice__payment_status='ANULADA')
+        .annotate(period=Trunc('invoice__created_at', granularity, output_field=DateTimeField()))
+        .values('period', 'invoice__origin_office', 'invoice__destination_office')
+        .annotate(kilos=Sum('weight'))
+        .order_by()
+    )
+    for row in items:
+        bucket = data.get(_period_of(row))
+        if bucket is None:
+            continue
+        route = bucket['routes'].setdefault(
+            (row['invoice__origin_office'], row['invoice__destination_office']),
+            {'revenue': ZERO, 'kilos': ZERO, 'guides': 0},
+        )
+        route['kilos'] += row['kilos'] or ZERO
+
+    archived = (
+        ArchivedInvoice.objects
+        .filter(created_at__gte=range_start, created_at__lt=range_end)
+        .exclude(payment_status='ANULADA')
+        .annotate(period=Trunc('created_at', granularity, output_field=DateTimeField()))
+        .values('period', 'origin_office', 'destination_office')
+        .annotate(revenue=Sum(currencies.invoice_amount(currency)), guides=Count('id'), kilos=Sum('kilos'))
+        .order_by()
+    )
+    for row in archived:
+        bucket = data.get(_period_of(row))
+        if bucket is None:
+            continue
+        route = bucket['routes'].setdefault(
+            (row['origin_office'], row['destination_office']),
+            {'revenue': ZERO, 'kilos': ZERO, 'guides': 0},
+        )
+        route['revenue'] += row['revenue'] or ZERO
+        route['kilos'] += row['kilos'] or ZERO
+        route['guides'] += row['guides']
+
+    expenses = (
+        Expense.objects
+        .filter(created_at__gte=range_start, created_at__lt=range_end)
+        .annotate(period=Trunc('created_at', granularity, output_field=DateTimeField()))
+        .values('period', 'office')
+        .annotate(amount=Sum(currencies.expense_amount(currency)))
+        .order_by()
+    )
+    for row in expenses:
+        bucket = data.get(_period_of(row))
+        if bucket is None:
+            continue
+        bucket['expenses'][row['office']] = bucket['expenses'].get(row['office'], ZERO) + (row['amount'] or ZERO)
+
+    return data
+
+
+def _format_period(start, granularity, data, closed, office_names):
+    routes = []
+    offices = {}
+
+    def office_row(office_id):
+        return offices.setdefault(office_id, {
+            'office': office_id,
+            'office_name': office_names.get(office_id),
+            'revenue': ZERO, 'expenses': ZERO, 'kilos': ZERO, 'guides': 0,
+        })
+
+    for (origin, destination), values in sorted(data['routes'].items()):
+        routes.append({
+            'origin_office': origin,
+            'origin_office_name': office_names.get(origin),
+            'destination_office': destination,
+            'destination_office_name': office_names.get(destination),
+            **values,
+        })
+        # Los ingresos se atribuyen a la oficina que emite la guía
+        row = office_row(origin)
+        row['revenue'] += values['revenue']
+        row['kilos'] += values['kilos']
+        row['guides'] += values['guides']
+
+    for office_id, amount in data['expenses'].items():
+        office_row(office_id)['expenses'] += amount
+
+    totals = {'revenue': ZERO, 'expenses': ZERO, 'kilos': ZERO, 'guides': 0}
+    for row in offices.values():
+        row['net_income'] = row['revenue'] - row['expenses']
+        for field in totals:
+            totals[field] += row[field]
+    totals['net_income'] = totals['revenue'] - totals['expenses']
+
+    return {
+        'period_start': start,
+        'period_end': next_period(start, granularity) - timedelta(days=1),
+        'closed': closed,
+        'routes': routes,
+        'offices': sorted(offices.values(), key=lambda row: row['office']),
+        'totals': totals,
+    }
+
+
+def profit_and_loss(start, end, granularity='month', currency=None):
+    """
+    Reporte de ganancias y pérdidas entre `start` y `end` (fechas, inclusive),
+    agrupado por periodos completos de la granularidad indicada y expresado
+    en `currency` (por defecto, la moneda de reporte configurada).
+    """
+    currency = currency or currencies.reporting_currency()
+    current = period_start(timezone.localdate(), granularity)
+    periods = list(iter_periods(start, end, granularity))
+    version = NAMESPACE.version()
+
+    results = {}
+    missing = []
+    cached = NAMESPACE.get_many([_cache_parts(granularity, p, currency) for p in periods if p < current], version)
+    for p in periods:
+        parts = _cache_parts(granularity, p, currency)
+        if parts in cached:
+            results[p] = cached[parts]
+        else:
+            missing.append(p)
+
+    if missing:
+        computed = _compute_periods(granularity, missing, currency)
+        NAMESPACE.set_many(
+            {_cache_parts(granularity, p, currency): computed[p] for p in missing if p < current},
+            version,
+            # Una réplica atrasada podría dejar un periodo desactualizado: se guarda por poco tiempo
+            timeout=settings.REPLICA_CACHE_SECONDS if db_router.reading_from_replica() else None,
+        )
+        results.update(computed)
+
+    office_names = dict(Office.objects.values_list('id', 'name'))
+    return {
+        'granularity': granularity,
+        'currency': currency,
+        'start': periods[0] if periods else start,
+        'end': end,
+        'periods': [
+            _format_period(p, granularity, results[p], p < current, office_names)
+            for p in periods
+        ],
+    }
+
+
+def invalidate_period(moment):
+    """Descarta de la caché los periodos (de toda granularidad) que contienen `moment`."""
+    if moment is None:
+        return
+    day = timezone.localtime(moment).date()
+    NAMESPACE.delete_many([
+        _cache_parts(g, period_start(day, g), c)
+        for g in GRANULARITIES for c in currencies.CURRENCIES
+    ])
+
+
+def invalidate_all():
+    """Invalida todos los reportes guardados (ej: al corregir una tasa histórica)."""
+    NAMESPACE.invalidate()
@@ -0,0 +1,235 @@
+# api/routing.py
+
+"""
+Orden de las entregas de un manifiesto y hora estimada de llegada a cada
+oficina.
+
+Las oficinas y sus tramos (OfficeRoute) forman un grafo ponderado por el
+tiempo de viaje. Para un manifiesto se calculan los caminos más cortos
+(Dijkstra) entre la oficina de salida y las oficinas de destino de sus
+facturas, y sobre esa matriz de tiempos se ordenan las paradas como un
+problema del viajante de camino abierto (el vehículo no vuelve): vecino más
+cercano para la primera ruta y después búsqueda local con 2-opt y or-opt
+hasta que ningún movimiento la acorte. Los movimientos se evalúan en tiempo
+constante, así que unas decenas de paradas se resuelven en milisegundos;
+`python manage.py benchmark_routing` lo mide para varios tamaños de grafo.
+
+El grafo se guarda en la caché de referencia de OfficeRoute, que las señales
+invalidan cuando cambia un tramo.
+"""
+
+import heapq
+import math
+from collections import Counter
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import serializers
+
+from .cache import reference_namespace
+from .models import Office, OfficeRoute
+
+INFINITY = math.inf
+# Mejora mínima para aceptar un movimiento: evita ciclos por redondeo
+EPSILON = 1e-9
+
+
+def build_graph(routes):
+    """
+    {oficina: {vecina: (minutos, km)}} a partir de tuplas (origen, destino,
+    minutos, km). Un tramo sin su inverso vale en los dos sentidos.
+    """
+    graph = {}
+    for origin, destination, minutes, km in routes:
+        graph.setdefault(origin, {})[destination] = (minutes, km)
+        graph.setdefault(destination, {})
+    for origin, destination, minutes, km in routes:
+        graph[destination].setdefault(origin, (minutes, km))
+    return graph
+
+
+def load_graph():
+    return reference_namespace(OfficeRoute).get_or_set(('graph',), lambda: build_graph([
+        (origin, destination, minutes, float(km))
+        for origin, destination, minutes, km in OfficeRoute.objects.values_list(
+            'origin_id', 'destination_id', 'travel_minutes', 'distance_km')
+    ]))
+
+
+def shortest_paths(graph, source, targets=None):
+    """
+    Dijkstra desde `source`: ({oficina: (minutos, km)}, {oficina: anterior}).
+    Con `targets` se detiene al llegar a todas ellas; los valores de las
+    demás oficinas pueden quedar sin ser los mínimos.
+    """
+    best = {source: (0, 0.0)}
+    previous = {}
+    heap = [(0, 0.0, source)]
+    pending = set(targets) - {source} if targets is not None else None
+    while heap:
+        minutes, km, node = heapq.heappop(heap)
+        if (minutes, km) > best[node]:
+            continue
+        if pending is not None:
+            pending.discard(node)
+            if not pending:
+                break
+        for neighbor, (edge_minutes, edge_km) in graph.get(node, {}).items():
+            candidate = (minutes + edge_minutes, km + edge_km)
+            if candidate < best.get(neighbor, (INFINITY, INFINITY)):
+                best[neighbor] = candidate
+                previous[neighbor] = node
+                heapq.heappush(heap, (*candidate, neighbor))
+    return best, previous
+
+
+def path(previous, source, target):
+    """Oficinas intermedias del camino más corto de `source` a `target`."""
+    nodes = []
+    while target != source:
+        target = previous[target]
+        nodes.append(target)
+    return nodes[-2::-1]
+
+
+def route_cost(route, matrix):
+    return sum(matrix[a][b] for a, b in zip(route, route[1:]))
+
+
+def nearest_neighbor(matrix):
+    """Ruta que parte de 0 y va siempre a la parada pendiente más cercana."""
+    pending = set(range(1, len(matrix)))
+    route = [0]
+    while pending:
+        row = matrix[route[-1]]
+        stop = min(pending, key=lambda candidate: (row[candidate], candidate))
+        pending.remove(stop)
+        route.append(stop)
+    return route
+
+
+def solve(matrix):
+    """
+    Orden de visita de las paradas 1..n-1 partiendo de la 0, sin volver:
+    una lista de índices que empieza en 0. `matrix[a][b]` es el costo de ir
+    de a hasta b; no necesita ser simétrica.
+    """
+    route = nearest_neighbor(matrix)
+    while _two_opt(route, matrix) or _or_opt(route, matrix):
+        pass
+    return route
+
+
+def _two_opt(route, matrix):
+    """
+    Invierte el primer tramo route[i..j] que acorta la ruta. Con las sumas
+    acumuladas en los dos sentidos, el costo del tramo invertido es una resta.
+    """
+    n = len(route)
+    forward, backward = [0], [0]
+    for a, b in zip(route, route[1:]):
+        forward.append(forward[-1] + matrix[a][b])
+        backward.append(backward[-1] + matrix[b][a])
+    for i in range(1, n - 1):
+        before = route[i - 1]
+        for j in range(i + 1, n):
+            after = route[j + 1] if j + 1 < n else None
+            old = matrix[before][route[i]] + forward[j] - forward[i]
+            new = matrix[before][route[j]] + backward[j] - backward[i]
+            if after is not None:
+                old += matrix[route[j]][after]
+                new += matrix[route[i]][after]
+            if new < old - EPSILON:
+                route[i:j + 1] = route[i:j + 1][::-1]
+                return True
+    return False
+
+
+def _or_opt(route, matrix):
+    """Mueve el primer segmento de 1 a 3 paradas que acorta la ruta al colocarlo en otra posición."""
+    n = len(route)
+    for length in (1, 2, 3):
+        for i in range(1, n - length + 1):
+            first, last = route[i], route[i + length - 1]
+            before = route[i - 1]
+            after = route[i + length] if i + length < n else None
+            removed = matrix[before][first] - (matrix[before][after] if after is not None else 0)
+            if after is not None:
+                removed += matrix[last][after]
+            rest = route[:i] + route[i + length:]
+            for k in range(len(rest)):
+                if k == i - 1:
+                    continue
+                a = rest[k]
+                b = rest[k + 1] if k + 1 < len(rest) else None
+                added = matrix[a][first] + (matrix[last][b] - matrix[a][b] if b is not None else 0)
+                if added < removed - EPSILON:
+                    route[:] = rest[:k + 1] + route[i:i + length] + rest[k + 1:]
+                    return True
+    return False
+
+
+def plan(manifest):
+    """
+    Ruta del manifiesto: desde su oficina (o la de origen más común de sus
+    facturas) por las oficinas de destino de sus facturas, en el orden que
+    minimiza el tiempo de viaje, con la llegada estimada a cada una.
+    """
+    invoices = list(manifest.invoices.order_by('pk').values_list(
+        'invoice_number', 'origin_office_id', 'destination_office_id'))
+    origin = manifest.office_id or (
+        Counter(origin for _, origin, _ in invoices).most_common(1)[0][0] if invoices else None)
+    if origin is None:
+        raise serializers.ValidationError("El manifiesto no tiene oficina de salida.")
+
+    drops = {}
+    for number, _, destination in invoices:
+        drops.setdefault(destination, []).append(number)
+    stops = [origin, *drops]
+    graph = load_graph()
+    paths = [shortest_paths(graph, stop, stops) for stop in stops]
+    unreachable = [stop for stop in stops[1:] if stop not in paths[0][0]]
+    if unreachable:
+        names = ', '.join(Office.objects.filter(pk__in=unreachable).order_by('name').values_list('name', flat=True))
+        raise serializers.ValidationError(f"No hay rutas registradas hasta: {names}.")
+
+    matrix = [[best[stop][0] for stop in stops] for best, _ in paths]
+    order = solve(matrix)
+
+    vias = [path(paths[a][1], stops[a], stops[b]) for a, b in zip(order, order[1:])]
+    offices = {*stops, *(node for via in vias for node in via)}
+    names = dict(Office.objects.filter(pk__in=offices).values_list('pk', 'name'))
+    departure = manifest.departure_time or timezone.now()
+    stop_minutes = settings.ROUTE_STOP_MINUTES
+    clock, total_minutes, total_km = departure, 0, 0.0
+    legs = []
+    for position, (a, b) in enumerate(zip(order, order[1:])):
+        minutes, km = paths[a][0][stops[b]]
+        # El tiempo de descarga se cuenta en cada parada antes de seguir
+        clock += timedelta(minutes=minutes + (stop_minutes if position else 0))
+        total_minutes += minutes
+        total_km += km
+        office = stops[b]
+        legs.append({
+            'office': office,
+            'name': names[office],
+            'via': [names[node] for node in vias[position]],
+            'invoices': drops[office],
+            'travel_minutes': minutes,
+            'distance_km': _km(km),
+            'eta': clock,
+        })
+    return {
+        'manifest': manifest.manifest_number,
+        'origin': {'office': origin, 'name': names[origin]},
+        'departure_time': departure,
+        'stops': legs,
+        'total_minutes': total_minutes,
+        'total_distance_km': _km(total_km),
+    }
+
+
+def _km(value):
+    return Decimal(str(round(value, 2))).quantize(Decimal('0.01'))
@@ -0,0 +1,184 @@
+# api/row_serializers.py
+
+"""
+Serialización de solo lectura a partir de tuplas de values_list().
+
+Un ModelSerializer crea un objeto del modelo por fila y llama al
+to_representation() de cada campo. Para las listas grandes (ej: la lista de
+facturas) RowSerializer compila una vez el serializer en un plan: las
+columnas que hay que pedir con values_list() y, por campo, una conversión
+directa del valor de la base de datos. El resultado es el mismo JSON, byte
+por byte, que el del serializer original (ver RowSerializerTests).
+
+Se admiten campos simples, claves foráneas como id, serializers anidados por
+clave foránea y, en el primer nivel, listas anidadas de una relación inversa
+(ej: los items de la factura), que se leen con una consulta adicional por
+cada FETCH_CHUNK_SIZE filas. Los
+campos que no tienen conversión directa usan su propio to_representation().
+"""
+
+from collections import defaultdict
+from decimal import Decimal
+from itertools import islice
+from operator import itemgetter
+
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+
+# Ids de padres por consulta al leer las listas anidadas: un IN acotado sin
+# importar cuántas filas se serialicen (SQLite limita los parámetros por consulta)
+FETCH_CHUNK_SIZE = 500
+
+
+class RowSerializer:
+    """Versión por tuplas de `serializer_class` (un ModelSerializer de solo lectura)."""
+
+    # Filas por tramo en serialize_chunks()
+    chunk_size = 1000
+
+    def __init__(self, serializer_class):
+        self.serializer_class = serializer_class
+        self._plan = None
+
+    @property
+    def plan(self):
+        # Se compila al primer uso: los campos del serializer dependen de los ajustes
+        if self._plan is None:
+            self._plan = _Plan(self.serializer_class())
+        return self._plan
+
+    def values(self, queryset):
+        """El queryset como tuplas con las columnas del plan (conserva filtros y orden)."""
+        return queryset.select_related(None).prefetch_related(None).values_list(*self.plan.lookups)
+
+    def serialize(self, rows):
+        """Lista de dicts, igual a serializer_class(objetos, many=True).data, para filas de values()."""
+        rows = rows if isinstance(rows, list) else list(rows)
+        if not rows:
+            return []
+        plan = self.plan
+        ids = [row[plan.pk_index] for row in rows]
+        build = plan.builder({name: child.fetch(relation, ids) for name, relation, child in plan.children})
+        return [build(row) for row in rows]
+
+    def serialize_chunks(self, queryset):
+        """
+        Como serialize(), pero lee el queryset de values() con un cursor y
+        entrega listas de a lo sumo `chunk_size` dicts, para no tener en
+        memoria una lista completa de miles de facturas.
+        """
+        rows = queryset.iterator(chunk_size=self.chunk_size)
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield self.serialize(chunk)
+
+
+class _Plan:
+    """Columnas y conversiones de un ModelSerializer; `prefix` es el camino desde el modelo raíz."""
+
+    def __init__(self, serializer, prefix='', lookups=None, nested=False):
+        self.model = serializer.Meta.model
+        self.lookups = [] if lookups is None else lookups
+        self.pk_index = self._column(prefix + 'pk')
+        self.entries = []  # (nombre, tipo, dato)
+        self.children = []  # (nombre, relación inversa, _Plan del hijo)
+        for name, field in serializer.fields.items():
+            if field.write_only:
+                continue
+            source = field.source
+            if source == '*' or '.' in source:
+                raise ImproperlyConfigured(f"RowSerializer no admite source='{source}' ({name}).")
+            if isinstance(field, serializers.ListSerializer):
+                if nested:
+                    raise ImproperlyConfigured(f"RowSerializer solo admite listas anidadas en el primer nivel ({name}).")
+                relation = self.model._meta.get_field(source)
+                child = _Plan(field.child, nested=True)
+                self.children.append((name, relation, child))
+                self.entries.append((name, 'children', None))
+            elif isinstance(field, serializers.BaseSerializer):
+                self.entries.append((name, 'nested', _Plan(field, f'{prefix}{source}__', self.lookups, nested=True)))
+            elif isinstance(field, serializers.RelatedField) and not isinstance(field, serializers.PrimaryKeyRelatedField):
+                raise ImproperlyConfigured(f"RowSerializer no admite {type(field).__name__} ({name}).")
+            else:
+                self.entries.append((name, 'column', (self._column(prefix + source), field)))
+
+    def _column(self, lookup):
+        self.lookups.append(lookup)
+        return len(self.lookups) - 1
+
+    def builder(self, children=None):
+        """Función fila -> dict; las conversiones se resuelven aquí, una vez por lista."""
+        getters = []
+        for name, kind, data in self.entries:
+            if kind == 'column':
+                getters.append((name, _getter(data[0], _converter(data[1]))))
+            elif kind == 'nested':
+                getters.append((name, _nested_getter(data.pk_index, data.builder())))
+            else:
+                getters.append((name, _children_getter(self.pk_index, children[name])))
+
+        def build(row):
+            return {name: get(row) for name, get in getters}
+        return build
+
+    def fetch(self, relation, ids):
+        """Filas hijas de la relación inversa agrupadas por id del padre, ya serializadas."""
+        fk = relation.field
+        queryset = relation.related_model._default_manager.order_by('pk').values_list(fk.attname, *self.lookups)
+        build = self.builder()
+        grouped = defaultdict(list)
+        for start in range(0, len(ids), FETCH_CHUNK_SIZE):
+            for row in queryset.filter(**{f'{fk.attname}__in': ids[start:start + FETCH_CHUNK_SIZE]}):
+                grouped[row[0]].append(build(row[1:]))
+        return grouped
+
+
+def _getter(index, convert):
+    if convert is None:
+        return itemgetter(index)
+
+    def get(row):
+        value = row[index]
+        return None if value is None else convert(value)
+    return get
+
+
+def _nested_getter(pk_index, build):
+    def get(row):
+        return None if row[pk_index] is None else build(row)
+    return get
+
+
+def _children_getter(pk_index, grouped):
+    return lambda row: grouped.get(row[pk_index], [])
+
+
+def _converter(field):
+    """Conversión equivalente a field.to_representation(), o None si el valor ya sirve tal cual."""
+    if isinstance(field, serializers.DecimalField):
+        coerce_to_string = getattr(field, 'coerce_to_string', api_settings.COERCE_DECIMAL_TO_STRING)
+        if coerce_to_string and not field.localize and not field.normalize_output and field.decimal_places is not None:
+            exponent = Decimal(1).scaleb(-field.decimal_places)
+            rounding = field.rounding
+            return lambda value: format(value.quantize(exponent, rounding=rounding), 'f')
+    elif isinstance(field, serializers.DateTimeField):
+        output_format = getattr(field, 'format', api_settings.DATETIME_FORMAT)
+        zone = field.timezone if hasattr(field, 'timezone') else field.default_timezone()
+        if output_format is not None and output_format.lower() == ISO_8601 and zone is not None:
+            def convert(value):
+                text = value.astimezone(zone).isoformat()
+                return text[:-6] + 'Z' if text.endswith('+00:00') else text
+            return convert
+    elif isinstance(field, (serializers.CharField, serializers.IntegerField, serializers.BooleanField,
+                            serializers.PrimaryKeyRelatedField)):
+        # Los tipos que devuelve la base de datos ya son los de la representación
+        if not isinstance(field, serializers.PrimaryKeyRelatedField) or field.pk_field is None:
+            return None
+    elif isinstance(field, serializers.ChoiceField):
+        if all(isinstance(key, str) for key in field.choices):
+            return None
+    return field.to_representation
@@ -1,13 +1,24 @@
 # api/serializers.py
 
+import itertools
+
 from rest_framework import serializers
+from django.conf import settings
 from django.db import transaction
 from django.utils import timezone
 from .models import (
-    User, Role, Office, Permission, Client, Invoice, MerchandiseItem,
+    User, Role, Office, OfficeRoute, Permission, Client, Invoice, MerchandiseItem,
     Vehicle, ShipmentManifest, Expense, AuditLog, CompanyInfo,
-    Supplier, AssetCategory, Asset, ShippingType, PaymentMethod, ExpenseCategory, Category
+    Supplier, AssetCategory, Asset, ShippingType, PaymentMethod, ExpenseCategory, Category,
+    ExchangeRate, StatusChange, DeliveryEvent, VehicleEvent
 )
+from . import fleet
+from . import manifests
+from . import reports
+from . import sync
+from . import transitions
+from . import currency as currencies
+from .row_serializers import RowSerializer
 
 class PermissionSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,6 +30,18 @@ class OfficeSerializer(serializers.ModelSerializer):
         model = Office
         fields = '__all__'
 
+class OfficeRouteSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = OfficeRoute
+        fields = '__all__'
+
+    def validate(self, data):
+        origin = data.get('origin', getattr(self.instance, 'origin', None))
+        destination = data.get('destination', getattr(self.instance, 'destination', None))
+        if origin is not None and origin == destination:
+            raise serializers.ValidationError("El origen y el destino del tramo deben ser oficinas distintas.")
+        return data
+
 class RoleSerializer(serializers.ModelSerializer):
     permissions = serializers.SerializerMethodField()
     class Meta:
@@ -64,6 +87,9 @@ class InvoiceSerializer(serializers.ModelSerializer):
         model = Invoice
         fields = '__all__'
 
+# Las listas de facturas se arman desde values_list(), sin una instancia por fila
+invoice_rows = RowSerializer(InvoiceSerializer)
+
 # Reemplaza tu clase CreateInvoiceSerializer con esta
 class CreateInvoiceSerializer(serializers.ModelSerializer):
     sender = ClientSerializer()
@@ -86,7 +112,8 @@ class CreateInvoiceSerializer(serializers.ModelSerializer):
         )
 
     def create(self, validated_data):
-        with transaction.atomic():
+        # El log de sincronización de la factura, sus items y clientes, en un solo INSERT
+        with transaction.atomic(), sync.deferred():
             sender_data = validated_data.pop('sender')
             recipient_data = validated_data.pop('recipient')
             items_data = validated_data.pop('items')
@@ -107,13 +134,14 @@ class CreateInvoiceSerializer(serializers.ModelSerializer):
             office_for_update.next_invoice_number += 1
             office_for_update.save()
 
-            # Crear la factura con todos los datos
+            # Crear la factura con todos los datos (y la tasa BCV del día)
             invoice = Invoice.objects.create(
                 sender=sender, 
                 recipient=recipient, 
                 created_by=user, 
                 origin_office=origin_office, 
                 invoice_number=invoice_number, 
+                exchange_rate=currencies.rate_on(timezone.localdate()),
                 **validated_data
             )
             
@@ -142,32 +170,131 @@ class VehicleSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Solo se permiten imágenes en formato JPG o PNG.")
         return value
 
+    @transaction.atomic
+    def update(self, instance, validated_data):
+        # Entrar o salir de mantenimiento editando el estado abre o cierra la
+        # ventana en el historial, igual que las acciones de VehicleViewSet
+        previous = instance.status
+        instance = super().update(instance, validated_data)
+        if previous != instance.status == 'En Mantenimiento':
+            fleet.open_maintenance(instance)
+        elif previous == 'En Mantenimiento' != instance.status:
+            fleet.close_maintenance(instance)
+        return instance
+
 class ShipmentManifestSerializer(serializers.ModelSerializer):
     invoices = InvoiceSerializer(many=True, read_only=True)
     class Meta:
         model = ShipmentManifest
         fields = '__all__'
-        read_only_fields = ('manifest_number', 'status', 'departure_time', 'arrival_time')
+        read_only_fields = ('manifest_number', 'office', 'status', 'departure_time', 'arrival_time')
+
+    def create(self, validated_data):
+        # El número se asigna por oficina y día (ver api/manifests.py)
+        return manifests.create(self.context['request'].user.office, validated_data['vehicle'], validated_data.get('driver'))
+
+class BulkStatusSerializer(serializers.Serializer):
+    """Cambio de estado masivo: {'ids': [...], 'field': 'payment_status', 'status': 'PAGADA'}."""
+    MAX_IDS = 5000
+
+    ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False, max_length=MAX_IDS)
+    field = serializers.ChoiceField(choices=list(transitions.TRANSITIONS))
+    status = serializers.CharField()
+
+    def validate(self, attrs):
+        if attrs['status'] not in transitions.TRANSITIONS[attrs['field']]:
+            raise serializers.ValidationError({'status': f"Estado desconocido para {attrs['field']}."})
+        return attrs
 
 class DispatchSerializer(serializers.Serializer):
     invoice_ids = serializers.ListField(child=serializers.IntegerField())
     driver_id = serializers.IntegerField(required=False)
+
+    def validate_driver_id(self, value):
+        try:
+            return User.objects.get(pk=value)
+        except User.DoesNotExist:
+            raise serializers.ValidationError("El conductor especificado no existe.")
+
     def update(self, instance, validated_data):
-        # ... (lógica de despacho sin cambios)
-        invoice_ids = validated_data.get('invoice_ids'); driver_id = validated_data.get('driver_id')
-        with transaction.atomic():
-            if instance.status != 'PLANIFICADO': raise serializers.ValidationError("Este manifiesto ya ha sido despachado o finalizado.")
-            vehicle = instance.vehicle
-            if vehicle.status != 'DISPONIBLE': raise serializers.ValidationError(f"El vehículo {vehicle.license_plate} no está disponible.")
-            if driver_id:
-                try: driver = User.objects.get(pk=driver_id); instance.driver = driver
-                except User.DoesNotExist: raise serializers.ValidationError("El conductor especificado no existe.")
-            invoices_to_dispatch = Invoice.objects.filter(pk__in=invoice_ids, shipping_status='PENDIENTE_DESPACHO')
-            if len(invoices_to_dispatch) != len(invoice_ids): raise serializers.ValidationError("Una o más facturas no existen o no están pendientes para despacho.")
-            invoices_to_dispatch.update(manifest=instance, shipping_status='EN_TRANSITO')
-            instance.status = 'EN_RUTA'; instance.departure_time = timezone.now(); instance.save()
-            vehicle.status = 'EN_RUTA'; vehicle.save()
-            return instance
+        return manifests.dispatch(instance, validated_data['invoice_ids'], validated_data.get('driver_id'))
+
+class CreateDispatchSerializer(DispatchSerializer):
+    """Crea un manifiesto de la oficina del usuario y lo despacha (ver api/manifests.py)."""
+    vehicle = serializers.PrimaryKeyRelatedField(queryset=Vehicle.objects.all())
+    invoice_ids = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+
+    def create(self, validated_data):
+        return manifests.create_and_dispatch(
+            self.context['request'].user.office, validated_data['vehicle'],
+            validated_data['invoice_ids'], validated_data.get('driver_id'),
+        )
+
+class ReturnedInvoiceSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    reason = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+class FinalizeTripSerializer(serializers.Serializer):
+    """Fin del viaje: {'returned': [{'id': 12, 'reason': 'Destinatario ausente'}]}; las demás facturas se entregan."""
+    returned = ReturnedInvoiceSerializer(many=True, required=False, default=list)
+    distance_km = serializers.DecimalField(
+        max_digits=10, decimal_places=2, min_value=0, required=False,
+        help_text="Kilómetros recorridos; si no se indican, los de la ruta planificada",
+    )
+
+    def validate_returned(self, value):
+        return {item['id']: item['reason'] for item in value}
+
+class VehicleEventSerializer(serializers.ModelSerializer):
+    manifest_number = serializers.CharField(source='manifest.manifest_number', read_only=True, default=None)
+    class Meta:
+        model = VehicleEvent
+        fields = (
+            'id', 'kind', 'manifest', 'manifest_number', 'driver', 'started_at', 'ended_at',
+            'distance_km', 'load_kg', 'kg_km', 'notes',
+        )
+
+class MaintenanceSerializer(serializers.Serializer):
+    notes = serializers.CharField(max_length=255, required=False, allow_blank=True, default='')
+
+class VehicleUtilizationSerializer(serializers.Serializer):
+    """Uso de un vehículo (ver api/fleet.py)."""
+    vehicle = serializers.IntegerField()
+    license_plate = serializers.CharField()
+    status = serializers.CharField()
+    capacity_kg = serializers.DecimalField(max_digits=10, decimal_places=2)
+    trips = serializers.IntegerField()
+    trip_hours = serializers.FloatField()
+    distance_km = serializers.DecimalField(max_digits=12, decimal_places=2)
+    kg_km = serializers.DecimalField(max_digits=18, decimal_places=2)
+    utilization_pct = serializers.DecimalField(max_digits=7, decimal_places=1, allow_null=True)
+    maintenance_count = serializers.IntegerField()
+    maintenance_hours = serializers.FloatField()
+    last_active_at = serializers.DateTimeField(allow_null=True)
+    idle_days = serializers.IntegerField(allow_null=True)
+
+class DeliveryEventSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DeliveryEvent
+        fields = ('id', 'invoice_id', 'invoice_number', 'outcome', 'reason', 'recorded_by', 'created_at')
+
+class RouteStopSerializer(serializers.Serializer):
+    office = serializers.IntegerField()
+    name = serializers.CharField()
+    via = serializers.ListField(child=serializers.CharField())
+    invoices = serializers.ListField(child=serializers.CharField())
+    travel_minutes = serializers.IntegerField()
+    distance_km = serializers.DecimalField(max_digits=10, decimal_places=2)
+    eta = serializers.DateTimeField()
+
+class RouteSerializer(serializers.Serializer):
+    """Paradas de un manifiesto en orden de visita (ver api/routing.py)."""
+    manifest = serializers.CharField()
+    origin = serializers.DictField()
+    departure_time = serializers.DateTimeField()
+    stops = RouteStopSerializer(many=True)
+    total_minutes = serializers.IntegerField()
+    total_distance_km = serializers.DecimalField(max_digits=10, decimal_places=2)
 
 class ExpenseSerializer(serializers.ModelSerializer):
     created_by = UserSerializer(read_only=True)
@@ -223,9 +350,29 @@ class CompanyInfoSerializer(serializers.ModelSerializer):
     def validate_logo(self, value):
         return self.validate_image(value, 'logo')
 
+    def validate_bcvRate(self, value):
+        return validate_positive_rate(value)
+
+    def validate_bcv_rate(self, value):
+        return validate_positive_rate(value)
+
     def validate_login_image(self, value):
         return self.validate_image(value, 'login_image')
 
+def validate_positive_rate(value):
+    # Las conversiones en SQL (api/currency.py) dividen y multiplican por la tasa
+    if value is not None and value <= 0:
+        raise serializers.ValidationError("La tasa debe ser mayor que cero.")
+    return value
+
+class ExchangeRateSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ExchangeRate
+        fields = '__all__'
+
+    def validate_rate(self, value):
+        return validate_positive_rate(value)
+
 class SupplierSerializer(serializers.ModelSerializer):
     # Mapea los nombres del frontend al backend
     idNumber = serializers.CharField(source='rif', required=False, allow_blank=True)
@@ -272,4 +419,92 @@ class ExpenseCategorySerializer(serializers.ModelSerializer):
 class CategorySerializer(serializers.ModelSerializer):
     class Meta:
         model = Category
-        fields = '__all__'
\ No newline at end of file
+        fields = '__all__'
+
+# --- FEED DE CAMBIOS ---
+
+class StatusChangeSerializer(serializers.ModelSerializer):
+    seq = serializers.IntegerField(source='id', read_only=True)
+    class Meta:
+        model = StatusChange
+        fields = ['seq', 'entity', 'object_id', 'number', 'field', 'old_value', 'new_value', 'created_at']
+
+class ChangeFeedQuerySerializer(serializers.Serializer):
+    """Parámetros del feed: ?since=<seq> (sin él se empieza desde el cambio más reciente) y ?wait=<segundos>."""
+    since = serializers.IntegerField(min_value=0, required=False)
+    wait = serializers.IntegerField(min_value=0, default=0)
+
+    def validate_wait(self, value):
+        return min(value, settings.CHANGE_FEED_MAX_WAIT)
+
+# --- RASTREO PÚBLICO ---
+
+class TrackingSerializer(serializers.ModelSerializer):
+    """Datos públicos de un envío: sin clientes ni montos."""
+    shipping_status_display = serializers.CharField(source='get_shipping_status_display', read_only=True)
+    origin_office = serializers.CharField(source='origin_office.name', read_only=True)
+    destination_office = serializers.CharField(source='destination_office.name', read_only=True)
+    manifest_status = serializers.CharField(source='manifest.status', read_only=True, default=None)
+    departure_time = serializers.DateTimeField(source='manifest.departure_time', read_only=True, default=None)
+    arrival_time = serializers.DateTimeField(source='manifest.arrival_time', read_only=True, default=None)
+    class Meta:
+        model = Invoice
+        fields = [
+            'invoice_number', 'shipping_status', 'shipping_status_display', 'created_at', 'origin_office',
+            'destination_office', 'manifest_status', 'departure_time', 'arrival_time',
+        ]
+
+class CleanupSerializer(serializers.Serializer):
+    """
+    Días a conservar y lotes como máximo de una ejecución del archivo (ver
+    api/archive.py). Desde el API nunca más de ARCHIVE_API_MAX_BATCHES por
+    tabla; las ejecuciones sin límite, con `python manage.py archive_data`.
+    """
+    invoice_days = serializers.IntegerField(min_value=1, required=False)
+    audit_days = serializers.IntegerField(min_value=1, required=False)
+    max_batches = serializers.IntegerField(min_value=1, required=False)
+
+    def validate(self, attrs):
+        limit = settings.ARCHIVE_API_MAX_BATCHES
+        attrs['max_batches'] = min(attrs.get('max_batches', limit), limit)
+        return attrs
+
+# --- SINCRONIZACIÓN ---
+
+class SyncQuerySerializer(serializers.Serializer):
+    """Parámetros del sync: ?since=<marca> y ?entities=client,invoice (por defecto, todas)."""
+    since = serializers.IntegerField(min_value=0, required=False)
+    entities = serializers.CharField(required=False)
+
+    def validate_entities(self, value):
+        entities = {entity.strip() for entity in value.split(',') if entity.strip()}
+        unknown = entities - set(sync.ENTITIES.values())
+        if unknown:
+            raise serializers.ValidationError(f"Entidades desconocidas: {', '.join(sorted(unknown))}.")
+        return entities
+
+# --- REPORTES ---
+
+class ProfitAndLossQuerySerializer(serializers.Serializer):
+    """Valida los parámetros del reporte de ganancias y pérdidas."""
+    MAX_PERIODS = 400
+    PERIOD_LABELS = {'day': 'días', 'week': 'semanas', 'month': 'meses'}
+
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    granularity = serializers.ChoiceField(choices=['day', 'week', 'month'], default='month')
+    currency = serializers.ChoiceField(choices=currencies.CURRENCIES, required=False)
+
+    def validate(self, attrs):
+        today = timezone.localdate()
+        attrs.setdefault('end', today)
+        attrs.setdefault('start', attrs['end'].replace(day=1))
+        attrs.setdefault('currency', currencies.reporting_currency())
+        if attrs['start'] > attrs['end']:
+            raise serializers.ValidationError("La fecha de inicio debe ser anterior a la fecha final.")
+        # Se cuentan sin recorrer más allá del límite, sea cual sea la granularidad
+        periods = reports.iter_periods(attrs['start'], attrs['end'], attrs['granularity'])
+        if len(list(itertools.islice(periods, self.MAX_PERIODS + 1))) > self.MAX_PERIODS:
+            label = self.PERIOD_LABELS[attrs['granularity']]
+            raise serializers.ValidationError(f"El rango no puede superar {self.MAX_PERIODS} {label}.")
+        return attrs
@@ -1,8 +1,20 @@
 # api/signals.py
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.db import transaction
 from django.dispatch import receiver
-from .models import Invoice, Expense, AuditLog, User
+from django.utils import timezone
+from .models import (
+    Invoice, Expense, AuditLog, User, MerchandiseItem, CompanyInfo, ExchangeRate, ShipmentManifest,
+    Office, OfficeRoute, Role, Permission, ShippingType, PaymentMethod, ExpenseCategory, Category, AssetCategory
+)
+from . import reports
+from . import changefeed
+from . import dashboard
+from . import sync
+from . import tracking
+from . import currency as currencies
+from .cache import on_commit_too, reference_namespace
 
 # Este decorador conecta nuestra función a la señal 'post_save' para el modelo Invoice
 @receiver(post_save, sender=Invoice)
@@ -30,4 +42,137 @@ def log_expense_creation(sender, instance, created, **kwargs):
         )
 
 # Podríamos añadir más señales para login, modificación de usuarios, etc.
-# Por ahora, estas dos son un excelente ejemplo.
\ No newline at end of file
+# Por ahora, estas dos son un excelente ejemplo.
+
+# --- Invalidación de los reportes de ganancias y pérdidas ---
+# Nota: los .update() masivos no disparan señales; quien los use debe llamar
+# a reports.invalidate_period() para los periodos afectados.
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Expense)
+@receiver(post_delete, sender=Expense)
+def invalidate_report_period(sender, instance, **kwargs):
+    on_commit_too(lambda: reports.invalidate_period(instance.created_at))
+
+@receiver(post_save, sender=MerchandiseItem)
+@receiver(post_delete, sender=MerchandiseItem)
+def invalidate_report_period_for_item(sender, instance, **kwargs):
+    # En un borrado en cascada la factura ya no existe; su propia señal se encarga
+    if sender.invoice.is_cached(instance):
+        created_at = instance.invoice.created_at
+    else:
+        created_at = Invoice.objects.filter(pk=instance.invoice_id).values_list('created_at', flat=True).first()
+    on_commit_too(lambda: reports.invalidate_period(created_at))
+
+# --- Feed de cambios de estado ---
+# Los .update() masivos pasan por changefeed.update(), que registra sus transiciones
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_save, sender=ShipmentManifest)
+def record_status_change(sender, instance, created, update_fields=None, **kwargs):
+    changefeed.record_save(instance, created, update_fields)
+
+@receiver(post_delete, sender=Invoice)
+def uncount_invoice(sender, instance, **kwargs):
+    # Las transiciones ajustan el conteo del dashboard en changefeed; los borrados, aquí
+    status = instance.shipping_status
+    transaction.on_commit(lambda: dashboard.apply({status: -1}))
+
+# --- Caché del rastreo público ---
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+def invalidate_tracking(sender, instance, **kwargs):
+    on_commit_too(lambda: tracking.invalidate([instance.invoice_number]))
+
+@receiver(post_save, sender=ShipmentManifest)
+def invalidate_manifest_tracking(sender, instance, created, **kwargs):
+    # El rastreo muestra el estado y las horas de salida y llegada del manifiesto
+    if not created:
+        numbers = list(instance.invoices.values_list('invoice_number', flat=True))
+        on_commit_too(lambda: tracking.invalidate(numbers))
+
+# --- Histórico de tasas del BCV ---
+
+@receiver(post_save, sender=CompanyInfo)
+def record_bcv_rate(sender, instance, created, **kwargs):
+    """
+    Cada vez que se actualiza la tasa de la empresa queda registrada como
+    la tasa del día en el histórico.
+    """
+    if created:
+        return
+    today = timezone.localdate()
+    latest = ExchangeRate.objects.filter(date__lte=today).order_by('-date').values_list('rate', flat=True).first()
+    if latest is not None and latest == instance.bcv_rate:
+        return
+    ExchangeRate.objects.update_or_create(date=today, defaults={'rate': instance.bcv_rate})
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_exchange_rates(sender, instance, **kwargs):
+    on_commit_too(currencies.invalidate_rate_table)
+    on_commit_too(reports.invalidate_all)
+
+# --- Caché de datos de referencia ---
+# Modelo modificado -> modelos cuya representación cacheada depende de él
+# (los roles se serializan con las claves de sus permisos).
+REFERENCE_DEPENDENCIES = {
+    Office: (Office,),
+    OfficeRoute: (OfficeRoute,),
+    Role: (Role,),
+    Permission: (Permission, Role),
+    ShippingType: (ShippingType,),
+    PaymentMethod: (PaymentMethod,),
+    ExpenseCategory: (ExpenseCategory,),
+    Category: (Category,),
+    AssetCategory: (AssetCategory,),
+    CompanyInfo: (CompanyInfo,),
+}
+
+def invalidate_reference_cache(sender, **kwargs):
+    for model in REFERENCE_DEPENDENCIES[sender]:
+        on_commit_too(reference_namespace(model).invalidate)
+
+for reference_model in REFERENCE_DEPENDENCIES:
+    post_save.connect(invalidate_reference_cache, sender=reference_model, dispatch_uid=f'ref-cache-save-{reference_model.__name__}')
+    post_delete.connect(invalidate_reference_cache, sender=reference_model, dispatch_uid=f'ref-cache-delete-{reference_model.__name__}')
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def invalidate_role_permissions_cache(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        on_commit_too(reference_namespace(Role).invalidate)
+
+# --- Log de sincronización incremental (api/sync.py) ---
+
+def log_sync_save(sender, instance, **kwargs):
+    sync.log(instance)
+
+def log_sync_delete(sender, instance, **kwargs):
+    sync.log(instance, deleted=True)
+
+for synced_model in sync.ENTITIES:
+    post_save.connect(log_sync_save, sender=synced_model, dispatch_uid=f'sync-save-{synced_model.__name__}')
+    post_delete.connect(log_sync_delete, sender=synced_model, dispatch_uid=f'sync-delete-{synced_model.__name__}')
+
+@receiver(post_save, sender=MerchandiseItem)
+@receiver(post_delete, sender=MerchandiseItem)
+def log_sync_invoice_items(sender, instance, **kwargs):
+    # Los items viajan dentro de la factura
+    sync.log_bulk(Invoice, [instance.invoice_id])
+
+@receiver(m2m_changed, sender=Role.permissions.through)
+def log_sync_role_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        sync.log(instance)
+    elif pk_set:
+        sync.log_bulk(Role, pk_set)
+
+@receiver(post_save, sender=Permission)
+def log_sync_permission_roles(sender, instance, created, **kwargs):
+    # Los roles se serializan con las claves de sus permisos
+    if not created:
+        sync.log_bulk(Role, instance.role_set.values_list('pk', flat=True))
@@ -0,0 +1,165 @@
+# api/sync.py
+
+"""
+Sincronización incremental para los clientes de las sucursales.
+
+Cada save() o delete() de los modelos sincronizados agrega una fila a
+SyncLog (ver api/signals.py) en la misma transacción que el cambio; dentro
+de un bloque deferred() se escriben todas juntas al final, una sola vez por
+objeto. El id de la fila es la marca de agua del cliente:
+
+    GET /api/sync/?since=<marca>[&entities=client,invoice]
+
+devuelve, por entidad, los objetos cambiados desde la marca (con la misma
+representación que su endpoint de lista) y los ids borrados, junto con la
+nueva marca. Mientras `has_more` sea true se repite con la nueva marca.
+
+Sin marca, o si es anterior al log conservado (ver prune()), la respuesta
+trae `full_resync: true`: el cliente descarga todo con los endpoints de
+lista y después sincroniza desde la marca recibida, que se toma antes de la
+descarga para no perder los cambios que ocurran mientras tanto.
+"""
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Max, Min
+from django.utils import timezone
+
+from . import changefeed
+from .models import (
+    AssetCategory, Category, Client, ExpenseCategory, Invoice, Office, PaymentMethod, Permission, Role,
+    ShipmentManifest, ShippingType, SyncLog, Vehicle,
+)
+
+# Modelo sincronizado -> nombre de la entidad en la API
+ENTITIES = {
+    Client: 'client',
+    Invoice: 'invoice',
+    ShipmentManifest: 'manifest',
+    Vehicle: 'vehicle',
+    Office: 'office',
+    Role: 'role',
+    Permission: 'permission',
+    ShippingType: 'shipping_type',
+    PaymentMethod: 'payment_method',
+    ExpenseCategory: 'expense_category',
+    Category: 'category',
+    AssetCategory: 'asset_category',
+}
+
+
+class _Batch:
+    """
+    Cambios de una unidad de trabajo, una vez por objeto. Lo registrado en
+    un savepoint revertido queda en el lote: un objeto de más solo se
+    reenvía, y los borrados se verifican antes de escribir.
+    """
+
+    def __init__(self):
+        self.rows = {}
+
+    def add(self, entity, ids, deleted):
+        rows = self.rows
+        for pk in ids:
+            # Un objeto borrado sigue borrado aunque después se toquen sus items
+            rows[entity, pk] = deleted or rows.get((entity, pk), False)
+
+    def write(self):
+        rows = self.rows
+        # Un borrado dentro de un savepoint revertido no debe llegar a los clientes
+        models = {entity: model for model, entity in ENTITIES.items()}
+        deleted = {}
+        for (entity, pk), is_deleted in rows.items():
+            if is_deleted:
+                deleted.setdefault(entity, []).append(pk)
+        for entity, ids in deleted.items():
+            for pk in models[entity]._base_manager.filter(pk__in=ids).values_list('pk', flat=True):
+                rows[entity, pk] = False
+        _write(rows.items())
+
+
+_batch = ContextVar('sync_batch', default=None)
+
+
+def _write(rows):
+    SyncLog.objects.bulk_create([
+        SyncLog(entity=entity, object_id=pk, deleted=deleted) for (entity, pk), deleted in rows
+    ])
+
+
+@contextmanager
+def deferred():
+    """
+    Junta los cambios del bloque y los escribe con un solo INSERT al salir.
+    Va dentro del transaction.atomic() de la unidad de trabajo, para que el
+    log se confirme o se revierta junto con los datos; si el bloque falla,
+    el lote se descarta. Los bloques anidados se suman al exterior.
+    """
+    if _batch.get() is not None:
+        yield
+        return
+    batch = _Batch()
+    token = _batch.set(batch)
+    try:
+        yield
+    finally:
+        _batch.reset(token)
+    batch.write()
+
+
+def log(instance, deleted=False):
+    log_bulk(type(instance), [instance.pk], deleted)
+
+
+def log_bulk(model, ids, deleted=False):
+    """
+    Registra cambios de inmediato o, dentro de deferred(), al final del
+    bloque. Los .update() y borrados masivos, que no disparan señales,
+    llaman directamente.
+    """
+    entity = ENTITIES[model]
+    batch = _batch.get()
+    if batch is None:
+        _write(((entity, pk), deleted) for pk in ids)
+    else:
+        batch.add(entity, ids, deleted)
+
+
+def head():
+    return SyncLog.objects.aggregate(head=Max('id'))['head'] or 0
+
+
+def needs_full_resync(since):
+    """La marca es anterior al log conservado, o posterior a él (base de datos restaurada)."""
+    bounds = SyncLog.objects.aggregate(first=Min('id'), last=Max('id'))
+    if bounds['first'] is None:
+        return since != 0
+    return since < bounds['first'] - 1 or since > bounds['last']
+
+
+def read(since, limit=None):
+    """
+    Cambios posteriores a `since` como ({entidad: (ids cambiados, ids borrados)},
+    nueva marca, has_more). Para cada objeto cuenta solo su último cambio.
+    """
+    limit = limit or settings.SYNC_PAGE_SIZE
+    fetched = list(SyncLog.objects.filter(id__gt=since).order_by('id')[:limit])
+    rows = changefeed.settled(fetched, since)
+    latest = {(row.entity, row.object_id): row.deleted for row in rows}
+    changes = {}
+    for (entity, object_id), deleted in latest.items():
+        changed, removed = changes.setdefault(entity, ([], []))
+        (removed if deleted else changed).append(object_id)
+    cursor = rows[-1].id if rows else since
+    return changes, cursor, len(rows) == limit
+
+
+def prune(days=None):
+    """Borra el log anterior a SYNC_LOG_RETENTION_DAYS (conserva siempre la última fila)."""
+    days = settings.SYNC_LOG_RETENTION_DAYS if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+    deleted, _ = SyncLog.objects.filter(created_at__lt=cutoff, id__lt=head()).delete()
+    return deleted
@@ -1,3 +1,1670 @@
-from django.test import TestCase
+import gzip
+import io
+import json
+import os
+import re
+import tempfile
+import zlib
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection, transaction
+import asyncio
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework import serializers
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from .models import (
+    ArchivedAuditLog, ArchivedInvoice, AuditLog, Client, CompanyInfo, Expense, ExchangeRate, IdempotencyKey, Invoice,
+    MerchandiseItem, Office, OfficeRoute, Permission, Role,
+    ShipmentManifest, StatusChange, SyncLog, User, Vehicle, VehicleEvent,
+)
+from . import archive, async_views, backup, changefeed, compression, currency, dashboard, db_router, documents, fleet, idempotency, manifests, pdf, reports, routing, sync, tracking
+from .cache import CacheNamespace
+from .renderers import FastJSONRenderer
+from .row_serializers import RowSerializer
+from .serializers import InvoiceSerializer, invoice_rows
+from .views import visible_invoices
+
+
+class ApiTestCase(TestCase):
+    """Datos base compartidos por las pruebas de la API."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.caracas = Office.objects.create(name='Caracas', address='Av. Principal')
+        cls.valencia = Office.objects.create(name='Valencia', address='Av. Bolívar')
+        cls.role = Role.objects.create(name='Reportes')
+        cls.role.permissions.add(Permission.objects.get_or_create(key='reports.view', defaults={'description': 'Ver Reportes'})[0])
+        cls.user = User.objects.create_user('operador', 'clave-segura', office=cls.caracas, role=cls.role)
+        cls.sender = Client.objects.create(id_type='V', id_number='1000', name='Remitente')
+        cls.recipient = Client.objects.create(id_type='V', id_number='2000', name='Destinatario')
+
+    def setUp(self):
+        cache.clear()
+        tracking.clear_local_cache()
+        currency.invalidate_rate_table()
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def create_invoice(self, number, total, origin=None, destination=None, weight=None, **extra):
+        invoice = Invoice.objects.create(
+            invoice_number=number, sender=self.sender, recipient=self.recipient,
+            origin_office=origin or self.caracas, destination_office=destination or self.valencia,
+            created_by=self.user, subtotal=total, tax=0, total=total, **extra
+        )
+        if weight is not None:
+            MerchandiseItem.objects.create(invoice=invoice, quantity=1, description='Caja', weight=weight)
+        return invoice
+
+
+class ProfitAndLossReportTests(ApiTestCase):
+    url = '/api/reports/profit-loss/'
+
+    def test_groups_by_route_and_excludes_voided_invoices(self):
+        self.create_invoice('C-000001', Decimal('100.00'), weight=Decimal('10.00'))
+        self.create_invoice('C-000002', Decimal('50.00'), weight=Decimal('5.50'))
+        self.create_invoice('C-000003', Decimal('999.00'), payment_status='ANULADA')
+        self.create_invoice('V-000001', Decimal('30.00'), origin=self.valencia, destination=self.caracas)
+        Expense.objects.create(description='Combustible', amount=Decimal('40.00'), office=self.caracas, created_by=self.user)
+
+        response = self.api.get(self.url, {'granularity': 'month'})
+        self.assertEqual(response.status_code, 200)
+        period = response.data['periods'][-1]
+        self.assertFalse(period['closed'])
+
+        routes = {(r['origin_office'], r['destination_office']): r for r in period['routes']}
+        route = routes[(self.caracas.id, self.valencia.id)]
+        self.assertEqual(route['revenue'], Decimal('150.00'))
+        self.assertEqual(route['kilos'], Decimal('15.50'))
+        self.assertEqual(route['guides'], 2)
+
+        offices = {o['office']: o for o in period['offices']}
+        self.assertEqual(offices[self.caracas.id]['net_income'], Decimal('110.00'))
+        self.assertEqual(period['totals']['revenue'], Decimal('180.00'))
+        self.assertEqual(period['totals']['net_income'], Decimal('140.00'))
+
+    def test_range_is_capped_for_every_granularity(self):
+        for granularity, start in (('day', '2024-01-01'), ('week', '0001-01-01'), ('month', '1900-01-01')):
+            with self.subTest(granularity=granularity):
+                response = self.api.get(self.url, {'granularity': granularity, 'start': start, 'end': '2026-01-01'})
+                self.assertEqual(response.status_code, 400)
+        response = self.api.get(self.url, {'granularity': 'month', 'start': '2000-01-01', 'end': '2026-01-01'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_closed_periods_are_cached_and_invalidated_on_write(self):
+        invoice = self.create_invoice('C-000001', Decimal('100.00'))
+        last_month = timezone.now() - timedelta(days=40)
+        Invoice.objects.filter(pk=invoice.pk).update(created_at=last_month)
+        day = timezone.localtime(last_month).date()
+
+        first = reports.profit_and_loss(day, day, 'day')
+        self.assertTrue(first['periods'][0]['closed'])
+        self.assertEqual(first['periods'][0]['totals']['revenue'], Decimal('100.00'))
+
+        # Un periodo cerrado se sirve de la caché sin consultar las tablas
+        with self.assertNumQueries(1):
+            reports.profit_and_loss(day, day, 'day')
+
+        invoice.refresh_from_db()
+        invoice.payment_status = 'ANULADA'
+        invoice.save()
+        again = reports.profit_and_loss(day, day, 'day')
+        self.assertEqual(again['periods'][0]['totals']['revenue'], Decimal('0'))
+
+    def test_requires_reports_permission(self):
+        other = User.objects.create_user('sin-permiso', 'clave-segura', office=self.caracas)
+        self.api.force_authenticate(other)
+        self.assertEqual(self.api.get(self.url).status_code, 403)
+
+
+class CurrencyTests(ApiTestCase):
+
+    def test_rate_table_uses_latest_rate_on_or_before_date(self):
+        today = timezone.localdate()
+        table = currency.RateTable([
+            (today, Decimal('40')),
+            (today - timedelta(days=10), Decimal('30')),
+        ])
+        self.assertEqual(table.rate_on(today - timedelta(days=20)), Decimal('30'))
+        self.assertEqual(table.rate_on(today - timedelta(days=5)), Decimal('30'))
+        self.assertEqual(table.rate_on(today + timedelta(days=1)), Decimal('40'))
+
+    def test_dashboard_converts_each_invoice_with_its_own_rate(self):
+        ExchangeRate.objects.create(date=timezone.localdate(), rate=Decimal('40'))
+        self.create_invoice('C-000001', Decimal('400.00'), exchange_rate=Decimal('40'))
+        self.create_invoice('C-000002', Decimal('10.00'), payment_currency='USD', exchange_rate=Decimal('50'))
+        Expense.objects.create(description='Peaje', amount=Decimal('80.00'), office=self.caracas, created_by=self.user)
+
+        ves = self.api.get('/api/dashboard-stats/', {'currency': 'VES'}).data
+        self.assertEqual(ves['total_revenue_month'], Decimal('900.00'))
+        usd = self.api.get('/api/dashboard-stats/', {'currency': 'USD'}).data
+        self.assertEqual(usd['total_revenue_month'], Decimal('20.00'))
+        self.assertEqual(usd['total_expenses_month'], Decimal('2.00'))
+
+    def test_dates_before_the_history_use_the_oldest_rate_in_sql_and_python(self):
+        today = timezone.localdate()
+        ExchangeRate.objects.create(date=today - timedelta(days=10), rate=Decimal('30'))
+        ExchangeRate.objects.create(date=today, rate=Decimal('40'))
+        currency.invalidate_rate_table()
+        invoice = self.create_invoice('C-000001', Decimal('10.00'), payment_currency='USD')
+        created_at = timezone.now() - timedelta(days=400)
+        Invoice.objects.filter(pk=invoice.pk).update(created_at=created_at)
+        day = timezone.localtime(created_at).date()
+
+        rate = currency.rate_on(day)
+        self.assertEqual(rate, Decimal('30'))
+        report = reports.profit_and_loss(day, day, 'day', 'VES')
+        self.assertEqual(report['periods'][0]['totals']['revenue'], currency.convert(Decimal('10.00'), 'USD', 'VES', rate))
+
+    def test_a_rate_change_in_another_worker_reloads_the_table(self):
+        today = timezone.localdate()
+        rate = ExchangeRate.objects.create(date=today, rate=Decimal('40'))
+        currency.invalidate_rate_table()
+        self.assertEqual(currency.rate_on(today), Decimal('40'))
+        # Otro worker guarda la tasa: aquí solo cambia la versión compartida
+        ExchangeRate.objects.filter(pk=rate.pk).update(rate=Decimal('45'))
+        currency.NAMESPACE.invalidate()
+        self.assertEqual(currency.rate_on(today), Decimal('45'))
+
+    def test_rates_must_be_positive(self):
+        self.user.is_staff = True
+        self.user.save()
+        for value in ('0', '-1'):
+            response = self.api.post('/api/exchange-rates/', {'date': '2024-01-01', 'rate': value}, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertIn('rate', response.data)
+        self.assertEqual(self.api.post('/api/exchange-rates/', {'date': '2024-01-01', 'rate': '36.5'}, format='json').status_code, 201)
+
+    def test_new_invoices_snapshot_the_current_rate(self):
+        ExchangeRate.objects.create(date=timezone.localdate(), rate=Decimal('42.5'))
+        payload = {
+            'sender': {'id_type': 'V', 'id_number': '3000', 'name': 'Nuevo remitente'},
+            'recipient': {'id_type': 'J', 'id_number': '4000', 'name': 'Nuevo destinatario'},
+            'items': [{'quantity': 1, 'description': 'Caja', 'weight': '3.00'}],
+            'subtotal': '10.00', 'tax': '1.60', 'total': '11.60',
+            'destination_office_id': self.valencia.id,
+        }
+        response = self.api.post('/api/invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(Invoice.objects.get().exchange_rate, Decimal('42.5'))
+
+
+class ReferenceCacheTests(ApiTestCase):
+    """Ningún endpoint de referencia debe servir datos viejos después de una escritura."""
+
+    endpoints = [
+        ('/api/offices/', {'name': 'Maracay', 'address': 'Centro'}, 'name', 'Maracay Norte'),
+        ('/api/roles/', {'name': 'Cajero'}, 'name', 'Cajero Principal'),
+        ('/api/permissions/', {'key': 'tracking.view'}, 'key', 'tracking.edit'),
+        ('/api/shipping-types/', {'name': 'Expreso'}, 'name', 'Expreso 24h'),
+        ('/api/payment-methods/', {'name': 'Banesco', 'type': 'Transferencia'}, 'name', 'Banesco Ahorro'),
+        ('/api/expense-categories/', {'name': 'Combustible'}, 'name', 'Gasoil'),
+        ('/api/categories/', {'name': 'Repuestos'}, 'name', 'Autopartes'),
+        ('/api/asset-categories/', {'name': 'Mobiliario'}, 'name', 'Mobiliario de oficina'),
+    ]
+
+    def values(self, url, field):
+        response = self.api.get(url)
+        self.assertEqual(response.status_code, 200)
+        return [row[field] for row in response.data]
+
+    def test_list_reflects_create_update_and_delete(self):
+        for url, payload, field, new_value in self.endpoints:
+            with self.subTest(url=url):
+                self.values(url, field)  # llena la caché
+                created = self.api.post(url, payload, format='json')
+                self.assertEqual(created.status_code, 201, created.data)
+                self.assertIn(payload[field], self.values(url, field))
+
+                model = reference_model_for(url)
+                pk = model.objects.get(**{field: payload[field]}).pk
+                self.api.get(f'{url}{pk}/')
+                self.api.patch(f'{url}{pk}/', {field: new_value}, format='json')
+                self.assertIn(new_value, self.values(url, field))
+                self.assertEqual(self.api.get(f'{url}{pk}/').data[field], new_value)
+
+                self.api.delete(f'{url}{pk}/')
+                self.assertNotIn(new_value, self.values(url, field))
+
+    def test_cached_list_does_not_hit_the_database(self):
+        self.api.get('/api/offices/')
+        with self.assertNumQueries(0):
+            self.api.get('/api/offices/')
+
+    def test_role_permissions_changes_are_visible(self):
+        self.api.get('/api/roles/')
+        permission = Permission.objects.create(key='pruebas.view', description='Ver Pruebas')
+        self.role.permissions.add(permission)
+        role = next(r for r in self.api.get('/api/roles/').data if r['id'] == self.role.id)
+        self.assertIn('pruebas.view', role['permissions'])
+
+        permission.key = 'pruebas.ver'
+        permission.save()
+        role = next(r for r in self.api.get('/api/roles/').data if r['id'] == self.role.id)
+        self.assertIn('pruebas.ver', role['permissions'])
+
+        self.role.permissions.clear()
+        role = next(r for r in self.api.get('/api/roles/').data if r['id'] == self.role.id)
+        self.assertEqual(role['permissions'], {})
+
+    def test_company_info_reflects_updates(self):
+        CompanyInfo.load()
+        self.assertEqual(self.api.get('/api/company-info/').data['bcvRate'], '36.50')
+        company = CompanyInfo.load()
+        company.bcv_rate = Decimal('40.10')
+        company.save()
+        self.assertEqual(self.api.get('/api/company-info/').data['bcvRate'], '40.10')
+
+    def test_lost_version_never_reuses_old_keys(self):
+        namespace = CacheNamespace('pruebas')
+        used = set()
+        for value in ('a', 'b', 'c'):
+            used.add(namespace.version())
+            namespace.set(('lista',), value)
+            namespace.invalidate()
+        used.add(namespace.version())
+        cache.delete(namespace.version_key)  # desalojo o reinicio de la caché
+        self.assertNotIn(namespace.version(), used)
+        self.assertIsNone(namespace.get(('lista',)))
+
+
+def reference_model_for(url):
+    from .models import AssetCategory, Category, ExpenseCategory, PaymentMethod, ShippingType
+    return {
+        '/api/offices/': Office, '/api/roles/': Role, '/api/permissions/': Permission,
+        '/api/shipping-types/': ShippingType, '/api/payment-methods/': PaymentMethod,
+        '/api/expense-categories/': ExpenseCategory, '/api/categories/': Category,
+        '/api/asset-categories/': AssetCategory,
+    }[url]
+
+
+class PerformanceMetricsTests(ApiTestCase):
+
+    def setUp(self):
+        super().setUp()
+        from .metrics import registry
+        registry.reset()
+
+    def test_server_timing_header_and_prometheus_series(self):
+        self.create_invoice('C-000001', Decimal('10.00'))
+        response = self.api.get('/api/invoices/')
+        self.assertEqual(response.status_code, 200)
+        timing = response['Server-Timing']
+        self.assertIn('total;dur=', timing)
+        self.assertRegex(timing, r'db;dur=[0-9.]+;desc="[1-9][0-9]* queries"')
+        self.assertIn('serialize;dur=', timing)
+
+        self.api.post('/api/manifests/999/dispatch/', {}, format='json')
+        body = self.api.get('/api/metrics/').content.decode()
+        self.assertIn('http_request_duration_seconds_count{view="InvoiceViewSet.list",method="GET",status="2xx"} 1', body)
+        self.assertIn('view="ShipmentManifestViewSet.dispatch_manifest",method="POST",status="4xx"', body)
+        self.assertRegex(body, r'http_request_db_queries_total\{view="InvoiceViewSet.list",method="GET",status="2xx"\} [1-9]')
+
+    def test_metrics_endpoint_is_restricted_by_ip(self):
+        response = self.api.get('/api/metrics/', REMOTE_ADDR='10.0.0.8')
+        self.assertEqual(response.status_code, 403)
+
+    def test_persistent_connections_are_flagged_under_asgi(self):
+        from .checks import performance_report
+        database = {**settings.DATABASES['default'], 'CONN_MAX_AGE': 60, 'OPTIONS': {}}
+        for asgi, recommended in ((False, True), (True, False)):
+            with self.subTest(asgi=asgi), override_settings(RUNNING_ASGI=asgi, DATABASES={**settings.DATABASES, 'default': database}):
+                report = {name: ok for name, _, ok in performance_report()}
+                self.assertEqual(report['Conexiones a la BD'], recommended)
+
+    @override_settings(METRICS_TOKEN='secreto')
+    def test_metrics_endpoint_requires_the_token(self):
+        # Detrás de un proxy local todas las peticiones vienen de 127.0.0.1
+        self.assertEqual(self.api.get('/api/metrics/').status_code, 403)
+        self.assertEqual(self.api.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer otro').status_code, 403)
+        self.assertEqual(self.api.get('/api/metrics/', HTTP_AUTHORIZATION='Bearer secreto').status_code, 200)
+
+
+@override_settings(QUERY_INSPECTOR='raise')
+class QueryBudgetTests(ApiTestCase):
+    """Los endpoints con presupuesto de consultas no deben crecer con el número de filas."""
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        from .models import Asset, AssetCategory, AuditLog
+        cls.admin = User.objects.create_user('admin', 'clave-segura', office=cls.caracas, role=cls.role, is_staff=True, is_superuser=True)
+        category = AssetCategory.objects.create(name='Equipos')
+        for index in range(6):
+            office = cls.caracas if index % 2 else cls.valencia
+            user = User.objects.create_user(f'usuario{index}', 'clave-segura', office=office, role=cls.role)
+            Expense.objects.create(description=f'Gasto {index}', amount=10, office=office, created_by=user)
+            AuditLog.objects.create(user=user, action='Inicio de sesión')
+            Asset.objects.create(name=f'Equipo {index}', category=category, office=office)
+            Client.objects.create(id_type='J', id_number=f'9{index}', name=f'Cliente {index}')
+
+    def setUp(self):
+        super().setUp()
+        self.api.force_authenticate(self.admin)
+        for index in range(6):
+            self.create_invoice(f'C-00010{index}', Decimal('10.00'), weight=Decimal('1.00'))
+
+    def test_list_endpoints_stay_within_budget(self):
+        for url in ['/api/expenses/', '/api/audit-logs/', '/api/assets/', '/api/users/', '/api/invoices/', '/api/clients/']:
+            with self.subTest(url=url):
+                response = self.api.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreaterEqual(len(response.json()), 6)
+
+    def test_detector_names_the_serializer_field_behind_an_n_plus_one(self):
+        from .query_inspector import inspect_queries
+        from .serializers import ExpenseSerializer
+        with inspect_queries() as report:
+            ExpenseSerializer(Expense.objects.all(), many=True).data
+        fields = {field for group in report.repeated() for field in group['fields']}
+        self.assertIn('ExpenseSerializer.created_by', fields)
+        self.assertIn('ExpenseSerializer.created_by.role', fields)
+
+    def test_budget_overrun_fails_the_request(self):
+        from .query_inspector import QueryBudgetExceeded
+        from .views import ExpenseViewSet
+        with mock.patch.object(ExpenseViewSet, 'query_budget', {'list': 1}):
+            with self.assertRaises(QueryBudgetExceeded):
+                self.api.get('/api/expenses/')
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """generate_data produce datos con los que corren todos los escenarios de los comandos de benchmark."""
+
+    def test_generated_data_supports_every_benchmark_scenario(self):
+        from .management.commands.benchmark_api import SCENARIOS
+        call_command('generate_data', scale=0.0001, offices=3, users_per_office=1, stdout=StringIO())
+        self.assertEqual(Client.objects.count(), 100)
+        self.assertEqual(Invoice.objects.count(), 500)
+        self.assertFalse(Invoice.objects.filter(items__isnull=True).exists())
+        self.assertTrue(Invoice.objects.filter(created_at__lt=timezone.now() - timedelta(days=30)).exists())
+
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'benchmark.json')
+            call_command('benchmark_api', transports='client', threads=1, requests=2, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                results = json.load(fh)['results']['client']
+            call_command('benchmark_async', concurrency=2, requests=2, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                mixed = json.load(fh)['results']
+            call_command('benchmark_serialization', rows=50, repeat=1, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                serialization = json.load(fh)
+            call_command('benchmark_backup', workers='1', levels='1', restore=True, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                archive = json.load(fh)['results']
+            call_command('benchmark_dispatch', dispatchers=1, manifests=2, invoices=2, overlap=True, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                dispatch = json.load(fh)
+            call_command('benchmark_pdf', guides=5, workers='1,2', repeat=1, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                pdfs = json.load(fh)
+            call_command('benchmark_routing', offices='20', stops='5,10', repeat=2, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                routes = json.load(fh)['results']
+            call_command('benchmark_compression', rows=50, gzip_levels='1,6', repeat=1, json_path=path, stdout=StringIO())
+            with open(path) as fh:
+                compressed = json.load(fh)
+
+        self.assertEqual(set(results), set(SCENARIOS))
+        for scenario, summary in results.items():
+            with self.subTest(scenario=scenario):
+                self.assertEqual(summary['requests'], 2)
+                self.assertEqual(summary['errors'], 0, summary.get('first_error'))
+
+        self.assertEqual(set(mixed), {'wsgi', 'asgi'})
+        for transport, summary in mixed.items():
+            with self.subTest(transport=transport):
+                self.assertEqual(summary['requests'], 4)
+                self.assertEqual(summary['errors'], 0, summary.get('first_error'))
+
+        self.assertEqual(serialization['rows'], 50)
+        self.assertEqual(set(serialization['results']), {'serializer', 'rows'})
+        self.assertEqual(archive['restore']['rows'], archive['backup workers=1 gzip=1']['rows'])
+        self.assertEqual((dispatch['results']['dispatched'], dispatch['results']['rejected']), (1, 1))
+        self.assertTrue(all(dispatch['checks'].values()))
+        self.assertEqual([(result['stops'], 'gap_to_optimal_pct' in result) for result in routes], [(5, True), (10, False)])
+        self.assertTrue(pdfs['identical'])
+        self.assertEqual([result['pages'] for result in pdfs['results'].values()], [5, 5])
+        self.assertEqual(compressed['rows'], 50)
+        self.assertLess(compressed['results']['gzip-6']['bytes'], compressed['results']['fast']['bytes'])
+
+
+class AsyncViewTests(ApiTestCase):
+    """Bajo ASGI las lecturas frecuentes las atienden las vistas asíncronas con la misma respuesta."""
+
+    def setUp(self):
+        super().setUp()
+        self.async_api = AsyncClient()
+        self.auth = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def async_get(self, path, headers=None):
+        return async_to_sync(self.async_api.get)(path, headers=self.auth if headers is None else headers)
+
+    def test_responses_match_the_sync_views(self):
+        self.create_invoice('C-000001', Decimal('100.00'))
+        paths = [
+            '/api/profile/', '/api/dashboard-stats/', '/api/offices/', '/api/roles/',
+            '/api/shipping-types/', '/api/invoices/by-number/C-000001/',
+        ]
+        for path in paths:
+            with self.subTest(path=path):
+                expected = self.api.get(path)
+                self.assertEqual(expected.status_code, 200)
+                with mock.patch.object(async_views, 'authenticate', wraps=async_views.authenticate) as authenticate:
+                    response = self.async_get(path)
+                authenticate.assert_awaited_once()
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.content, expected.content)
+
+    def test_queries_are_measured_under_asgi(self):
+        # Bajo ASGI las consultas corren en los hilos de sync_to_async, no en el del bucle
+        self.create_invoice('C-000001', Decimal('100.00'))
+        for path in ['/api/profile/', '/api/offices/', '/api/clients/', '/api/dashboard-stats/']:
+            with self.subTest(path=path):
+                response = self.async_get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertGreater(int(response['X-Query-Count']), 0)
+                queries = re.search(r'desc="(\d+) queries"', response['Server-Timing']).group(1)
+                self.assertEqual(queries, response['X-Query-Count'])
+
+    def test_invoice_by_number_respects_visibility(self):
+        other = User.objects.create_user('otro', 'clave-segura', office=self.caracas, role=self.role)
+        Invoice.objects.create(
+            invoice_number='C-000009', sender=self.sender, recipient=self.recipient, origin_office=self.caracas,
+            destination_office=self.valencia, created_by=other, subtotal=10, tax=0, total=10,
+        )
+        self.assertEqual(self.api.get('/api/invoices/by-number/C-000009/').status_code, 404)
+        self.assertEqual(self.async_get('/api/invoices/by-number/C-000009/').status_code, 404)
+
+    def test_requires_a_valid_token(self):
+        response = self.async_get('/api/profile/', headers={})
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('Bearer', response['WWW-Authenticate'])
+        response = self.async_get('/api/profile/', headers={'authorization': 'Bearer invalido'})
+        self.assertEqual(response.status_code, 401)
+
+    def test_writes_fall_back_to_the_sync_view(self):
+        response = async_to_sync(self.async_api.post)(
+            '/api/offices/', {'name': 'Maracay', 'address': 'Centro'}, content_type='application/json', headers=self.auth,
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('Maracay', [office['name'] for office in self.async_get('/api/offices/').json()])
+
+    @override_settings(ASYNC_VIEW_CONCURRENCY=1, ASYNC_VIEW_QUEUE_TIMEOUT=0.01)
+    def test_requests_over_the_concurrency_limit_get_503(self):
+        async def scenario():
+            async with async_views.concurrency_limit():
+                return await self.async_api.get('/api/profile/', headers=self.auth)
+
+        response = async_to_sync(scenario)()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+
+class ChangeFeedTests(ApiTestCase):
+    """Feed de cambios de estado con cursor ?since=, long-poll y SSE."""
+    url = '/api/changes/'
+
+    def setUp(self):
+        super().setUp()
+        self.async_api = AsyncClient()
+        self.auth = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def feed(self, since):
+        response = self.api.get(self.url, {'since': since})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_records_saves_and_bulk_transitions_in_order(self):
+        start = self.api.get(self.url).json()['next']
+        invoice = self.create_invoice('C-000001', Decimal('100.00'))
+        vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        manifest = ShipmentManifest.objects.create(manifest_number='M-0001', vehicle=vehicle)
+        self.assertEqual(self.api.post(f'/api/manifests/{manifest.pk}/dispatch/', {'invoice_ids': [invoice.pk]}, format='json').status_code, 200)
+        self.assertEqual(self.api.post(f'/api/manifests/{manifest.pk}/finalize_trip/').status_code, 200)
+        invoice.refresh_from_db()
+        invoice.payment_status = 'PAGADA'
+        invoice.save()
+
+        data = self.feed(start)
+        transitions = [(change['number'], change['field'], change['old_value'], change['new_value']) for change in data['results']]
+        self.assertEqual(transitions, [
+            ('C-000001', 'payment_status', '', 'PENDIENTE_PAGO'),
+            ('C-000001', 'shipping_status', '', 'PENDIENTE_DESPACHO'),
+            ('M-0001', 'status', '', 'PLANIFICADO'),
+            ('C-000001', 'shipping_status', 'PENDIENTE_DESPACHO', 'EN_TRANSITO'),
+            ('M-0001', 'status', 'PLANIFICADO', 'EN_RUTA'),
+            ('M-0001', 'status', 'EN_RUTA', 'FINALIZADO'),
+            ('C-000001', 'shipping_status', 'EN_TRANSITO', 'ENTREGADA'),
+            ('C-000001', 'payment_status', 'PENDIENTE_PAGO', 'PAGADA'),
+        ])
+        self.assertEqual(data['next'], data['results'][-1]['seq'])
+        self.assertEqual(self.feed(data['next'])['results'], [])
+
+    def test_hides_invoices_the_user_cannot_see(self):
+        other = User.objects.create_user('otro', 'clave-segura', office=self.caracas, role=self.role)
+        Invoice.objects.create(
+            invoice_number='C-000009', sender=self.sender, recipient=self.recipient, origin_office=self.caracas,
+            destination_office=self.valencia, created_by=other, subtotal=10, tax=0, total=10,
+        )
+        data = self.feed(0)
+        self.assertEqual(data['results'], [])
+        self.assertEqual(data['next'], StatusChange.objects.latest('id').id)
+
+    def test_cursor_stops_at_a_recent_gap_in_the_sequence(self):
+        for seq in (1, 3):
+            StatusChange.objects.create(id=seq, entity='manifest', object_id=1, number='M-1', field='status', new_value='EN_RUTA')
+        self.assertEqual(changefeed.read(0), ([StatusChange.objects.get(id=1)], 1))
+        StatusChange.objects.filter(id=3).update(created_at=timezone.now() - timedelta(minutes=1))
+        changes, cursor = changefeed.read(0)
+        self.assertEqual((len(changes), cursor), (2, 3))
+
+    def test_sync_view_clamps_the_wait(self):
+        head = changefeed.head()
+        with mock.patch.object(changefeed, 'wait_for', wraps=changefeed.wait_for) as wait_for, \
+                override_settings(CHANGE_FEED_SYNC_MAX_WAIT=0):
+            response = self.api.get(self.url, {'since': head, 'wait': 25})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(wait_for.call_args.args[2], 0)
+
+    @override_settings(CHANGE_FEED_POLL_INTERVAL=0.01)
+    def test_async_long_poll_returns_when_a_change_arrives(self):
+        head = self.feed(0)['next']
+
+        async def scenario():
+            request = asyncio.ensure_future(self.async_api.get(self.url, {'since': head, 'wait': 5}, headers=self.auth))
+            await asyncio.sleep(0.05)
+            self.assertFalse(request.done())
+            await sync_to_async(self.create_invoice)('C-000002', Decimal('10.00'))
+            return await request
+
+        data = async_to_sync(scenario)().json()
+        self.assertEqual([change['number'] for change in data['results']], ['C-000002', 'C-000002'])
+
+    def test_sse_stream_resumes_from_last_event_id(self):
+        self.create_invoice('C-000003', Decimal('10.00'))
+        first = StatusChange.objects.earliest('id').id
+
+        async def scenario():
+            response = await self.async_api.get(f'{self.url}stream/', headers={**self.auth, 'Last-Event-ID': str(first)})
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            chunks = aiter(response.streaming_content)
+            received = [await anext(chunks) for _ in range(2)]
+            await chunks.aclose()
+            return received
+
+        retry, event = async_to_sync(scenario)()
+        self.assertTrue(retry.startswith(b'retry: '))
+        self.assertIn(b'event: status', event)
+        self.assertIn(b'"new_value":"PENDIENTE_DESPACHO"', event)
+
+
+class SyncTests(ApiTestCase):
+    """Sincronización incremental con marca de agua y tombstones."""
+    url = '/api/sync/'
+
+    def sync(self, **params):
+        response = self.api.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_without_watermark_asks_for_a_full_resync(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.create_invoice('C-000001', Decimal('10.00'))
+        data = self.sync()
+        self.assertTrue(data['full_resync'])
+        self.assertEqual(data['watermark'], SyncLog.objects.latest('id').id)
+        self.assertFalse(self.sync(since=data['watermark'])['full_resync'])
+
+    def test_returns_changed_rows_and_tombstones_since_the_watermark(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        watermark = self.sync()['watermark']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            invoice = self.create_invoice('C-000001', Decimal('10.00'), weight=Decimal('2.00'))
+            other = User.objects.create_user('otro', 'clave-segura', office=self.caracas, role=self.role)
+            Invoice.objects.create(
+                invoice_number='C-000009', sender=self.sender, recipient=self.recipient, origin_office=self.caracas,
+                destination_office=self.valencia, created_by=other, subtotal=10, tax=0, total=10,
+            )
+            self.valencia.phone = '0241-555'
+            self.valencia.save()
+            vehicle_id = vehicle.pk
+            vehicle.delete()
+
+        data = self.sync(since=watermark)
+        self.assertFalse(data['full_resync'])
+        self.assertFalse(data['has_more'])
+        changes = data['changes']
+        self.assertEqual(set(changes), {'invoice', 'office', 'vehicle'})
+        self.assertEqual(changes['invoice']['updated'], [self.api.get(f'/api/invoices/{invoice.pk}/').json()])
+        self.assertEqual(changes['office']['updated'][0]['phone'], '0241-555')
+        self.assertEqual(changes['vehicle'], {'updated': [], 'deleted': [vehicle_id]})
+
+        only_offices = self.sync(since=watermark, entities='office')
+        self.assertEqual(set(only_offices['changes']), {'office'})
+        self.assertEqual(self.sync(since=data['watermark'])['changes'], {})
+
+    @override_settings(SYNC_PAGE_SIZE=2)
+    def test_pages_through_long_change_logs(self):
+        # En PostgreSQL las secuencias no vuelven atrás entre pruebas: sin una
+        # fila previa, el hueco hasta la primera parecería una transacción abierta
+        with self.captureOnCommitCallbacks(execute=True):
+            Office.objects.create(name='Oficina base', address='Centro')
+        watermark = self.sync()['watermark']
+        with self.captureOnCommitCallbacks(execute=True):
+            for number in range(3):
+                Office.objects.create(name=f'Oficina {number}', address='Centro')
+        first = self.sync(since=watermark)
+        self.assertTrue(first['has_more'])
+        second = self.sync(since=first['watermark'])
+        self.assertFalse(second['has_more'])
+        names = [office['name'] for page in (first, second) for office in page['changes']['office']['updated']]
+        self.assertEqual(names, ['Oficina 0', 'Oficina 1', 'Oficina 2'])
+
+    def test_watermark_older_than_the_retained_log_requires_a_full_resync(self):
+        watermark = self.sync()['watermark']
+        with self.captureOnCommitCallbacks(execute=True):
+            Office.objects.create(name='Maracay', address='Centro')
+            Office.objects.create(name='Maracaibo', address='Centro')
+        SyncLog.objects.update(created_at=timezone.now() - timedelta(days=60))
+        call_command('prune_sync_log', stdout=StringIO())
+        self.assertEqual(SyncLog.objects.count(), 1)
+        self.assertTrue(self.sync(since=watermark)['full_resync'])
+
+    def test_one_insert_per_transaction(self):
+        payload = {
+            'sender': {'id_type': 'V', 'id_number': '3000', 'name': 'Nuevo remitente'},
+            'recipient': {'id_type': 'J', 'id_number': '3001', 'name': 'Nuevo destinatario'},
+            'items': [{'quantity': 1, 'description': 'Caja', 'weight': '3.00'}] * 3,
+            'subtotal': '10.00', 'tax': '1.60', 'total': '11.60', 'destination_office_id': self.valencia.id,
+        }
+        watermark = sync.head()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.api.post('/api/invoices/', payload, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        inserts = [q for q in queries.captured_queries if q['sql'].startswith('INSERT INTO "api_synclog"')]
+        self.assertEqual(len(inserts), 1)
+        # Se escribe dentro de la transacción, antes de confirmarla
+        commit = max(i for i, q in enumerate(queries.captured_queries) if q['sql'].startswith('RELEASE SAVEPOINT'))
+        self.assertLess(queries.captured_queries.index(inserts[0]), commit)
+        # La factura tocada por sus tres items aparece una vez
+        logged = list(SyncLog.objects.filter(id__gt=watermark).values_list('entity', flat=True))
+        self.assertEqual((logged.count('invoice'), logged.count('client')), (1, 2))
+
+        # Un borrado dentro de un savepoint revertido no llega como tombstone
+        watermark = sync.head()
+        with transaction.atomic(), sync.deferred():
+            office = Office.objects.create(name='Maracay', address='Centro')
+            with transaction.atomic():
+                office.delete()
+                transaction.set_rollback(True)
+        self.assertEqual(list(SyncLog.objects.filter(id__gt=watermark).values_list('entity', 'deleted')), [('office', False)])
+
+    def test_failed_unit_of_work_logs_nothing(self):
+        watermark = sync.head()
+        with self.assertRaises(ValueError), transaction.atomic(), sync.deferred():
+            Office.objects.create(name='Maracay', address='Centro')
+            raise ValueError
+        self.assertEqual(sync.head(), watermark)
+        self.assertFalse(Office.objects.filter(name='Maracay').exists())
+
+
+class TrackingTests(ApiTestCase):
+    """Rastreo público por número de factura, con caché invalidada en cada transición."""
+
+    def track(self, number):
+        return APIClient().get(f'/api/tracking/{number}/')
+
+    def test_public_lookup_without_client_data(self):
+        self.create_invoice('C-000001', Decimal('100.00'))
+        response = self.track('C-000001')
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['shipping_status'], 'PENDIENTE_DESPACHO')
+        self.assertEqual((data['origin_office'], data['destination_office']), ('Caracas', 'Valencia'))
+        self.assertIsNone(data['departure_time'])
+        self.assertNotIn('sender', data)
+        self.assertNotIn('total', data)
+        self.assertEqual(self.track('C-999999').status_code, 404)
+
+    def test_hot_numbers_do_not_touch_the_database(self):
+        self.create_invoice('C-000001', Decimal('100.00'))
+        self.track('C-000001')
+        self.track('C-404040')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.track('C-000001').status_code, 200)
+            self.assertEqual(self.track('C-404040').status_code, 404)
+        # Sin la copia en memoria se sirve desde la caché compartida
+        tracking.clear_local_cache()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.track('C-000001').status_code, 200)
+
+    def test_status_transitions_invalidate_the_cache(self):
+        invoice = self.create_invoice('C-000001', Decimal('100.00'))
+        vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        manifest = ShipmentManifest.objects.create(manifest_number='M-0001', vehicle=vehicle)
+        self.assertEqual(self.track('C-000001').json()['shipping_status'], 'PENDIENTE_DESPACHO')
+
+        self.api.post(f'/api/manifests/{manifest.pk}/dispatch/', {'invoice_ids': [invoice.pk]}, format='json')
+        data = self.track('C-000001').json()
+        self.assertEqual((data['shipping_status'], data['manifest_status']), ('EN_TRANSITO', 'EN_RUTA'))
+        self.assertIsNotNone(data['departure_time'])
+
+        # Al finalizar, la entrada en caché se actualiza al confirmar la transacción
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(f'/api/manifests/{manifest.pk}/finalize_trip/')
+        data = self.track('C-000001').json()
+        self.assertEqual((data['shipping_status'], data['manifest_status']), ('ENTREGADA', 'FINALIZADO'))
+        self.assertIsNotNone(data['arrival_time'])
+
+        self.assertEqual(self.track('C-000002').status_code, 404)
+        self.create_invoice('C-000002', Decimal('100.00'))
+        self.assertEqual(self.track('C-000002').status_code, 200)
+
+    def test_lookups_are_rate_limited_per_ip(self):
+        from rest_framework.throttling import ScopedRateThrottle
+        with mock.patch.object(ScopedRateThrottle, 'THROTTLE_RATES', {'tracking': '2/min'}):
+            self.assertEqual([self.track('C-000001').status_code for _ in range(3)], [404, 404, 429])
+
+
+class BulkStatusTests(ApiTestCase):
+    """Cambio de estado masivo validado por la máquina de estados."""
+    url = '/api/invoices/bulk-status/'
+
+    def setUp(self):
+        super().setUp()
+        self.grant('invoices.changeStatus')
+
+    def grant(self, key):
+        self.role.permissions.add(Permission.objects.get_or_create(key=key, defaults={'description': key})[0])
+
+    def dispatched_manifest(self, number='M-0001'):
+        vehicle = Vehicle.objects.create(license_plate=f'AB{number[-3:]}CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        return ShipmentManifest.objects.create(manifest_number=number, vehicle=vehicle, status='EN_RUTA')
+
+    def test_one_update_per_source_status_and_rejections(self):
+        manifest = self.dispatched_manifest()
+        pending = self.create_invoice('C-000001', Decimal('100.00'), manifest=manifest)
+        returned = self.create_invoice('C-000002', Decimal('100.00'), shipping_status='DEVUELTA', manifest=manifest)
+        in_transit = self.create_invoice('C-000003', Decimal('100.00'), shipping_status='EN_TRANSITO')
+        delivered = self.create_invoice('C-000004', Decimal('100.00'), shipping_status='ENTREGADA')
+        other = User.objects.create_user('otro', 'clave-segura', office=self.valencia)
+        hidden = self.create_invoice('C-000005', Decimal('100.00'))
+        Invoice.objects.filter(pk=hidden.pk).update(created_by=other)
+        ids = [pending.pk, returned.pk, in_transit.pk, delivered.pk, hidden.pk, 999999]
+        before = StatusChange.objects.count()
+        before_log = sync.head()
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.api.post(self.url, {'ids': ids, 'field': 'shipping_status', 'status': 'EN_TRANSITO'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(response.data['updated']), sorted([pending.pk, returned.pk]))
+        self.assertEqual(response.data['unchanged'], [in_transit.pk])
+        self.assertEqual(response.data['rejected'], [
+            {'id': delivered.pk, 'reason': 'transicion_invalida', 'current': 'ENTREGADA'},
+            {'id': hidden.pk, 'reason': 'no_encontrada'},
+            {'id': 999999, 'reason': 'no_encontrada'},
+        ])
+        updates = [q for q in queries.captured_queries if q['sql'].startswith('UPDATE "api_invoice"')]
+        self.assertEqual(len(updates), 2)
+
+        states = dict(Invoice.objects.values_list('invoice_number', 'shipping_status'))
+        self.assertEqual(states, {
+            'C-000001': 'EN_TRANSITO', 'C-000002': 'EN_TRANSITO', 'C-000003': 'EN_TRANSITO',
+            'C-000004': 'ENTREGADA', 'C-000005': 'PENDIENTE_DESPACHO',
+        })
+        changes = StatusChange.objects.filter(id__gt=before)
+        self.assertEqual(
+            sorted(changes.values_list('number', 'old_value', 'new_value')),
+            [('C-000001', 'PENDIENTE_DESPACHO', 'EN_TRANSITO'), ('C-000002', 'DEVUELTA', 'EN_TRANSITO')],
+        )
+        self.assertEqual(AuditLog.objects.filter(action='Cambio de Estado de Factura').count(), 2)
+        self.assertEqual(
+            sorted(SyncLog.objects.filter(entity='invoice', id__gt=before_log).values_list('object_id', flat=True)),
+            [pending.pk, returned.pk],
+        )
+
+    def test_en_transito_requires_a_dispatched_manifest(self):
+        planned = self.dispatched_manifest()
+        ShipmentManifest.objects.filter(pk=planned.pk).update(status='PLANIFICADO')
+        loose = self.create_invoice('C-000001', Decimal('100.00'))
+        unsent = self.create_invoice('C-000002', Decimal('100.00'), manifest=planned)
+        returned = self.create_invoice('C-000003', Decimal('100.00'), shipping_status='DEVUELTA')
+        sent = self.create_invoice('C-000004', Decimal('100.00'), manifest=self.dispatched_manifest('M-0002'))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(
+                self.url, {'ids': [loose.pk, unsent.pk, returned.pk, sent.pk], 'field': 'shipping_status', 'status': 'EN_TRANSITO'},
+                format='json',
+            )
+        self.assertEqual(response.data['updated'], [sent.pk])
+        self.assertEqual(response.data['rejected'], [
+            {'id': loose.pk, 'reason': 'sin_manifiesto_despachado', 'current': 'PENDIENTE_DESPACHO'},
+            {'id': unsent.pk, 'reason': 'sin_manifiesto_despachado', 'current': 'PENDIENTE_DESPACHO'},
+            {'id': returned.pk, 'reason': 'sin_manifiesto_despachado', 'current': 'DEVUELTA'},
+        ])
+        self.assertEqual(Invoice.objects.filter(shipping_status='EN_TRANSITO').count(), 1)
+
+    def test_invalidates_tracking_cache(self):
+        invoice = self.create_invoice('C-000001', Decimal('100.00'), manifest=self.dispatched_manifest())
+        self.assertEqual(tracking.lookup('C-000001')['shipping_status'], 'PENDIENTE_DESPACHO')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.api.post(self.url, {'ids': [invoice.pk], 'field': 'shipping_status', 'status': 'EN_TRANSITO'}, format='json')
+        self.assertEqual(tracking.lookup('C-000001')['shipping_status'], 'EN_TRANSITO')
+
+    def test_voiding_requires_its_own_permission_and_refreshes_reports(self):
+        invoice = self.create_invoice('C-000001', Decimal('100.00'))
+        last_month = timezone.now() - timedelta(days=40)
+        Invoice.objects.filter(pk=invoice.pk).update(created_at=last_month)
+        day = timezone.localtime(last_month).date()
+        self.assertEqual(reports.profit_and_loss(day, day, 'day')['periods'][0]['totals']['revenue'], Decimal('100.00'))
+
+        body = {'ids': [invoice.pk], 'field': 'payment_status', 'status': 'ANULADA'}
+        self.assertEqual(self.api.post(self.url, body, format='json').status_code, 403)
+        self.grant('invoices.void')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(self.api.post(self.url, body, format='json').data['updated'], [invoice.pk])
+        self.assertEqual(reports.profit_and_loss(day, day, 'day')['periods'][0]['totals']['revenue'], Decimal('0'))
+
+        # Una factura anulada ya no cambia de estado de pago
+        body['status'] = 'PAGADA'
+        self.assertEqual(self.api.post(self.url, body, format='json').data['rejected'][0]['reason'], 'transicion_invalida')
+
+    def test_rejects_unknown_status_and_requires_permission(self):
+        response = self.api.post(self.url, {'ids': [1], 'field': 'shipping_status', 'status': 'PAGADA'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.api.post(self.url, {'ids': [], 'field': 'shipping_status', 'status': 'ENTREGADA'}, format='json').status_code, 400)
+        self.role.permissions.remove(Permission.objects.get(key='invoices.changeStatus'))
+        response = self.api.post(self.url, {'ids': [1], 'field': 'shipping_status', 'status': 'ENTREGADA'}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+
+class RowSerializerTests(ApiTestCase):
+    """La lista de facturas armada desde values_list() es idéntica a la de InvoiceSerializer."""
+
+    def setUp(self):
+        super().setUp()
+        vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        manifest = ShipmentManifest.objects.create(manifest_number='M-0001', vehicle=vehicle)
+        self.create_invoice('C-000001', Decimal('100.00'), weight=Decimal('10.50'))
+        self.create_invoice('C-000002', Decimal('0.10'), exchange_rate=Decimal('36.1234'), manifest=manifest, has_discount=True)
+        self.create_invoice('C-000003', Decimal('2500.00'), payment_status='ANULADA', declared_value=Decimal('7'))
+        items = Invoice.objects.get(invoice_number='C-000002').items
+        items.create(quantity=3, description='Sobres', weight=Decimal('0.25'))
+        items.create(quantity=1, description='Caja "frágil"', weight=Decimal('12'))
+
+    def assertSameJSON(self, queryset):
+        renderer = JSONRenderer()
+        expected = renderer.render(InvoiceSerializer(queryset, many=True).data)
+        self.assertEqual(renderer.render(invoice_rows.serialize(invoice_rows.values(queryset))), expected)
+        return expected
+
+    def test_byte_identical_to_invoice_serializer(self):
+        queryset = Invoice.objects.select_related('sender', 'recipient').prefetch_related('items').order_by('pk')
+        self.assertIn(b'"exchange_rate":null', self.assertSameJSON(queryset))
+        # Con UTC las fechas terminan en Z en lugar de +00:00
+        with timezone.override('UTC'):
+            self.assertIn(b'Z"', self.assertSameJSON(queryset))
+        self.assertEqual(invoice_rows.serialize(invoice_rows.values(queryset.none())), [])
+
+    def test_list_endpoint_uses_rows(self):
+        expected = JSONRenderer().render(InvoiceSerializer(visible_invoices(self.user), many=True).data)
+        with self.assertNumQueries(2):
+            response = self.api.get('/api/invoices/')
+        self.assertEqual(response.content, expected)
+
+        page = self.api.get('/api/invoices/', {'limit': 2, 'offset': 1}).json()
+        self.assertEqual(page['count'], 3)
+        self.assertEqual([invoice['invoice_number'] for invoice in page['results']], ['C-000002', 'C-000001'])
+
+    def test_full_list_is_serialized_in_chunks(self):
+        expected = JSONRenderer().render(InvoiceSerializer(visible_invoices(self.user), many=True).data)
+        with mock.patch.object(invoice_rows, 'chunk_size', 2), CaptureQueriesContext(connection) as queries:
+            response = self.api.get('/api/invoices/')
+        self.assertEqual(response.content, expected)
+        # Las facturas en una consulta y los items de cada tramo de 2 facturas
+        self.assertEqual(len([q for q in queries.captured_queries if 'api_merchandiseitem' in q['sql']]), 2)
+        # Con sangría (o el API navegable) se usa el render de DRF, con el mismo contenido
+        indented = self.api.get('/api/invoices/', HTTP_ACCEPT='application/json; indent=2')
+        self.assertEqual(indented.json(), response.json())
+
+    def test_items_are_read_in_chunks(self):
+        queryset = Invoice.objects.order_by('pk')
+        expected = InvoiceSerializer(queryset, many=True).data
+        with mock.patch('api.row_serializers.FETCH_CHUNK_SIZE', 2), CaptureQueriesContext(connection) as queries:
+            self.assertEqual(invoice_rows.serialize(invoice_rows.values(queryset)), expected)
+        # Una consulta para las facturas y dos para los items de las tres
+        self.assertEqual(len(queries), 3)
+
+    def test_unsupported_fields_are_rejected(self):
+        class WithMethod(serializers.ModelSerializer):
+            label = serializers.SerializerMethodField()
+
+            class Meta:
+                model = Invoice
+                fields = ('id', 'label')
+
+        with self.assertRaises(ImproperlyConfigured):
+            RowSerializer(WithMethod).plan
+
+
+class BackupTests(ApiTestCase):
+    """Respaldos completos e incrementales y su restauración (api/backup.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.first = self.create_invoice('C-000001', Decimal('100.00'), weight=Decimal('10.50'), exchange_rate=Decimal('36.1234'))
+            self.second = self.create_invoice('C-000002', Decimal('0.10'))
+
+    def path(self, name):
+        return os.path.join(self.directory.name, name)
+
+    def state(self, *exclude):
+        return {
+            backup.label(model): list(model._base_manager.order_by('pk').values_list())
+            for model in backup.backup_models() if model not in exclude
+        }
+
+    def test_full_backup_round_trip_with_media(self):
+        media = os.path.join(settings.MEDIA_ROOT, 'company', 'logo.png')
+        os.makedirs(os.path.dirname(media), exist_ok=True)
+        with open(media, 'wb') as fh:
+            fh.write(b'logo')
+        self.addCleanup(os.remove, media)
+        before = self.state()
+        manifest = backup.backup(self.path('full.tar'), chunk_size=2)
+
+        self.assertEqual(manifest['kind'], 'full')
+        self.assertIn('company/logo.png', manifest['media'])
+        tables = {table['model']: table for table in manifest['tables']}
+        self.assertEqual(len(tables['api.statuschange']['chunks']), 2)
+        order = list(tables)
+        self.assertLess(order.index('api.client'), order.index('api.invoice'))
+        self.assertLess(order.index('api.invoice'), order.index('api.merchandiseitem'))
+
+        Invoice.objects.filter(pk=self.second.pk).update(total=Decimal('1.00'))
+        self.first.delete()
+        self.create_invoice('C-000003', Decimal('5.00'))
+        with open(media, 'wb') as fh:
+            fh.write(b'otro')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            summary = backup.restore([self.path('full.tar')])
+        self.assertEqual(summary['media'], 1)
+        # Fechas con microsegundos, decimales y claves foráneas idénticos
+        self.assertEqual(self.state(), before)
+        with open(media, 'rb') as fh:
+            self.assertEqual(fh.read(), b'logo')
+        # Las secuencias siguen después de los ids restaurados
+        self.assertGreater(self.create_invoice('C-000004', Decimal('1.00')).pk, self.second.pk)
+
+    def test_incremental_backup_and_chain_restore(self):
+        base = backup.backup(self.path('full.tar'), media=False)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.second.payment_status = 'PAGADA'
+            self.second.save()
+            self.create_invoice('C-000003', Decimal('5.00'), weight=Decimal('1.00'))
+            spare = Client.objects.create(id_type='V', id_number='3000', name='Temporal')
+            spare_id, first_id = spare.pk, self.first.pk
+            spare.delete()
+            self.first.delete()
+            archive.run(audit_days=0)
+        after = self.state(SyncLog)
+
+        manifest = backup.backup(self.path('delta.tar'), since=base, media=False)
+        self.assertEqual((manifest['kind'], manifest['base']), ('incremental', base['id']))
+        tables = {table['model']: table for table in manifest['tables']}
+        self.assertEqual((tables['api.invoice']['mode'], tables['api.invoice']['rows']), ('delta', 2))
+        self.assertEqual(tables['api.invoice']['deleted'], [first_id])
+        self.assertEqual(tables['api.client']['deleted'], [spare_id])
+        self.assertEqual(tables['api.merchandiseitem']['rows'], 1)
+        self.assertEqual(tables['api.office']['mode'], 'delta')
+        self.assertEqual(tables['api.user']['mode'], 'full')
+
+        Invoice.objects.all().delete()
+        backup.restore([self.path('full.tar'), self.path('delta.tar')])
+        self.assertEqual(self.state(SyncLog), after)
+
+        with self.assertRaises(backup.BackupError):
+            backup.restore([self.path('delta.tar'), self.path('full.tar')])
+
+    def test_api_requires_permission(self):
+        self.assertEqual(self.api.get('/api/backup/').status_code, 403)
+        self.role.permissions.add(Permission.objects.get_or_create(key='system.backupRestore', defaults={'description': 'Respaldos'})[0])
+        response = self.api.get('/api/backup/', {'media': '0'})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response['Content-Disposition'])
+        content = b''.join(response.streaming_content)
+        response.close()
+
+        Invoice.objects.filter(pk=self.first.pk).delete()
+        upload = SimpleUploadedFile('respaldo.tar', content, content_type='application/x-tar')
+        response = self.api.post('/api/backup/restore/', {'archives': [upload], 'media': '0'}, format='multipart')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertTrue(Invoice.objects.filter(pk=self.first.pk).exists())
+        self.assertTrue(AuditLog.objects.filter(action='Restauración de la Base de Datos').exists())
+
+        upload = SimpleUploadedFile('otro.tar', b'no es un tar')
+        self.assertEqual(self.api.post('/api/backup/restore/', {'archives': [upload]}, format='multipart').status_code, 400)
+
+
+class ArchiveTests(ApiTestCase):
+    """Archivo por lotes de facturas terminadas y auditoría antigua (api/archive.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.old = timezone.now() - timedelta(days=400)
+        self.finished = [
+            self.create_invoice(f'C-00000{n}', Decimal('100.00'), weight=Decimal('2.50'),
+                                shipping_status='ENTREGADA', payment_status='PAGADA')
+            for n in (1, 2)
+        ]
+        self.pending = self.create_invoice('C-000003', Decimal('50.00'), shipping_status='ENTREGADA')
+        self.recent = self.create_invoice('C-000004', Decimal('70.00'), shipping_status='ENTREGADA', payment_status='PAGADA')
+        Invoice.objects.exclude(pk=self.recent.pk).update(created_at=self.old)
+        AuditLog.objects.update(timestamp=self.old)
+
+    def test_archives_in_batches_and_keeps_tracking_and_reports(self):
+        day = timezone.localtime(self.old).date()
+        report = reports.profit_and_loss(day, day, 'day')['periods'][0]['totals']
+        first = self.finished[0]
+        serialized = JSONRenderer().render(InvoiceSerializer(visible_invoices(self.user).get(pk=first.pk)).data)
+        public = tracking.lookup('C-000001')
+        audit_rows = AuditLog.objects.count()
+
+        # Un lote por tabla; la siguiente ejecución continúa con lo que falta
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.run(batch_size=1, max_batches=1), {'invoices': 1, 'audit_logs': 1})
+        self.assertEqual(archive.pending(), {'invoices': 1, 'audit_logs': audit_rows - 1})
+        self.assertEqual(archive.run(batch_size=1), {'invoices': 1, 'audit_logs': audit_rows - 1})
+        self.assertEqual(archive.run(), {'invoices': 0, 'audit_logs': 0})
+
+        self.assertEqual(
+            sorted(Invoice.objects.values_list('invoice_number', flat=True)), ['C-000003', 'C-000004'],
+        )
+        self.assertFalse(MerchandiseItem.objects.filter(invoice_id=first.pk).exists())
+        archived = ArchivedInvoice.objects.get(invoice_number='C-000001')
+        self.assertEqual(JSONRenderer().render(archived.data), serialized)
+        self.assertEqual(archived.kilos, Decimal('2.50'))
+        self.assertEqual(tracking.lookup('C-000001'), public)
+        self.assertEqual(reports.profit_and_loss(day, day, 'day')['periods'][0]['totals'], report)
+        self.assertTrue(SyncLog.objects.filter(entity='invoice', object_id=first.pk, deleted=True).exists())
+        self.assertEqual(ArchivedAuditLog.objects.count(), audit_rows)
+        self.assertEqual(ArchivedAuditLog.objects.filter(username='operador').count(), audit_rows)
+
+    def test_cleanup_api(self):
+        self.assertEqual(self.api.get('/api/cleanup/').status_code, 403)
+        self.role.permissions.add(Permission.objects.get_or_create(key='system.cleanup', defaults={'description': 'Limpieza'})[0])
+        self.assertEqual(self.api.get('/api/cleanup/', {'audit_days': 1000}).data, {'invoices': 2, 'audit_logs': 0})
+        response = self.api.post('/api/cleanup/', {'audit_days': 1000}, format='json')
+        self.assertEqual(response.data, {'invoices': 2, 'audit_logs': 0})
+        self.assertEqual(self.track('C-000002').status_code, 200)
+        self.assertEqual(self.api.post('/api/cleanup/', {'invoice_days': 0}, format='json').status_code, 400)
+
+    @override_settings(ARCHIVE_BATCH_SIZE=1, ARCHIVE_API_MAX_BATCHES=1)
+    def test_cleanup_api_caps_the_batches(self):
+        self.role.permissions.add(Permission.objects.get_or_create(key='system.cleanup', defaults={'description': 'Limpieza'})[0])
+        response = self.api.post('/api/cleanup/', {'audit_days': 1000, 'max_batches': 100}, format='json')
+        self.assertEqual(response.data, {'invoices': 1, 'audit_logs': 0})
+        self.assertEqual(self.api.post('/api/cleanup/', {'audit_days': 1000}, format='json').data, {'invoices': 1, 'audit_logs': 0})
+        self.assertEqual(self.api.get('/api/cleanup/', {'audit_days': 1000}).data, {'invoices': 0, 'audit_logs': 0})
+
+    def track(self, number):
+        return APIClient().get(f'/api/tracking/{number}/')
+
+
+class ManifestTests(ApiTestCase):
+    """Numeración de manifiestos por oficina y día, y creación con despacho (ver api/manifests.py)."""
+    url = '/api/manifests/create-and-dispatch/'
+
+    def setUp(self):
+        super().setUp()
+        self.vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+
+    def test_numbers_per_office_and_day(self):
+        today = timezone.localdate()
+        tomorrow = today + timedelta(days=1)
+        self.assertEqual(manifests.allocate_number(self.caracas), f'M{self.caracas.pk}-{today:%Y%m%d}-001')
+        self.assertEqual(manifests.allocate_number(self.caracas), f'M{self.caracas.pk}-{today:%Y%m%d}-002')
+        self.assertEqual(manifests.allocate_number(self.valencia), f'M{self.valencia.pk}-{today:%Y%m%d}-001')
+        self.assertEqual(manifests.allocate_number(self.caracas, tomorrow), f'M{self.caracas.pk}-{tomorrow:%Y%m%d}-001')
+        # Un despacho revertido devuelve su número
+        with self.assertRaises(serializers.ValidationError):
+            manifests.create_and_dispatch(self.caracas, self.vehicle, [999999])
+        self.assertEqual(manifests.allocate_number(self.caracas), f'M{self.caracas.pk}-{today:%Y%m%d}-003')
+
+    def test_create_and_dispatch(self):
+        invoices = [self.create_invoice(f'C-00000{n}', Decimal('10.00')) for n in (1, 2)]
+        response = self.api.post(self.url, {'vehicle': self.vehicle.pk, 'invoice_ids': [i.pk for i in invoices]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['manifest_number'], f'M{self.caracas.pk}-{timezone.localdate():%Y%m%d}-001')
+        self.assertEqual(response.data['status'], 'EN_RUTA')
+        self.assertEqual(response.data['office'], self.caracas.pk)
+        self.assertEqual(len(response.data['invoices']), 2)
+        self.assertEqual(set(Invoice.objects.values_list('shipping_status', flat=True)), {'EN_TRANSITO'})
+        self.vehicle.refresh_from_db()
+        self.assertEqual(self.vehicle.status, 'En Ruta')
+        self.assertEqual(
+            list(StatusChange.objects.filter(entity='manifest').values_list('new_value', flat=True)),
+            ['PLANIFICADO', 'EN_RUTA'],
+        )
+
+        # Vehículo ocupado y facturas ya despachadas: no se crea nada
+        other = Vehicle.objects.create(license_plate='XY987ZW', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        for vehicle in (self.vehicle, other):
+            response = self.api.post(self.url, {'vehicle': vehicle.pk, 'invoice_ids': [invoices[0].pk]}, format='json')
+            self.assertEqual(response.status_code, 400)
+        self.assertEqual(ShipmentManifest.objects.count(), 1)
+        self.assertEqual(Vehicle.objects.get(pk=other.pk).status, 'Disponible')
+
+    def test_finalize_trip_with_partial_delivery(self):
+        invoices = [self.create_invoice(f'C-00000{n}', Decimal('10.00')) for n in (1, 2, 3)]
+        response = self.api.post(self.url, {'vehicle': self.vehicle.pk, 'invoice_ids': [i.pk for i in invoices]}, format='json')
+        manifest_id = response.data['id']
+        # Entradas ya en caché, que se actualizan en su lugar
+        for invoice in invoices:
+            self.assertEqual(tracking.lookup(invoice.invoice_number)['shipping_status'], 'EN_TRANSITO')
+        self.assertEqual(dashboard.shipping_status_counts(), {'EN_TRANSITO': 3})
+        url = f'/api/manifests/{manifest_id}/finalize_trip/'
+
+        # Una devolución que no es del manifiesto no cambia nada
+        response = self.api.post(url, {'returned': [{'id': 999999}]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(ShipmentManifest.objects.get().status, 'EN_RUTA')
+
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as queries:
+            response = self.api.post(url, {'returned': [{'id': invoices[2].pk, 'reason': 'Destinatario ausente'}]}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['delivered'], [invoices[0].pk, invoices[1].pk])
+        self.assertEqual(response.data['returned'], [invoices[2].pk])
+        self.assertEqual(
+            sum('UPDATE "api_invoice"' in query['sql'] for query in queries.captured_queries), 1,
+        )
+        self.assertEqual(
+            dict(Invoice.objects.values_list('invoice_number', 'shipping_status')),
+            {'C-000001': 'ENTREGADA', 'C-000002': 'ENTREGADA', 'C-000003': 'DEVUELTA'},
+        )
+        self.assertEqual(Vehicle.objects.get(pk=self.vehicle.pk).status, 'Disponible')
+        self.assertEqual(
+            list(StatusChange.objects.filter(entity='manifest').values_list('new_value', flat=True)),
+            ['PLANIFICADO', 'EN_RUTA', 'FINALIZADO'],
+        )
+        self.assertEqual(
+            [(event['invoice_number'], event['outcome'], event['reason']) for event in self.api.get(f'/api/manifests/{manifest_id}/deliveries/').data],
+            [('C-000001', 'ENTREGADA', ''), ('C-000002', 'ENTREGADA', ''), ('C-000003', 'DEVUELTA', 'Destinatario ausente')],
+        )
+
+        # Rastreo y dashboard, desde la caché y al día
+        tracking.clear_local_cache()
+        with self.assertNumQueries(0):
+            entry = tracking.lookup('C-000003')
+            counts = dashboard.shipping_status_counts()
+        self.assertEqual(entry, tracking.represent(tracking.tracked_invoices().get(invoice_number='C-000003')))
+        self.assertEqual(counts, {'ENTREGADA': 2, 'DEVUELTA': 1})
+
+        self.assertEqual(self.api.post(url).status_code, 400)
+
+    def test_plain_create_assigns_number(self):
+        response = self.api.post('/api/manifests/', {'vehicle': self.vehicle.pk}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['manifest_number'], f'M{self.caracas.pk}-{timezone.localdate():%Y%m%d}-001')
+        self.assertEqual(response.data['status'], 'PLANIFICADO')
+
+
+class RouteTests(ApiTestCase):
+    """Orden de las paradas de un manifiesto sobre el grafo de oficinas (ver api/routing.py)."""
+
+    def setUp(self):
+        super().setUp()
+        self.maracay = Office.objects.create(name='Maracay', address='Av. Las Delicias')
+        self.barquisimeto = Office.objects.create(name='Barquisimeto', address='Av. Lara')
+        self.merida = Office.objects.create(name='Mérida', address='Av. Los Próceres')
+        # Una carretera: Caracas - Maracay - Valencia - Barquisimeto - Mérida
+        road = [self.caracas, self.maracay, self.valencia, self.barquisimeto, self.merida]
+        for (origin, destination), (km, minutes) in zip(zip(road, road[1:]), [(110, 90), (50, 45), (180, 150), (400, 360)]):
+            OfficeRoute.objects.create(origin=origin, destination=destination, distance_km=km, travel_minutes=minutes)
+        self.vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+
+    def dispatch(self, *destinations):
+        invoices = [self.create_invoice(f'R-{n:06d}', Decimal('10.00'), destination=office) for n, office in enumerate(destinations)]
+        response = self.api.post('/api/manifests/create-and-dispatch/', {
+            'vehicle': self.vehicle.pk, 'invoice_ids': [invoice.pk for invoice in invoices],
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        return ShipmentManifest.objects.get(pk=response.data['id'])
+
+    @override_settings(ROUTE_STOP_MINUTES=15)
+    def test_stops_in_road_order_with_eta(self):
+        manifest = self.dispatch(self.merida, self.valencia, self.barquisimeto, self.valencia)
+        response = self.api.get(f'/api/manifests/{manifest.pk}/route/')
+        self.assertEqual(response.status_code, 200, response.data)
+        stops = response.data['stops']
+        self.assertEqual(response.data['origin'], {'office': self.caracas.pk, 'name': 'Caracas'})
+        self.assertEqual([stop['name'] for stop in stops], ['Valencia', 'Barquisimeto', 'Mérida'])
+        self.assertEqual(stops[0]['via'], ['Maracay'])
+        self.assertEqual(stops[0]['invoices'], ['R-000001', 'R-000003'])
+        self.assertEqual([stop['travel_minutes'] for stop in stops], [135, 150, 360])
+        self.assertEqual(stops[0]['distance_km'], '160.00')
+        self.assertEqual((response.data['total_minutes'], response.data['total_distance_km']), (645, '740.00'))
+        # Viaje más los 15 minutos de descarga en cada parada anterior
+        self.assertEqual(
+            [serializers.DateTimeField().to_internal_value(stop['eta']) - manifest.departure_time for stop in stops],
+            [timedelta(minutes=135), timedelta(minutes=300), timedelta(minutes=675)],
+        )
+
+    def test_unreachable_office_and_graph_changes(self):
+        island = Office.objects.create(name='Margarita', address='Av. 4 de Mayo')
+        manifest = self.dispatch(self.valencia, island)
+        response = self.api.get(f'/api/manifests/{manifest.pk}/route/')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Margarita', str(response.data))
+
+        # Un tramo nuevo invalida el grafo en caché
+        response = self.api.post('/api/office-routes/', {
+            'origin': self.caracas.pk, 'destination': island.pk, 'distance_km': '330.00', 'travel_minutes': 300,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        response = self.api.get(f'/api/manifests/{manifest.pk}/route/')
+        self.assertEqual([stop['name'] for stop in response.data['stops']], ['Valencia', 'Margarita'])
+        # De Valencia a Margarita se vuelve por Caracas
+        self.assertEqual(response.data['stops'][1]['via'], ['Maracay', 'Caracas'])
+
+        response = self.api.post('/api/office-routes/', {
+            'origin': island.pk, 'destination': island.pk, 'distance_km': '1.00', 'travel_minutes': 1,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_solver_improves_on_nearest_neighbor(self):
+        import random
+        rng = random.Random(7)
+        for _ in range(20):
+            size = rng.randint(2, 30)
+            matrix = [[0 if a == b else rng.randint(1, 100) for b in range(size)] for a in range(size)]
+            route = routing.solve(matrix)
+            self.assertEqual((route[0], sorted(route)), (0, list(range(size))))
+            self.assertLessEqual(routing.route_cost(route, matrix), routing.route_cost(routing.nearest_neighbor(matrix), matrix))
+
+
+class FleetTests(ApiTestCase):
+    """Historial y uso de los vehículos (ver api/fleet.py)."""
+
+    def setUp(self):
+        super().setUp()
+        OfficeRoute.objects.create(origin=self.caracas, destination=self.valencia, distance_km=170, travel_minutes=150)
+        self.vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=1000)
+
+    def trip(self, *weights, **finalize):
+        invoices = [
+            self.create_invoice(f'F-{Invoice.objects.count() + 1:06d}', Decimal('10.00'), weight=Decimal(weight))
+            for weight in weights
+        ]
+        response = self.api.post('/api/manifests/create-and-dispatch/', {
+            'vehicle': self.vehicle.pk, 'invoice_ids': [invoice.pk for invoice in invoices], 'driver_id': self.user.pk,
+        }, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        manifest = ShipmentManifest.objects.get(pk=response.data['id'])
+        event = VehicleEvent.objects.get(manifest=manifest)
+        self.assertEqual((event.kind, event.driver, event.ended_at), ('VIAJE', self.user, None))
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.api.post(f'/api/manifests/{manifest.pk}/finalize_trip/', finalize, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        event.refresh_from_db()
+        return event
+
+    def test_trips_accumulate_utilization(self):
+        event = self.trip('300.00', '200.00')
+        self.assertIsNotNone(event.ended_at)
+        self.assertEqual((event.distance_km, event.load_kg, event.kg_km), (Decimal('170.00'), Decimal('500.00'), Decimal('85000.00')))
+        # Los kilómetros que informa el conductor reemplazan a los de la ruta
+        event = self.trip('100.00', distance_km='200.00')
+        self.assertEqual((event.distance_km, event.kg_km), (Decimal('200.00'), Decimal('20000.00')))
+
+        response = self.api.get('/api/vehicles/utilization/')
+        self.assertEqual(response.status_code, 200)
+        [row] = response.data
+        self.assertEqual((row['trips'], row['distance_km'], row['kg_km']), (2, '370.00', '105000.00'))
+        # 105.000 kg-km sobre 1.000 kg x 370 km
+        self.assertEqual(row['utilization_pct'], '28.4')
+        self.assertEqual((row['status'], row['idle_days']), ('Disponible', 0))
+        self.assertEqual(
+            [entry['manifest_number'] is not None for entry in self.api.get(f'/api/vehicles/{self.vehicle.pk}/events/').data],
+            [True, True],
+        )
+
+        # El recálculo desde los eventos da los mismos totales, y crea los viajes que falten
+        incremental = fleet.utilization()
+        VehicleEvent.objects.filter(pk=event.pk).delete()
+        call_command('rebuild_fleet_stats', stdout=StringIO())
+        # (sin los kilómetros informados: el viaje recreado usa los de la ruta)
+        self.assertEqual(fleet.utilization(), [
+            {**incremental[0], 'distance_km': Decimal('340.00'), 'kg_km': Decimal('102000.00'), 'utilization_pct': Decimal('30.0')},
+        ])
+
+    def test_maintenance_windows(self):
+        url = f'/api/vehicles/{self.vehicle.pk}/maintenance/'
+        response = self.api.post(url, {'notes': 'Cambio de aceite'}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['status'], 'En Mantenimiento')
+        self.assertEqual(self.api.post(url, {}, format='json').status_code, 400)
+        self.assertEqual(self.api.post(url + 'finish/').status_code, 200)
+        self.assertEqual(self.api.post(url + 'finish/').status_code, 400)
+
+        # Editar el estado también abre y cierra la ventana
+        self.api.patch(f'/api/vehicles/{self.vehicle.pk}/', {'status': 'En Mantenimiento'}, format='multipart')
+        self.assertTrue(VehicleEvent.objects.filter(kind='MANTENIMIENTO', ended_at__isnull=True).exists())
+        self.api.patch(f'/api/vehicles/{self.vehicle.pk}/', {'status': 'Disponible'}, format='multipart')
+
+        events = self.api.get(f'/api/vehicles/{self.vehicle.pk}/events/').data
+        self.assertEqual([(event['kind'], event['ended_at'] is not None) for event in events], [('MANTENIMIENTO', True)] * 2)
+        self.assertEqual(events[1]['notes'], 'Cambio de aceite')
+        [row] = fleet.utilization()
+        self.assertEqual((row['trips'], row['maintenance_count'], row['utilization_pct']), (0, 2, None))
+
+
+class DocumentTests(ApiTestCase):
+    """PDF de guías y manifiestos con el membrete de la empresa (ver api/documents.py y api/pdf.py)."""
+
+    def setUp(self):
+        super().setUp()
+        documents.clear_compiled()
+        self.company = CompanyInfo.objects.create(name='Transporte Alianza', rif='J-12345678-9', address='Caracas', phone='0212')
+
+    def pages(self, content):
+        """Texto de cada página del PDF, en el orden del archivo."""
+        self.assertTrue(content.startswith(b'%PDF-1.4') and content.endswith(b'%%EOF\n'))
+        streams = re.findall(rb'/Filter /FlateDecode /Length \d+ >>\nstream\n(.*?)\nendstream', content, re.S)
+        self.assertEqual(len(streams), int(re.search(rb'/Count (\d+)', content).group(1)))
+        return [zlib.decompress(stream).decode('cp1252') for stream in streams]
+
+    def test_invoice_guide(self):
+        invoice = self.create_invoice('C-000001', Decimal('1234.50'), weight=Decimal('12.50'))
+        response = self.api.get(f'/api/invoices/{invoice.pk}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('guia-C-000001.pdf', response['Content-Disposition'])
+        [page] = self.pages(response.content)
+        for text in ('GUÍA DE ENVÍO', 'C-000001', 'Transporte Alianza', 'RIF: J-12345678-9', 'Remitente', 'V-2000', '1.234,50', '12,50'):
+            self.assertIn(text, page)
+        self.assertIn('Página 1 de 1', page)
+        self.assertNotIn(b'/DCTDecode', response.content)
+
+        # Los errores se responden en JSON
+        response = self.api.get('/api/invoices/999999/pdf/')
+        self.assertEqual((response.status_code, response['Content-Type']), (404, 'application/json'))
+
+    def test_logo_and_compiled_templates_are_cached(self):
+        from PIL import Image
+        image = io.BytesIO()
+        Image.new('RGBA', (1200, 600), (200, 0, 0, 128)).save(image, 'PNG')
+        self.company.logo = SimpleUploadedFile('logo.png', image.getvalue(), content_type='image/png')
+        self.company.save()
+        self.addCleanup(self.company.logo.delete, save=False)
+
+        templates, logo = documents.branding()
+        self.assertEqual(logo[1:], (280, 140))
+        self.assertIs(documents.branding()[0], templates)
+        documents.clear_compiled()
+        # Otro proceso: el logo escalado sale de la caché compartida, sin abrir el archivo
+        with mock.patch.object(documents, '_scaled_logo') as scale:
+            self.assertEqual(documents.branding()[1], logo)
+        scale.assert_not_called()
+
+        # Editar la empresa recompila las plantillas
+        self.company.name = 'Alianza Express'
+        self.company.save()
+        self.assertIsNot(documents.branding()[0], templates)
+        invoice = self.create_invoice('C-000001', Decimal('10.00'), weight=Decimal('1.00'))
+        content = documents.invoice_pdf(invoice)
+        self.assertEqual(content.count(b'/DCTDecode'), 1)
+        self.assertIn('Alianza Express', self.pages(content)[0])
+
+    def test_manifest_with_guides(self):
+        vehicle = Vehicle.objects.create(license_plate='AB123CD', brand='Iveco', model='Daily', year=2020, capacity_kg=3500)
+        invoices = [self.create_invoice(f'C-00000{n}', Decimal('10.00'), weight=Decimal('2.00')) for n in (1, 2, 3)]
+        MerchandiseItem.objects.bulk_create(
+            MerchandiseItem(invoice=invoices[2], quantity=1, description=f'Caja {n}', weight=1) for n in range(pdf.GUIDE_ROWS)
+        )
+        response = self.api.post('/api/manifests/create-and-dispatch/', {
+            'vehicle': vehicle.pk, 'invoice_ids': [invoice.pk for invoice in invoices],
+        }, format='json')
+        manifest = ShipmentManifest.objects.get(pk=response.data['id'])
+
+        response = self.api.get(f'/api/manifests/{manifest.pk}/pdf/')
+        self.assertEqual(response.status_code, 200)
+        pages = self.pages(response.content)
+        # Resumen, dos guías de una página y una de dos
+        self.assertEqual(len(pages), 5)
+        self.assertIn('MANIFIESTO DE CARGA', pages[0])
+        self.assertIn('AB123CD - Iveco Daily', pages[0])
+        self.assertIn('Guías: 3', pages[0])
+        self.assertEqual([page.count('GUÍA DE ENVÍO') for page in pages[1:]], [1] * 4)
+        self.assertIn('Página 2 de 2', pages[4])
+        self.assertIn(manifest.manifest_number, pages[1])
+
+        self.assertEqual(len(self.pages(self.api.get(f'/api/manifests/{manifest.pk}/pdf/?guides=0').content)), 1)
+
+        # El pool de procesos produce el mismo archivo
+        with override_settings(PDF_POOL_MIN_GUIDES=1):
+            self.assertEqual(documents.manifest_pdf(manifest, workers=2), response.content)
+
+
+class CompressionTests(ApiTestCase):
+    """FastJSONRenderer (api/renderers.py) y CompressionMiddleware (api/compression.py)."""
+
+    def test_fast_renderer_matches_drf(self):
+        moment = timezone.now()
+        data = [
+            {
+                'id': index, 'total': Decimal('10.50'), 'created_at': moment, 'local': timezone.localtime(moment),
+                'day': moment.date(), 'name': 'Peña\u2028Núñez', 'items': [{'weight': '1.00'}], 'empty': None,
+            }
+            for index in range(25)
+        ]
+        renderer = FastJSONRenderer()
+        renderer.chunk_size = 10
+        for value in (data, data[:3], [], {'count': 25, 'results': data}, 'texto', None):
+            with self.subTest(value=type(value).__name__):
+                self.assertEqual(renderer.render(value), JSONRenderer().render(value))
+        media_type = 'application/json; indent=2'
+        self.assertEqual(renderer.render(data, media_type), JSONRenderer().render(data, media_type))
+
+    def test_negotiation(self):
+        best = 'br' if 'br' in compression.available() else 'gzip'
+        self.assertEqual(compression.negotiate('gzip, deflate, br'), best)
+        self.assertEqual(compression.negotiate('br;q=0.5, gzip;q=0.8'), 'gzip')
+        self.assertEqual(compression.negotiate('*'), best)
+        self.assertIsNone(compression.negotiate('gzip;q=0, br;q=0'))
+        self.assertIsNone(compression.negotiate('identity'))
+        self.assertIsNone(compression.negotiate(''))
+
+    @override_settings(COMPRESSION_MIN_BYTES=200)
+    def test_large_responses_are_compressed(self):
+        for index in range(10):
+            self.create_invoice(f'C-00000{index}', Decimal('10.00'), weight=Decimal('1.00'))
+        plain = self.api.get('/api/invoices/')
+        self.assertFalse(plain.has_header('Content-Encoding'))
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.api.get('/api/invoices/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertLess(len(response.content), len(plain.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        # Las respuestas pequeñas y los PDF se envían tal cual
+        small = self.api.get('/api/invoices/999999/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertFalse(small.has_header('Content-Encoding'))
+        invoice = Invoice.objects.order_by('pk').first()
+        self.assertFalse(self.api.get(f'/api/invoices/{invoice.pk}/pdf/', HTTP_ACCEPT_ENCODING='gzip').has_header('Content-Encoding'))
+
+    def test_streams_are_compressed_chunk_by_chunk(self):
+        chunks = [json.dumps({'seq': index}).encode() for index in range(100)]
+        compressed = list(compression.compress_stream(iter(chunks), 'gzip'))
+        # Cada trozo sale al cliente sin esperar al final
+        self.assertEqual(len(compressed), len(chunks) + 1)
+        self.assertEqual(zlib.decompressobj(31).decompress(b''.join(compressed[:3])), b''.join(chunks[:3]))
+        self.assertEqual(gzip.decompress(b''.join(compressed)), b''.join(chunks))
+
+
+class IdempotencyTests(ApiTestCase):
+    """Cabecera Idempotency-Key (ver api/idempotency.py)."""
+    url = '/api/invoices/'
+
+    def payload(self, sender='3000', total='11.60'):
+        # Cada factura nueva lleva clientes nuevos: ClientSerializer rechaza documentos repetidos
+        return {
+            'sender': {'id_type': 'V', 'id_number': sender, 'name': 'Nuevo remitente'},
+            'recipient': {'id_type': 'J', 'id_number': f'{sender}-1', 'name': 'Nuevo destinatario'},
+            'items': [{'quantity': 1, 'description': 'Caja', 'weight': '3.00'}],
+            'subtotal': '10.00', 'tax': '1.60', 'total': total,
+            'destination_office_id': self.valencia.id,
+        }
+
+    def post(self, payload, key='reintento-1'):
+        return self.api.post(self.url, payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_replays_the_stored_response(self):
+        first = self.post(self.payload())
+        self.assertEqual(first.status_code, 201, first.data)
+        retry = self.post(self.payload())
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(Invoice.objects.count(), 1)
+
+        # Otra clave, u otro usuario con la misma clave, crea otra factura
+        self.assertEqual(self.post(self.payload('3001'), key='reintento-2').status_code, 201)
+        other = User.objects.create_user('otro', 'clave-segura', office=self.caracas)
+        self.api.force_authenticate(other)
+        self.assertEqual(self.post(self.payload('3002')).status_code, 201)
+        self.assertEqual(Invoice.objects.count(), 3)
+
+    def test_reused_key_with_other_body_and_failed_requests(self):
+        self.assertEqual(self.post(self.payload()).status_code, 201)
+        self.assertEqual(self.post(self.payload(total='20.00')).status_code, 422)
+
+        # Una respuesta de error no se guarda: la clave se puede reintentar
+        self.assertEqual(self.post(self.payload(), key='otra').status_code, 400)  # clientes ya registrados
+        self.assertFalse(IdempotencyKey.objects.filter(key='otra').exists())
+        self.assertEqual(self.post(self.payload('3001'), key='otra').status_code, 201)
+
+    @override_settings(IDEMPOTENCY_WAIT_SECONDS=0)
+    def test_duplicate_of_a_request_in_progress(self):
+        record = IdempotencyKey.objects.create(
+            user=self.user, key='reintento-1', fingerprint=self._fingerprint(),
+            expires_at=timezone.now() + timedelta(hours=1),
+        )
+        self.assertEqual(self.post(self.payload()).status_code, 409)
+        self.assertEqual(Invoice.objects.count(), 0)
+
+        # Una petición en curso por más de IDEMPOTENCY_LOCK_SECONDS se da por abandonada
+        IdempotencyKey.objects.filter(pk=record.pk).update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(self.post(self.payload()).status_code, 201)
+        self.assertEqual(Invoice.objects.count(), 1)
+
+    def test_prune_deletes_expired_keys(self):
+        self.post(self.payload())
+        IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command('prune_idempotency_keys', stdout=out)
+        self.assertIn('1 claves', out.getvalue())
+        # Vencida la clave, la misma petición se ejecuta de nuevo
+        self.assertEqual(self.post(self.payload()).status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+    def _fingerprint(self):
+        request = APIRequestFactory().post(self.url, self.payload(), format='json')
+        return idempotency.fingerprint(Request(request, parsers=[JSONParser()]))
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """Lecturas desde la base 'replica', que aquí es una copia atrasada (ver config/settings_test.py)."""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('operador', 'clave-segura')
+        Client.objects.create(id_type='V', id_number='1000', name='En la principal')
+        Client.objects.using('replica').create(id_type='V', id_number='9000', name='En la réplica')
+        self.api = APIClient()
+        self.api.force_authenticate(self.user)
+
+    def client_names(self, api):
+        response = api.get('/api/clients/')
+        self.assertEqual(response.status_code, 200)
+        return [client['name'] for client in response.data]
+
+    def test_read_actions_use_replica_until_the_user_writes(self):
+        self.assertEqual(self.client_names(self.api), ['En la réplica'])
+
+        response = self.api.post('/api/clients/', {'id_type': 'V', 'id_number': '2000', 'name': 'Nuevo'}, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Quien escribió lee de la principal; los demás siguen en la réplica
+        self.assertEqual(self.client_names(self.api), ['En la principal', 'Nuevo'])
+        other = APIClient()
+        other.force_authenticate(User.objects.create_user('otro', 'clave-segura'))
+        self.assertEqual(self.client_names(other), ['En la réplica'])
+
+        # Vencida la marca, el usuario vuelve a la réplica
+        cache.clear()
+        self.assertEqual(self.client_names(self.api), ['En la réplica'])
+
+    def test_other_actions_read_and_write_primary(self):
+        client = Client.objects.get()
+        Client.objects.using('replica').update(name='Atrasado')
+        # La actualización busca el cliente en la principal, no en la réplica
+        response = self.api.patch(f'/api/clients/{client.pk}/', {'phone': '0212'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['name'], 'En la principal')
+        # Fuera de una petición (comandos, tareas) todo va a la principal
+        self.assertEqual(Client.objects.get().phone, '0212')
+        self.assertEqual(Client.objects.using('replica').get().phone, '')
+
+    def test_async_dashboard_reads_from_replica(self):
+        office = Office.objects.using('replica').create(name='Caracas', address='Centro')
+        author = User.objects.db_manager('replica').create_user('autor', 'clave-segura')
+        # Sin señales: su auditoría se escribiría en la principal
+        Expense.objects.using('replica').bulk_create([
+            Expense(description='Peaje', amount=Decimal('80.00'), office=office, created_by=author),
+        ])
+        CompanyInfo.objects.using('replica').create()
+        auth = {'authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+        response = async_to_sync(AsyncClient().get)('/api/dashboard-stats/', headers=auth)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['total_expenses_month'], 80.0)
+        # Leer el dashboard no cuenta como escritura del usuario
+        self.assertFalse(db_router.is_sticky(self.user))
+        self.assertEqual(self.api.get('/api/dashboard-stats/').json(), response.json())
+
+
+class MigrationTests(TestCase):
+    """La migración compactada conserva los datos iniciales de 0009."""
+
+    def test_squashed_migration_seeds_permissions_and_roles(self):
+        self.assertTrue(Permission.objects.filter(key='system.backupRestore').exists())
+        support = Role.objects.get(name='Soporte Técnico')
+        self.assertEqual(support.permissions.count(), Permission.objects.count())
+        self.assertTrue(Role.objects.get(name='Operador').permissions.filter(key='invoices.create').exists())
@@ -0,0 +1,109 @@
+# api/tracking.py
+
+"""
+Rastreo público de envíos por número de factura (GET /api/tracking/<número>/).
+
+Las consultas se sirven de una caché de lectura en dos niveles:
+
+- la caché compartida (CACHE_BACKEND), que se invalida por número cuando la
+  factura o su manifiesto cambian (ver api/signals.py y changefeed.update());
+  al finalizar un viaje las entradas se actualizan en su lugar (patch());
+- una copia en la memoria del proceso que vive TRACKING_LOCAL_CACHE_SECONDS,
+  para que un número muy consultado no salga ni a la caché compartida. Otro
+  proceso puede servir un estado viejo a lo sumo durante ese tiempo.
+
+Los números inexistentes también se cachean (TRACKING_NOT_FOUND_TIMEOUT) para
+que probar números al azar no llegue a la base de datos. Las facturas
+archivadas (ver api/archive.py) se sirven con los datos guardados al archivarlas.
+"""
+
+import time
+
+from django.conf import settings
+
+from .cache import CacheNamespace
+from .models import ArchivedInvoice, Invoice
+from .serializers import TrackingSerializer
+
+namespace = CacheNamespace('tracking')
+
+# Marca en caché de un número que no existe
+NOT_FOUND = 'no-existe'
+
+_local = {}
+
+
+def lookup(number):
+    """Datos públicos del envío, o None si el número no existe."""
+    now = time.monotonic()
+    entry = _local.get(number)
+    if entry is not None and entry[0] > now:
+        data = entry[1]
+    else:
+        data = namespace.get((number,))
+        if data is None:
+            data = _load(number)
+            timeout = settings.TRACKING_NOT_FOUND_TIMEOUT if data == NOT_FOUND else settings.TRACKING_CACHE_TIMEOUT
+            namespace.set((number,), data, timeout=timeout)
+        if len(_local) >= settings.TRACKING_LOCAL_CACHE_SIZE:
+            _local.clear()
+        _local[number] = (now + settings.TRACKING_LOCAL_CACHE_SECONDS, data)
+    return None if data == NOT_FOUND else data
+
+
+def _load(number):
+    invoice = tracked_invoices().filter(invoice_number=number).first()
+    if invoice is not None:
+        return represent(invoice)
+    archived = ArchivedInvoice.objects.filter(invoice_number=number).values_list('tracking', flat=True).first()
+    return NOT_FOUND if archived is None else archived
+
+
+def tracked_invoices():
+    """Facturas con lo que necesita TrackingSerializer, en una sola consulta."""
+    return (
+        Invoice.objects
+        .select_related('origin_office', 'destination_office', 'manifest')
+        .only(
+            'invoice_number', 'shipping_status', 'created_at', 'origin_office__name', 'destination_office__name',
+            'manifest__status', 'manifest__departure_time', 'manifest__arrival_time',
+        )
+    )
+
+
+def represent(invoice):
+    return dict(TrackingSerializer(invoice).data)
+
+
+def invalidate(numbers):
+    numbers = list(numbers)
+    for number in numbers:
+        _local.pop(number, None)
+    namespace.delete_many([(number,) for number in numbers])
+
+
+def patch(changes):
+    """
+    Aplica los cambios {número: {campo: valor del modelo}} a las entradas que
+    ya están en la caché compartida, sin leer la base de datos; los números
+    que no están en caché se cargarán completos en su próxima consulta.
+    """
+    fields = TrackingSerializer().fields
+    display = dict(Invoice.SHIPPING_STATUS_CHOICES)
+    patched = {}
+    for (number,), data in namespace.get_many([(number,) for number in changes]).items():
+        if data == NOT_FOUND:
+            continue
+        data = dict(data)
+        for name, value in changes[number].items():
+            data[name] = None if value is None else fields[name].to_representation(value)
+            if name == 'shipping_status':
+                data['shipping_status_display'] = display[value]
+        patched[(number,)] = data
+    namespace.set_many(patched, timeout=settings.TRACKING_CACHE_TIMEOUT)
+    for number in changes:
+        _local.pop(number, None)
+
+
+def clear_local_cache():
+    _local.clear()
@@ -0,0 +1,109 @@
+# api/transitions.py
+
+"""
+Máquina de estados de las facturas y cambio de estado masivo
+(POST /api/invoices/bulk-status/).
+
+Un cambio masivo bloquea las facturas pedidas, las agrupa por su estado
+actual y aplica un UPDATE condicionado (WHERE estado = origen) por cada
+estado de origen permitido. La auditoría, el feed de cambios, el log de
+sincronización y las cachés se actualizan en bloque, ya que .update() no
+dispara señales.
+"""
+
+from collections import defaultdict
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import changefeed, reports
+from .cache import on_commit_too
+from .models import AuditLog, Invoice
+
+# Campo -> {estado de origen: estados de destino permitidos}
+TRANSITIONS = {
+    'payment_status': {
+        'PENDIENTE_PAGO': {'PAGADA', 'ANULADA'},
+        'PAGADA': {'PENDIENTE_PAGO', 'ANULADA'},
+        'ANULADA': set(),
+    },
+    'shipping_status': {
+        'PENDIENTE_DESPACHO': {'EN_TRANSITO'},
+        'EN_TRANSITO': {'ENTREGADA', 'DEVUELTA'},
+        'DEVUELTA': {'PENDIENTE_DESPACHO', 'EN_TRANSITO'},
+        'ENTREGADA': set(),
+    },
+}
+
+# Anular exige un permiso propio; los demás cambios, invoices.changeStatus
+VOID_STATUS = 'ANULADA'
+
+# Una factura solo sale en tránsito en un manifiesto despachado (ver
+# api/manifests.py): en bloque se rechazan las que no tienen uno en ruta
+REQUIRES_DISPATCHED_MANIFEST = {('shipping_status', 'EN_TRANSITO')}
+DISPATCHED_MANIFEST_STATUS = 'EN_RUTA'
+
+
+def _invalidate_reports(moments):
+    for moment in moments:
+        reports.invalidate_period(moment)
+
+
+def required_permission(target):
+    return 'invoices.void' if target == VOID_STATUS else 'invoices.changeStatus'
+
+
+def sources_for(field, target):
+    return [source for source, targets in TRANSITIONS[field].items() if target in targets]
+
+
+def bulk_transition(queryset, ids, field, target, user):
+    """
+    Lleva a `target` las facturas `ids` de `queryset` (las que el usuario puede
+    ver). Devuelve {'updated': [...], 'unchanged': [...], 'rejected': [...]},
+    donde cada rechazo indica el id, el motivo y el estado actual si existe.
+    """
+    sources = sources_for(field, target)
+    needs_manifest = (field, target) in REQUIRES_DISPATCHED_MANIFEST
+    with transaction.atomic():
+        current = {
+            pk: (number, state, created_at, manifest_status)
+            for pk, number, state, created_at, manifest_status in (
+                queryset.filter(pk__in=ids).select_for_update(of=('self',))
+                .values_list('pk', 'invoice_number', field, 'created_at', 'manifest__status').order_by()
+            )
+        }
+        by_source = defaultdict(list)
+        unchanged, rejected = [], []
+        for pk in dict.fromkeys(ids):
+            if pk not in current:
+                rejected.append({'id': pk, 'reason': 'no_encontrada'})
+            elif current[pk][1] == target:
+                unchanged.append(pk)
+            elif current[pk][1] not in sources:
+                rejected.append({'id': pk, 'reason': 'transicion_invalida', 'current': current[pk][1]})
+            elif needs_manifest and current[pk][3] != DISPATCHED_MANIFEST_STATUS:
+                rejected.append({'id': pk, 'reason': 'sin_manifiesto_despachado', 'current': current[pk][1]})
+            else:
+                by_source[current[pk][1]].append(pk)
+
+        updated = []
+        for source, pks in by_source.items():
+            # Las filas están bloqueadas; la condición sobre el origen es una garantía más
+            Invoice.objects.filter(pk__in=pks, **{field: source}).update(**{field: target})
+            updated.extend(pks)
+
+        rows = [(pk, current[pk][0], current[pk][1]) for pk in updated]
+        changefeed.record_bulk(Invoice, field, target, rows)
+        AuditLog.objects.bulk_create([
+            AuditLog(
+                user=user, action="Cambio de Estado de Factura",
+                details=f"Factura N° {number}: {field} {old} -> {target}.",
+            )
+            for _, number, old in rows
+        ])
+        if field == 'payment_status':
+            # Las facturas anuladas no cuentan en los reportes de ganancias y pérdidas
+            days = {timezone.localtime(current[pk][2]).date(): current[pk][2] for pk in updated}
+            on_commit_too(lambda: _invalidate_reports(days.values()))
+    return {'updated': updated, 'unchanged': unchanged, 'rejected': rejected}
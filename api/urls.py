@@ -6,10 +6,11 @@ from .views import (
     RegisterUserView, get_user_profile,
     ClientViewSet, InvoiceViewSet, VehicleViewSet, ShipmentManifestViewSet,
     ExpenseViewSet, get_dashboard_stats, AuditLogViewSet, CompanyInfoView,
-    SupplierViewSet, AssetCategoryViewSet, AssetViewSet, OfficeViewSet,
+    SupplierViewSet, AssetCategoryViewSet, AssetViewSet, OfficeViewSet, OfficeRouteViewSet,
     RoleViewSet, PermissionViewSet, UserViewSet,
     # CAMBIO: Importar las nuevas vistas
-    ShippingTypeViewSet, PaymentMethodViewSet, ExpenseCategoryViewSet, CategoryViewSet
+    ShippingTypeViewSet, PaymentMethodViewSet, ExpenseCategoryViewSet, CategoryViewSet,
+    ProfitAndLossReportView, ExchangeRateViewSet, ChangeFeedView, SyncView, TrackingView, BackupView, RestoreView, CleanupView, prometheus_metrics
 )
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 
@@ -24,6 +25,7 @@ router.register(r'suppliers', SupplierViewSet)
 router.register(r'asset-categories', AssetCategoryViewSet)
 router.register(r'assets', AssetViewSet)
 router.register(r'offices', OfficeViewSet)
+router.register(r'office-routes', OfficeRouteViewSet)
 router.register(r'roles', RoleViewSet)
 router.register(r'permissions', PermissionViewSet)
 router.register(r'users', UserViewSet)
@@ -32,6 +34,7 @@ router.register(r'shipping-types', ShippingTypeViewSet)
 router.register(r'payment-methods', PaymentMethodViewSet)
 router.register(r'expense-categories', ExpenseCategoryViewSet)
 router.register(r'categories', CategoryViewSet)
+router.register(r'exchange-rates', ExchangeRateViewSet)
 
 
 urlpatterns = [
@@ -41,5 +44,13 @@ urlpatterns = [
     path('profile/', get_user_profile, name='user_profile'),
     path('dashboard-stats/', get_dashboard_stats, name='dashboard_stats'),
     path('company-info/', CompanyInfoView.as_view(), name='company-info'),
+    path('reports/profit-loss/', ProfitAndLossReportView.as_view(), name='reports-profit-loss'),
+    path('metrics/', prometheus_metrics, name='metrics'),
+    path('changes/', ChangeFeedView.as_view(), name='change-feed'),
+    path('sync/', SyncView.as_view(), name='sync'),
+    path('tracking/<str:invoice_number>/', TrackingView.as_view(), name='tracking'),
+    path('backup/', BackupView.as_view(), name='backup'),
+    path('backup/restore/', RestoreView.as_view(), name='backup-restore'),
+    path('cleanup/', CleanupView.as_view(), name='cleanup'),
     path('', include(router.urls)),
 ]
\ No newline at end of file
@@ -0,0 +1,28 @@
+# api/urls_async.py
+
+# Rutas servidas por vistas asíncronas bajo ASGI (ver api/async_views.py).
+# config.urls_asgi las antepone a api/urls.py, que atiende todo lo demás.
+
+from django.urls import path
+
+from . import async_views
+from .views import (
+    CategoryViewSet, ExpenseCategoryViewSet, OfficeViewSet, PaymentMethodViewSet, PermissionViewSet,
+    RoleViewSet, ShippingTypeViewSet,
+)
+
+urlpatterns = [
+    path('profile/', async_views.user_profile),
+    path('dashboard-stats/', async_views.dashboard_stats),
+    path('invoices/by-number/<str:number>/', async_views.invoice_by_number),
+    path('changes/', async_views.change_feed),
+    # Solo bajo ASGI: bajo WSGI cada conexión abierta ocuparía un hilo
+    path('changes/stream/', async_views.change_stream),
+    path('offices/', async_views.reference_list(OfficeViewSet)),
+    path('roles/', async_views.reference_list(RoleViewSet)),
+    path('permissions/', async_views.reference_list(PermissionViewSet)),
+    path('shipping-types/', async_views.reference_list(ShippingTypeViewSet)),
+    path('payment-methods/', async_views.reference_list(PaymentMethodViewSet)),
+    path('expense-categories/', async_views.reference_list(ExpenseCategoryViewSet)),
+    path('categories/', async_views.reference_list(CategoryViewSet)),
+]
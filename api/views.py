@@ -1,25 +1,59 @@
+import hmac
+import tarfile
+import tempfile
+
 from rest_framework import generics, viewsets, status
 from rest_framework.permissions import AllowAny, IsAuthenticated, IsAdminUser
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from django.db.models import Sum, Count
+from rest_framework.pagination import LimitOffsetPagination
+from rest_framework.throttling import ScopedRateThrottle
+from rest_framework import serializers
+from django.db.models import Sum
 from django.utils import timezone
-from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.parsers import JSONParser, MultiPartParser, FormParser
 from django.db import transaction # Se importa transaction que faltaba
+from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.http import FileResponse, HttpResponse, HttpResponseForbidden
 from .models import (
-    User, Client, Invoice, Vehicle, ShipmentManifest, Expense, Office, AuditLog, CompanyInfo,
-    Role, Permission, Supplier, AssetCategory, Asset, ShippingType, PaymentMethod, ExpenseCategory, Category
+    User, Client, Invoice, Vehicle, ShipmentManifest, Expense, Office, OfficeRoute, AuditLog, CompanyInfo,
+    Role, Permission, Supplier, AssetCategory, Asset, ShippingType, PaymentMethod, ExpenseCategory, Category,
+    ExchangeRate
 )
 from .serializers import (
     RegisterUserSerializer, UserSerializer, ClientSerializer, 
-    InvoiceSerializer, CreateInvoiceSerializer, VehicleSerializer,
-    ShipmentManifestSerializer, DispatchSerializer, ExpenseSerializer,
+    InvoiceSerializer, CreateInvoiceSerializer, invoice_rows, VehicleSerializer,
+    ShipmentManifestSerializer, DispatchSerializer, CreateDispatchSerializer, FinalizeTripSerializer,
+    DeliveryEventSerializer, RouteSerializer, VehicleEventSerializer, MaintenanceSerializer,
+    VehicleUtilizationSerializer, ExpenseSerializer,
     AuditLogSerializer, CompanyInfoSerializer, SupplierSerializer,
     AssetCategorySerializer, AssetSerializer, CreateAssetSerializer,
-    RoleSerializer, PermissionSerializer, OfficeSerializer,
-    ShippingTypeSerializer, PaymentMethodSerializer, ExpenseCategorySerializer, CategorySerializer
+    RoleSerializer, PermissionSerializer, OfficeSerializer, OfficeRouteSerializer,
+    ShippingTypeSerializer, PaymentMethodSerializer, ExpenseCategorySerializer, CategorySerializer,
+    ProfitAndLossQuerySerializer, ExchangeRateSerializer, StatusChangeSerializer, ChangeFeedQuerySerializer,
+    SyncQuerySerializer, BulkStatusSerializer, CleanupSerializer
 )
+from .permissions import HasPermissionKey, user_has_permission_key
+from .cache import CachedReferenceMixin, reference_namespace
+from .db_router import ReplicaReadsMixin, use_replica
+from .idempotency import idempotent
+from .renderers import FastJSONRenderer, ListChunks, PDFRenderer
+from . import reports
+from . import archive
+from . import backup
+from . import changefeed
+from . import dashboard
+from . import documents
+from . import fleet
+from . import manifests
+from . import routing
+from . import sync
+from . import tracking
+from . import transitions
+from . import currency as currencies
+from .metrics import registry as metrics_registry
 
 # --- VISTAS DE LA FASE 2 (Sin cambios) ---
 class RegisterUserView(generics.CreateAPIView):
@@ -36,19 +70,61 @@ def get_user_profile(request):
 
 # --- NUEVAS VISTAS DE LA FASE 3 ---
 
-class ClientViewSet(viewsets.ModelViewSet):
+def pdf_response(content, filename):
+    return Response(content, headers={'Content-Disposition': f'inline; filename="{filename}"'})
+
+def visible_invoices(user):
+    """
+    Filtra las facturas para que los usuarios solo vean lo que les corresponde.
+    - Admin General ve todo.
+    - Admin de Oficina ve todas las de su oficina.
+    - Usuario Normal solo ve las que él creó.
+    El usuario debe venir con su rol cargado (select_related) si se usa desde una vista asíncrona.
+    """
+    # Clientes e items se cargan junto con las facturas, no una consulta por fila
+    queryset = Invoice.objects.select_related('sender', 'recipient').prefetch_related('items').order_by('-created_at')
+    
+    if sees_all_invoices(user):
+        return queryset
+    
+    if user.role and user.role.name == 'Admin de Oficina':
+        return queryset.filter(origin_office=user.office_id)
+        
+    return queryset.filter(created_by=user)
+
+def sees_all_invoices(user):
+    return user.is_superuser or bool(user.role and user.role.name == 'Admin General')
+
+class ClientViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """API endpoint para ver y editar clientes."""
     queryset = Client.objects.all()
     serializer_class = ClientSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = LimitOffsetPagination
+    query_budget = {'list': 3, 'retrieve': 2}
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+    def get_queryset(self):
+        """Búsqueda por documento: ?id_type=V&id_number=12345678 (usa el índice único)."""
+        queryset = Client.objects.all().order_by('id')
+        id_number = self.request.query_params.get('id_number')
+        if id_number:
+            queryset = queryset.filter(id_number=id_number)
+            id_type = self.request.query_params.get('id_type')
+            if id_type:
+                queryset = queryset.filter(id_type=id_type)
+        return queryset
+
+class InvoiceViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """
     API endpoint para facturas.
     Usa un serializer diferente para 'create' vs 'list'/'retrieve'.
     """
     queryset = Invoice.objects.all().order_by('-created_at')
     permission_classes = [IsAuthenticated]
+    # Sin ?limit= la lista se devuelve completa, como antes
+    pagination_class = LimitOffsetPagination
+    query_budget = {'list': 5, 'retrieve': 4, 'by_number': 4, 'bulk_status': 12}
+    replica_actions = ('list', 'retrieve', 'by_number', 'pdf')
 
     def get_serializer_class(self):
         if self.action == 'create':
@@ -56,38 +132,113 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         return InvoiceSerializer
     
     def get_queryset(self):
-        """
-        Filtra las facturas para que los usuarios solo vean lo que les corresponde.
-        - Admin General ve todo.
-        - Admin de Oficina ve todas las de su oficina.
-        - Usuario Normal solo ve las que él creó.
-        """
-        user = self.request.user
-        
-        if user.is_superuser or (user.role and user.role.name == 'Admin General'):
-            return Invoice.objects.all().order_by('-created_at')
-        
-        if user.role and user.role.name == 'Admin de Oficina':
-            return Invoice.objects.filter(origin_office=user.office).order_by('-created_at')
-            
-        return Invoice.objects.filter(created_by=user).order_by('-created_at')
+        return visible_invoices(self.request.user)
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        # Un reintento con la misma Idempotency-Key no consume otro número de factura
+        return super().create(request, *args, **kwargs)
+
+    def list(self, request, *args, **kwargs):
+        # Misma respuesta que InvoiceSerializer, armada desde tuplas (ver api/row_serializers.py)
+        queryset = invoice_rows.values(self.filter_queryset(self.get_queryset()))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(invoice_rows.serialize(page))
+        if isinstance(request.accepted_renderer, FastJSONRenderer):
+            # La lista completa se arma y codifica por tramos: en memoria
+            # quedan los bytes del JSON, no un dict por factura
+            return Response(ListChunks(invoice_rows.serialize_chunks(queryset)))
+        return Response(invoice_rows.serialize(queryset))
+
+    @action(detail=False, methods=['get'], url_path=r'by-number/(?P<number>[^/]+)')
+    def by_number(self, request, number=None):
+        """Busca una factura por su número (ej: C-000123)."""
+        invoice = get_object_or_404(self.get_queryset(), invoice_number=number)
+        return Response(InvoiceSerializer(invoice).data)
+
+    @action(detail=False, methods=['post'], url_path='bulk-status')
+    @idempotent
+    def bulk_status(self, request):
+        """Cambia el estado de pago o de envío de varias facturas (ver api/transitions.py)."""
+        serializer = BulkStatusSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        if not user_has_permission_key(request.user, transitions.required_permission(data['status'])):
+            return Response({'detail': 'No tienes permiso para realizar esta acción.'}, status=status.HTTP_403_FORBIDDEN)
+        queryset = visible_invoices(request.user).prefetch_related(None)
+        return Response(transitions.bulk_transition(queryset, data['ids'], data['field'], data['status'], request.user))
+
+    @action(detail=True, methods=['get'], renderer_classes=[PDFRenderer])
+    def pdf(self, request, pk=None):
+        """Guía de envío en PDF con el membrete de la empresa (ver api/documents.py)."""
+        invoice = self.get_object()
+        return pdf_response(documents.invoice_pdf(invoice), f'guia-{invoice.invoice_number}.pdf')
     
 
-class VehicleViewSet(viewsets.ModelViewSet):
+class VehicleViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """API endpoint para la flota de vehículos."""
     queryset = Vehicle.objects.all()
     serializer_class = VehicleSerializer
     permission_classes = [IsAuthenticated]
     parser_classes = (MultiPartParser, FormParser)
+    replica_actions = ('utilization',)
+    query_budget = {'utilization': 1}
+
+    @action(detail=False, methods=['get'])
+    def utilization(self, request):
+        """Uso de toda la flota en una consulta (ver api/fleet.py)."""
+        return Response(VehicleUtilizationSerializer(fleet.utilization(), many=True).data)
+
+    @action(detail=True, methods=['get'])
+    def events(self, request, pk=None):
+        """Historial del vehículo: viajes y mantenimientos, del más reciente al más antiguo."""
+        events = self.get_object().events.select_related('manifest').order_by('-started_at', '-pk')
+        return Response(VehicleEventSerializer(events, many=True).data)
+
+    @action(detail=True, methods=['post'], parser_classes=[JSONParser, FormParser, MultiPartParser])
+    def maintenance(self, request, pk=None):
+        """Pone en mantenimiento un vehículo disponible."""
+        vehicle = self.get_object()
+        serializer = MaintenanceSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        fleet.start_maintenance(vehicle, serializer.validated_data['notes'])
+        return Response(VehicleSerializer(vehicle, context={'request': request}).data)
 
-class ShipmentManifestViewSet(viewsets.ModelViewSet):
+    @action(detail=True, methods=['post'], url_path='maintenance/finish', url_name='finish-maintenance',
+            parser_classes=[JSONParser, FormParser, MultiPartParser])
+    def finish_maintenance(self, request, pk=None):
+        """Termina el mantenimiento: el vehículo vuelve a estar disponible."""
+        vehicle = self.get_object()
+        fleet.finish_maintenance(vehicle)
+        return Response(VehicleSerializer(vehicle, context={'request': request}).data)
+
+class ShipmentManifestViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """API endpoint para los manifiestos de carga (remesas)."""
     queryset = ShipmentManifest.objects.all().order_by('-id')
     serializer_class = ShipmentManifestSerializer
     permission_classes = [IsAuthenticated]
+    replica_actions = ('list', 'retrieve', 'pdf')
     
-    @action(detail=True, methods=['post'])
-    def dispatch(self, request, pk=None):
+    @action(detail=False, methods=['post'], url_path='create-and-dispatch', url_name='create-and-dispatch')
+    @idempotent
+    def create_and_dispatch(self, request):
+        """Crea un manifiesto con el vehículo y las facturas pendientes indicadas y lo despacha."""
+        serializer = CreateDispatchSerializer(data=request.data, context={'request': request})
+        serializer.is_valid(raise_exception=True)
+        manifest = serializer.save()
+        manifest = (
+            ShipmentManifest.objects
+            .prefetch_related('invoices__sender', 'invoices__recipient', 'invoices__items')
+            .get(pk=manifest.pk)
+        )
+        return Response(ShipmentManifestSerializer(manifest).data, status=status.HTTP_201_CREATED)
+
+    # El método no puede llamarse `dispatch`: reemplazaría a APIView.dispatch
+    # y todas las peticiones del viewset terminarían en esta acción.
+    @action(detail=True, methods=['post'], url_path='dispatch', url_name='dispatch')
+    @idempotent
+    def dispatch_manifest(self, request, pk=None):
         """Acción para despachar un manifiesto con sus facturas."""
         manifest = self.get_object()
         serializer = DispatchSerializer(instance=manifest, data=request.data)
@@ -98,67 +249,245 @@ class ShipmentManifestViewSet(viewsets.ModelViewSet):
             return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     @action(detail=True, methods=['post'])
+    @idempotent
     def finalize_trip(self, request, pk=None):
-        """Acción para finalizar un viaje."""
+        """
+        Finaliza el viaje. Las facturas en tránsito quedan ENTREGADAS, salvo
+        las indicadas en `returned`, que quedan DEVUELTAS (ver api/manifests.py).
+        """
         manifest = self.get_object()
-        with transaction.atomic():
-            if manifest.status != 'EN_RUTA':
-                return Response({'error': 'El manifiesto no está en ruta.'}, status=status.HTTP_400_BAD_REQUEST)
-            
-            manifest.status = 'FINALIZADO'
-            manifest.arrival_time = timezone.now()
-            manifest.save()
-            
-            vehicle = manifest.vehicle
-            vehicle.status = 'DISPONIBLE'
-            vehicle.save()
-            
-            manifest.invoices.all().update(shipping_status='ENTREGADA')
-            
-            return Response({'status': 'viaje finalizado, facturas entregadas'}, status=status.HTTP_200_OK)
-        
-class ExpenseViewSet(viewsets.ModelViewSet):
+        if manifest.status != 'EN_RUTA':
+            return Response({'error': 'El manifiesto no está en ruta.'}, status=status.HTTP_400_BAD_REQUEST)
+        serializer = FinalizeTripSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        result = manifests.finalize(
+            manifest, serializer.validated_data['returned'], request.user, serializer.validated_data.get('distance_km'),
+        )
+        return Response({'status': 'viaje finalizado', **result}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def deliveries(self, request, pk=None):
+        """Resultado de la entrega de cada factura del manifiesto."""
+        events = self.get_object().delivery_events.order_by('pk')
+        return Response(DeliveryEventSerializer(events, many=True).data)
+
+    @action(detail=True, methods=['get'], renderer_classes=[PDFRenderer])
+    def pdf(self, request, pk=None):
+        """
+        Manifiesto en PDF: el resumen de la carga y, salvo con ?guides=0, las
+        guías de todas sus facturas en el mismo archivo (ver api/documents.py).
+        """
+        manifest = self.get_object()
+        with_guides = request.query_params.get('guides', '1').lower() not in ('0', 'false', 'no')
+        return pdf_response(documents.manifest_pdf(manifest, with_guides), f'manifiesto-{manifest.manifest_number}.pdf')
+
+    @action(detail=True, methods=['get'])
+    def route(self, request, pk=None):
+        """Orden de las paradas del manifiesto y llegada estimada a cada oficina (ver api/routing.py)."""
+        return Response(RouteSerializer(routing.plan(self.get_object())).data)
+
+class ExpenseViewSet(ReplicaReadsMixin, viewsets.ModelViewSet):
     """API endpoint para los gastos operativos."""
     queryset = Expense.objects.all().order_by('-created_at')
     serializer_class = ExpenseSerializer
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 4, 'retrieve': 4}
 
     def get_queryset(self):
         """Filtra los gastos por usuario/oficina, similar a las facturas."""
         user = self.request.user
+        # created_by se serializa con su rol (y permisos) y su oficina
+        queryset = (
+            Expense.objects
+            .select_related('office', 'created_by__role', 'created_by__office')
+            .prefetch_related('created_by__role__permissions')
+            .order_by('-created_at')
+        )
         if user.is_superuser:
-            return Expense.objects.all().order_by('-created_at')
-        return Expense.objects.filter(office=user.office).order_by('-created_at')
+            return queryset
+        return queryset.filter(office=user.office)
 
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_dashboard_stats(request):
     """
     Calcula y devuelve las estadísticas principales para el Dashboard.
+    Los montos se expresan en la moneda indicada en ?currency= (VES o USD).
     """
+    currency = request.query_params.get('currency', currencies.reporting_currency())
+    if currency not in currencies.CURRENCIES:
+        return Response({'currency': 'Moneda no soportada.'}, status=status.HTTP_400_BAD_REQUEST)
+    use_replica(request.user)
+    revenue, expenses = dashboard_queries(currency)
+    return Response(dashboard_stats(
+        currency,
+        revenue.aggregate(total=Sum('converted'))['total'],
+        expenses.aggregate(total=Sum('converted'))['total'],
+        dashboard.shipping_status_counts(),
+    ))
+
+def dashboard_queries(currency):
+    """Consultas del dashboard: ingresos y gastos del mes (el conteo por estado está en api/dashboard.py)."""
     now = timezone.now()
-    total_revenue = Invoice.objects.filter(
+    revenue = Invoice.objects.filter(
         created_at__year=now.year,
         created_at__month=now.month
-    ).exclude(payment_status='ANULADA').aggregate(total=Sum('total'))['total'] or 0
-    total_expenses = Expense.objects.filter(
+    ).exclude(payment_status='ANULADA').annotate(converted=currencies.invoice_amount(currency))
+    expenses = Expense.objects.filter(
         created_at__year=now.year,
         created_at__month=now.month
-    ).aggregate(total=Sum('amount'))['total'] or 0
-    shipping_status_counts = Invoice.objects.values('shipping_status').annotate(count=Count('id'))
-    stats = {
+    ).annotate(converted=currencies.expense_amount(currency))
+    return revenue, expenses
+
+def dashboard_stats(currency, total_revenue, total_expenses, shipping_status_counts):
+    total_revenue = total_revenue or 0
+    total_expenses = total_expenses or 0
+    return {
+        'currency': currency,
         'total_revenue_month': total_revenue,
         'total_expenses_month': total_expenses,
         'net_income_month': total_revenue - total_expenses,
-        'shipping_status_counts': {item['shipping_status']: item['count'] for item in shipping_status_counts}
+        'shipping_status_counts': shipping_status_counts
     }
-    return Response(stats)
 
-class AuditLogViewSet(viewsets.ReadOnlyModelViewSet):
+class ProfitAndLossReportView(ReplicaReadsMixin, APIView):
+    """
+    Reporte de ganancias y pérdidas por oficina, ruta (origen/destino) y periodo.
+    Parámetros: start, end (YYYY-MM-DD) y granularity (day, week o month).
+    """
+    permission_classes = [IsAuthenticated, HasPermissionKey]
+    required_permission = 'reports.view'
+
+    def get(self, request, *args, **kwargs):
+        params = ProfitAndLossQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        data = params.validated_data
+        return Response(reports.profit_and_loss(data['start'], data['end'], data['granularity'], data['currency']))
+
+class BackupView(APIView):
+    """
+    GET: descarga un respaldo completo de la base de datos y de los archivos
+    subidos (?media=0 para omitirlos). Para bases grandes o respaldos
+    incrementales conviene `python manage.py backup` (ver api/backup.py).
+    """
+    permission_classes = [IsAuthenticated, HasPermissionKey]
+    required_permission = 'system.backupRestore'
+
+    def get(self, request, *args, **kwargs):
+        archive = tempfile.NamedTemporaryFile(suffix='.tar')
+        try:
+            manifest = backup.backup(archive.name, media=request.query_params.get('media') != '0')
+        except Exception:
+            archive.close()
+            raise
+        AuditLog.objects.create(
+            user=request.user, action="Respaldo de la Base de Datos",
+            details=f"Respaldo {manifest['id']}: {manifest['rows']} filas.",
+        )
+        # El archivo temporal se borra cuando la respuesta lo cierra
+        filename = f"respaldo-{timezone.localtime():%Y%m%d-%H%M%S}.tar"
+        return FileResponse(archive, as_attachment=True, filename=filename, content_type='application/x-tar')
+
+class RestoreView(APIView):
+    """
+    POST (multipart): restaura los respaldos del campo `archives`, en orden:
+    uno completo y, opcionalmente, sus incrementales. Reemplaza los datos actuales.
+    """
+    permission_classes = [IsAuthenticated, HasPermissionKey]
+    required_permission = 'system.backupRestore'
+    parser_classes = (MultiPartParser,)
+
+    def post(self, request, *args, **kwargs):
+        archives = request.FILES.getlist('archives')
+        if not archives:
+            return Response({'archives': ['Se requiere al menos un respaldo.']}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            summary = backup.restore(archives, media=request.data.get('media') != '0')
+        except (tarfile.TarError, backup.BackupError) as error:
+            return Response({'detail': str(error)}, status=status.HTTP_400_BAD_REQUEST)
+        # El usuario puede no existir en la base restaurada
+        AuditLog.objects.create(
+            user=User.objects.filter(pk=request.user.pk).first(), action="Restauración de la Base de Datos",
+            details=f"Respaldos {', '.join(summary['archives'])}: {sum(summary['tables'].values())} filas.",
+        )
+        return Response(summary)
+
+class CleanupView(APIView):
+    """
+    Archivo de datos antiguos (ver api/archive.py). GET informa cuántas filas
+    se archivarían; POST archiva, con los mismos parámetros (invoice_days,
+    audit_days) y max_batches, acotado a ARCHIVE_API_MAX_BATCHES para que la
+    petición no ocupe un hilo indefinidamente.
+    """
+    permission_classes = [IsAuthenticated, HasPermissionKey]
+    required_permission = 'system.cleanup'
+
+    def get(self, request, *args, **kwargs):
+        params = CleanupSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params.validated_data.pop('max_batches', None)
+        return Response(archive.pending(**params.validated_data))
+
+    def post(self, request, *args, **kwargs):
+        params = CleanupSerializer(data=request.data)
+        params.is_valid(raise_exception=True)
+        counts = archive.run(**params.validated_data)
+        AuditLog.objects.create(
+            user=request.user, action="Archivo de Datos",
+            details=f"{counts['invoices']} facturas y {counts['audit_logs']} registros de auditoría archivados.",
+        )
+        return Response(counts)
+
+class ChangeFeedView(APIView):
+    """
+    Cambios de estado de facturas y manifiestos posteriores a ?since=<seq>.
+    Con ?wait=<segundos> espera a que haya alguno, pero como cada espera ocupa
+    un hilo se limita a CHANGE_FEED_SYNC_MAX_WAIT; el long-poll completo lo
+    atiende async_views.change_feed bajo ASGI (ver api/changefeed.py).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = ChangeFeedQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get('since')
+        if since is None:
+            return Response({'since': None, 'next': changefeed.head(), 'results': []})
+        wait = min(params.validated_data['wait'], settings.CHANGE_FEED_SYNC_MAX_WAIT)
+        changes, cursor = changefeed.wait_for(since, feed_invoices(request.user), wait)
+        return Response({'since': since, 'next': cursor, 'results': StatusChangeSerializer(changes, many=True).data})
+
+def feed_invoices(user):
+    """Facturas cuyos cambios ve el usuario en el feed (None: todas)."""
+    return None if sees_all_invoices(user) else visible_invoices(user)
+
+class ExchangeRateViewSet(viewsets.ModelViewSet):
+    """API endpoint para el histórico de tasas del BCV. Solo el staff puede modificarlo."""
+    queryset = ExchangeRate.objects.all()
+    serializer_class = ExchangeRateSerializer
+
+    def get_permissions(self):
+        if self.action in ('list', 'retrieve', 'on_date'):
+            return [IsAuthenticated()]
+        return [IsAdminUser()]
+
+    @action(detail=False, methods=['get'], url_path='on-date')
+    def on_date(self, request):
+        """Devuelve la tasa vigente en ?date=YYYY-MM-DD (por defecto, hoy)."""
+        field = serializers.DateField()
+        day = field.to_internal_value(request.query_params['date']) if 'date' in request.query_params else timezone.localdate()
+        return Response({'date': day, 'rate': currencies.rate_on(day)})
+
+class AuditLogViewSet(ReplicaReadsMixin, viewsets.ReadOnlyModelViewSet):
     """API endpoint para ver los registros de auditoría."""
-    queryset = AuditLog.objects.all()
+    queryset = (
+        AuditLog.objects
+        .select_related('user__role', 'user__office')
+        .prefetch_related('user__role__permissions')
+    )
     serializer_class = AuditLogSerializer
     permission_classes = [IsAdminUser]
+    query_budget = {'list': 4, 'retrieve': 4}
 
 class CompanyInfoView(APIView):
     permission_classes = [IsAuthenticated]
@@ -166,9 +495,10 @@ class CompanyInfoView(APIView):
     parser_classes = (MultiPartParser, FormParser,)
 
     def get(self, request, *args, **kwargs):
-        company_info = CompanyInfo.load()
-        serializer = CompanyInfoSerializer(company_info)
-        return Response(serializer.data)
+        data = reference_namespace(CompanyInfo).get_or_set(
+            ('detail',), lambda: CompanyInfoSerializer(CompanyInfo.load()).data
+        )
+        return Response(data)
 
     def post(self, request, *args, **kwargs):
         if not request.user.is_staff:
@@ -188,7 +518,7 @@ class SupplierViewSet(viewsets.ModelViewSet):
     serializer_class = SupplierSerializer
     permission_classes = [IsAuthenticated]
 
-class AssetCategoryViewSet(viewsets.ModelViewSet):
+class AssetCategoryViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """API endpoint para Categorías de Bienes."""
     queryset = AssetCategory.objects.all()
     serializer_class = AssetCategorySerializer
@@ -197,8 +527,9 @@ class AssetCategoryViewSet(viewsets.ModelViewSet):
 
 class AssetViewSet(viewsets.ModelViewSet):
     """API endpoint para Bienes/Activos."""
-    queryset = Asset.objects.all()
+    queryset = Asset.objects.select_related('category', 'office')
     permission_classes = [IsAuthenticated]
+    query_budget = {'list': 3, 'retrieve': 3}
     
     def get_serializer_class(self):
         if self.action == 'create' or self.action == 'update':
@@ -207,52 +538,139 @@ class AssetViewSet(viewsets.ModelViewSet):
 
 # --- VISTAS PARA PARÁMETROS DE CONFIGURACIÓN ---
 
-class OfficeViewSet(viewsets.ModelViewSet):
+class OfficeViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     queryset = Office.objects.all()
     serializer_class = OfficeSerializer
     # CAMBIO: Se permite a cualquier usuario autenticado LEER.
     permission_classes = [IsAuthenticated]
 
-class RoleViewSet(viewsets.ModelViewSet):
-    queryset = Role.objects.all()
+class OfficeRouteViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
+    """Tramos entre oficinas: distancia y tiempo de viaje."""
+    queryset = OfficeRoute.objects.order_by('pk')
+    serializer_class = OfficeRouteSerializer
+    permission_classes = [IsAuthenticated]
+
+class RoleViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
+    queryset = Role.objects.prefetch_related('permissions')
     serializer_class = RoleSerializer
     # CAMBIO: Se permite a cualquier usuario autenticado LEER.
     permission_classes = [IsAuthenticated]
     
-class PermissionViewSet(viewsets.ModelViewSet):
+class PermissionViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     queryset = Permission.objects.all()
     serializer_class = PermissionSerializer
     # CAMBIO: Se permite a cualquier usuario autenticado LEER.
     permission_classes = [IsAuthenticated]
 
 class UserViewSet(viewsets.ModelViewSet):
-    queryset = User.objects.all()
+    queryset = User.objects.select_related('role', 'office').prefetch_related('role__permissions')
     serializer_class = UserSerializer
+    query_budget = {'list': 4, 'retrieve': 4}
     # CAMBIO: Se permite a cualquier usuario autenticado LEER.
     permission_classes = [IsAuthenticated]
 
 # --- CAMBIO: AÑADIR NUEVAS VISTAS (VIEWSETS) ---
 
-class ShippingTypeViewSet(viewsets.ModelViewSet):
+class ShippingTypeViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """API endpoint para Tipos de Envío."""
     queryset = ShippingType.objects.all()
     serializer_class = ShippingTypeSerializer
     permission_classes = [IsAuthenticated]
 
-class PaymentMethodViewSet(viewsets.ModelViewSet):
+class PaymentMethodViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """API endpoint para Formas de Pago."""
     queryset = PaymentMethod.objects.all()
     serializer_class = PaymentMethodSerializer
     permission_classes = [IsAuthenticated]
 
-class ExpenseCategoryViewSet(viewsets.ModelViewSet):
+class ExpenseCategoryViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """API endpoint para Categorías de Gasto."""
     queryset = ExpenseCategory.objects.all()
     serializer_class = ExpenseCategorySerializer
     permission_classes = [IsAuthenticated]
 
-class CategoryViewSet(viewsets.ModelViewSet):
+class CategoryViewSet(CachedReferenceMixin, viewsets.ModelViewSet):
     """API endpoint para Categorías de Mercancía."""
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     permission_classes = [IsAuthenticated]
+
+# --- RASTREO PÚBLICO ---
+
+class TrackingView(APIView):
+    """Estado de un envío por número de factura, sin autenticación y con límite por IP (ver api/tracking.py)."""
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = [ScopedRateThrottle]
+    throttle_scope = 'tracking'
+
+    def get(self, request, invoice_number, *args, **kwargs):
+        data = tracking.lookup(invoice_number)
+        if data is None:
+            return Response({'detail': 'No se encontró un envío con ese número.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(data)
+
+# --- SINCRONIZACIÓN INCREMENTAL ---
+
+class SyncView(APIView):
+    """
+    Objetos cambiados y borrados desde ?since=<marca> para los clientes de las
+    sucursales (ver api/sync.py). ?entities= limita las entidades.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        params = SyncQuerySerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        since = params.validated_data.get('since')
+        if since is None or sync.needs_full_resync(since):
+            return Response({'watermark': sync.head(), 'full_resync': True, 'has_more': False, 'changes': {}})
+
+        changes, watermark, has_more = sync.read(since)
+        entities = params.validated_data.get('entities')
+        sources = sync_sources(request.user)
+        data = {}
+        for entity, (changed, deleted) in changes.items():
+            if entities and entity not in entities:
+                continue
+            queryset, serializer_class = sources[entity]
+            rows = queryset.filter(pk__in=changed) if changed else []
+            data[entity] = {
+                'updated': serializer_class(rows, many=True, context={'request': request}).data,
+                'deleted': deleted,
+            }
+        return Response({'watermark': watermark, 'full_resync': False, 'has_more': has_more, 'changes': data})
+
+def sync_sources(user):
+    """Entidad -> (queryset visible para el usuario, serializer): la misma representación que su endpoint de lista."""
+    viewsets = {
+        'vehicle': VehicleViewSet, 'office': OfficeViewSet, 'role': RoleViewSet, 'permission': PermissionViewSet,
+        'shipping_type': ShippingTypeViewSet, 'payment_method': PaymentMethodViewSet,
+        'expense_category': ExpenseCategoryViewSet, 'category': CategoryViewSet, 'asset_category': AssetCategoryViewSet,
+    }
+    return {
+        'client': (Client.objects.all(), ClientSerializer),
+        'invoice': (visible_invoices(user), InvoiceSerializer),
+        'manifest': (
+            ShipmentManifest.objects.prefetch_related('invoices__sender', 'invoices__recipient', 'invoices__items'),
+            ShipmentManifestSerializer,
+        ),
+        **{entity: (viewset.queryset, viewset.serializer_class) for entity, viewset in viewsets.items()},
+    }
+
+# --- MÉTRICAS ---
+
+def prometheus_metrics(request):
+    """
+    Métricas de rendimiento en formato de Prometheus, solo para las IPs de
+    METRICS_ALLOWED_IPS y, si se define METRICS_TOKEN, con la cabecera
+    `Authorization: Bearer <METRICS_TOKEN>`. Detrás de un proxy local la IP es
+    siempre la del proxy: ahí lo que protege el endpoint es el token.
+    """
+    if request.META.get('REMOTE_ADDR') not in settings.METRICS_ALLOWED_IPS:
+        return HttpResponseForbidden()
+    if settings.METRICS_TOKEN and not hmac.compare_digest(
+        request.headers.get('Authorization', '').encode(), f'Bearer {settings.METRICS_TOKEN}'.encode(),
+    ):
+        return HttpResponseForbidden()
+    return HttpResponse(metrics_registry.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
@@ -5,6 +5,11 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+En producción: uvicorn config.asgi:application --workers N, con DB_POOL=1
+para reutilizar conexiones (las persistentes, CONN_MAX_AGE > 0, no se
+admiten bajo ASGI). Las rutas de api/urls_async.py se atienden con vistas
+asíncronas (ver api/async_views.py).
 """
 
 import os
@@ -12,5 +17,12 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
+# Sin conexiones persistentes por defecto, que Django no admite bajo ASGI (ver config/settings.py)
+os.environ.setdefault('DJANGO_ASGI', '1')
 
 application = get_asgi_application()
+
+# Deja en el log qué ajustes de rendimiento están activos en este proceso
+from api.checks import log_performance_report  # noqa: E402
+
+log_performance_report()
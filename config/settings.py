@@ -4,13 +4,63 @@ from pathlib import Path
 import os
 from datetime import timedelta
 
+from corsheaders.defaults import default_headers
+
 BASE_DIR = Path(__file__).resolve().parent.parent
 
-SECRET_KEY = 'django-insecure-aqui-va-una-clave-generada-automaticamente'
 
-DEBUG = True
+def env_bool(name, default=False):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+def env_int(name, default):
+    value = os.environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def env_list(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def cache_config(backend, location=None):
+    """
+    Configuración de la caché 'default' según CACHE_BACKEND:
+    'locmem' (memoria del proceso), 'file' (disco, compartida entre procesos),
+    'redis' (servidor Redis/Valkey en CACHE_URL) o 'fakeredis' (stand-in en
+    memoria compatible con Redis, requiere el paquete fakeredis).
+    """
+    if backend == 'locmem':
+        return {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': location or 'sistema-backend'}
+    if backend == 'file':
+        return {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': location or '/var/tmp/sistema_backend_cache',
+        }
+    if backend == 'redis':
+        return {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': location or 'redis://127.0.0.1:6379/0'}
+    if backend == 'fakeredis':
+        from fakeredis import FakeConnection
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': location or 'redis://fakeredis/0',
+            'OPTIONS': {'connection_class': FakeConnection},
+        }
+    raise ValueError(f"CACHE_BACKEND desconocido: {backend}")
+
+
+# Los valores por defecto son los de desarrollo local; en producción se usa
+# config.settings_production y todo se toma de variables de entorno.
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY', 'django-insecure-aqui-va-una-clave-generada-automaticamente')
 
-ALLOWED_HOSTS = ['*']
+DEBUG = env_bool('DJANGO_DEBUG', True)
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', ['*'])
 
 # Application definition
 
@@ -32,6 +82,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Bajo ASGI, las lecturas más consultadas las atienden vistas asíncronas
+    'api.middleware.AsyncRoutesMiddleware',
+    # Para medir la petición completa (ver api/middleware.py)
+    'api.middleware.PerformanceMiddleware',
+    'api.middleware.QueryInspectorMiddleware',
+    # Dentro de PerformanceMiddleware: se mide el tamaño ya comprimido
+    'api.middleware.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     # Middleware de CORS (importante que esté aquí arriba)
@@ -39,6 +96,8 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    # Lecturas desde réplicas (ver api/db_router.py)
+    'api.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -65,17 +124,59 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 # Configuración para PostgreSQL
+# Lo marca config/asgi.py antes de cargar la configuración
+RUNNING_ASGI = env_bool('DJANGO_ASGI')
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.postgresql',
-        'NAME': 'alianza_db',       # Reemplaza con el nombre de tu BD
-        'USER': 'miguel',           # Reemplaza con tu usuario de PostgreSQL
-        'PASSWORD': '123',  # Reemplaza con tu contraseña de PostgreSQL
-        'HOST': 'localhost',
-        'PORT': '5432',
+        'NAME': os.environ.get('DB_NAME', 'alianza_db'),
+        'USER': os.environ.get('DB_USER', 'miguel'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', '123'),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        # Conexiones persistentes: segundos que se reutiliza una conexión (0 = una por petición).
+        # Django no las admite bajo ASGI (cada hilo de sync_to_async dejaría la suya
+        # abierta): ahí el valor por defecto es 0 y se usa DB_POOL
+        'CONN_MAX_AGE': env_int('DB_CONN_MAX_AGE', 0 if RUNNING_ASGI else 60),
+        # Verifica que la conexión reutilizada siga viva antes de usarla
+        'CONN_HEALTH_CHECKS': env_bool('DB_CONN_HEALTH_CHECKS', True),
+        'OPTIONS': {},
     }
 }
 
+# Pool de conexiones de psycopg 3 (Django 5.1+, `psycopg[pool]` en
+# requirements.txt). Reemplaza a las conexiones persistentes, que Django no
+# permite combinar.
+if env_bool('DB_POOL'):
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['OPTIONS']['pool'] = {
+        'min_size': env_int('DB_POOL_MIN_SIZE', 2),
+        'max_size': env_int('DB_POOL_MAX_SIZE', 10),
+        'timeout': env_int('DB_POOL_TIMEOUT', 10),
+    }
+
+# Réplicas de solo lectura (ver api/db_router.py): DB_REPLICA_HOSTS=host1,host2:5433
+# con el mismo nombre de base, usuario y clave que la principal. En pruebas
+# apuntan a la base de prueba de la principal.
+DATABASE_REPLICAS = []
+for number, address in enumerate(env_list('DB_REPLICA_HOSTS', []), start=1):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'OPTIONS': {**DATABASES['default']['OPTIONS']},
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+# Segundos que un usuario lee de la principal después de escribir
+REPLICA_STICKY_SECONDS = env_int('REPLICA_STICKY_SECONDS', 10)
+# Segundos que se guardan en caché los resultados calculados en una réplica
+# (ej: periodos cerrados del reporte), por si la réplica estaba atrasada
+REPLICA_CACHE_SECONDS = env_int('REPLICA_CACHE_SECONDS', 300)
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator'},
@@ -104,6 +205,17 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.AllowAny',
     ),
+    # Mismo JSON que el JSONRenderer de DRF, más rápido (ver api/renderers.py)
+    'DEFAULT_RENDERER_CLASSES': (
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ),
+    # Límites por IP de los endpoints públicos (ej: rastreo de envíos)
+    'DEFAULT_THROTTLE_RATES': {
+        'tracking': os.environ.get('TRACKING_RATE', '60/min'),
+    },
+    # Proxies delante de la aplicación, para tomar la IP del cliente de X-Forwarded-For
+    'NUM_PROXIES': env_int('NUM_PROXIES', None),
 }
 
 # --- Configuración de CORS ---
@@ -113,11 +225,106 @@ CORS_ALLOWED_ORIGINS = [
     "http://localhost:5173", # Puerto por defecto de Vite/React
     "http://127.0.0.1:5173",
 ]
+# Reintentos seguros de creación y despacho (ver api/idempotency.py)
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key')
 
 AUTH_USER_MODEL = 'api.User'
 
-MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# --- Caché ---
+CACHES = {
+    'default': cache_config(
+        os.environ.get('CACHE_BACKEND', 'locmem'),
+        os.environ.get('CACHE_URL') or os.environ.get('CACHE_DIR'),
+    ),
+}
+
+# --- Métricas de rendimiento ---
+# Server-Timing en cada respuesta y /api/metrics/ en formato de Prometheus
+PERFORMANCE_METRICS = env_bool('PERFORMANCE_METRICS', True)
+METRICS_ALLOWED_IPS = env_list('METRICS_ALLOWED_IPS', ['127.0.0.1', '::1'])
+# Con valor, /api/metrics/ exige además `Authorization: Bearer <METRICS_TOKEN>`
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Detector de N+1 y consultas lentas (api/query_inspector.py): 'off', 'log' (staging) o 'raise' (pruebas)
+QUERY_INSPECTOR = os.environ.get('QUERY_INSPECTOR', 'off')
+NPLUSONE_THRESHOLD = env_int('NPLUSONE_THRESHOLD', 3)
+SLOW_QUERY_MS = env_int('SLOW_QUERY_MS', 100)
+
+# Vistas asíncronas bajo ASGI (api/async_views.py): URLconf y peticiones
+# simultáneas por proceso (igualar al tamaño del pool de conexiones)
+ASGI_URLCONF = 'config.urls_asgi'
+ASYNC_VIEW_CONCURRENCY = env_int('ASYNC_VIEW_CONCURRENCY', 20)
+ASYNC_VIEW_QUEUE_TIMEOUT = env_int('ASYNC_VIEW_QUEUE_TIMEOUT', 5)
+
+# Feed de cambios de estado (api/changefeed.py): cambios por respuesta, espera
+# máxima de un long-poll, frecuencia de sondeo y antigüedad a partir de la cual
+# un hueco en la secuencia se considera una transacción revertida (segundos).
+# Bajo WSGI cada espera ocupa un hilo: la vista síncrona espera a lo sumo
+# CHANGE_FEED_SYNC_MAX_WAIT; las esperas largas, solo bajo ASGI
+CHANGE_FEED_PAGE_SIZE = env_int('CHANGE_FEED_PAGE_SIZE', 500)
+CHANGE_FEED_MAX_WAIT = env_int('CHANGE_FEED_MAX_WAIT', 25)
+CHANGE_FEED_SYNC_MAX_WAIT = env_int('CHANGE_FEED_SYNC_MAX_WAIT', 2)
+CHANGE_FEED_POLL_INTERVAL = env_int('CHANGE_FEED_POLL_INTERVAL', 1)
+CHANGE_FEED_SETTLE = env_int('CHANGE_FEED_SETTLE', 5)
+
+# Sincronización incremental (api/sync.py): objetos por respuesta y días de
+# log conservados; una marca de agua más antigua requiere resincronizar todo
+SYNC_PAGE_SIZE = env_int('SYNC_PAGE_SIZE', 1000)
+SYNC_LOG_RETENTION_DAYS = env_int('SYNC_LOG_RETENTION_DAYS', 30)
+
+# Rastreo público (api/tracking.py): vigencia en la caché compartida de un
+# envío y de un número inexistente, y copia en memoria de cada proceso
+TRACKING_CACHE_TIMEOUT = env_int('TRACKING_CACHE_TIMEOUT', 3600)
+TRACKING_NOT_FOUND_TIMEOUT = env_int('TRACKING_NOT_FOUND_TIMEOUT', 60)
+TRACKING_LOCAL_CACHE_SECONDS = env_int('TRACKING_LOCAL_CACHE_SECONDS', 1)
+TRACKING_LOCAL_CACHE_SIZE = env_int('TRACKING_LOCAL_CACHE_SIZE', 10000)
+
+# Conteo de facturas por estado de envío del dashboard (api/dashboard.py): se
+# ajusta con cada transición y se recalcula al vencer
+DASHBOARD_COUNTS_TIMEOUT = env_int('DASHBOARD_COUNTS_TIMEOUT', 300)
+
+# Ruta de los manifiestos (api/routing.py): minutos de descarga en cada
+# oficina, sumados a la hora estimada de llegada a las siguientes
+ROUTE_STOP_MINUTES = env_int('ROUTE_STOP_MINUTES', 15)
+
+# Respaldos (api/backup.py): filas por trozo comprimido, nivel de gzip y
+# tablas leídas en paralelo (solo PostgreSQL)
+BACKUP_CHUNK_SIZE = env_int('BACKUP_CHUNK_SIZE', 10000)
+BACKUP_COMPRESSION_LEVEL = env_int('BACKUP_COMPRESSION_LEVEL', 6)
+BACKUP_WORKERS = env_int('BACKUP_WORKERS', 4)
+
+# PDF de guías y manifiestos (api/documents.py): procesos que dibujan las
+# guías de un manifiesto y guías a partir de las cuales se usan
+PDF_WORKERS = env_int('PDF_WORKERS', 2)
+PDF_POOL_MIN_GUIDES = env_int('PDF_POOL_MIN_GUIDES', 50)
+
+# Compresión de las respuestas (api/compression.py): tamaño mínimo en bytes,
+# nivel de gzip y calidad de brotli (solo si el paquete brotli está instalado)
+RESPONSE_COMPRESSION = env_bool('RESPONSE_COMPRESSION', True)
+COMPRESSION_MIN_BYTES = env_int('COMPRESSION_MIN_BYTES', 1024)
+COMPRESSION_GZIP_LEVEL = env_int('COMPRESSION_GZIP_LEVEL', 5)
+COMPRESSION_BROTLI_QUALITY = env_int('COMPRESSION_BROTLI_QUALITY', 4)
+
+# Archivo de datos antiguos (api/archive.py): días que se conservan las
+# facturas terminadas y la auditoría, filas por lote y lotes por tabla como
+# máximo en una petición a /api/cleanup/ (archive_data no tiene límite)
+ARCHIVE_INVOICE_DAYS = env_int('ARCHIVE_INVOICE_DAYS', 365)
+ARCHIVE_AUDIT_DAYS = env_int('ARCHIVE_AUDIT_DAYS', 180)
+ARCHIVE_BATCH_SIZE = env_int('ARCHIVE_BATCH_SIZE', 500)
+ARCHIVE_API_MAX_BATCHES = env_int('ARCHIVE_API_MAX_BATCHES', 10)
+
+# Cabecera Idempotency-Key (api/idempotency.py): segundos que se conserva la
+# respuesta, espera máxima de un duplicado mientras la original sigue en
+# curso y tiempo tras el cual una petición en curso se da por abandonada
+IDEMPOTENCY_KEY_TTL = env_int('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+IDEMPOTENCY_WAIT_SECONDS = env_int('IDEMPOTENCY_WAIT_SECONDS', 10)
+IDEMPOTENCY_LOCK_SECONDS = env_int('IDEMPOTENCY_LOCK_SECONDS', 120)
+
+# Moneda en la que se expresan el dashboard y los reportes ('VES' o 'USD')
+REPORTING_CURRENCY = 'VES'
+
+MEDIA_URL = os.environ.get('DJANGO_MEDIA_URL', '/media/')
+MEDIA_ROOT = os.environ.get('DJANGO_MEDIA_ROOT', os.path.join(BASE_DIR, 'media'))
 
 SIMPLE_JWT = {
     # El token principal de acceso dura 8 horas
@@ -131,7 +338,7 @@ SIMPLE_JWT = {
     "UPDATE_LAST_LOGIN": False,
 
     "ALGORITHM": "HS256",
-    "SIGNING_KEY": SECRET_KEY,
+    "SIGNING_KEY": os.environ.get('JWT_SIGNING_KEY', SECRET_KEY),
     "VERIFYING_KEY": "",
     "AUDIENCE": None,
     "ISSUER": None,
@@ -0,0 +1,76 @@
+# config/settings_production.py
+
+"""
+Perfil de producción. Se activa con DJANGO_SETTINGS_MODULE=config.settings_production
+y toma la configuración sensible de variables de entorno:
+
+    DJANGO_SECRET_KEY (obligatoria), JWT_SIGNING_KEY, DJANGO_ALLOWED_HOSTS,
+    DB_NAME, DB_USER, DB_PASSWORD, DB_HOST, DB_PORT, DB_CONN_MAX_AGE, DB_POOL...,
+    CACHE_BACKEND (redis o file) con CACHE_URL (redis://...) o CACHE_DIR, DJANGO_MEDIA_URL, DJANGO_MEDIA_ROOT,
+    DJANGO_STATIC_ROOT, DJANGO_LOG_LEVEL, METRICS_TOKEN.
+
+Los archivos de /media/ y /static/ los sirve el servidor web (nginx) o un CDN,
+nunca Django.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+from .settings import *  # noqa: F401,F403
+from .settings import BASE_DIR, REST_FRAMEWORK, SIMPLE_JWT, TEMPLATES, cache_config, env_list
+
+# Sin DEBUG Django deja de guardar cada consulta SQL en memoria y de servir /media/
+DEBUG = False
+
+SECRET_KEY = os.environ.get('DJANGO_SECRET_KEY')
+if not SECRET_KEY:
+    raise ImproperlyConfigured("La variable de entorno DJANGO_SECRET_KEY es obligatoria en producción.")
+
+SIMPLE_JWT = {**SIMPLE_JWT, 'SIGNING_KEY': os.environ.get('JWT_SIGNING_KEY', SECRET_KEY)}
+
+ALLOWED_HOSTS = env_list('DJANGO_ALLOWED_HOSTS', [])
+
+STATIC_ROOT = os.environ.get('DJANGO_STATIC_ROOT', os.path.join(BASE_DIR, 'staticfiles'))
+
+# Plantillas compiladas una sola vez por proceso
+TEMPLATES = [{
+    **TEMPLATES[0],
+    'APP_DIRS': False,
+    'OPTIONS': {
+        **TEMPLATES[0]['OPTIONS'],
+        'loaders': [
+            ('django.template.loaders.cached.Loader', [
+                'django.template.loaders.filesystem.Loader',
+                'django.template.loaders.app_directories.Loader',
+            ]),
+        ],
+    },
+}]
+
+# Caché compartida entre procesos: Redis si se indica CACHE_URL, si no, archivos en disco
+CACHES = {
+    'default': cache_config(
+        os.environ.get('CACHE_BACKEND', 'redis' if os.environ.get('CACHE_URL') else 'file'),
+        os.environ.get('CACHE_URL') or os.environ.get('CACHE_DIR'),
+    ),
+}
+
+# Detrás del proxy todas las peticiones llegan desde 127.0.0.1, así que la IP
+# no basta: sin METRICS_TOKEN /api/metrics/ queda cerrado para todos
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+if not METRICS_TOKEN:
+    METRICS_ALLOWED_IPS = []
+
+# Solo JSON: el API navegable de DRF no se usa en producción y es costoso de renderizar
+REST_FRAMEWORK = {
+    **REST_FRAMEWORK,
+    'DEFAULT_RENDERER_CLASSES': ('api.renderers.FastJSONRenderer',),
+}
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {'console': {'class': 'logging.StreamHandler'}},
+    'root': {'handlers': ['console'], 'level': os.environ.get('DJANGO_LOG_LEVEL', 'INFO')},
+}
@@ -0,0 +1,61 @@
+# config/settings_test.py
+
+"""
+Perfil para la suite de pruebas. `python manage.py test` lo usa por defecto
+(ver manage.py) y no necesita un PostgreSQL en marcha:
+
+    TEST_DATABASE=sqlite   (por defecto) SQLite en memoria
+    TEST_DATABASE=postgres PostgreSQL local desechable, con DB_NAME, DB_USER,
+                           DB_PASSWORD, DB_HOST y DB_PORT; Django crea y borra
+                           la base test_<DB_NAME>
+
+Ambos perfiles definen además la base 'replica', una segunda base de prueba
+que solo usan las pruebas del router de réplicas (api/db_router.py).
+
+En ambos casos la suite puede correr en paralelo en todos los núcleos:
+
+    python manage.py test --parallel
+"""
+
+import os
+import tempfile
+
+from .settings import *  # noqa: F401,F403
+from .settings import DATABASES, cache_config
+
+if os.environ.get('TEST_DATABASE', 'sqlite') == 'postgres':
+    DATABASES = {
+        'default': {
+            **DATABASES['default'],
+            # Las conexiones persistentes o en pool no aportan nada en pruebas
+            'CONN_MAX_AGE': 0,
+            'OPTIONS': {},
+        }
+    }
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'NAME': f"test_{DATABASES['default']['NAME']}_replica"}}
+else:
+    # Con --parallel Django clona la base en memoria para cada proceso
+    DATABASES = {
+        'default': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+        'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': ':memory:'},
+    }
+
+# 'replica' es una base aparte que hace de réplica (atrasada) en ReplicaTests;
+# solo se crea en las pruebas que la declaran y fuera de ellas no se usa
+DATABASE_REPLICAS = []
+
+DEBUG = False
+
+# El hasher por defecto (PBKDF2) es deliberadamente lento; en pruebas no hace falta
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+# Caché en memoria, propia de cada proceso de prueba
+CACHES = {'default': cache_config('locmem', 'pruebas')}
+
+# Las pruebas fallan si un endpoint supera su presupuesto de consultas
+QUERY_INSPECTOR = 'raise'
+
+# Los archivos subidos durante las pruebas no ensucian media/
+MEDIA_ROOT = tempfile.mkdtemp(prefix='sistema_backend_media_')
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
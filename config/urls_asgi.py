@@ -0,0 +1,14 @@
+# config/urls_asgi.py
+
+# URLconf usado bajo ASGI (lo activa api.middleware.AsyncRoutesMiddleware):
+# las vistas asíncronas de api/urls_async.py tienen prioridad y el resto de
+# rutas son las mismas de config/urls.py.
+
+from django.urls import include, path
+
+from .urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/', include('api.urls_async')),
+    *wsgi_urlpatterns,
+]
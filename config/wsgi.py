@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
 application = get_wsgi_application()
+
+# Deja en el log qué ajustes de rendimiento están activos en este proceso
+from api.checks import log_performance_report  # noqa: E402
+
+log_performance_report()